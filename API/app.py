@@ -1,13 +1,16 @@
-from flask import Flask, request, jsonify, g
+from flask import Flask, Response, request, jsonify, g
 from flask_cors import CORS
 import logging
 import os
 import threading
 import time
+from contextlib import ExitStack
 from controladores.bloques_controlador import BloquesControlador
 from controladores.archivos_controlador import archivos_bp, ArchivosControlador
-from servicios.archivos_servicio import ArchivosServicio
-from servicios.bloques_servicio import BloquesServicio
+from controladores.servidor_grpc import iniciar_servidor_grpc
+from servicios import metricas
+from servicios.grabador_carga import grabador
+from common.utils import tracing
 
 
 # Configurar logging
@@ -24,13 +27,52 @@ CORS(app)
 # Registra el Blueprint de archivos
 app.register_blueprint(archivos_bp)
 
-# Inicializar servicios
-archivos_servicio = ArchivosServicio()
-bloques_servicio = BloquesServicio()
+# Spans en DFS_TRACE_DIR/namenode.jsonl, colgados de la traza que envíe el cliente
+tracing.configure('namenode')
+
+# Latencia de cada petición REST, agrupada por la regla de la ruta (no por la URL concreta)
+@app.before_request
+def iniciar_medicion():
+    g.inicio_peticion = time.perf_counter()
+    g.ts_peticion = time.time()
+    endpoint = request.url_rule.rule if request.url_rule else 'sin_ruta'
+    g.traza = ExitStack()
+    g.traza.enter_context(tracing.continued(*tracing.extract(request.headers)))
+    g.atributos_traza = g.traza.enter_context(tracing.span(f"{request.method} {endpoint}"))
+
+@app.after_request
+def registrar_medicion(response):
+    inicio = g.pop('inicio_peticion', None)
+    if inicio is not None:
+        endpoint = request.url_rule.rule if request.url_rule else 'sin_ruta'
+        duracion = time.perf_counter() - inicio
+        metricas.PETICIONES_HTTP.labels(request.method, endpoint, response.status_code).observe(duracion)
+        grabador.grabar_peticion(request, response, g.pop('ts_peticion'), duracion)
+    if 'atributos_traza' in g:
+        g.atributos_traza['status'] = response.status_code
+    return response
+
+@app.teardown_request
+def cerrar_traza(error=None):
+    traza = g.pop('traza', None)
+    if traza is not None:
+        traza.close()
+
+# Inicializar servicios (las mismas instancias que usa el Blueprint de archivos)
+controlador = ArchivosControlador()
+archivos_servicio = controlador.archivos_servicio
+bloques_servicio = controlador.bloques_servicio
+contenedores_servicio = controlador.contenedores_servicio
+reclamacion_servicio = controlador.reclamacion_servicio
+concesiones_servicio = controlador.concesiones_servicio
+sesiones_subida_servicio = controlador.sesiones_subida_servicio
+metricas.registrar_colector_replicacion(bloques_servicio)
 
 # Configuración por variables de entorno
 PUERTO_NAMENODE = int(os.getenv('NAMENODE_PORT', 8080))
 HOST_NAMENODE = os.getenv('NAMENODE_HOST', '0.0.0.0')
+# Modo debug de Flask (recarga al cambiar el código); los benchmarks lo desactivan
+DEBUG_NAMENODE = os.getenv('NAMENODE_DEBUG', 'true').lower() == 'true'
 
 # ================== Monitor de DataNodes ==================
 
@@ -46,15 +88,38 @@ def monitor_datanodes():
             for bloque_id in bloques_problematicos:
                 bloques_servicio.reparar_replicacion(bloque_id)
             
+            # Compactar contenedores de archivos pequeños con muchos bytes borrados
+            contenedores_servicio.compactar()
+            
+            # Olvidar los rangos de contenedor reservados que ningún cliente confirmó
+            contenedores_servicio.expirar_reservas()
+            
+            # Dar por fallidos los comandos que ningún DataNode confirmó a tiempo
+            bloques_servicio.expirar_comandos()
+            
+            # Abandonar los anexados cuyo escritor dejó de renovar la concesión
+            concesiones_servicio.expirar()
+            
+            # Liberar los bloques de las subidas reanudables que nadie retomó
+            sesiones_subida_servicio.expirar()
+            
             time.sleep(30)
 
         except Exception as e:
             logger.error(f"Error en monitor de DataNodes: {e}")
             time.sleep(60)
 
-# Iniciar hilo de monitorización
-monitor_thread = threading.Thread(target=monitor_datanodes, daemon=True)
-monitor_thread.start()
+def iniciar_segundo_plano():
+    """Arranca los hilos de fondo y los servidores gRPC; retorna (heartbeats, clientes)"""
+    # Iniciar hilo de monitorización
+    threading.Thread(target=monitor_datanodes, daemon=True).start()
+
+    # Reclamación en segundo plano de los subárboles borrados con rmdir -r
+    reclamacion_servicio.iniciar()
+
+    # gRPC: stream de heartbeats de los DataNodes (detecta caídas al cortarse el stream)
+    # y, en otro servidor, protocolo de metadatos para clientes
+    return iniciar_servidor_grpc(controlador)
 
 # ================== Endpoints del sistema ==================
 
@@ -81,6 +146,12 @@ def obtener_estado():
         logger.error(f"Error obteniendo estado: {e}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+@app.route('/metrics', methods=['GET'])
+def exportar_metricas():
+    """Métricas en formato Prometheus"""
+    cuerpo, tipo = metricas.exportar()
+    return Response(cuerpo, content_type=tipo)
+
 # ================== Endpoints de DataNodes ==================
 
 @app.route('/datanodes/register', methods=['POST'])
@@ -116,15 +187,15 @@ def heartbeat_datanode():
         if not data or 'host' not in data or 'puerto' not in data:
             return jsonify({'status': 'error', 'message': 'Host y puerto son requeridos'}), 400
 
-        success = bloques_servicio.heartbeat_datanode(
-            host=data['host'],
-            puerto=data['puerto'],
-            estado_info=data.get('estado_info'))
+        with metricas.HEARTBEATS.labels('rest').time():
+            comandos = bloques_servicio.heartbeat_datanode(
+                host=data['host'],
+                puerto=data['puerto'],
+                estado_info=data.get('estado_info'),
+                invalidados=data.get('invalidados'),
+                completados=data.get('completados'))
         
-        if success:
-            return jsonify({'status': 'success'})
-        else:
-            return jsonify({'status': 'error', 'message': 'Error procesando heartbeat'}), 500
+        return jsonify({'status': 'success', 'comandos': comandos})
 
     except Exception as e:
         logger.error(f"Error en heartbeat: {e}")
@@ -134,23 +205,17 @@ def heartbeat_datanode():
 
 @app.route('/blocks/<bloque_id>/confirm', methods=['POST'])
 def confirmar_bloque(bloque_id):
-    """Confirma que un bloque ha sido escrito correctamente"""
+    """Confirma que un bloque ha sido escrito correctamente en todas sus réplicas"""
     try:
         data = request.get_json()
-        if not data or 'datanode_id' not in data or 'checksum' not in data:
-            return jsonify({'status': 'error', 'message': 'Datanode ID y checksum son requeridos'}), 400
-
-        bloque = bloques_servicio.obtener_bloque(bloque_id)
-        if not bloque:
-            return jsonify({'status': 'error', 'message': 'Bloque no encontrado'}), 404
-
-        # Actualizar checksum y estado del bloque
-        bloque.checksum = data['checksum']
-        bloque.fecha_modificacion = time.time().isoformat()
-        bloques_servicio._guardar_metadata()
+        if not data or 'checksum' not in data:
+            return jsonify({'status': 'error', 'message': 'El checksum es requerido'}), 400
 
+        controlador.confirmar_bloque(bloque_id, data['checksum'], data.get('codec'), data.get('tamaño_almacenado'))
         return jsonify({'status': 'success'})
 
+    except LookupError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 404
     except Exception as e:
         logger.error(f"Error confirmando bloque: {e}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -177,4 +242,11 @@ if __name__ == '__main__':
     # Asegurar que el directorio de metadata existe
     os.makedirs('namenode_data', exist_ok=True)
 
-    app.run(host=HOST_NAMENODE, port=PUERTO_NAMENODE, debug=True, threaded=True)
\ No newline at end of file
+    # Con el recargador de Werkzeug (debug) este módulo se ejecuta en dos procesos: el padre
+    # solo vigila el código y relanza al hijo, que es el que sirve. gRPC abre los puertos con
+    # SO_REUSEPORT, así que si ambos arrancaran sus servidores los DataNodes se repartirían
+    # entre dos NameNodes con estados distintos.
+    if not DEBUG_NAMENODE or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        servidor_heartbeats, servidor_clientes_grpc = iniciar_segundo_plano()
+
+    app.run(host=HOST_NAMENODE, port=PUERTO_NAMENODE, debug=DEBUG_NAMENODE, threaded=True)
\ No newline at end of file
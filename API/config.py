@@ -4,17 +4,75 @@ import os
 # Configuración del NameNode
 NAMENODE_HOST = os.getenv('NAMENODE_HOST', 'localhost')
 NAMENODE_PORT = int(os.getenv('NAMENODE_PORT', 5000))
+# Stream gRPC de heartbeats de los DataNodes: cada stream ocupa un hilo mientras el nodo
+# está conectado, así que su servidor se dimensiona con el tamaño máximo de la flota
+NAMENODE_GRPC_PORT = int(os.getenv('NAMENODE_GRPC_PORT', 50050))
+NAMENODE_MAX_DATANODES = int(os.getenv('NAMENODE_MAX_DATANODES', 256))
+# Protocolo de metadatos de los clientes (ClientProtocol), en un servidor aparte
+NAMENODE_CLIENT_GRPC_PORT = int(os.getenv('NAMENODE_CLIENT_GRPC_PORT', 50049))
+NAMENODE_GRPC_WORKERS = int(os.getenv('NAMENODE_GRPC_WORKERS', 64))
 
 # Configuración de DataNodes
-DATANODE_PORTS = [5001, 5002, 5003]  # Puertos por defecto para DataNodes
+# Puertos de los DataNodes que se dan de alta al arrancar sin metadatos (vacío: solo los que se registren)
+DATANODE_PORTS = [int(p) for p in os.getenv('DATANODE_PORTS', '5001,5002,5003').split(',') if p]
 DATANODE_HOST = os.getenv('DATANODE_HOST', 'localhost')
 
 # Configuración de bloques
 BLOCK_SIZE = int(os.getenv('BLOCK_SIZE', 64 * 1024 * 1024))  # 64MB por defecto
 REPLICATION_FACTOR = int(os.getenv('REPLICATION_FACTOR', 2))  # Factor de replicación mínimo
+# Hilos que comprueban con un DataNode el digest confirmado antes de indexarlo para deduplicar
+DIGEST_VERIFY_WORKERS = int(os.getenv('DIGEST_VERIFY_WORKERS', 4))
+
+# Codificación por borrado Reed-Solomon (k celdas de datos + m de paridad)
+# RS(2,1) cuesta 1.5x y tolera la misma caída de un nodo que la replicación x2
+EC_DATA_CELLS = int(os.getenv('EC_DATA_CELLS', 2))
+EC_PARITY_CELLS = int(os.getenv('EC_PARITY_CELLS', 1))
+
+# Empaquetado de archivos pequeños en bloques contenedor
+SMALL_FILE_THRESHOLD = int(os.getenv('SMALL_FILE_THRESHOLD', 1024 * 1024))  # 1MB
+CONTAINER_BLOCK_SIZE = int(os.getenv('CONTAINER_BLOCK_SIZE', BLOCK_SIZE))
+# Segundos que dura la reserva de un rango hasta que el cliente confirma que escribió los datos
+SMALL_FILE_RESERVATION_TTL = int(os.getenv('SMALL_FILE_RESERVATION_TTL', 10 * 60))
+# Se compacta un contenedor cuando la fracción de bytes muertos supera este umbral
+COMPACTION_GARBAGE_RATIO = float(os.getenv('COMPACTION_GARBAGE_RATIO', 0.5))
+
+# Inodos liberados por lote al reclamar subárboles borrados
+RECLAIM_BATCH_SIZE = int(os.getenv('RECLAIM_BATCH_SIZE', 1000))
+
+# Listado paginado de directorios
+LIST_PAGE_SIZE = int(os.getenv('LIST_PAGE_SIZE', 100))
+LIST_MAX_PAGE_SIZE = int(os.getenv('LIST_MAX_PAGE_SIZE', 1000))
+
+# Diario del namespace: entradas acumuladas antes de compactarlo en una instantánea completa
+NAMESPACE_JOURNAL_MAX = int(os.getenv('NAMESPACE_JOURNAL_MAX', 10000))
+
+# Máximo de bloques a borrar que se envían a un DataNode en cada heartbeat
+INVALIDATION_BATCH_SIZE = int(os.getenv('INVALIDATION_BATCH_SIZE', 1000))
+# Transferencias/compactaciones simultáneas por DataNode si no informa su capacidad
+COMMANDS_PER_HEARTBEAT = int(os.getenv('COMMANDS_PER_HEARTBEAT', 2))
+# Un comando sin confirmar tras este tiempo se da por fallido
+COMMAND_TIMEOUT = int(os.getenv('COMMAND_TIMEOUT', 600))  # segundos
+
+# Subida en streaming: bloques enviándose a la vez por subida (memoria ~ (n + 1) bloques),
+# hilos de envío compartidos entre subidas y tamaño de cada lectura del cuerpo
+STREAM_UPLOAD_INFLIGHT_BLOCKS = int(os.getenv('STREAM_UPLOAD_INFLIGHT_BLOCKS', 3))
+STREAM_UPLOAD_WORKERS = int(os.getenv('STREAM_UPLOAD_WORKERS', 16))
+STREAM_READ_CHUNK = int(os.getenv('STREAM_READ_CHUNK', 1024 * 1024))  # 1MB
+# Escrituras a réplicas en paralelo: cada bloque subido ocupa REPLICATION_FACTOR hilos
+REPLICA_WRITE_WORKERS = int(os.getenv('REPLICA_WRITE_WORKERS', 48))
+
+# Anexado: una concesión de escritura no renovada en este tiempo caduca y libera el archivo
+LEASE_DURATION = int(os.getenv('LEASE_DURATION', 60))  # segundos
+
+# Subidas reanudables: una sesión sin actividad en este tiempo caduca y libera sus bloques
+UPLOAD_SESSION_TTL = int(os.getenv('UPLOAD_SESSION_TTL', 24 * 60 * 60))  # segundos
+
+# Grabación de la carga de metadatos en JSONL para reproducirla después (vacío: no se graba)
+WORKLOAD_RECORD_FILE = os.getenv('WORKLOAD_RECORD_FILE')
 
 # Configuración de directorios
-NAMENODE_METADATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'namenode_data')
+NAMENODE_METADATA_DIR = os.getenv('NAMENODE_METADATA_DIR',
+                                  os.path.join(os.path.dirname(os.path.abspath(__file__)), 'namenode_data'))
 DATANODE_STORAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'datanode_data')
 
 # Configuración de autenticación (opcional)
@@ -24,6 +82,15 @@ SECRET_KEY = os.getenv('SECRET_KEY', 'dfs-secret-key-2025')
 # Configuración de red
 REQUEST_TIMEOUT = int(os.getenv('REQUEST_TIMEOUT', 30))  # segundos
 MAX_RETRIES = int(os.getenv('MAX_RETRIES', 3))
+# Transporte gRPC NameNode -> DataNode (un canal por nodo): espera máxima a que el
+# canal conecte, aparte del timeout de cada llamada
+DATANODE_CONNECT_TIMEOUT = float(os.getenv('DATANODE_CONNECT_TIMEOUT', 2))  # segundos
+# Backoff con jitter entre reintentos: aleatorio en [0, min(max, base * 2^intento)]
+RETRY_BACKOFF_BASE = float(os.getenv('RETRY_BACKOFF_BASE', 0.2))  # segundos
+RETRY_BACKOFF_MAX = float(os.getenv('RETRY_BACKOFF_MAX', 5))  # segundos
+# Fallos seguidos que abren el circuito de un DataNode y cuánto dura abierto
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', 5))
+CIRCUIT_OPEN_SECONDS = float(os.getenv('CIRCUIT_OPEN_SECONDS', 15))
 
 # Configuración de logging
 LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
@@ -1,9 +1,24 @@
-from flask import Blueprint, request, jsonify, g
+from flask import Blueprint, Response, request, jsonify, g, stream_with_context
 from servicios.archivos_servicio import ArchivosServicio
 from servicios.bloques_servicio import BloquesServicio
+from servicios.contenedores_servicio import ContenedoresServicio
+from servicios.reclamacion_servicio import ReclamacionServicio
+from servicios.subida_servicio import SubidaServicio
+from servicios.concesiones_servicio import ConcesionesServicio
+from servicios.sesiones_subida_servicio import SesionesSubidaServicio
+from servicios.lectura_servicio import LecturaServicio
+from servicios.cerrojo_metadatos import cerrojo_metadatos, con_lectura, con_escritura
 import logging
+from datetime import datetime
 from functools import wraps
 import os
+import sys
+# Permite importar el paquete common
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from common.utils import erasure, tracing
+from common.utils.byte_ranges import parse_range_header, covering_blocks
+from config import LIST_PAGE_SIZE
 
 logger = logging.getLogger(__name__)
 
@@ -45,6 +60,82 @@ class ArchivosControlador:
         """Inicializa los servicios necesarios"""
         self.archivos_servicio = ArchivosServicio()
         self.bloques_servicio = BloquesServicio()
+        self.contenedores_servicio = ContenedoresServicio(self.archivos_servicio, self.bloques_servicio)
+        self.reclamacion_servicio = ReclamacionServicio(
+            self.archivos_servicio, self.bloques_servicio, self.contenedores_servicio
+        )
+        self.subida_servicio = SubidaServicio(
+            self.archivos_servicio, self.bloques_servicio, self.contenedores_servicio
+        )
+        self.concesiones_servicio = ConcesionesServicio(self.archivos_servicio, self.bloques_servicio)
+        self.sesiones_subida_servicio = SesionesSubidaServicio(self.archivos_servicio, self.bloques_servicio)
+        self.lectura_servicio = LecturaServicio()
+
+    # ---- Operaciones compartidas por la API REST y el protocolo gRPC de clientes ----
+
+    @tracing.traced('asignar_archivo')
+    @con_escritura
+    def asignar_archivo(self, ruta: str, tamaño: int, usuario: str):
+        """Crea el archivo y reserva sus bloques replicados; el cliente los escribe en los DataNodes"""
+        directorio_padre = os.path.dirname(ruta) or '/'
+        if not self.archivos_servicio.directorio_existe(directorio_padre):
+            self.archivos_servicio.crear_directorio(directorio_padre)
+
+        archivo = self.archivos_servicio.crear_archivo(ruta, usuario)
+        bloques = self.bloques_servicio.crear_bloques_para_archivo(archivo.nombre, tamaño)
+        archivo.bloques = [b.bloque_id for b in bloques]
+        archivo.tamaño_total = tamaño
+        self.archivos_servicio.guardar_archivo(archivo)
+        return archivo, bloques
+
+    @con_lectura
+    def bloques_de_archivo(self, archivo) -> list:
+        """Bloques de un archivo en orden, con ubicaciones; un archivo empaquetado es un rango de su contenedor"""
+        if archivo.contenedor:
+            contenedor = self.bloques_servicio.obtener_bloque(archivo.contenedor['bloque_id'])
+            bloque = contenedor.to_dict()
+            bloque.update({
+                'offset': archivo.contenedor['offset'],
+                'longitud': archivo.contenedor['longitud'],
+                'tamaño': archivo.contenedor['longitud']
+            })
+            return [bloque]
+
+        bloques = [self.bloques_servicio.obtener_bloque(bid) for bid in archivo.bloques]
+        return [b.to_dict() for b in bloques if b]
+
+    @con_escritura
+    def eliminar_archivo_y_bloques(self, ruta: str, usuario: str):
+        """Elimina un archivo y libera una referencia de cada bloque; None si no existe"""
+        archivo = self.archivos_servicio.obtener_archivo(ruta)
+        if not archivo:
+            return None
+
+        self.archivos_servicio.eliminar_archivo(ruta, usuario)
+        if archivo.contenedor:
+            self.contenedores_servicio.liberar(archivo)
+        eliminados = self.bloques_servicio.liberar_bloques(archivo.bloques)
+        return {
+            'bloques_liberados': eliminados,
+            'bloques_compartidos': len(archivo.bloques) - eliminados
+        }
+
+    @con_escritura
+    def confirmar_bloque(self, bloque_id: str, checksum: str, codec: str = None, tamaño_almacenado: int = None):
+        """Anota un bloque que el cliente ya escribió en sus DataNodes: checksum, codec y tamaño almacenado"""
+        bloque = self.bloques_servicio.obtener_bloque(bloque_id)
+        if not bloque:
+            raise LookupError('Bloque no encontrado')
+
+        # El checksum lo calcula el cliente: el bloque se deduplica solo cuando un
+        # DataNode confirma que guarda ese contenido
+        self.bloques_servicio.registrar_checksum(bloque, checksum)
+        if self.sesiones_subida_servicio.pertenece(bloque_id):
+            self.sesiones_subida_servicio.bloque_confirmado(bloque_id)
+        bloque.codec = codec or bloque.codec
+        bloque.tamaño_almacenado = tamaño_almacenado if tamaño_almacenado is not None else bloque.tamaño
+        bloque.fecha_modificacion = datetime.now().isoformat()
+        self.bloques_servicio._guardar_metadata()
 
     @staticmethod
     @archivos_bp.route('/upload', methods=['POST'])
@@ -72,26 +163,53 @@ class ArchivosControlador:
             instancia = ArchivosControlador()
             archivos_servicio = instancia.archivos_servicio
             bloques_servicio = instancia.bloques_servicio
-
-            # Verificar y crear directorios si no existen
-            if not archivos_servicio.directorio_existe(directorio_padre):
-                archivos_servicio.crear_directorio(directorio_padre)
-
-            # Validar ruta completa
-            ruta = archivos_servicio.validar_ruta(ruta_destino)
+            contenedores_servicio = instancia.contenedores_servicio
 
             # Determinar tamaño del archivo
             file.seek(0, 2)
             tamaño = file.tell()
             file.seek(0)
 
-            # Crear metadatos del archivo
-            archivo = archivos_servicio.crear_archivo(ruta, g.usuario)
+            # Archivos pequeños: se anexan a un contenedor compartido y el archivo
+            # solo se crea cuando sus datos están escritos
+            if contenedores_servicio.es_pequeño(tamaño) and request.form.get('modo') != 'ec':
+                ruta = archivos_servicio.validar_ruta(ruta_destino)
+                archivo = contenedores_servicio.subir(ruta, file.read(), g.usuario)
+                return jsonify({
+                    'success': True,
+                    'message': f'Archivo {ruta} subido exitosamente',
+                    'data': {
+                        'archivo': archivo.to_dict(),
+                        'bloques_subidos': 0,
+                        'tamaño_total': tamaño
+                    }
+                }), 201
+
+            # Los metadatos se registran bajo el cerrojo; la subida a los DataNodes va fuera de él
+            with cerrojo_metadatos.escritura():
+                # Verificar y crear directorios si no existen
+                if not archivos_servicio.directorio_existe(directorio_padre):
+                    archivos_servicio.crear_directorio(directorio_padre)
 
-            # Crear bloques para el archivo
-            bloques = bloques_servicio.crear_bloques_para_archivo(archivo.nombre, tamaño)
-            archivo.bloques = [b.bloque_id for b in bloques]
-            archivo.tamaño_total = tamaño
+                # Validar ruta completa
+                ruta = archivos_servicio.validar_ruta(ruta_destino)
+
+                # Crear metadatos del archivo
+                archivo = archivos_servicio.crear_archivo(ruta, g.usuario)
+
+                # Crear bloques para el archivo (replicados o con codificación por borrado)
+                if request.form.get('modo') == 'ec':
+                    bloques = bloques_servicio.crear_grupos_ec_para_archivo(
+                        archivo.nombre, tamaño,
+                        k=request.form.get('ec_k', type=int),
+                        m=request.form.get('ec_m', type=int)
+                    )
+                    archivo.redundancia = 'ec'
+                else:
+                    bloques = bloques_servicio.crear_bloques_para_archivo(archivo.nombre, tamaño)
+                archivo.bloques = [b.bloque_id for b in bloques]
+                archivo.tamaño_total = tamaño
+                archivos_servicio.guardar_archivo(archivo)
 
             # Subir los bloques
             block_size = bloques_servicio.block_size
@@ -99,11 +217,14 @@ class ArchivosControlador:
                 file.seek(bloque.posicion * block_size)
                 block_data = file.read(bloque.tamaño)
 
-                success = bloques_servicio.subir_bloque(
-                    bloque_id=bloque.bloque_id,
-                    data=block_data,
-                    leader_uri=bloque.get_leader_uri()
-                )
+                if bloque.es_erasure():
+                    success = ArchivosControlador._subir_celdas_ec(bloques_servicio, bloque, block_data)
+                else:
+                    success = bloques_servicio.subir_bloque(
+                        bloque_id=bloque.bloque_id,
+                        data=block_data,
+                        ubicaciones=bloque.ubicaciones
+                    )
 
                 if not success:
                     raise Exception(f"Error subiendo bloque {bloque.bloque_id}")
@@ -122,5 +243,609 @@ class ArchivosControlador:
             logger.error(f"Error en upload_file: {str(e)}", exc_info=True)
             return jsonify({'success': False, 'error': str(e)}), 500
 
+    @staticmethod
+    @archivos_bp.route('/stream/<path:ruta>', methods=['PUT'])
+    @autenticar
+    def upload_stream(ruta):
+        """Sube un archivo desde el cuerpo crudo de la petición (application/octet-stream).
+        Los bloques se envían a los DataNodes mientras el cuerpo sigue llegando."""
+        try:
+            instancia = ArchivosControlador()
+            ruta = instancia.archivos_servicio.validar_ruta(ruta)
+            archivo, bloques_subidos = instancia.subida_servicio.subir(ruta, request.stream, g.usuario)
+
+            return jsonify({
+                'success': True,
+                'message': f'Archivo {ruta} subido exitosamente',
+                'data': {
+                    'archivo': archivo.to_dict(),
+                    'bloques_subidos': bloques_subidos,
+                    'tamaño_total': archivo.tamaño_total
+                }
+            }), 201
+
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 409
+        except Exception as e:
+            logger.error(f"Error en upload_stream: {str(e)}", exc_info=True)
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @staticmethod
+    @archivos_bp.route('/stream/<path:ruta>', methods=['GET'])
+    @autenticar
+    def download_stream(ruta):
+        """Descarga el contenido de un archivo. Con cabecera `Range: bytes=...` responde 206
+        con solo ese rango: a cada DataNode se le piden únicamente los bytes de sus bloques
+        que caen dentro."""
+        try:
+            instancia = ArchivosControlador()
+            ruta = instancia.archivos_servicio.validar_ruta(ruta)
+            with cerrojo_metadatos.lectura():
+                archivo = instancia.archivos_servicio.obtener_archivo(ruta)
+                if not archivo:
+                    return jsonify({'success': False, 'error': f'El archivo {ruta} no existe'}), 404
+                tamaño = archivo.tamaño_total
+                bloques = instancia.bloques_de_archivo(archivo)
+
+            cabeceras = {'Accept-Ranges': 'bytes'}
+            estado = 200
+            offset, longitud = 0, tamaño
+            if request.headers.get('Range'):
+                try:
+                    offset, longitud = parse_range_header(request.headers['Range'], tamaño)
+                except ValueError as e:
+                    return jsonify({'success': False, 'error': str(e)}), 416, {'Content-Range': f'bytes */{tamaño}'}
+                estado = 206
+                cabeceras['Content-Range'] = f'bytes {offset}-{offset + longitud - 1}/{tamaño}'
+            cabeceras['Content-Length'] = str(longitud)
+
+            # Los datos se leen fuera del cerrojo de metadatos, según se envían
+            partes = covering_blocks(bloques, offset, longitud)
+            return Response(stream_with_context(instancia.lectura_servicio.leer(partes)), status=estado,
+                            headers=cabeceras, mimetype='application/octet-stream')
+
+        except Exception as e:
+            logger.error(f"Error en download_stream: {str(e)}", exc_info=True)
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @staticmethod
+    def _subir_celdas_ec(bloques_servicio, bloque, block_data: bytes) -> bool:
+        """Codifica un bloque en k+m celdas y sube cada una a su DataNode"""
+        celdas = erasure.encode(block_data, bloque.ec_k, bloque.ec_m)
+        for indice, ubicacion in enumerate(bloque.ubicaciones):
+            if not bloques_servicio.subir_bloque(bloque.celda_id(indice), celdas[indice], [ubicacion]):
+                return False
+        return True
+
+    @staticmethod
+    @archivos_bp.route('/asignar', methods=['POST'])
+    @autenticar
+    def registrar_archivo():
+        """Registra un archivo y reserva sus bloques; el cliente sube los datos a los DataNodes"""
+        try:
+            data = request.get_json()
+            if not data or 'ruta' not in data or 'tamaño' not in data:
+                return jsonify({'success': False, 'error': 'Se requieren ruta y tamaño'}), 400
+
+            instancia = ArchivosControlador()
+            ruta = instancia.archivos_servicio.validar_ruta(data['ruta'])
+            archivo, bloques = instancia.asignar_archivo(ruta, data['tamaño'], g.usuario)
+
+            return jsonify({
+                'success': True,
+                'data': {
+                    'archivo': archivo.to_dict(),
+                    'bloques': [b.to_dict() for b in bloques]
+                }
+            }), 201
+
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 409
+        except Exception as e:
+            logger.error(f"Error en registrar_archivo: {str(e)}", exc_info=True)
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @staticmethod
+    @archivos_bp.route('/estado', methods=['GET'])
+    @autenticar
+    def obtener_estado():
+        """Atributos de un archivo o directorio: ?ruta="""
+        try:
+            archivos_servicio = ArchivosControlador().archivos_servicio
+            ruta = archivos_servicio.validar_ruta(request.args.get('ruta', '/'))
+            estado = archivos_servicio.obtener_estado(ruta)
+            if estado is None:
+                return jsonify({'success': False, 'error': f'La ruta {ruta} no existe'}), 404
+            return jsonify({'success': True, 'data': estado})
+
+        except Exception as e:
+            logger.error(f"Error en obtener_estado: {str(e)}", exc_info=True)
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @staticmethod
+    @archivos_bp.route('/bloques/<path:ruta>', methods=['GET'])
+    @autenticar
+    def obtener_bloques(ruta):
+        """Devuelve los bloques de un archivo, en orden, con sus ubicaciones"""
+        try:
+            instancia = ArchivosControlador()
+            archivos_servicio = instancia.archivos_servicio
+
+            ruta = archivos_servicio.validar_ruta(ruta)
+            with cerrojo_metadatos.lectura():
+                archivo = archivos_servicio.obtener_archivo(ruta)
+                if not archivo:
+                    return jsonify({'success': False, 'error': f'El archivo {ruta} no existe'}), 404
+                datos = {'archivo': archivo.to_dict(), 'bloques': instancia.bloques_de_archivo(archivo)}
+
+            return jsonify({'success': True, 'data': datos})
+
+        except Exception as e:
+            logger.error(f"Error en obtener_bloques: {str(e)}", exc_info=True)
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @staticmethod
+    @archivos_bp.route('/ec/registrar', methods=['POST'])
+    @autenticar
+    def registrar_archivo_ec():
+        """Registra un archivo con codificación por borrado; el cliente sube las celdas"""
+        try:
+            data = request.get_json()
+            if not data or 'ruta' not in data or 'tamaño' not in data:
+                return jsonify({'success': False, 'error': 'Se requieren ruta y tamaño'}), 400
+
+            instancia = ArchivosControlador()
+            archivos_servicio = instancia.archivos_servicio
+            bloques_servicio = instancia.bloques_servicio
+
+            with cerrojo_metadatos.escritura():
+                ruta = archivos_servicio.validar_ruta(data['ruta'])
+                directorio_padre = os.path.dirname(ruta) or '/'
+                if not archivos_servicio.directorio_existe(directorio_padre):
+                    archivos_servicio.crear_directorio(directorio_padre)
+
+                archivo = archivos_servicio.crear_archivo(ruta, g.usuario)
+                bloques = bloques_servicio.crear_grupos_ec_para_archivo(
+                    archivo.nombre, data['tamaño'], k=data.get('ec_k'), m=data.get('ec_m')
+                )
+                archivo.bloques = [b.bloque_id for b in bloques]
+                archivo.tamaño_total = data['tamaño']
+                archivo.redundancia = 'ec'
+                archivos_servicio.guardar_archivo(archivo)
+
+            return jsonify({
+                'success': True,
+                'data': {
+                    'archivo': archivo.to_dict(),
+                    'bloques': [b.to_dict() for b in bloques]
+                }
+            }), 201
+
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 409
+        except Exception as e:
+            logger.error(f"Error en registrar_archivo_ec: {str(e)}", exc_info=True)
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @staticmethod
+    @archivos_bp.route('/empaquetado/registrar', methods=['POST'])
+    @autenticar
+    def registrar_archivo_pequeño():
+        """Reserva un rango en un contenedor para un archivo pequeño.
+        El cliente escribe los datos en ese offset del contenedor y después confirma la
+        reserva; hasta entonces el archivo no existe."""
+        try:
+            data = request.get_json()
+            if not data or 'ruta' not in data or 'tamaño' not in data:
+                return jsonify({'success': False, 'error': 'Se requieren ruta y tamaño'}), 400
+
+            instancia = ArchivosControlador()
+            archivos_servicio = instancia.archivos_servicio
+            contenedores_servicio = instancia.contenedores_servicio
+
+            if not contenedores_servicio.es_pequeño(data['tamaño']):
+                return jsonify({
+                    'success': False,
+                    'error': f"El archivo supera el umbral de empaquetado ({contenedores_servicio.umbral} bytes)"
+                }), 400
+
+            ruta = archivos_servicio.validar_ruta(data['ruta'])
+            reserva, contenedor = contenedores_servicio.reservar(ruta, data['tamaño'], g.usuario)
+
+            return jsonify({
+                'success': True,
+                'data': {
+                    'reserva_id': reserva['reserva_id'],
+                    'ruta': ruta,
+                    'bloque_id': contenedor.bloque_id,
+                    'offset': reserva['offset'],
+                    'ubicaciones': contenedor.ubicaciones
+                }
+            }), 201
+
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 409
+        except Exception as e:
+            logger.error(f"Error en registrar_archivo_pequeño: {str(e)}", exc_info=True)
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @staticmethod
+    @archivos_bp.route('/empaquetado/<reserva_id>/confirmar', methods=['POST'])
+    @autenticar
+    def confirmar_archivo_pequeño(reserva_id):
+        """Crea el archivo pequeño una vez escritos sus datos en todas las réplicas del contenedor"""
+        try:
+            archivo = ArchivosControlador().contenedores_servicio.confirmar(reserva_id, g.usuario)
+            return jsonify({'success': True, 'data': {'archivo': archivo.to_dict()}}), 201
+
+        except LookupError as e:
+            return jsonify({'success': False, 'error': str(e)}), 404
+        except PermissionError as e:
+            return jsonify({'success': False, 'error': str(e)}), 403
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 409
+        except Exception as e:
+            logger.error(f"Error en confirmar_archivo_pequeño: {str(e)}", exc_info=True)
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @staticmethod
+    @archivos_bp.route('/empaquetado/<reserva_id>', methods=['DELETE'])
+    @autenticar
+    def abandonar_archivo_pequeño(reserva_id):
+        """El cliente no pudo escribir los datos: se descarta la reserva"""
+        try:
+            ArchivosControlador().contenedores_servicio.abandonar(reserva_id, g.usuario)
+            return jsonify({'success': True})
+
+        except LookupError as e:
+            return jsonify({'success': False, 'error': str(e)}), 404
+        except PermissionError as e:
+            return jsonify({'success': False, 'error': str(e)}), 403
+        except Exception as e:
+            logger.error(f"Error en abandonar_archivo_pequeño: {str(e)}", exc_info=True)
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @staticmethod
+    @archivos_bp.route('/dedup/consultar', methods=['POST'])
+    @autenticar
+    def consultar_digests():
+        """Indica qué bloques (por digest SHA-256) ya están almacenados"""
+        try:
+            data = request.get_json()
+            if not data or 'digests' not in data:
+                return jsonify({'success': False, 'error': 'Se requiere la lista de digests'}), 400
+
+            bloques_servicio = ArchivosControlador().bloques_servicio
+            existentes = bloques_servicio.buscar_bloques_por_digest(data['digests'])
+
+            return jsonify({
+                'success': True,
+                'data': {
+                    'existentes': {
+                        digest: {
+                            'bloque_id': bloque.bloque_id,
+                            'ubicaciones': bloque.ubicaciones
+                        } for digest, bloque in existentes.items()
+                    },
+                    'faltantes': [d for d in data['digests'] if d not in existentes]
+                }
+            })
+
+        except Exception as e:
+            logger.error(f"Error en consultar_digests: {str(e)}", exc_info=True)
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @staticmethod
+    @archivos_bp.route('/dedup/registrar', methods=['POST'])
+    @autenticar
+    def registrar_archivo_deduplicado():
+        """Registra un archivo a partir de los digests de sus bloques.
+        Solo los bloques marcados como nuevos deben subirse a los DataNodes."""
+        try:
+            data = request.get_json()
+            if not data or 'ruta' not in data or 'bloques' not in data:
+                return jsonify({'success': False, 'error': 'Se requieren ruta y bloques'}), 400
+
+            instancia = ArchivosControlador()
+            archivos_servicio = instancia.archivos_servicio
+            bloques_servicio = instancia.bloques_servicio
+
+            with cerrojo_metadatos.escritura():
+                ruta = archivos_servicio.validar_ruta(data['ruta'])
+                directorio_padre = os.path.dirname(ruta) or '/'
+                if not archivos_servicio.directorio_existe(directorio_padre):
+                    archivos_servicio.crear_directorio(directorio_padre)
+
+                archivo = archivos_servicio.crear_archivo(ruta, g.usuario)
+                try:
+                    asignados = bloques_servicio.crear_bloques_deduplicados(archivo.nombre, data['bloques'])
+                except Exception:
+                    # crear_bloques_deduplicados ya deshizo sus reservas; falta quitar el archivo
+                    archivos_servicio.eliminar_archivo(ruta, g.usuario)
+                    raise
+                archivo.bloques = [bloque.bloque_id for bloque, _ in asignados]
+                archivo.tamaño_total = sum(b['tamaño'] for b in data['bloques'])
+                archivos_servicio.guardar_archivo(archivo)
+
+            return jsonify({
+                'success': True,
+                'data': {
+                    'archivo': archivo.to_dict(),
+                    'bloques': [{
+                        'bloque_id': bloque.bloque_id,
+                        'digest': bloque.checksum,
+                        'ubicaciones': bloque.ubicaciones,
+                        'nuevo': es_nuevo
+                    } for bloque, es_nuevo in asignados]
+                }
+            }), 201
+
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 409
+        except Exception as e:
+            logger.error(f"Error en registrar_archivo_deduplicado: {str(e)}", exc_info=True)
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @staticmethod
+    @archivos_bp.route('/anexar/abrir', methods=['POST'])
+    @autenticar
+    def abrir_anexado():
+        """Concede el archivo al cliente para anexarle `tamaño` bytes.
+        Devuelve el rango del último bloque que hay que rellenar (si lo hay) y los bloques nuevos."""
+        try:
+            data = request.get_json()
+            if not data or 'ruta' not in data or 'tamaño' not in data:
+                return jsonify({'success': False, 'error': 'Se requieren ruta y tamaño'}), 400
+
+            instancia = ArchivosControlador()
+            ruta = instancia.archivos_servicio.validar_ruta(data['ruta'])
+            plan = instancia.concesiones_servicio.abrir(ruta, int(data['tamaño']), g.usuario)
+            return jsonify({'success': True, 'data': plan}), 201
+
+        except LookupError as e:
+            return jsonify({'success': False, 'error': str(e)}), 404
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 409
+        except Exception as e:
+            logger.error(f"Error en abrir_anexado: {str(e)}", exc_info=True)
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @staticmethod
+    @archivos_bp.route('/anexar/<concesion_id>/renovar', methods=['POST'])
+    @autenticar
+    def renovar_anexado(concesion_id):
+        """Prolonga la concesión de un anexado en curso"""
+        try:
+            duracion = ArchivosControlador().concesiones_servicio.renovar(concesion_id, g.usuario)
+            return jsonify({'success': True, 'data': {'duracion': duracion}})
+
+        except PermissionError as e:
+            return jsonify({'success': False, 'error': str(e)}), 403
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 409
+        except Exception as e:
+            logger.error(f"Error en renovar_anexado: {str(e)}", exc_info=True)
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @staticmethod
+    @archivos_bp.route('/anexar/<concesion_id>/completar', methods=['POST'])
+    @autenticar
+    def completar_anexado(concesion_id):
+        """Incorpora al archivo lo anexado y libera la concesión"""
+        try:
+            data = request.get_json(silent=True) or {}
+            archivo = ArchivosControlador().concesiones_servicio.completar(
+                concesion_id, g.usuario, data.get('checksum_ultimo'))
+            return jsonify({'success': True, 'data': {'archivo': archivo.to_dict()}})
+
+        except LookupError as e:
+            return jsonify({'success': False, 'error': str(e)}), 404
+        except PermissionError as e:
+            return jsonify({'success': False, 'error': str(e)}), 403
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 409
+        except Exception as e:
+            logger.error(f"Error en completar_anexado: {str(e)}", exc_info=True)
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @staticmethod
+    @archivos_bp.route('/anexar/<concesion_id>', methods=['DELETE'])
+    @autenticar
+    def abandonar_anexado(concesion_id):
+        """Abandona un anexado: el archivo queda como estaba"""
+        try:
+            ArchivosControlador().concesiones_servicio.abandonar(concesion_id, g.usuario)
+            return jsonify({'success': True})
+
+        except PermissionError as e:
+            return jsonify({'success': False, 'error': str(e)}), 403
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 409
+        except Exception as e:
+            logger.error(f"Error en abandonar_anexado: {str(e)}", exc_info=True)
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @staticmethod
+    @archivos_bp.route('/subidas', methods=['POST'])
+    @autenticar
+    def abrir_subida():
+        """Abre una subida reanudable, o devuelve la que el usuario dejó a medias en la misma ruta.
+        Cada bloque lleva 'confirmado' con el checksum que recibió el NameNode (None si falta)."""
+        try:
+            data = request.get_json()
+            if not data or 'ruta' not in data or 'tamaño' not in data:
+                return jsonify({'success': False, 'error': 'Se requieren ruta y tamaño'}), 400
+
+            instancia = ArchivosControlador()
+            ruta = instancia.archivos_servicio.validar_ruta(data['ruta'])
+            sesion = instancia.sesiones_subida_servicio.abrir(ruta, int(data['tamaño']), g.usuario)
+            return jsonify({'success': True, 'data': sesion}), 200 if sesion['reanudada'] else 201
+
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 409
+        except Exception as e:
+            logger.error(f"Error en abrir_subida: {str(e)}", exc_info=True)
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @staticmethod
+    @archivos_bp.route('/subidas/<sesion_id>', methods=['GET'])
+    @autenticar
+    def estado_subida(sesion_id):
+        """Bloques confirmados de una subida y el checksum de cada uno"""
+        try:
+            sesion = ArchivosControlador().sesiones_subida_servicio.estado(sesion_id, g.usuario)
+            return jsonify({'success': True, 'data': sesion})
+
+        except LookupError as e:
+            return jsonify({'success': False, 'error': str(e)}), 404
+        except PermissionError as e:
+            return jsonify({'success': False, 'error': str(e)}), 403
+        except Exception as e:
+            logger.error(f"Error en estado_subida: {str(e)}", exc_info=True)
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @staticmethod
+    @archivos_bp.route('/subidas/<sesion_id>/completar', methods=['POST'])
+    @autenticar
+    def completar_subida(sesion_id):
+        """Crea el archivo con los bloques de la subida; falla con 409 si falta alguno por confirmar"""
+        try:
+            archivo = ArchivosControlador().sesiones_subida_servicio.completar(sesion_id, g.usuario)
+            return jsonify({'success': True, 'data': {'archivo': archivo.to_dict()}})
+
+        except LookupError as e:
+            return jsonify({'success': False, 'error': str(e)}), 404
+        except PermissionError as e:
+            return jsonify({'success': False, 'error': str(e)}), 403
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 409
+        except Exception as e:
+            logger.error(f"Error en completar_subida: {str(e)}", exc_info=True)
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @staticmethod
+    @archivos_bp.route('/subidas/<sesion_id>', methods=['DELETE'])
+    @autenticar
+    def abandonar_subida(sesion_id):
+        """Abandona una subida y libera sus bloques"""
+        try:
+            ArchivosControlador().sesiones_subida_servicio.abandonar(sesion_id, g.usuario)
+            return jsonify({'success': True})
+
+        except LookupError as e:
+            return jsonify({'success': False, 'error': str(e)}), 404
+        except PermissionError as e:
+            return jsonify({'success': False, 'error': str(e)}), 403
+        except Exception as e:
+            logger.error(f"Error en abandonar_subida: {str(e)}", exc_info=True)
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @staticmethod
+    @archivos_bp.route('/listar', methods=['GET'])
+    @autenticar
+    def listar_directorio():
+        """Lista un directorio por páginas: ?ruta=&limite=&cursor=&orden=&campos=a,b"""
+        try:
+            archivos_servicio = ArchivosControlador().archivos_servicio
+            ruta = archivos_servicio.validar_ruta(request.args.get('ruta', '/'))
+            campos = request.args.get('campos')
+
+            pagina = archivos_servicio.listar_directorio_paginado(
+                ruta,
+                g.usuario,
+                limite=request.args.get('limite', LIST_PAGE_SIZE, type=int),
+                cursor=request.args.get('cursor'),
+                orden=request.args.get('orden', 'nombre'),
+                campos=[c.strip() for c in campos.split(',') if c.strip()] if campos else None
+            )
+            return jsonify({'success': True, 'data': pagina})
+
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        except Exception as e:
+            logger.error(f"Error en listar_directorio: {str(e)}", exc_info=True)
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @staticmethod
+    @archivos_bp.route('/renombrar', methods=['POST'])
+    @autenticar
+    def renombrar():
+        """Mueve o renombra un archivo o un directorio completo"""
+        try:
+            data = request.get_json() or {}
+            if not data.get('origen') or not data.get('destino'):
+                return jsonify({'success': False, 'error': 'Se requieren origen y destino'}), 400
+
+            archivos_servicio = ArchivosControlador().archivos_servicio
+            origen = archivos_servicio.validar_ruta(data['origen'])
+            destino = archivos_servicio.validar_ruta(data['destino'])
+            archivos_servicio.renombrar(origen, destino, g.usuario)
+
+            return jsonify({
+                'success': True,
+                'message': f'{origen} movido a {destino}',
+                'data': {'origen': origen, 'destino': destino}
+            })
+
+        except PermissionError as e:
+            return jsonify({'success': False, 'error': str(e)}), 403
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 409
+        except Exception as e:
+            logger.error(f"Error en renombrar: {str(e)}", exc_info=True)
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @staticmethod
+    @archivos_bp.route('/directorios/<path:ruta>', methods=['DELETE'])
+    @autenticar
+    def eliminar_directorio(ruta):
+        """Elimina un directorio; con ?recursivo=true desengancha el subárbol y responde al instante"""
+        try:
+            instancia = ArchivosControlador()
+            archivos_servicio = instancia.archivos_servicio
+            ruta = archivos_servicio.validar_ruta(ruta)
+            recursivo = request.args.get('recursivo', 'false').lower() == 'true'
+
+            if not archivos_servicio.eliminar_directorio(ruta, g.usuario, recursivo):
+                return jsonify({'success': False, 'error': f'El directorio {ruta} no existe'}), 404
+
+            return jsonify({
+                'success': True,
+                'message': f'Directorio {ruta} eliminado',
+                'data': {'subarboles_pendientes': instancia.reclamacion_servicio.pendientes()}
+            }), 202 if recursivo else 200
+
+        except PermissionError as e:
+            return jsonify({'success': False, 'error': str(e)}), 403
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 409
+        except Exception as e:
+            logger.error(f"Error en eliminar_directorio: {str(e)}", exc_info=True)
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @staticmethod
+    @archivos_bp.route('/<path:ruta>', methods=['DELETE'])
+    @autenticar
+    def eliminar_archivo(ruta):
+        """Elimina un archivo y libera una referencia de cada uno de sus bloques"""
+        try:
+            instancia = ArchivosControlador()
+            ruta = instancia.archivos_servicio.validar_ruta(ruta)
+            resultado = instancia.eliminar_archivo_y_bloques(ruta, g.usuario)
+            if resultado is None:
+                return jsonify({'success': False, 'error': f'El archivo {ruta} no existe'}), 404
+
+            return jsonify({
+                'success': True,
+                'message': f'Archivo {ruta} eliminado',
+                'data': resultado
+            })
+
+        except PermissionError as e:
+            return jsonify({'success': False, 'error': str(e)}), 403
+        except Exception as e:
+            logger.error(f"Error en eliminar_archivo: {str(e)}", exc_info=True)
+            return jsonify({'success': False, 'error': str(e)}), 500
+
 # Inicialización del controlador (Singleton)
 controlador = ArchivosControlador()
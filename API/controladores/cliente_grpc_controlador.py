@@ -0,0 +1,207 @@
+import base64
+import logging
+import grpc
+from functools import wraps
+from controladores.heartbeat_controlador import namenode_pb2, namenode_pb2_grpc
+from controladores.archivos_controlador import ArchivosControlador, USUARIOS_VALIDOS
+from servicios.cerrojo_metadatos import cerrojo_metadatos
+from servicios.grabador_carga import grabador
+from config import LIST_PAGE_SIZE
+from common.utils import tracing
+
+logger = logging.getLogger(__name__)
+
+
+def usuario_de_metadata(context):
+    """Usuario autenticado a partir de la metadata 'authorization' (Basic, igual que la API REST)"""
+    for clave, valor in context.invocation_metadata():
+        if clave == 'authorization' and valor.startswith('Basic '):
+            try:
+                usuario, password = base64.b64decode(valor[6:]).decode('utf-8').split(':', 1)
+            except Exception:
+                return None
+            if USUARIOS_VALIDOS.get(usuario) == password:
+                return usuario
+    return None
+
+
+def rpc_autenticado(f):
+    """Decorador para autenticar la llamada y traducir las excepciones del servicio a códigos gRPC"""
+    @wraps(f)
+    def decorated_function(self, request, context):
+        usuario = usuario_de_metadata(context)
+        if usuario is None:
+            context.abort(grpc.StatusCode.UNAUTHENTICATED, 'Autenticación requerida')
+        # La grabación envuelve la traducción de errores para registrar el código final
+        with grabador.grabar_rpc(f.__name__, request, context, usuario) as grabacion:
+            try:
+                with tracing.continued(*tracing.extract(context.invocation_metadata())), \
+                        tracing.span(f"grpc.{f.__name__}", usuario=usuario):
+                    grabacion['respuesta'] = f(self, request, context, usuario)
+                    return grabacion['respuesta']
+            except LookupError as e:
+                context.abort(grpc.StatusCode.NOT_FOUND, str(e))
+            except FileExistsError as e:
+                context.abort(grpc.StatusCode.ALREADY_EXISTS, str(e))
+            except PermissionError as e:
+                context.abort(grpc.StatusCode.PERMISSION_DENIED, str(e))
+            except ValueError as e:
+                context.abort(grpc.StatusCode.FAILED_PRECONDITION, str(e))
+            except Exception as e:
+                logger.error(f"Error en {f.__name__}: {str(e)}", exc_info=True)
+                context.abort(grpc.StatusCode.INTERNAL, str(e))
+    return decorated_function
+
+
+def estado_a_proto(estado: dict):
+    """Traducir una entrada del listado (o de obtener_estado) a FileStatus"""
+    return namenode_pb2.FileStatus(
+        path=estado.get('ruta', ''),
+        name=estado['nombre'],
+        type=estado['tipo'],
+        size=estado['tamaño'],
+        modified=estado['fecha_modificacion'] or '',
+        permissions=estado['permisos'],
+        owner=estado['usuario'],
+        inode_id=estado['inodo_id']
+    )
+
+
+def bloque_a_proto(bloque: dict):
+    """Traducir un bloque (BloqueInfo.to_dict, con rango si es de un contenedor) a BlockLocation"""
+    return namenode_pb2.BlockLocation(
+        block_id=bloque['bloque_id'],
+        position=bloque['posicion'],
+        size=bloque['tamaño'],
+        locations=[namenode_pb2.NodeAddress(host=host, port=puerto) for host, puerto in bloque['ubicaciones']],
+        checksum=bloque['checksum'] or '',
+        codec=bloque['codec'] or '',
+        ec_k=bloque['ec_k'],
+        ec_m=bloque['ec_m'],
+        cell_size=bloque['tamaño_celda'],
+        packed='longitud' in bloque,
+        offset=bloque.get('offset', 0),
+        length=bloque.get('longitud', 0)
+    )
+
+
+def sesion_a_proto(sesion: dict):
+    """Traducir el estado de una subida reanudable a UploadSession"""
+    return namenode_pb2.UploadSession(
+        session_id=sesion['sesion_id'],
+        path=sesion['ruta'],
+        size=sesion['tamaño'],
+        resumed=sesion['reanudada'],
+        confirmed=sesion['confirmados'],
+        blocks=[bloque_a_proto(b) for b in sesion['bloques']]
+    )
+
+
+class ClienteGrpcControlador(namenode_pb2_grpc.ClientProtocolServicer):
+    """Protocolo de metadatos para clientes sobre gRPC.
+
+    Usa las mismas operaciones del ArchivosControlador que la API REST, de modo
+    que ambos protocolos ven el mismo espacio de nombres y las mismas reglas.
+    """
+
+    def __init__(self, controlador: ArchivosControlador):
+        self.controlador = controlador
+        self.archivos_servicio = controlador.archivos_servicio
+
+    def _estado_archivo(self, archivo):
+        return estado_a_proto(self.archivos_servicio.obtener_estado(archivo.ruta))
+
+    @rpc_autenticado
+    def CreateFile(self, request, context, usuario):
+        ruta = self.archivos_servicio.validar_ruta(request.path)
+        with cerrojo_metadatos.escritura():
+            if self.archivos_servicio.obtener_archivo(ruta):
+                raise FileExistsError(f'El archivo {ruta} ya existe')
+            archivo, bloques = self.controlador.asignar_archivo(ruta, request.size, usuario)
+            return namenode_pb2.BlockLocationsResponse(
+                file=self._estado_archivo(archivo),
+                blocks=[bloque_a_proto(b.to_dict()) for b in bloques]
+            )
+
+    @rpc_autenticado
+    def GetBlockLocations(self, request, context, usuario):
+        ruta = self.archivos_servicio.validar_ruta(request.path)
+        with cerrojo_metadatos.lectura():
+            archivo = self.archivos_servicio.obtener_archivo(ruta)
+            if not archivo:
+                raise LookupError(f'El archivo {ruta} no existe')
+            return namenode_pb2.BlockLocationsResponse(
+                file=self._estado_archivo(archivo),
+                blocks=[bloque_a_proto(b) for b in self.controlador.bloques_de_archivo(archivo)]
+            )
+
+    @rpc_autenticado
+    def List(self, request, context, usuario):
+        ruta = self.archivos_servicio.validar_ruta(request.path or '/')
+        with cerrojo_metadatos.lectura():
+            if self.archivos_servicio.obtener_directorio(ruta) is None:
+                raise LookupError(f'El directorio {ruta} no existe')
+            pagina = self.archivos_servicio.listar_directorio_paginado(
+                ruta,
+                usuario,
+                limite=request.limit or LIST_PAGE_SIZE,
+                cursor=request.cursor or None,
+                orden=request.order or 'nombre'
+            )
+        return namenode_pb2.ListResponse(
+            entries=[estado_a_proto(entrada) for entrada in pagina['entradas']],
+            next_cursor=pagina['siguiente_cursor'] or ''
+        )
+
+    @rpc_autenticado
+    def Stat(self, request, context, usuario):
+        ruta = self.archivos_servicio.validar_ruta(request.path or '/')
+        estado = self.archivos_servicio.obtener_estado(ruta)
+        if estado is None:
+            raise LookupError(f'La ruta {ruta} no existe')
+        return estado_a_proto(estado)
+
+    @rpc_autenticado
+    def Delete(self, request, context, usuario):
+        ruta = self.archivos_servicio.validar_ruta(request.path)
+        with cerrojo_metadatos.escritura():
+            if self.archivos_servicio.obtener_directorio(ruta) is not None:
+                self.archivos_servicio.eliminar_directorio(ruta, usuario, request.recursive)
+                return namenode_pb2.DeleteResponse(
+                    pending_subtrees=self.controlador.reclamacion_servicio.pendientes()
+                )
+
+            resultado = self.controlador.eliminar_archivo_y_bloques(ruta, usuario)
+            if resultado is None:
+                raise LookupError(f'La ruta {ruta} no existe')
+            return namenode_pb2.DeleteResponse(
+                blocks_freed=resultado['bloques_liberados'],
+                blocks_shared=resultado['bloques_compartidos']
+            )
+
+    @rpc_autenticado
+    def Rename(self, request, context, usuario):
+        origen = self.archivos_servicio.validar_ruta(request.source)
+        destino = self.archivos_servicio.validar_ruta(request.destination)
+        self.archivos_servicio.renombrar(origen, destino, usuario)
+        return namenode_pb2.RenameResponse()
+
+    @rpc_autenticado
+    def OpenUpload(self, request, context, usuario):
+        ruta = self.archivos_servicio.validar_ruta(request.path)
+        return sesion_a_proto(self.controlador.sesiones_subida_servicio.abrir(ruta, request.size, usuario))
+
+    @rpc_autenticado
+    def GetUpload(self, request, context, usuario):
+        return sesion_a_proto(self.controlador.sesiones_subida_servicio.estado(request.session_id, usuario))
+
+    @rpc_autenticado
+    def ConfirmBlock(self, request, context, usuario):
+        self.controlador.confirmar_bloque(request.block_id, request.checksum, request.codec or None,
+                                          request.stored_size or None)
+        return namenode_pb2.ConfirmBlockResponse()
+
+    @rpc_autenticado
+    def CompleteUpload(self, request, context, usuario):
+        archivo = self.controlador.sesiones_subida_servicio.completar(request.session_id, usuario)
+        return self._estado_archivo(archivo)
@@ -0,0 +1,77 @@
+import logging
+import os
+import sys
+# Permite importar los protos compartidos con los DataNodes
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'datanode_grpc')))
+
+import protos.namenode_pb2 as namenode_pb2
+import protos.namenode_pb2_grpc as namenode_pb2_grpc
+from servicios.metricas import HEARTBEATS
+
+logger = logging.getLogger(__name__)
+
+
+def heartbeat_a_dict(heartbeat) -> dict:
+    """Traducir un Heartbeat al formato que procesa BloquesServicio.heartbeat_datanode"""
+    estado_info = {'capacidad': heartbeat.capacity}
+    if heartbeat.used_space:
+        estado_info['espacio_usado'] = heartbeat.used_space
+    if heartbeat.total_space:
+        estado_info['espacio_total'] = heartbeat.total_space
+    if heartbeat.report.full:
+        estado_info['bloques'] = list(heartbeat.report.added)
+    else:
+        estado_info['bloques_agregados'] = list(heartbeat.report.added)
+        estado_info['bloques_eliminados'] = list(heartbeat.report.removed)
+
+    completados = [{
+        'id': resultado.id,
+        'exito': resultado.success,
+        'error': resultado.error,
+        'destinos_ok': [[destino.host, destino.port] for destino in resultado.targets_ok],
+        'tamaño': resultado.size
+    } for resultado in heartbeat.completed]
+
+    return {
+        'host': heartbeat.node.host,
+        'puerto': heartbeat.node.port,
+        'estado_info': estado_info,
+        'invalidados': list(heartbeat.invalidated),
+        'completados': completados
+    }
+
+
+def comando_a_proto(comando: dict):
+    """Traducir un comando del NameNode a su mensaje tipado"""
+    return namenode_pb2.Command(
+        id=comando.get('id', ''),
+        type=comando['tipo'],
+        block_id=comando.get('bloque_id', ''),
+        targets=[namenode_pb2.NodeAddress(host=d['host'], port=d['puerto']) for d in comando.get('destinos', [])],
+        block_ids=comando.get('bloques', []),
+        source_block_id=comando.get('origen', ''),
+        target_block_id=comando.get('destino', ''),
+        ranges=[namenode_pb2.CopyRange(**rango) for rango in comando.get('rangos', [])]
+    )
+
+
+class HeartbeatControlador(namenode_pb2_grpc.NameNodeServiceServicer):
+    """Stream bidireccional de heartbeats: un stream abierto por DataNode"""
+
+    def __init__(self, bloques_servicio):
+        self.bloques_servicio = bloques_servicio
+
+    def HeartbeatStream(self, request_iterator, context):
+        nodo = None
+        try:
+            for heartbeat in request_iterator:
+                datos = heartbeat_a_dict(heartbeat)
+                nodo = (datos['host'], datos['puerto'])
+                with HEARTBEATS.labels('grpc').time():
+                    comandos = self.bloques_servicio.heartbeat_datanode(**datos)
+                yield namenode_pb2.HeartbeatResponse(commands=[comando_a_proto(c) for c in comandos])
+        finally:
+            # El stream terminó (cierre, caída del nodo o de la red): no hay que esperar al timeout
+            if nodo is not None:
+                self.bloques_servicio.marcar_datanode_caido(*nodo)
+
@@ -0,0 +1,38 @@
+import grpc
+from concurrent import futures
+import logging
+from controladores.heartbeat_controlador import HeartbeatControlador, namenode_pb2_grpc
+from controladores.cliente_grpc_controlador import ClienteGrpcControlador
+from config import NAMENODE_GRPC_PORT, NAMENODE_MAX_DATANODES, NAMENODE_CLIENT_GRPC_PORT, NAMENODE_GRPC_WORKERS
+
+logger = logging.getLogger(__name__)
+
+
+def iniciar_servidor_grpc(controlador, puerto: int = NAMENODE_GRPC_PORT,
+                          puerto_clientes: int = NAMENODE_CLIENT_GRPC_PORT):
+    """Arrancar en segundo plano los servidores gRPC del NameNode.
+
+    Los streams de heartbeat de los DataNodes y el protocolo de metadatos de los
+    clientes van en servidores distintos: cada stream retiene su hilo mientras el
+    DataNode sigue conectado, y no debe dejar sin hilos a las peticiones de clientes.
+    Retorna (servidor de heartbeats, servidor de clientes).
+    """
+    # Un hilo por DataNode: se dimensiona con la flota conocida o el máximo configurado.
+    # Los hilos se crean a medida que se conectan nodos; sobre el máximo, el stream se rechaza
+    flota = max(NAMENODE_MAX_DATANODES, len(controlador.bloques_servicio.datanodes))
+    heartbeats = grpc.server(futures.ThreadPoolExecutor(max_workers=flota, thread_name_prefix='heartbeat'),
+                             maximum_concurrent_rpcs=flota)
+    namenode_pb2_grpc.add_NameNodeServiceServicer_to_server(
+        HeartbeatControlador(controlador.bloques_servicio), heartbeats
+    )
+    heartbeats.add_insecure_port(f"[::]:{puerto}")
+    heartbeats.start()
+
+    clientes = grpc.server(futures.ThreadPoolExecutor(max_workers=NAMENODE_GRPC_WORKERS,
+                                                      thread_name_prefix='cliente-grpc'))
+    namenode_pb2_grpc.add_ClientProtocolServicer_to_server(ClienteGrpcControlador(controlador), clientes)
+    clientes.add_insecure_port(f"[::]:{puerto_clientes}")
+    clientes.start()
+    logger.info(f"Servidores gRPC del NameNode escuchando: heartbeats en {puerto} (hasta {flota} DataNodes), "
+                f"clientes en {puerto_clientes}")
+    return heartbeats, clientes
@@ -1,12 +1,23 @@
 # modelos/archivo_metadata.py
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
+import bisect
 import json
 
+def ruta_inodo(nodo) -> str:
+    """Calcular la ruta de un inodo subiendo por sus padres (O(profundidad))"""
+    partes = []
+    while nodo.padre is not None:
+        partes.append(nodo.nombre)
+        nodo = nodo.padre
+    return '/' + '/'.join(reversed(partes))
+
 class ArchivoMetadata:
     def __init__(self, nombre: str, ruta: str, usuario: str = "default"):
+        self.inodo_id = 0  # Asignado por el namespace
+        self.padre: Optional['DirectorioMetadata'] = None
         self.nombre = nombre
-        self.ruta = ruta
+        self._ruta = ruta
         self.usuario = usuario
         self.tamaño_total = 0
         self.bloques: List[str] = []  # IDs de los bloques
@@ -14,6 +25,18 @@ class ArchivoMetadata:
         self.fecha_modificacion = datetime.now().isoformat()
         self.permisos = "755"
         self.checksum = ""
+        self.redundancia = "replicacion"  # replicacion, ec
+        # Archivos pequeños empaquetados: {'bloque_id', 'offset', 'longitud'} en un contenedor
+        self.contenedor: Optional[Dict] = None
+    
+    @property
+    def ruta(self) -> str:
+        """Ruta derivada del árbol: renombrar un ancestro no obliga a reescribirla"""
+        return ruta_inodo(self) if self.padre is not None else self._ruta
+    
+    @ruta.setter
+    def ruta(self, valor: str):
+        self._ruta = valor
         
     def agregar_bloque(self, bloque_id: str):
         """Agregar un bloque al archivo"""
@@ -24,6 +47,8 @@ class ArchivoMetadata:
     def to_dict(self) -> Dict:
         """Convertir a diccionario para serialización"""
         return {
+            'inodo_id': self.inodo_id,
+            'padre_id': self.padre.inodo_id if self.padre is not None else 0,
             'nombre': self.nombre,
             'ruta': self.ruta,
             'usuario': self.usuario,
@@ -32,7 +57,9 @@ class ArchivoMetadata:
             'fecha_creacion': self.fecha_creacion,
             'fecha_modificacion': self.fecha_modificacion,
             'permisos': self.permisos,
-            'checksum': self.checksum
+            'checksum': self.checksum,
+            'redundancia': self.redundancia,
+            'contenedor': self.contenedor
         }
     
     def to_json(self) -> str:
@@ -43,12 +70,15 @@ class ArchivoMetadata:
     def from_dict(cls, data: Dict) -> 'ArchivoMetadata':
         """Crear instancia desde diccionario"""
         archivo = cls(data['nombre'], data['ruta'], data.get('usuario', 'default'))
+        archivo.inodo_id = data.get('inodo_id', 0)
         archivo.tamaño_total = data.get('tamaño_total', 0)
         archivo.bloques = data.get('bloques', [])
         archivo.fecha_creacion = data.get('fecha_creacion', datetime.now().isoformat())
         archivo.fecha_modificacion = data.get('fecha_modificacion', datetime.now().isoformat())
         archivo.permisos = data.get('permisos', '755')
         archivo.checksum = data.get('checksum', '')
+        archivo.redundancia = data.get('redundancia', 'replicacion')
+        archivo.contenedor = data.get('contenedor')
         return archivo
     
     @classmethod
@@ -58,47 +88,94 @@ class ArchivoMetadata:
 
 class DirectorioMetadata:
     def __init__(self, nombre: str, ruta: str, usuario: str = "default"):
+        self.inodo_id = 0  # Asignado por el namespace
+        self.padre: Optional['DirectorioMetadata'] = None
         self.nombre = nombre
-        self.ruta = ruta
+        self._ruta = ruta
         self.usuario = usuario
-        self.archivos: List[str] = []  # Nombres de archivos
-        self.subdirectorios: List[str] = []  # Nombres de subdirectorios
+        self.archivos: Dict[str, ArchivoMetadata] = {}  # nombre -> inodo de archivo
+        self.subdirectorios: Dict[str, 'DirectorioMetadata'] = {}  # nombre -> inodo de directorio
+        # Claves (0 directorio | 1 archivo, '', nombre) ordenadas para el listado paginado;
+        # se crean en el primer listado y desde entonces se mantienen en cada alta o baja
+        self._claves_orden: Optional[List[Tuple]] = None
         self.fecha_creacion = datetime.now().isoformat()
         self.fecha_modificacion = datetime.now().isoformat()
         self.permisos = "755"
     
-    def agregar_archivo(self, nombre_archivo: str):
+    @property
+    def ruta(self) -> str:
+        """Ruta derivada del árbol: renombrar un ancestro no obliga a reescribirla"""
+        return ruta_inodo(self) if self.padre is not None else self._ruta
+    
+    @ruta.setter
+    def ruta(self, valor: str):
+        self._ruta = valor
+    
+    def agregar_archivo(self, archivo: ArchivoMetadata):
         """Agregar un archivo al directorio"""
-        if nombre_archivo not in self.archivos:
-            self.archivos.append(nombre_archivo)
+        if archivo.nombre not in self.archivos:
+            self.archivos[archivo.nombre] = archivo
+            archivo.padre = self
+            self._indexar((1, '', archivo.nombre))
             self.fecha_modificacion = datetime.now().isoformat()
     
     def remover_archivo(self, nombre_archivo: str):
         """Remover un archivo del directorio"""
         if nombre_archivo in self.archivos:
-            self.archivos.remove(nombre_archivo)
+            del self.archivos[nombre_archivo]
+            self._desindexar((1, '', nombre_archivo))
             self.fecha_modificacion = datetime.now().isoformat()
     
-    def agregar_subdirectorio(self, nombre_dir: str):
+    def agregar_subdirectorio(self, directorio: 'DirectorioMetadata'):
         """Agregar un subdirectorio"""
-        if nombre_dir not in self.subdirectorios:
-            self.subdirectorios.append(nombre_dir)
+        if directorio.nombre not in self.subdirectorios:
+            self.subdirectorios[directorio.nombre] = directorio
+            directorio.padre = self
+            self._indexar((0, '', directorio.nombre))
             self.fecha_modificacion = datetime.now().isoformat()
     
     def remover_subdirectorio(self, nombre_dir: str):
         """Remover un subdirectorio"""
         if nombre_dir in self.subdirectorios:
-            self.subdirectorios.remove(nombre_dir)
+            del self.subdirectorios[nombre_dir]
+            self._desindexar((0, '', nombre_dir))
             self.fecha_modificacion = datetime.now().isoformat()
     
+    def claves_ordenadas(self) -> List[Tuple]:
+        """Hijos en orden de nombre, directorios primero; solo el primer listado ordena"""
+        if self._claves_orden is None:
+            self._claves_orden = sorted([(0, '', nombre) for nombre in self.subdirectorios] +
+                                        [(1, '', nombre) for nombre in self.archivos])
+        return self._claves_orden
+    
+    def _indexar(self, clave: Tuple):
+        if self._claves_orden is not None:
+            bisect.insort(self._claves_orden, clave)
+    
+    def _desindexar(self, clave: Tuple):
+        if self._claves_orden is not None:
+            posicion = bisect.bisect_left(self._claves_orden, clave)
+            if posicion < len(self._claves_orden) and self._claves_orden[posicion] == clave:
+                del self._claves_orden[posicion]
+    
+    def es_ancestro_de(self, nodo) -> bool:
+        """Indica si `nodo` está dentro del subárbol de este directorio"""
+        while nodo is not None:
+            if nodo is self:
+                return True
+            nodo = nodo.padre
+        return False
+    
     def to_dict(self) -> Dict:
         """Convertir a diccionario para serialización"""
         return {
+            'inodo_id': self.inodo_id,
+            'padre_id': self.padre.inodo_id if self.padre is not None else 0,
             'nombre': self.nombre,
             'ruta': self.ruta,
             'usuario': self.usuario,
-            'archivos': self.archivos,
-            'subdirectorios': self.subdirectorios,
+            'archivos': list(self.archivos),
+            'subdirectorios': list(self.subdirectorios),
             'fecha_creacion': self.fecha_creacion,
             'fecha_modificacion': self.fecha_modificacion,
             'permisos': self.permisos
@@ -110,10 +187,9 @@ class DirectorioMetadata:
     
     @classmethod
     def from_dict(cls, data: Dict) -> 'DirectorioMetadata':
-        """Crear instancia desde diccionario"""
+        """Crear instancia desde diccionario (los hijos los enlaza el namespace)"""
         directorio = cls(data['nombre'], data['ruta'], data.get('usuario', 'default'))
-        directorio.archivos = data.get('archivos', [])
-        directorio.subdirectorios = data.get('subdirectorios', [])
+        directorio.inodo_id = data.get('inodo_id', 0)
         directorio.fecha_creacion = data.get('fecha_creacion', datetime.now().isoformat())
         directorio.fecha_modificacion = data.get('fecha_modificacion', datetime.now().isoformat())
         directorio.permisos = data.get('permisos', '755')
@@ -122,4 +198,4 @@ class DirectorioMetadata:
     @classmethod
     def from_json(cls, json_str: str) -> 'DirectorioMetadata':
         """Crear instancia desde JSON"""
-        return cls.from_dict(json.loads(json_str))
\ No newline at end of file
+        return cls.from_dict(json.loads(json_str))
@@ -7,14 +7,27 @@ import uuid
 class BloqueInfo:
     def __init__(self, bloque_id: str = None, archivo_nombre: str = "", posicion: int = 0):
         self.bloque_id = bloque_id or str(uuid.uuid4())
-        self.archivo_nombre = archivo_nombre
+        self.archivo_nombre = archivo_nombre  # Nombre del archivo al crear el bloque (informativo: no sigue renombrados)
         self.posicion = posicion  # Posición del bloque en el archivo
         self.tamaño = 0
         self.checksum = ""
         self.ubicaciones: List[Tuple[str, int]] = []  # (host, puerto) de DataNodes
         self.fecha_creacion = datetime.now().isoformat()
         self.fecha_modificacion = datetime.now().isoformat()
-        self.estado = "activo"  # activo, corrupto, eliminado
+        self.estado = "activo"  # activo, en_construccion (anexado en curso), pendiente (subida sin completar), corrupto, eliminado
+        self.codec = "none"  # none, lz4, zstd (compresión en disco y en la red)
+        self.tamaño_almacenado = 0  # Bytes ocupados en el DataNode tras comprimir
+        self.referencias = 1  # Archivos que comparten el bloque (deduplicación)
+        # Una réplica confirmó que guarda el contenido de `checksum`: puede deduplicarse contra él
+        self.digest_verificado = False
+        # Codificación por borrado: ec_k celdas de datos + ec_m de paridad.
+        # ubicaciones[i] guarda la celda i; ec_k == 0 significa replicación
+        self.ec_k = 0
+        self.ec_m = 0
+        self.tamaño_celda = 0
+        # Contenedor de archivos pequeños: tamaño = bytes ocupados, bytes_vivos = no borrados
+        self.es_contenedor = False
+        self.bytes_vivos = 0
         
     def agregar_ubicacion(self, host: str, puerto: int):
         """Agregar una ubicación (DataNode) donde está almacenado el bloque"""
@@ -45,8 +58,18 @@ class BloqueInfo:
         """Obtener las URIs de los DataNodes followers"""
         return [f"http://{host}:{puerto}" for host, puerto in self.ubicaciones[1:]]
     
+    def es_erasure(self) -> bool:
+        """Indica si el bloque está almacenado con codificación por borrado"""
+        return self.ec_k > 0
+    
+    def celda_id(self, indice: int) -> str:
+        """Identificador en el DataNode de la celda `indice` de un grupo EC"""
+        return f"{self.bloque_id}_c{indice}"
+    
     def is_replicado_suficiente(self, factor_replicacion: int = 2) -> bool:
         """Verificar si el bloque tiene suficiente replicación"""
+        if self.es_erasure():
+            return len(self.ubicaciones) >= self.ec_k + self.ec_m
         return len(self.ubicaciones) >= factor_replicacion
     
     def to_dict(self) -> Dict:
@@ -60,7 +83,16 @@ class BloqueInfo:
             'ubicaciones': self.ubicaciones,
             'fecha_creacion': self.fecha_creacion,
             'fecha_modificacion': self.fecha_modificacion,
-            'estado': self.estado
+            'estado': self.estado,
+            'codec': self.codec,
+            'tamaño_almacenado': self.tamaño_almacenado,
+            'referencias': self.referencias,
+            'digest_verificado': self.digest_verificado,
+            'ec_k': self.ec_k,
+            'ec_m': self.ec_m,
+            'tamaño_celda': self.tamaño_celda,
+            'es_contenedor': self.es_contenedor,
+            'bytes_vivos': self.bytes_vivos
         }
     
     def to_json(self) -> str:
@@ -81,6 +113,15 @@ class BloqueInfo:
         bloque.fecha_creacion = data.get('fecha_creacion', datetime.now().isoformat())
         bloque.fecha_modificacion = data.get('fecha_modificacion', datetime.now().isoformat())
         bloque.estado = data.get('estado', 'activo')
+        bloque.codec = data.get('codec', 'none')
+        bloque.tamaño_almacenado = data.get('tamaño_almacenado', bloque.tamaño)
+        bloque.referencias = data.get('referencias', 1)
+        bloque.digest_verificado = data.get('digest_verificado', False)
+        bloque.ec_k = data.get('ec_k', 0)
+        bloque.ec_m = data.get('ec_m', 0)
+        bloque.tamaño_celda = data.get('tamaño_celda', 0)
+        bloque.es_contenedor = data.get('es_contenedor', False)
+        bloque.bytes_vivos = data.get('bytes_vivos', 0)
         return bloque
     
     @classmethod
@@ -97,6 +138,13 @@ class DataNodeInfo:
         self.espacio_total = 0
         self.espacio_usado = 0
         self.bloques_almacenados: List[str] = []  # IDs de bloques
+        # Bloques que el DataNode debe borrar físicamente; se reenvían hasta que confirme
+        self.invalidaciones: List[str] = []
+        # Comandos pesados (transferencias, compactaciones) en cola y ya enviados; no se persisten
+        self.comandos: List[Dict] = []
+        self.comandos_en_vuelo: Dict[str, Dict] = {}  # id -> {'comando', 'enviado'}
+        self.capacidad_comandos = 0  # Comandos simultáneos que admite (0 = valor por defecto)
+        self.reporte_solicitado = False
         self.ultima_conexion = datetime.now().isoformat()
         self.fecha_registro = datetime.now().isoformat()
         
@@ -106,6 +154,9 @@ class DataNodeInfo:
     
     def agregar_bloque(self, bloque_id: str, tamaño: int = 0):
         """Agregar un bloque al DataNode"""
+        if bloque_id in self.invalidaciones:
+            # El bloque vuelve a escribirse: ya no hay que borrarlo
+            self.invalidaciones.remove(bloque_id)
         if bloque_id not in self.bloques_almacenados:
             self.bloques_almacenados.append(bloque_id)
             self.espacio_usado += tamaño
@@ -118,6 +169,18 @@ class DataNodeInfo:
             self.espacio_usado = max(0, self.espacio_usado - tamaño)
             self.ultima_conexion = datetime.now().isoformat()
     
+    def encolar_invalidacion(self, bloque_id: str):
+        """Programar el borrado físico de un bloque para el próximo heartbeat"""
+        if bloque_id not in self.invalidaciones:
+            self.invalidaciones.append(bloque_id)
+    
+    def confirmar_invalidaciones(self, bloque_ids: List[str]) -> int:
+        """Quitar de la cola los bloques que el DataNode confirmó haber borrado"""
+        confirmados = set(bloque_ids)
+        antes = len(self.invalidaciones)
+        self.invalidaciones = [b for b in self.invalidaciones if b not in confirmados]
+        return antes - len(self.invalidaciones)
+    
     def get_espacio_disponible(self) -> int:
         """Obtener el espacio disponible"""
         return max(0, self.espacio_total - self.espacio_usado)
@@ -142,6 +205,7 @@ class DataNodeInfo:
             'espacio_total': self.espacio_total,
             'espacio_usado': self.espacio_usado,
             'bloques_almacenados': self.bloques_almacenados,
+            'invalidaciones': self.invalidaciones,
             'ultima_conexion': self.ultima_conexion,
             'fecha_registro': self.fecha_registro
         }
@@ -162,6 +226,7 @@ class DataNodeInfo:
         datanode.espacio_total = data.get('espacio_total', 0)
         datanode.espacio_usado = data.get('espacio_usado', 0)
         datanode.bloques_almacenados = data.get('bloques_almacenados', [])
+        datanode.invalidaciones = data.get('invalidaciones', [])
         datanode.ultima_conexion = data.get('ultima_conexion', datetime.now().isoformat())
         datanode.fecha_registro = data.get('fecha_registro', datetime.now().isoformat())
         return datanode
@@ -3,124 +3,353 @@ import os
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))  # Ruta base del proyecto
 UPLOAD_FOLDER = os.path.join(BASE_DIR, 'namenode_data')  # Carpeta para almacenar metadatos
 import json
+import base64
+import bisect
 import hashlib
+import heapq
+import itertools
 import shutil
+import threading
 from typing import List, Dict, Optional, Tuple
 from modelos.archivo_metadata import ArchivoMetadata, DirectorioMetadata
 from modelos.bloque_info import BloqueInfo, DataNodeInfo
-from config import NAMENODE_METADATA_DIR, BLOCK_SIZE, REPLICATION_FACTOR
+from servicios.cerrojo_metadatos import con_lectura, con_escritura
+from servicios.metricas import medir_persistencia, contar_cache
+from config import (NAMENODE_METADATA_DIR, BLOCK_SIZE, REPLICATION_FACTOR, LIST_PAGE_SIZE, LIST_MAX_PAGE_SIZE,
+                    NAMESPACE_JOURNAL_MAX)
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Criterios de orden admitidos por el listado paginado
+ORDENES_LISTADO = ('nombre', 'tamaño', 'fecha_modificacion')
+CAMPOS_LISTADO = ('nombre', 'tipo', 'tamaño', 'fecha_modificacion', 'permisos', 'usuario', 'inodo_id')
+
 class ArchivosServicio:
     def __init__(self):
         self.metadata_dir = NAMENODE_METADATA_DIR
-        self.archivos_metadata = {}  # archivo_path -> ArchivoMetadata
-        self.directorios_metadata = {}  # directorio_path -> DirectorioMetadata
+        # Namespace en árbol de inodos: cada directorio guarda sus hijos en dicts por nombre
+        self.raiz = DirectorioMetadata('/', '/')
+        self.inodos = {}  # inodo_id -> ArchivoMetadata | DirectorioMetadata
+        self.siguiente_inodo = 1
+        # Subárboles desenganchados por un borrado masivo, pendientes de reclamar sus bloques
+        self.papelera: List[DirectorioMetadata] = []
+        self.papelera_evento = threading.Event()
+        # Diario: cambios del namespace posteriores a la última instantánea, una línea JSON por cambio
+        self._diario = None
+        self._entradas_diario = 0
+        self._asignar_inodo(self.raiz)
         self._cargar_metadata()
+        if self._aplicar_diario():
+            self._guardar_metadata()
+    
+    def _asignar_inodo(self, nodo, inodo_id: int = 0):
+        """Registrar un inodo con un id nuevo (o el persistido)"""
+        nodo.inodo_id = inodo_id or self.siguiente_inodo
+        self.siguiente_inodo = max(self.siguiente_inodo, nodo.inodo_id + 1)
+        self.inodos[nodo.inodo_id] = nodo
+    
+    @staticmethod
+    def _enlazar(hijos: Dict, padre: DirectorioMetadata, nodo):
+        """Enlazar un hijo cargado del disco sin alterar las fechas de modificación"""
+        hijos[nodo.nombre] = nodo
+        nodo.padre = padre
+    
+    def _resolver(self, ruta: str):
+        """Resolver una ruta recorriendo sus componentes; O(1) por nivel"""
+        nodo = self.raiz
+        for parte in ruta.split('/'):
+            if not parte:
+                continue
+            if not isinstance(nodo, DirectorioMetadata):
+                return None
+            siguiente = nodo.subdirectorios.get(parte)
+            if siguiente is None:
+                siguiente = nodo.archivos.get(parte)
+            if siguiente is None:
+                return None
+            nodo = siguiente
+        return nodo
+    
+    def _resolver_directorio(self, ruta: str) -> Optional[DirectorioMetadata]:
+        nodo = self._resolver(ruta)
+        return nodo if isinstance(nodo, DirectorioMetadata) else None
+    
+    def _resolver_archivo(self, ruta: str) -> Optional[ArchivoMetadata]:
+        directorio = self._resolver_directorio(os.path.dirname(ruta) or '/')
+        if directorio is None:
+            return None
+        return directorio.archivos.get(os.path.basename(ruta))
+    
+    def iterar_archivos(self):
+        """Recorrer todos los archivos, incluidos los de la papelera que aún no se reclamaron"""
+        return (nodo for nodo in list(self.inodos.values()) if isinstance(nodo, ArchivoMetadata))
+    
+    def en_namespace(self, nodo) -> bool:
+        """Indica si el inodo cuelga de la raíz (y no de un subárbol en la papelera)"""
+        while nodo.padre is not None:
+            nodo = nodo.padre
+        return nodo is self.raiz
         
     def _cargar_metadata(self):
         """Cargar metadatos desde el disco"""
         try:
+            directorios_file = os.path.join(self.metadata_dir, 'directorios.json')
+            directorios_data = {}
+            if os.path.exists(directorios_file):
+                with open(directorios_file, 'r') as f:
+                    directorios_data = json.load(f)
+            
             archivos_file = os.path.join(self.metadata_dir, 'archivos.json')
+            archivos_data = {}
             if os.path.exists(archivos_file):
                 with open(archivos_file, 'r') as f:
-                    data = json.load(f)
-                    for path, metadata in data.items():
-                        self.archivos_metadata[path] = ArchivoMetadata.from_dict(metadata)
+                    archivos_data = json.load(f)
             
-            directorios_file = os.path.join(self.metadata_dir, 'directorios.json')
-            if os.path.exists(directorios_file):
-                with open(directorios_file, 'r') as f:
-                    data = json.load(f)
-                    for path, metadata in data.items():
-                        self.directorios_metadata[path] = DirectorioMetadata.from_dict(metadata)
+            # Directorios: los padres antes que los hijos (formato antiguo indexado por ruta)
+            por_id = {}
+            por_ruta = {'/': self.raiz}
+            cargados = []
+            for data in sorted(directorios_data.values(), key=lambda d: d['ruta'].rstrip('/').count('/')):
+                if data['ruta'] == '/' and data.get('padre_id', 0) == 0 and data.get('inodo_id', 1) == self.raiz.inodo_id:
+                    self.raiz.fecha_creacion = data.get('fecha_creacion', self.raiz.fecha_creacion)
+                    por_id[self.raiz.inodo_id] = self.raiz
+                    continue
+                directorio = DirectorioMetadata.from_dict(data)
+                self._asignar_inodo(directorio, directorio.inodo_id)
+                por_id[directorio.inodo_id] = directorio
+                por_ruta.setdefault(data['ruta'], directorio)
+                cargados.append((data, directorio))
+            
+            for data, directorio in cargados:
+                padre = por_id.get(data['padre_id']) if 'padre_id' in data else por_ruta.get(os.path.dirname(data['ruta']) or '/')
+                if padre is not None:
+                    self._enlazar(padre.subdirectorios, padre, directorio)
+                elif 'padre_id' in data:
+                    # Subárbol desenganchado antes de reiniciar: su reclamación sigue pendiente
+                    self.papelera.append(directorio)
             
-            # Crear directorio raíz si no existe
-            if '/' not in self.directorios_metadata:
-                self.crear_directorio('/')
+            for data in archivos_data.values():
+                archivo = ArchivoMetadata.from_dict(data)
+                padre = por_id.get(data['padre_id']) if 'padre_id' in data else por_ruta.get(os.path.dirname(data['ruta']) or '/')
+                if padre is None:
+                    logger.warning(f"Archivo huérfano ignorado: {data['ruta']}")
+                    continue
+                self._asignar_inodo(archivo, archivo.inodo_id)
+                self._enlazar(padre.archivos, padre, archivo)
                 
         except Exception as e:
             logger.error(f"Error cargando metadatos: {e}")
     
+    def _archivo_diario(self) -> str:
+        return os.path.join(self.metadata_dir, 'namespace_diario.jsonl')
+    
+    def _aplicar_diario(self) -> int:
+        """Reaplicar sobre la instantánea los cambios anotados en el diario; retorna cuántos.
+        Cada operación es idempotente: el diario puede solaparse con una instantánea más nueva."""
+        aplicadas = 0
+        try:
+            if not os.path.exists(self._archivo_diario()):
+                return 0
+            with open(self._archivo_diario(), 'r') as f:
+                for linea in f:
+                    try:
+                        operacion = json.loads(linea)
+                    except ValueError:
+                        # Línea a medias por una caída mientras se escribía: lo anterior es válido
+                        logger.warning("Diario del namespace truncado; se descarta la última entrada")
+                        break
+                    self._reaplicar(operacion)
+                    aplicadas += 1
+        except Exception as e:
+            logger.error(f"Error aplicando el diario del namespace: {e}")
+        if aplicadas:
+            logger.info(f"Reaplicados {aplicadas} cambios del diario del namespace")
+        return aplicadas
+    
+    def _reaplicar(self, operacion: Dict):
+        if operacion['op'] == 'crear_archivo':
+            data = operacion['archivo']
+            padre = self.inodos.get(data['padre_id'])
+            if data['inodo_id'] in self.inodos or not isinstance(padre, DirectorioMetadata):
+                return
+            archivo = ArchivoMetadata.from_dict(data)
+            self._asignar_inodo(archivo, archivo.inodo_id)
+            self._enlazar(padre.archivos, padre, archivo)
+        elif operacion['op'] == 'renombrar':
+            nodo = self.inodos.get(operacion['inodo_id'])
+            destino = self.inodos.get(operacion['padre_id'])
+            if nodo is None or not isinstance(destino, DirectorioMetadata):
+                return
+            es_directorio = isinstance(nodo, DirectorioMetadata)
+            if nodo.padre is not None:
+                hijos = nodo.padre.subdirectorios if es_directorio else nodo.padre.archivos
+                if hijos.get(nodo.nombre) is nodo:
+                    del hijos[nodo.nombre]
+            nodo.nombre = operacion['nombre']
+            self._enlazar(destino.subdirectorios if es_directorio else destino.archivos, destino, nodo)
+        elif operacion['op'] == 'archivo':
+            archivo = self.inodos.get(operacion['archivo']['inodo_id'])
+            if not isinstance(archivo, ArchivoMetadata):
+                return
+            estado = ArchivoMetadata.from_dict(operacion['archivo'])
+            for campo in ('tamaño_total', 'bloques', 'fecha_modificacion', 'checksum', 'redundancia', 'contenedor'):
+                setattr(archivo, campo, getattr(estado, campo))
+        elif operacion['op'] == 'crear_directorio':
+            data = operacion['directorio']
+            padre = self.inodos.get(data['padre_id'])
+            if data['inodo_id'] in self.inodos or not isinstance(padre, DirectorioMetadata):
+                return
+            directorio = DirectorioMetadata.from_dict(data)
+            self._asignar_inodo(directorio, directorio.inodo_id)
+            self._enlazar(padre.subdirectorios, padre, directorio)
+        elif operacion['op'] == 'eliminar':
+            nodo = self.inodos.pop(operacion['inodo_id'], None)
+            if nodo is None or nodo.padre is None:
+                return
+            hijos = nodo.padre.subdirectorios if isinstance(nodo, DirectorioMetadata) else nodo.padre.archivos
+            if hijos.get(nodo.nombre) is nodo:
+                del hijos[nodo.nombre]
+        elif operacion['op'] == 'desenganchar':
+            directorio = self.inodos.get(operacion['inodo_id'])
+            if not isinstance(directorio, DirectorioMetadata) or directorio.padre is None:
+                return
+            if directorio.padre.subdirectorios.get(directorio.nombre) is directorio:
+                del directorio.padre.subdirectorios[directorio.nombre]
+            directorio.ruta = operacion['ruta']
+            directorio.padre = None
+            self.papelera.append(directorio)
+    
+    @medir_persistencia('diario')
+    def _registrar(self, operacion: Dict):
+        """Anotar un cambio del namespace con una línea en el diario, en vez de reescribir la
+        instantánea entera; cada NAMESPACE_JOURNAL_MAX entradas se compacta en una nueva."""
+        try:
+            if self._diario is None:
+                self._diario = open(self._archivo_diario(), 'a')
+            self._diario.write(json.dumps(operacion, ensure_ascii=False) + '\n')
+            self._diario.flush()
+            self._entradas_diario += 1
+        except Exception as e:
+            logger.error(f"Error escribiendo el diario del namespace: {e}")
+            # La instantánea completa también conserva el cambio
+            self._guardar_metadata()
+            return
+        if self._entradas_diario >= NAMESPACE_JOURNAL_MAX:
+            self._guardar_metadata()
+    
+    def _vaciar_diario(self):
+        """La instantánea recién escrita ya contiene todo lo anotado"""
+        if self._diario is not None:
+            self._diario.close()
+        self._diario = open(self._archivo_diario(), 'w')
+        self._entradas_diario = 0
+    
+    def _escribir_json(self, nombre: str, data: Dict):
+        """Escribir en un temporal y reemplazar: una caída a mitad no deja el archivo a medias"""
+        destino = os.path.join(self.metadata_dir, nombre)
+        temporal = destino + '.tmp'
+        with open(temporal, 'w') as f:
+            json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, destino)
+    
+    @medir_persistencia('archivos')
     def _guardar_metadata(self):
-        """Guardar metadatos al disco"""
+        """Guardar metadatos al disco (instantánea completa) y vaciar el diario.
+        El diario solo se vacía cuando la instantánea nueva ya reemplazó a la anterior."""
         try:
-            # Guardar archivos
-            archivos_file = os.path.join(self.metadata_dir, 'archivos.json')
-            with open(archivos_file, 'w') as f:
-                data = {path: metadata.to_dict() for path, metadata in self.archivos_metadata.items()}
-                json.dump(data, f, indent=2)
-            
-            # Guardar directorios
-            directorios_file = os.path.join(self.metadata_dir, 'directorios.json')
-            with open(directorios_file, 'w') as f:
-                data = {path: metadata.to_dict() for path, metadata in self.directorios_metadata.items()}
-                json.dump(data, f, indent=2)
+            self._escribir_json('archivos.json',
+                                {str(archivo.inodo_id): archivo.to_dict() for archivo in self.iterar_archivos()})
+            self._escribir_json('directorios.json',
+                                {str(nodo.inodo_id): nodo.to_dict() for nodo in list(self.inodos.values())
+                                 if isinstance(nodo, DirectorioMetadata)})
+            self._vaciar_diario()
                 
         except Exception as e:
             logger.error(f"Error guardando metadatos: {e}")
     
+    @con_escritura
     def crear_archivo(self, ruta: str, usuario: str = "default") -> ArchivoMetadata:
-        """Crear un nuevo archivo"""
-        if ruta in self.archivos_metadata:
-            raise ValueError(f"El archivo {ruta} ya existe")
-        
+        """Crear un nuevo archivo; se persiste con una entrada del diario, sin reescribir el namespace"""
         # Verificar que el directorio padre existe
         directorio_padre = os.path.dirname(ruta) or '/'
-        if directorio_padre not in self.directorios_metadata:
+        directorio = self._resolver_directorio(directorio_padre)
+        if directorio is None:
             raise ValueError(f"El directorio padre {directorio_padre} no existe")
         
         nombre = os.path.basename(ruta)
+        if nombre in directorio.archivos:
+            raise ValueError(f"El archivo {ruta} ya existe")
+        if nombre in directorio.subdirectorios:
+            raise ValueError(f"Ya existe un directorio {ruta}")
+        
         archivo = ArchivoMetadata(nombre, ruta, usuario)
-        self.archivos_metadata[ruta] = archivo
+        self._asignar_inodo(archivo)
         
         # Agregar al directorio padre
-        self.directorios_metadata[directorio_padre].agregar_archivo(nombre)
+        directorio.agregar_archivo(archivo)
         
-        self._guardar_metadata()
+        self._registrar({'op': 'crear_archivo', 'archivo': archivo.to_dict()})
         logger.info(f"Archivo creado: {ruta}")
         return archivo
     
+    @con_escritura
+    def guardar_archivo(self, archivo: ArchivoMetadata):
+        """Persistir los bloques, el tamaño o el contenedor de un archivo con una entrada del diario"""
+        self._registrar({'op': 'archivo', 'archivo': archivo.to_dict()})
+    
+    @con_lectura
     def obtener_archivo(self, ruta: str) -> Optional[ArchivoMetadata]:
         """Obtener metadatos de un archivo"""
-        return self.archivos_metadata.get(ruta)
+        return self._resolver_archivo(ruta)
     
+    @con_escritura
     def eliminar_archivo(self, ruta: str, usuario: str = "default") -> bool:
         """Eliminar un archivo"""
-        if ruta not in self.archivos_metadata:
+        archivo = self._resolver_archivo(ruta)
+        if archivo is None:
             return False
         
-        archivo = self.archivos_metadata[ruta]
         if archivo.usuario != usuario and usuario != "admin":
             raise PermissionError("No tienes permisos para eliminar este archivo")
         
         # Remover del directorio padre
-        directorio_padre = os.path.dirname(ruta) or '/'
-        if directorio_padre in self.directorios_metadata:
-            self.directorios_metadata[directorio_padre].remover_archivo(archivo.nombre)
-        
-        del self.archivos_metadata[ruta]
-        self._guardar_metadata()
+        archivo.padre.remover_archivo(archivo.nombre)
+        self.inodos.pop(archivo.inodo_id, None)
+        self._registrar({'op': 'eliminar', 'inodo_id': archivo.inodo_id})
         logger.info(f"Archivo eliminado: {ruta}")
         return True
     
         
+    @con_lectura
     def obtener_directorio(self, ruta: str) -> Optional[DirectorioMetadata]:
         """Obtener metadatos de un directorio"""
-        return self.directorios_metadata.get(ruta)
-    
+        return self._resolver_directorio(ruta)
+
+    @con_lectura
+    def obtener_estado(self, ruta: str) -> Optional[Dict]:
+        """Atributos de un archivo o directorio (stat), con el mismo formato que el listado"""
+        nodo = self._resolver(ruta)
+        if nodo is None:
+            return None
+        tipo = 'directorio' if isinstance(nodo, DirectorioMetadata) else 'archivo'
+        estado = self._entrada_listado(nodo, tipo)
+        estado['ruta'] = nodo.ruta
+        return estado
+
+    @con_escritura
     def eliminar_directorio(self, ruta: str, usuario: str = "default", recursivo: bool = False) -> bool:
         """Eliminar un directorio"""
-        if ruta not in self.directorios_metadata:
+        directorio = self._resolver_directorio(ruta)
+        if directorio is None:
             return False
         
-        if ruta == '/':
+        if directorio is self.raiz:
             raise ValueError("No se puede eliminar el directorio raíz")
         
-        directorio = self.directorios_metadata[ruta]
         if directorio.usuario != usuario and usuario != "admin":
             raise PermissionError("No tienes permisos para eliminar este directorio")
         
@@ -129,38 +358,51 @@ class ArchivosServicio:
             raise ValueError("El directorio no está vacío. Use eliminación recursiva.")
         
         if recursivo:
-            # Eliminar archivos del directorio
-            for archivo_nombre in directorio.archivos.copy():
-                archivo_ruta = os.path.join(ruta, archivo_nombre).replace('\\', '/')
-                self.eliminar_archivo(archivo_ruta, usuario)
-            
-            # Eliminar subdirectorios recursivamente
-            for subdir_nombre in directorio.subdirectorios.copy():
-                subdir_ruta = os.path.join(ruta, subdir_nombre).replace('\\', '/')
-                self.eliminar_directorio(subdir_ruta, usuario, True)
+            return self.eliminar_subarbol(ruta, usuario)
         
         # Remover del directorio padre
-        directorio_padre = os.path.dirname(ruta) or '/'
-        if directorio_padre in self.directorios_metadata:
-            self.directorios_metadata[directorio_padre].remover_subdirectorio(directorio.nombre)
-        
-        del self.directorios_metadata[ruta]
-        self._guardar_metadata()
+        directorio.padre.remover_subdirectorio(directorio.nombre)
+        self.inodos.pop(directorio.inodo_id, None)
+        self._registrar({'op': 'eliminar', 'inodo_id': directorio.inodo_id})
         logger.info(f"Directorio eliminado: {ruta}")
         return True
     
+    @con_escritura
+    def eliminar_subarbol(self, ruta: str, usuario: str = "default") -> bool:
+        """Eliminar un directorio con todo su contenido en una sola transacción.
+        
+        Solo se desengancha la raíz del subárbol de su padre y se anota en el diario;
+        los inodos y bloques del subárbol los libera después la reclamación en segundo plano.
+        """
+        directorio = self._resolver_directorio(ruta)
+        if directorio is None:
+            return False
+        
+        if directorio is self.raiz:
+            raise ValueError("No se puede eliminar el directorio raíz")
+        
+        if directorio.usuario != usuario and usuario != "admin":
+            raise PermissionError("No tienes permisos para eliminar este directorio")
+        
+        directorio.padre.remover_subdirectorio(directorio.nombre)
+        directorio.ruta = ruta
+        directorio.padre = None
+        self.papelera.append(directorio)
+        self._registrar({'op': 'desenganchar', 'inodo_id': directorio.inodo_id, 'ruta': ruta})
+        self.papelera_evento.set()
+        logger.info(f"Subárbol {ruta} desenganchado; reclamación en segundo plano")
+        return True
+    
+    @con_lectura
     def listar_directorio(self, ruta: str, usuario: str = "default") -> Dict:
         """Listar contenido de un directorio"""
-        if ruta not in self.directorios_metadata:
+        directorio = self._resolver_directorio(ruta)
+        if directorio is None:
             raise ValueError(f"El directorio {ruta} no existe")
         
-        directorio = self.directorios_metadata[ruta]
-        
         archivos = []
-        for archivo_nombre in directorio.archivos:
-            archivo_ruta = os.path.join(ruta, archivo_nombre).replace('\\', '/')
-            archivo_metadata = self.archivos_metadata.get(archivo_ruta)
-            if archivo_metadata and (archivo_metadata.usuario == usuario or usuario == "admin"):
+        for archivo_metadata in directorio.archivos.values():
+            if archivo_metadata.usuario == usuario or usuario == "admin":
                 archivos.append({
                     'nombre': archivo_metadata.nombre,
                     'tipo': 'archivo',
@@ -171,10 +413,8 @@ class ArchivosServicio:
                 })
         
         subdirectorios = []
-        for subdir_nombre in directorio.subdirectorios:
-            subdir_ruta = os.path.join(ruta, subdir_nombre).replace('\\', '/')
-            subdir_metadata = self.directorios_metadata.get(subdir_ruta)
-            if subdir_metadata and (subdir_metadata.usuario == usuario or usuario == "admin"):
+        for subdir_metadata in directorio.subdirectorios.values():
+            if subdir_metadata.usuario == usuario or usuario == "admin":
                 subdirectorios.append({
                     'nombre': subdir_metadata.nombre,
                     'tipo': 'directorio',
@@ -191,11 +431,128 @@ class ArchivosServicio:
             'total_directorios': len(subdirectorios)
         }
     
+    @staticmethod
+    def _entrada_listado(nodo, tipo: str) -> Dict:
+        """Representación de un hijo en el listado de un directorio"""
+        return {
+            'nombre': nodo.nombre,
+            'tipo': tipo,
+            'tamaño': nodo.tamaño_total if tipo == 'archivo' else 0,
+            'fecha_modificacion': nodo.fecha_modificacion,
+            'permisos': nodo.permisos,
+            'usuario': nodo.usuario,
+            'inodo_id': nodo.inodo_id
+        }
+    
+    @staticmethod
+    def _clave_orden(nodo, tipo: str, orden: str) -> Tuple:
+        """Clave total de orden: directorios primero y el nombre como desempate"""
+        if orden == 'tamaño':
+            valor = nodo.tamaño_total if tipo == 'archivo' else 0
+        elif orden == 'fecha_modificacion':
+            valor = nodo.fecha_modificacion or ''
+        else:
+            valor = ''
+        return (0 if tipo == 'directorio' else 1, valor, nodo.nombre)
+    
+    @staticmethod
+    def _codificar_cursor(orden: str, clave: Tuple) -> str:
+        contenido = json.dumps([orden, list(clave)], ensure_ascii=False).encode('utf-8')
+        return base64.urlsafe_b64encode(contenido).decode('ascii')
+    
+    @staticmethod
+    def _decodificar_cursor(cursor: str, orden: str) -> Tuple:
+        try:
+            orden_cursor, clave = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        except Exception:
+            raise ValueError("Cursor inválido")
+        if orden_cursor != orden:
+            raise ValueError("El cursor pertenece a un listado con otro orden")
+        return tuple(clave)
+    
+    def _pagina_por_nombre(self, directorio: DirectorioMetadata, desde: Optional[Tuple],
+                           cantidad: int, visible) -> List[Tuple]:
+        """Página en orden de nombre sobre el índice ordenado que el directorio mantiene al
+        agregar o quitar hijos: cada página cuesta una búsqueda binaria más las entradas devueltas"""
+        contar_cache('indice_listado', directorio._claves_orden is not None)
+        # El primer listado lo crea bajo el cerrojo de lectura: dos lectores a la vez calculan el
+        # mismo índice y la asignación es atómica; las altas y bajas llegan con el de escritura
+        claves = directorio.claves_ordenadas()
+        
+        pagina = []
+        inicio = bisect.bisect_right(claves, desde) if desde is not None else 0
+        for clave in itertools.islice(claves, inicio, None):
+            tipo, hijos = ('directorio', directorio.subdirectorios) if clave[0] == 0 else ('archivo', directorio.archivos)
+            nodo = hijos[clave[2]]
+            if visible(nodo):
+                pagina.append((clave, tipo, nodo))
+                if len(pagina) == cantidad:
+                    break
+        return pagina
+    
+    @con_lectura
+    def listar_directorio_paginado(self, ruta: str, usuario: str = "default", limite: int = LIST_PAGE_SIZE,
+                                   cursor: Optional[str] = None, orden: str = 'nombre',
+                                   campos: Optional[List[str]] = None) -> Dict:
+        """Listar una página de un directorio a partir de un cursor estable.
+        
+        El cursor codifica la clave de orden de la última entrada devuelta, así que
+        las inserciones y borrados entre páginas no duplican ni saltan entradas.
+        En orden de nombre se busca el cursor en el índice ordenado del directorio; en
+        tamaño o fecha se seleccionan las `limite` entradas siguientes sin ordenar el resto.
+        """
+        directorio = self._resolver_directorio(ruta)
+        if directorio is None:
+            raise ValueError(f"El directorio {ruta} no existe")
+        if orden not in ORDENES_LISTADO:
+            raise ValueError(f"Orden no soportado: {orden}")
+        if campos:
+            desconocidos = [c for c in campos if c not in CAMPOS_LISTADO]
+            if desconocidos:
+                raise ValueError(f"Campos no soportados: {', '.join(desconocidos)}")
+        limite = max(1, min(int(limite), LIST_MAX_PAGE_SIZE))
+        desde = self._decodificar_cursor(cursor, orden) if cursor else None
+        
+        def visible(nodo) -> bool:
+            return nodo.usuario == usuario or usuario == "admin"
+        
+        # Se pide una entrada de más para saber si queda otra página
+        if orden == 'nombre':
+            pagina = self._pagina_por_nombre(directorio, desde, limite + 1, visible)
+        else:
+            # Tamaño y fecha cambian sin tocar el directorio: se seleccionan al vuelo
+            def candidatos():
+                for tipo, hijos in (('directorio', directorio.subdirectorios), ('archivo', directorio.archivos)):
+                    for nodo in hijos.values():
+                        if not visible(nodo):
+                            continue
+                        clave = self._clave_orden(nodo, tipo, orden)
+                        if desde is None or clave > desde:
+                            yield clave, tipo, nodo
+            pagina = heapq.nsmallest(limite + 1, candidatos(), key=lambda c: c[0])
+        hay_mas = len(pagina) > limite
+        pagina = pagina[:limite]
+        
+        entradas = []
+        for _, tipo, nodo in pagina:
+            entrada = self._entrada_listado(nodo, tipo)
+            if campos:
+                entrada = {campo: entrada[campo] for campo in campos}
+            entradas.append(entrada)
+        
+        return {
+            'ruta': ruta,
+            'entradas': entradas,
+            'orden': orden,
+            'siguiente_cursor': self._codificar_cursor(orden, pagina[-1][0]) if hay_mas else None
+        }
+    
+    @con_lectura
     def obtener_archivos_usuario(self, usuario: str) -> List[Dict]:
         """Obtener todos los archivos de un usuario"""
         archivos_usuario = []
-        for ruta, archivo in self.archivos_metadata.items():
-            if archivo.usuario == usuario or usuario == "admin":
+        for archivo in self.iterar_archivos():
+            if (archivo.usuario == usuario or usuario == "admin") and self.en_namespace(archivo):
                 archivos_usuario.append({
                     'nombre': archivo.nombre,
                     'ruta': archivo.ruta,
@@ -216,66 +573,105 @@ class ArchivosServicio:
             ruta = '/' + ruta
         return ruta.replace('\\', '/').replace('//', '/')
     
-    def mover_archivo(self, ruta_origen: str, ruta_destino: str, usuario: str = "default") -> bool:
-        """Mover un archivo de una ubicación a otra"""
-        if ruta_origen not in self.archivos_metadata:
-            raise ValueError(f"El archivo {ruta_origen} no existe")
+    @con_escritura
+    def renombrar(self, ruta_origen: str, ruta_destino: str, usuario: str = "default") -> bool:
+        """Mover o renombrar un archivo o un directorio completo.
         
-        archivo = self.archivos_metadata[ruta_origen]
-        if archivo.usuario != usuario and usuario != "admin":
-            raise PermissionError("No tienes permisos para mover este archivo")
+        Solo se mueve el puntero del inodo entre los dicts de sus padres: el coste
+        no depende del tamaño del subárbol.
+        """
+        nodo = self._resolver(ruta_origen)
+        if nodo is None or nodo is self.raiz:
+            raise ValueError(f"La ruta {ruta_origen} no existe")
+        
+        if nodo.usuario != usuario and usuario != "admin":
+            raise PermissionError("No tienes permisos para mover esta ruta")
         
         # Verificar que el directorio destino existe
         directorio_destino = os.path.dirname(ruta_destino) or '/'
-        if directorio_destino not in self.directorios_metadata:
+        destino = self._resolver_directorio(directorio_destino)
+        if destino is None:
             raise ValueError(f"El directorio destino {directorio_destino} no existe")
         
-        # Actualizar metadatos
         nuevo_nombre = os.path.basename(ruta_destino)
-        archivo.nombre = nuevo_nombre
-        archivo.ruta = ruta_destino
+        if nuevo_nombre in destino.archivos or nuevo_nombre in destino.subdirectorios:
+            raise ValueError(f"La ruta {ruta_destino} ya existe")
+        
+        es_directorio = isinstance(nodo, DirectorioMetadata)
+        if es_directorio and nodo.es_ancestro_de(destino):
+            raise ValueError("No se puede mover un directorio dentro de sí mismo")
         
-        # Actualizar directorios
-        directorio_origen = os.path.dirname(ruta_origen) or '/'
-        if directorio_origen in self.directorios_metadata:
-            self.directorios_metadata[directorio_origen].remover_archivo(os.path.basename(ruta_origen))
-        self.directorios_metadata[directorio_destino].agregar_archivo(nuevo_nombre)
+        # Desenganchar del padre actual y enganchar en el destino
+        if es_directorio:
+            nodo.padre.remover_subdirectorio(nodo.nombre)
+            nodo.nombre = nuevo_nombre
+            destino.agregar_subdirectorio(nodo)
+        else:
+            nodo.padre.remover_archivo(nodo.nombre)
+            nodo.nombre = nuevo_nombre
+            destino.agregar_archivo(nodo)
         
-        self._guardar_metadata()
-        logger.info(f"Archivo movido: {ruta_origen} -> {ruta_destino}")
+        self._registrar({'op': 'renombrar', 'inodo_id': nodo.inodo_id, 'padre_id': destino.inodo_id,
+                         'nombre': nuevo_nombre})
+        logger.info(f"Ruta movida: {ruta_origen} -> {ruta_destino}")
         return True
     
+    @con_escritura
+    def mover_archivo(self, ruta_origen: str, ruta_destino: str, usuario: str = "default") -> bool:
+        """Mover un archivo de una ubicación a otra"""
+        if self._resolver_archivo(ruta_origen) is None:
+            raise ValueError(f"El archivo {ruta_origen} no existe")
+        return self.renombrar(ruta_origen, ruta_destino, usuario)
+    
+    @con_lectura
     def directorio_existe(self, ruta):
         """Verifica si un directorio existe"""
-        return ruta in self.directorios_metadata
+        return self._resolver_directorio(ruta) is not None
     
+    @con_escritura
     def crear_directorio(self, ruta, nombre="root", usuario="default"):
         """Crea un directorio recursivamente"""
-        partes = ruta.strip('/').split('/')
-        path_actual = '/'
+        partes = [parte for parte in ruta.strip('/').split('/') if parte]
         
+        # Se comprueba la ruta entera antes de crear nada: un archivo no puede ser también directorio
+        actual = self.raiz
+        for indice, parte in enumerate(partes):
+            if parte in actual.archivos:
+                raise ValueError(f"Ya existe un archivo /{'/'.join(partes[:indice + 1])}")
+            actual = actual.subdirectorios.get(parte)
+            if actual is None:
+                break
+        
+        actual = self.raiz
         for parte in partes:
-            path_actual = os.path.join(path_actual, parte).replace('\\', '/')
-            if not self.directorio_existe(path_actual):
-                self._crear_directorio_simple(path_actual, usuario)
+            siguiente = actual.subdirectorios.get(parte)
+            if siguiente is None:
+                siguiente = DirectorioMetadata(parte, os.path.join(actual.ruta, parte), usuario)
+                self._asignar_inodo(siguiente)
+                actual.agregar_subdirectorio(siguiente)
+                self._registrar({'op': 'crear_directorio', 'directorio': siguiente.to_dict()})
+            actual = siguiente
 
+    @con_escritura
     def _crear_directorio_simple(self, ruta, usuario="default"):
         """Crea un solo directorio"""
-        nombre = os.path.basename(ruta) or '/'
-        directorio_padre = os.path.dirname(ruta) or '/'
-
-        from modelos.archivo_metadata import DirectorioMetadata
-
         if ruta == '/':
-            # Crear directorio raíz sin padre
-            self.directorios_metadata[ruta] = DirectorioMetadata(nombre, ruta, usuario)
-            self._guardar_metadata()
+            # El directorio raíz siempre existe en el árbol
             return
 
-        if directorio_padre not in self.directorios_metadata:
+        directorio_padre = os.path.dirname(ruta) or '/'
+        padre = self._resolver_directorio(directorio_padre)
+        if padre is None:
             raise ValueError(f"Directorio padre {directorio_padre} no existe")
 
-        self.directorios_metadata[ruta] = DirectorioMetadata(nombre, ruta, usuario)
-        self.directorios_metadata[directorio_padre].agregar_subdirectorio(nombre)
-        self._guardar_metadata()
+        # Antes de asignar el inodo, para no gastarlo si el nombre ya está ocupado
+        nombre = os.path.basename(ruta)
+        if nombre in padre.archivos:
+            raise ValueError(f"Ya existe un archivo {ruta}")
+        if nombre in padre.subdirectorios:
+            return
 
+        directorio = DirectorioMetadata(nombre, ruta, usuario)
+        self._asignar_inodo(directorio)
+        padre.agregar_subdirectorio(directorio)
+        self._registrar({'op': 'crear_directorio', 'directorio': directorio.to_dict()})
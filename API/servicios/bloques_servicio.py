@@ -3,23 +3,51 @@ import os
 import json
 import hashlib
 import random
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Optional, Tuple
 from modelos.bloque_info import BloqueInfo, DataNodeInfo
-from config import NAMENODE_METADATA_DIR, BLOCK_SIZE, REPLICATION_FACTOR, DATANODE_HOST, DATANODE_PORTS
+from servicios.cerrojo_metadatos import con_lectura, con_escritura
+from servicios.datanode_cliente import ClienteDataNodes
+from servicios.metricas import medir_operacion, medir_persistencia, contar_cache
+from common.utils import tracing
+from config import (NAMENODE_METADATA_DIR, BLOCK_SIZE, REPLICATION_FACTOR, DATANODE_HOST, DATANODE_PORTS,
+                    EC_DATA_CELLS, EC_PARITY_CELLS, INVALIDATION_BATCH_SIZE, COMMANDS_PER_HEARTBEAT,
+                    COMMAND_TIMEOUT, REPLICA_WRITE_WORKERS,
+                    DIGEST_VERIFY_WORKERS)
 import logging
-import requests
+import time
 from datetime import datetime, timedelta
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Tipos de comando que viajan en la respuesta al heartbeat
+COMANDO_TRANSFERIR = 'transferir'
+COMANDO_INVALIDAR = 'invalidar'
+COMANDO_REPORTE = 'reporte_completo'
+COMANDO_REREGISTRO = 're_registrar'
+COMANDO_COMPACTAR = 'compactar'
+
 class BloquesServicio:
     def __init__(self):
         self.metadata_dir = NAMENODE_METADATA_DIR
         self.bloques_metadata = {}  # bloque_id -> BloqueInfo
         self.datanodes = {}  # node_id -> DataNodeInfo
+        self.indice_digest = {}  # checksum SHA-256 -> bloque_id (deduplicación), solo digests verificados
+        self.verificaciones_digest = {}  # bloque_id -> checksum cuya verificación está en curso
         self.block_size = BLOCK_SIZE
         self.replication_factor = REPLICATION_FACTOR
+        # Tipo de comando -> función(datanode, comando, resultado) al confirmarse o fallar
+        self.manejadores_comando = {COMANDO_TRANSFERIR: self._transferencia_confirmada}
+        self.replicaciones_en_curso = set()  # bloque_id con una transferencia pendiente
+        # Un DataNode cuyo circuito se abre deja de recibir escrituras hasta que vuelva a responder
+        self.cliente_datanodes = ClienteDataNodes(al_abrir=self._circuito_abierto)
+        # Cada bloque se escribe a la vez en todas sus réplicas
+        self.ejecutor_replicas = ThreadPoolExecutor(max_workers=REPLICA_WRITE_WORKERS,
+                                                    thread_name_prefix='replica')
+        self.ejecutor_digests = ThreadPoolExecutor(max_workers=DIGEST_VERIFY_WORKERS,
+                                                   thread_name_prefix='digest')
         self._cargar_metadata()
         self._inicializar_datanodes()
         
@@ -31,7 +59,10 @@ class BloquesServicio:
                 with open(bloques_file, 'r') as f:
                     data = json.load(f)
                     for bloque_id, metadata in data.items():
-                        self.bloques_metadata[bloque_id] = BloqueInfo.from_dict(metadata)
+                        bloque = BloqueInfo.from_dict(metadata)
+                        self.bloques_metadata[bloque_id] = bloque
+                        if bloque.checksum and bloque.digest_verificado and bloque.estado == 'activo':
+                            self.indice_digest[bloque.checksum] = bloque_id
             
             datanodes_file = os.path.join(self.metadata_dir, 'datanodes.json')
             if os.path.exists(datanodes_file):
@@ -43,6 +74,7 @@ class BloquesServicio:
         except Exception as e:
             logger.error(f"Error cargando metadatos de bloques: {e}")
     
+    @medir_persistencia('bloques')
     def _guardar_metadata(self):
         """Guardar metadatos de bloques al disco"""
         try:
@@ -68,6 +100,8 @@ class BloquesServicio:
                 self.datanodes[datanode.node_id] = datanode
             self._guardar_metadata()
     
+    @medir_operacion
+    @con_escritura
     def registrar_datanode(self, host: str, puerto: int, espacio_total: int = 0) -> DataNodeInfo:
         """Registrar un nuevo DataNode"""
         # Verificar si ya existe
@@ -86,16 +120,20 @@ class BloquesServicio:
         logger.info(f"DataNode registrado: {host}:{puerto}")
         return datanode
     
+    @con_lectura
     def obtener_datanodes_activos(self) -> List[DataNodeInfo]:
         """Obtener lista de DataNodes activos"""
         return [dn for dn in self.datanodes.values() if dn.estado == "activo"]
     
+    @medir_operacion
+    @con_lectura
     def seleccionar_datanodes_para_escritura(self, cantidad: int = None) -> List[DataNodeInfo]:
         """Seleccionar DataNodes para escritura basado en criterios de optimización"""
         if cantidad is None:
             cantidad = self.replication_factor
         
-        datanodes_activos = self.obtener_datanodes_activos()
+        datanodes_activos = [dn for dn in self.obtener_datanodes_activos()
+                             if self.cliente_datanodes.disponible(dn.host, dn.puerto)]
         if len(datanodes_activos) < cantidad:
             raise ValueError(f"No hay suficientes DataNodes activos. Necesarios: {cantidad}, Disponibles: {len(datanodes_activos)}")
         
@@ -105,74 +143,257 @@ class BloquesServicio:
         
         return datanodes_ordenados[:cantidad]
     
-    def crear_bloques_para_archivo(self, archivo_nombre: str, tamaño_archivo: int) -> List[BloqueInfo]:
-        """Crear bloques para un archivo dado su tamaño"""
+    @medir_operacion
+    @con_escritura
+    def crear_bloque(self, archivo_nombre: str, posicion: int, tamaño: int, guardar: bool = True) -> BloqueInfo:
+        """Crear un bloque replicado y asignarle DataNodes (la subida en streaming los pide de uno en uno)"""
+        bloque = BloqueInfo(archivo_nombre=archivo_nombre, posicion=posicion)
+        bloque.tamaño = tamaño
+        
+        # Seleccionar DataNodes para este bloque
+        datanodes_seleccionados = self.seleccionar_datanodes_para_escritura()
+        for datanode in datanodes_seleccionados:
+            bloque.agregar_ubicacion(datanode.host, datanode.puerto)
+            datanode.agregar_bloque(bloque.bloque_id, tamaño)
+        
+        self.bloques_metadata[bloque.bloque_id] = bloque
+        if guardar:
+            self._guardar_metadata()
+        return bloque
+    
+    @medir_operacion
+    @con_escritura
+    def crear_bloques_para_archivo(self, archivo_nombre: str, tamaño_archivo: int,
+                                   posicion_inicial: int = 0) -> List[BloqueInfo]:
+        """Crear bloques para un archivo dado su tamaño (un anexado numera a partir de posicion_inicial)"""
         num_bloques = (tamaño_archivo + self.block_size - 1) // self.block_size
         bloques = []
         
         for i in range(num_bloques):
-            bloque = BloqueInfo(archivo_nombre=archivo_nombre, posicion=i)
             tamaño_bloque = min(self.block_size, tamaño_archivo - i * self.block_size)
-            bloque.tamaño = tamaño_bloque
+            bloques.append(self.crear_bloque(archivo_nombre, posicion_inicial + i, tamaño_bloque, guardar=False))
+        
+        self._guardar_metadata()
+        logger.info(f"Creados {len(bloques)} bloques para archivo {archivo_nombre}")
+        return bloques
+    
+    @medir_operacion
+    @con_escritura
+    def crear_grupos_ec_para_archivo(self, archivo_nombre: str, tamaño_archivo: int,
+                                     k: int = None, m: int = None) -> List[BloqueInfo]:
+        """Crear bloques con codificación por borrado RS(k, m).
+        
+        Cada bloque lógico se divide en k celdas de datos más m de paridad, y cada
+        celda va a un DataNode distinto para tolerar la caída de m nodos.
+        """
+        k = k or EC_DATA_CELLS
+        m = m or EC_PARITY_CELLS
+        num_bloques = (tamaño_archivo + self.block_size - 1) // self.block_size
+        bloques = []
+        
+        for i in range(num_bloques):
+            bloque = BloqueInfo(archivo_nombre=archivo_nombre, posicion=i)
+            bloque.tamaño = min(self.block_size, tamaño_archivo - i * self.block_size)
+            bloque.ec_k = k
+            bloque.ec_m = m
+            bloque.tamaño_celda = -(-bloque.tamaño // k)
             
-            # Seleccionar DataNodes para este bloque
-            datanodes_seleccionados = self.seleccionar_datanodes_para_escritura()
-            for datanode in datanodes_seleccionados:
+            # Colocación por franja: una celda por DataNode, en orden de celda
+            datanodes_seleccionados = self.seleccionar_datanodes_para_escritura(k + m)
+            for indice, datanode in enumerate(datanodes_seleccionados):
                 bloque.agregar_ubicacion(datanode.host, datanode.puerto)
-                datanode.agregar_bloque(bloque.bloque_id, tamaño_bloque)
+                datanode.agregar_bloque(bloque.celda_id(indice), bloque.tamaño_celda)
             
             self.bloques_metadata[bloque.bloque_id] = bloque
             bloques.append(bloque)
         
         self._guardar_metadata()
-        logger.info(f"Creados {len(bloques)} bloques para archivo {archivo_nombre}")
+        logger.info(f"Creados {len(bloques)} grupos RS({k},{m}) para archivo {archivo_nombre}")
         return bloques
     
+    @medir_operacion
+    @con_lectura
+    def buscar_bloques_por_digest(self, digests: List[str]) -> Dict[str, BloqueInfo]:
+        """Obtener los bloques ya almacenados cuyo contenido coincide con los digests dados"""
+        existentes = {}
+        for digest in digests:
+            bloque_id = self.indice_digest.get(digest)
+            encontrado = bool(bloque_id) and bloque_id in self.bloques_metadata
+            if encontrado:
+                existentes[digest] = self.bloques_metadata[bloque_id]
+            contar_cache('digest', encontrado)
+        return existentes
+    
+    @medir_operacion
+    @con_escritura
+    def crear_bloques_deduplicados(self, archivo_nombre: str, bloques_solicitados: List[Dict]) -> List[Tuple[BloqueInfo, bool]]:
+        """Crear bloques de un archivo reutilizando los que ya existen por contenido.
+        
+        bloques_solicitados: [{'digest': str, 'tamaño': int}, ...] en orden.
+        Retorna [(BloqueInfo, es_nuevo), ...]; solo los nuevos deben subirse.
+        """
+        resultado = []
+        # Los bloques nuevos no entran en el índice hasta que se confirman y verifican;
+        # dentro de la misma petición sí se reutilizan (los sube este mismo cliente)
+        nuevos_por_digest = {}
+        
+        try:
+            for i, solicitado in enumerate(bloques_solicitados):
+                digest = solicitado['digest']
+                existente = (self.buscar_bloques_por_digest([digest]).get(digest)
+                             or nuevos_por_digest.get(digest))
+                if existente:
+                    existente.referencias += 1
+                    resultado.append((existente, False))
+                    continue
+                
+                bloque = BloqueInfo(archivo_nombre=archivo_nombre, posicion=i)
+                bloque.tamaño = solicitado['tamaño']
+                bloque.checksum = digest
+                
+                for datanode in self.seleccionar_datanodes_para_escritura():
+                    bloque.agregar_ubicacion(datanode.host, datanode.puerto)
+                    datanode.agregar_bloque(bloque.bloque_id, bloque.tamaño)
+                
+                self.bloques_metadata[bloque.bloque_id] = bloque
+                nuevos_por_digest[digest] = bloque
+                resultado.append((bloque, True))
+        except Exception:
+            # Se deshacen las referencias sumadas y los bloques reservados hasta el fallo
+            self.liberar_bloques([bloque.bloque_id for bloque, _ in resultado], guardar=False)
+            raise
+        
+        self._guardar_metadata()
+        nuevos = sum(1 for _, es_nuevo in resultado if es_nuevo)
+        logger.info(f"Archivo {archivo_nombre}: {nuevos} bloques nuevos, {len(resultado) - nuevos} deduplicados")
+        return resultado
+    
+    @con_escritura
+    def registrar_checksum(self, bloque: BloqueInfo, checksum: str):
+        """Anotar el checksum que confirmó el cliente. No se indexa tal cual: el bloque entra
+        en el índice de deduplicación cuando una réplica confirma que guarda ese contenido."""
+        self.desindexar_digest(bloque)
+        bloque.checksum = checksum
+        self.verificar_digest(bloque)
+
+    @con_escritura
+    def desindexar_digest(self, bloque: BloqueInfo):
+        """Sacar el bloque del índice y anular su verificación en curso: su contenido va a cambiar"""
+        if self.indice_digest.get(bloque.checksum) == bloque.bloque_id:
+            del self.indice_digest[bloque.checksum]
+        bloque.digest_verificado = False
+        self.verificaciones_digest.pop(bloque.bloque_id, None)
+
+    @con_escritura
+    def verificar_digest(self, bloque: BloqueInfo):
+        """Pedir en segundo plano a una réplica el checksum de lo que guarda del bloque.
+        Solo los bloques activos y replicados se deduplican; los pendientes se verifican al activarse."""
+        if not bloque.checksum or bloque.estado != 'activo' or bloque.es_erasure() or bloque.es_contenedor:
+            return
+        self.verificaciones_digest[bloque.bloque_id] = bloque.checksum
+        self.ejecutor_digests.submit(tracing.propagate(self._verificar_digest), bloque.bloque_id,
+                                     bloque.checksum, bloque.tamaño, list(bloque.ubicaciones))
+
+    def _verificar_digest(self, bloque_id: str, checksum: str, tamaño: int, ubicaciones: List[Tuple[str, int]]):
+        """Corre fuera del cerrojo: pregunta a las réplicas por orden hasta que una responde"""
+        for host, puerto in ubicaciones:
+            try:
+                guardado = self.cliente_datanodes.checksum_bloque(host, puerto, bloque_id, tamaño)
+            except IOError as e:
+                logger.warning(f"No se pudo verificar el digest del bloque {bloque_id} en {host}:{puerto}: {e}")
+                continue
+            self._indexar_digest(bloque_id, checksum, guardado)
+            return
+        self._indexar_digest(bloque_id, checksum, None)
+
+    @con_escritura
+    def _indexar_digest(self, bloque_id: str, checksum: str, guardado: Optional[str]):
+        # Una verificación anulada (el bloque cambió o se borró mientras tanto) no se aplica
+        if self.verificaciones_digest.get(bloque_id) != checksum:
+            return
+        del self.verificaciones_digest[bloque_id]
+        bloque = self.bloques_metadata.get(bloque_id)
+        if bloque is None or bloque.checksum != checksum or guardado is None:
+            return
+        if guardado != checksum:
+            logger.warning(f"Bloque {bloque_id}: el checksum confirmado no coincide con el guardado; "
+                           f"no se deduplica contra él")
+            return
+        # Se persiste con el siguiente guardado de metadatos; si se pierde, el bloque solo deja de deduplicarse
+        bloque.digest_verificado = True
+        self.indice_digest.setdefault(checksum, bloque_id)
+
+    @medir_operacion
+    @con_escritura
+    def liberar_bloques(self, bloque_ids: List[str], guardar: bool = True) -> int:
+        """Liberar una referencia de cada bloque; se eliminan los que quedan sin referencias"""
+        eliminados = 0
+        for bloque_id in bloque_ids:
+            if self.eliminar_bloque(bloque_id, guardar=False):
+                eliminados += 1
+        if guardar and bloque_ids:
+            self._guardar_metadata()
+        return eliminados
+    
+    @con_lectura
     def obtener_bloque(self, bloque_id: str) -> Optional[BloqueInfo]:
         """Obtener información de un bloque"""
         return self.bloques_metadata.get(bloque_id)
     
-    def obtener_bloques_archivo(self, archivo_nombre: str) -> List[BloqueInfo]:
-        """Obtener todos los bloques de un archivo ordenados por posición"""
-        bloques = [bloque for bloque in self.bloques_metadata.values() 
-                  if bloque.archivo_nombre == archivo_nombre]
-        return sorted(bloques, key=lambda b: b.posicion)
+    @medir_operacion
+    @con_lectura
+    def obtener_bloques_archivo(self, archivo) -> List[BloqueInfo]:
+        """Obtener todos los bloques de un archivo en orden.
+        
+        Se resuelven por la lista del inodo y no por `archivo_nombre`, que es el nombre con el
+        que se creó el bloque: no sigue a los renombrados y puede repetirse entre directorios.
+        """
+        return [self.bloques_metadata[bloque_id] for bloque_id in archivo.bloques
+                if bloque_id in self.bloques_metadata]
     
-    def eliminar_bloques_archivo(self, archivo_nombre: str) -> bool:
-        """Eliminar todos los bloques de un archivo"""
-        bloques_a_eliminar = [bloque_id for bloque_id, bloque in self.bloques_metadata.items()
-                             if bloque.archivo_nombre == archivo_nombre]
-        
-        for bloque_id in bloques_a_eliminar:
-            self.eliminar_bloque(bloque_id)
-        
-        logger.info(f"Eliminados {len(bloques_a_eliminar)} bloques del archivo {archivo_nombre}")
+    @medir_operacion
+    @con_escritura
+    def eliminar_bloques_archivo(self, archivo) -> bool:
+        """Liberar una referencia de cada bloque de un archivo"""
+        bloques_a_eliminar = list(archivo.bloques)
+        self.liberar_bloques(bloques_a_eliminar)
+        
+        logger.info(f"Liberados {len(bloques_a_eliminar)} bloques del archivo {archivo.ruta}")
         return len(bloques_a_eliminar) > 0
     
-    def eliminar_bloque(self, bloque_id: str) -> bool:
-        """Eliminar un bloque del sistema"""
+    @medir_operacion
+    @con_escritura
+    def eliminar_bloque(self, bloque_id: str, guardar: bool = True) -> bool:
+        """Eliminar un bloque del sistema (guardar=False permite agrupar varias bajas en una escritura)"""
         if bloque_id not in self.bloques_metadata:
             return False
         
         bloque = self.bloques_metadata[bloque_id]
         
-        # Notificar a los DataNodes para eliminar el bloque
-        for host, puerto in bloque.ubicaciones:
-            try:
-                response = requests.delete(f"http://{host}:{puerto}/bloques/{bloque_id}", timeout=5)
-                if response.status_code == 200:
-                    # Actualizar metadata del DataNode
-                    for datanode in self.datanodes.values():
-                        if datanode.host == host and datanode.puerto == puerto:
-                            datanode.remover_bloque(bloque_id, bloque.tamaño)
-                            break
-            except Exception as e:
-                logger.warning(f"Error eliminando bloque {bloque_id} del DataNode {host}:{puerto}: {e}")
+        # Un bloque compartido solo pierde una referencia
+        if bloque.referencias > 1:
+            bloque.referencias -= 1
+            if guardar:
+                self._guardar_metadata()
+            return False
+        
+        # El borrado físico (del bloque o de cada celda EC) viaja en el próximo heartbeat
+        for indice, (host, puerto) in enumerate(bloque.ubicaciones):
+            id_fisico = bloque.celda_id(indice) if bloque.es_erasure() else bloque_id
+            tamaño_fisico = bloque.tamaño_celda if bloque.es_erasure() else bloque.tamaño
+            datanode = self._buscar_datanode(host, puerto)
+            if datanode:
+                datanode.remover_bloque(id_fisico, tamaño_fisico)
+                datanode.encolar_invalidacion(id_fisico)
         
+        self.desindexar_digest(bloque)
         del self.bloques_metadata[bloque_id]
-        self._guardar_metadata()
+        if guardar:
+            self._guardar_metadata()
         return True
     
+    @medir_operacion
+    @con_lectura
     def verificar_replicacion(self) -> List[str]:
         """Verificar y reportar bloques con replicación insuficiente"""
         bloques_problematicos = []
@@ -180,18 +401,27 @@ class BloquesServicio:
         for bloque_id, bloque in self.bloques_metadata.items():
             if not bloque.is_replicado_suficiente(self.replication_factor):
                 bloques_problematicos.append(bloque_id)
-                logger.warning(f"Bloque {bloque_id} tiene replicación insuficiente: {len(bloque.ubicaciones)}/{self.replication_factor}")
+                esperadas = bloque.ec_k + bloque.ec_m if bloque.es_erasure() else self.replication_factor
+                logger.warning(f"Bloque {bloque_id} tiene replicación insuficiente: {len(bloque.ubicaciones)}/{esperadas}")
         
         return bloques_problematicos
     
+    @medir_operacion
+    @con_escritura
     def reparar_replicacion(self, bloque_id: str) -> bool:
-        """Reparar la replicación de un bloque"""
+        """Reparar la replicación de un bloque; las copias que falten se programan como comando"""
         if bloque_id not in self.bloques_metadata:
             return False
         
         bloque = self.bloques_metadata[bloque_id]
         ubicaciones_actuales = len(bloque.ubicaciones)
         
+        # Las celdas EC no se copian: se reconstruyen a partir de k celdas en la lectura
+        if bloque.es_erasure():
+            if not bloque.is_replicado_suficiente():
+                logger.warning(f"Grupo EC {bloque_id} degradado: {ubicaciones_actuales}/{bloque.ec_k + bloque.ec_m} celdas")
+            return bloque.is_replicado_suficiente()
+        
         if ubicaciones_actuales >= self.replication_factor:
             return True
         
@@ -207,40 +437,65 @@ class BloquesServicio:
             logger.warning(f"No hay suficientes DataNodes disponibles para reparar bloque {bloque_id}")
             return False
         
-        # Obtener el bloque desde el primer DataNode disponible
         if not bloque.ubicaciones:
             logger.error(f"Bloque {bloque_id} no tiene ubicaciones disponibles")
             return False
         
-        source_host, source_port = bloque.ubicaciones[0]
+        if bloque_id in self.replicaciones_en_curso:
+            return False
         
-        # Replicar a DataNodes adicionales
-        datanodes_seleccionados = datanodes_libres[:replicas_necesarias]
-        for datanode in datanodes_seleccionados:
-            try:
-                # Solicitar replicación del bloque
-                replica_data = {
-                    'source_host': source_host,
-                    'source_port': source_port,
-                    'bloque_id': bloque_id
-                }
-                response = requests.post(
-                    f"http://{datanode.host}:{datanode.puerto}/bloques/replicate",
-                    json=replica_data,
-                    timeout=30
-                )
-                
-                if response.status_code == 200:
-                    bloque.agregar_ubicacion(datanode.host, datanode.puerto)
-                    datanode.agregar_bloque(bloque_id, bloque.tamaño)
-                    logger.info(f"Bloque {bloque_id} replicado a {datanode.host}:{datanode.puerto}")
-                
-            except Exception as e:
-                logger.error(f"Error replicando bloque {bloque_id} a {datanode.host}:{datanode.puerto}: {e}")
+        # La copia la hace una réplica viva cuando recibe el comando en su heartbeat
+        origen = next((dn for dn in datanodes_disponibles if (dn.host, dn.puerto) in bloque.ubicaciones), None)
+        if origen is None:
+            logger.error(f"Bloque {bloque_id} no tiene réplicas activas desde las que copiar")
+            return False
         
+        datanodes_seleccionados = datanodes_libres[:replicas_necesarias]
+        self.encolar_comando(origen, COMANDO_TRANSFERIR, bloque_id=bloque_id, destinos=[
+            {'host': dn.host, 'puerto': dn.puerto} for dn in datanodes_seleccionados
+        ])
+        self.replicaciones_en_curso.add(bloque_id)
+        logger.info(f"Replicación de {bloque_id} programada en {origen.host}:{origen.puerto}")
+        return False
+    
+    @con_escritura
+    def _transferencia_confirmada(self, origen: DataNodeInfo, comando: Dict, resultado: Dict):
+        """Registrar las réplicas nuevas que el DataNode origen confirmó"""
+        bloque_id = comando['bloque_id']
+        self.replicaciones_en_curso.discard(bloque_id)
+        bloque = self.bloques_metadata.get(bloque_id)
+        
+        for host, puerto in resultado.get('destinos_ok', []):
+            destino = self._buscar_datanode(host, puerto)
+            if destino is None:
+                continue
+            if bloque is None:
+                # El bloque se borró mientras se copiaba: la copia sobra
+                destino.encolar_invalidacion(bloque_id)
+                continue
+            bloque.agregar_ubicacion(host, puerto)
+            destino.agregar_bloque(bloque_id, bloque.tamaño)
+            logger.info(f"Bloque {bloque_id} replicado a {host}:{puerto}")
+        
+        if not resultado.get('exito'):
+            logger.warning(f"Transferencia de {bloque_id} fallida: {resultado.get('error')}")
         self._guardar_metadata()
-        return len(bloque.ubicaciones) >= self.replication_factor
     
+    @con_lectura
+    def backlog_replicacion(self) -> Dict:
+        """Trabajo de replicación y borrado pendiente, sin el log por bloque de verificar_replicacion"""
+        nodos = list(self.datanodes.values())
+        return {
+            'bajo_replicados': sum(1 for b in self.bloques_metadata.values()
+                                   if not b.is_replicado_suficiente(self.replication_factor)),
+            'replicaciones_en_curso': len(self.replicaciones_en_curso),
+            'comandos_en_cola': sum(len(dn.comandos) for dn in nodos),
+            'comandos_en_vuelo': sum(len(dn.comandos_en_vuelo) for dn in nodos),
+            'invalidaciones': sum(len(dn.invalidaciones) for dn in nodos),
+            'datanodes_activos': sum(1 for dn in nodos if dn.estado == "activo")
+        }
+    
+    @con_lectura
     def obtener_estadisticas(self) -> Dict:
         """Obtener estadísticas del sistema de bloques"""
         total_bloques = len(self.bloques_metadata)
@@ -252,6 +507,9 @@ class BloquesServicio:
         
         bloques_mal_replicados = len(self.verificar_replicacion())
         
+        bytes_logicos = sum(b.tamaño for b in self.bloques_metadata.values())
+        bytes_almacenados = sum(b.tamaño_almacenado or b.tamaño for b in self.bloques_metadata.values())
+        
         return {
             'total_bloques': total_bloques,
             'total_datanodes': total_datanodes,
@@ -261,33 +519,215 @@ class BloquesServicio:
             'espacio_disponible_gb': (espacio_total - espacio_usado) / (1024**3),
             'porcentaje_uso': (espacio_usado / espacio_total * 100) if espacio_total > 0 else 0,
             'bloques_mal_replicados': bloques_mal_replicados,
+            'ratio_compresion': (bytes_almacenados / bytes_logicos) if bytes_logicos > 0 else 1.0,
             'factor_replicacion': self.replication_factor,
-            'tamaño_bloque_mb': self.block_size / (1024**2)
+            'tamaño_bloque_mb': self.block_size / (1024**2),
+            'transporte_datanodes': self.cliente_datanodes.estadisticas()
         }
     
-    def heartbeat_datanode(self, host: str, puerto: int, estado_info: Dict = None) -> bool:
-        """Procesar heartbeat de un DataNode"""
-        datanode = None
-        for dn in self.datanodes.values():
-            if dn.host == host and dn.puerto == puerto:
-                datanode = dn
-                break
+    @con_lectura
+    def _buscar_datanode(self, host: str, puerto: int) -> Optional[DataNodeInfo]:
+        """Buscar un DataNode por su dirección"""
+        for datanode in self.datanodes.values():
+            if datanode.host == host and datanode.puerto == puerto:
+                return datanode
+        return None
+    
+    @con_escritura
+    def registrar_manejador(self, tipo: str, manejador):
+        """Registrar quién procesa el resultado de un tipo de comando"""
+        self.manejadores_comando[tipo] = manejador
+    
+    @con_escritura
+    def encolar_comando(self, datanode: DataNodeInfo, tipo: str, **datos) -> Dict:
+        """Encolar un comando pesado para el DataNode; se entrega con sus heartbeats"""
+        comando = {'id': str(uuid.uuid4()), 'tipo': tipo, 'creado': time.time(), **datos}
+        datanode.comandos.append(comando)
+        return comando
+    
+    def _finalizar_comando(self, datanode: DataNodeInfo, comando: Dict, resultado: Dict):
+        manejador = self.manejadores_comando.get(comando['tipo'])
+        if manejador is None:
+            return
+        try:
+            manejador(datanode, comando, resultado)
+        except Exception as e:
+            logger.error(f"Error procesando resultado del comando {comando['tipo']} {comando['id']}: {e}")
+    
+    @medir_operacion
+    @con_escritura
+    def expirar_comandos(self) -> int:
+        """Dar por fallidos los comandos sin confirmar (p. ej. de DataNodes caídos)"""
+        limite = time.time() - COMMAND_TIMEOUT
+        expirados = 0
+        for datanode in self.datanodes.values():
+            vencidos = [c for c in datanode.comandos if c['creado'] < limite]
+            datanode.comandos = [c for c in datanode.comandos if c['creado'] >= limite]
+            for comando_id, en_vuelo in list(datanode.comandos_en_vuelo.items()):
+                if en_vuelo['enviado'] < limite:
+                    del datanode.comandos_en_vuelo[comando_id]
+                    vencidos.append(en_vuelo['comando'])
+            for comando in vencidos:
+                self._finalizar_comando(datanode, comando, {'id': comando['id'], 'exito': False, 'error': 'timeout'})
+            expirados += len(vencidos)
+        return expirados
+    
+    @con_escritura
+    def comandos_para_datanode(self, datanode: DataNodeInfo) -> List[Dict]:
+        """Comandos que viajan en la respuesta al heartbeat de un DataNode.
+        
+        Los borrados y el reporte son baratos y van siempre; las transferencias y
+        compactaciones se limitan a la capacidad que el nodo tiene libre.
+        """
+        comandos = []
+        if datanode.reporte_solicitado:
+            comandos.append({'tipo': COMANDO_REPORTE})
+        if datanode.invalidaciones:
+            comandos.append({
+                'tipo': COMANDO_INVALIDAR,
+                'bloques': datanode.invalidaciones[:INVALIDATION_BATCH_SIZE]
+            })
+        
+        libres = (datanode.capacidad_comandos or COMMANDS_PER_HEARTBEAT) - len(datanode.comandos_en_vuelo)
+        while datanode.comandos and libres > 0:
+            comando = datanode.comandos.pop(0)
+            datanode.comandos_en_vuelo[comando['id']] = {'comando': comando, 'enviado': time.time()}
+            comandos.append({k: v for k, v in comando.items() if k != 'creado'})
+            libres -= 1
+        return comandos
+    
+    @staticmethod
+    def _aplicar_delta_bloques(datanode: DataNodeInfo, agregados: List[str], eliminados: List[str]):
+        """Actualizar la lista de bloques del nodo con un reporte incremental"""
+        if eliminados:
+            eliminados = set(eliminados)
+            datanode.bloques_almacenados = [b for b in datanode.bloques_almacenados if b not in eliminados]
+        if agregados:
+            presentes = set(datanode.bloques_almacenados)
+            datanode.bloques_almacenados.extend(b for b in agregados if b not in presentes)
+    
+    @medir_operacion
+    @con_escritura
+    def marcar_datanode_caido(self, host: str, puerto: int, motivo: str = 'stream de heartbeat cerrado'):
+        """Dar un DataNode por caído en el acto (p. ej. se cortó su stream de heartbeat)"""
+        datanode = self._buscar_datanode(host, puerto)
+        if datanode is None or datanode.estado != "activo":
+            return
+        datanode.estado = "inactivo"
+        # Sus comandos en curso no van a confirmarse: se liberan para reprogramarlos en otro nodo
+        en_vuelo = [c['comando'] for c in datanode.comandos_en_vuelo.values()] + datanode.comandos
+        datanode.comandos_en_vuelo = {}
+        datanode.comandos = []
+        for comando in en_vuelo:
+            self._finalizar_comando(datanode, comando, {'id': comando['id'], 'exito': False,
+                                                        'error': 'DataNode desconectado'})
+        self._guardar_metadata()
+        logger.warning(f"DataNode {host}:{puerto} marcado como inactivo: {motivo}")
+
+    def _circuito_abierto(self, host: str, puerto: int):
+        # Su próximo heartbeat lo reactiva, pero no recibe escrituras mientras el circuito siga abierto
+        self.marcar_datanode_caido(host, puerto, motivo='circuito abierto tras fallos seguidos')
+    
+    @medir_operacion
+    @con_escritura
+    def heartbeat_datanode(self, host: str, puerto: int, estado_info: Dict = None,
+                           invalidados: List[str] = None, completados: List[Dict] = None) -> List[Dict]:
+        """Procesar heartbeat de un DataNode; retorna los comandos pendientes para él.
         
-        if not datanode:
-            # Registrar nuevo DataNode
-            datanode = self.registrar_datanode(host, puerto)
+        `invalidados` son los bloques que el DataNode borró tras el heartbeat anterior y
+        `completados` los resultados ({id, exito, ...}) de los comandos pesados que ejecutó.
+        """
+        datanode = self._buscar_datanode(host, puerto)
         
+        if not datanode:
+            # Nodo desconocido (p. ej. metadata perdida): debe registrarse y reportar de nuevo
+            return [{'tipo': COMANDO_REREGISTRO}]
+        
+        # Un latido sin novedades (solo marca de tiempo y espacio) no se persiste:
+        # tras un reinicio, el siguiente heartbeat los vuelve a traer
+        cambios = datanode.estado != "activo"
+        if cambios:
+            # Volvió tras estar caído: su lista de bloques puede estar desactualizada
+            datanode.reporte_solicitado = True
         datanode.actualizar_heartbeat()
         datanode.estado = "activo"
         
         if estado_info:
             datanode.espacio_usado = estado_info.get('espacio_usado', datanode.espacio_usado)
             datanode.espacio_total = estado_info.get('espacio_total', datanode.espacio_total)
-            datanode.bloques_almacenados = estado_info.get('bloques', datanode.bloques_almacenados)
-        
-        self._guardar_metadata()
-        return True
+            datanode.capacidad_comandos = estado_info.get('capacidad', datanode.capacidad_comandos)
+            if 'bloques' in estado_info:
+                datanode.bloques_almacenados = estado_info['bloques']
+                datanode.reporte_solicitado = False
+                cambios = True
+            else:
+                agregados = estado_info.get('bloques_agregados', [])
+                eliminados = estado_info.get('bloques_eliminados', [])
+                self._aplicar_delta_bloques(datanode, agregados, eliminados)
+                cambios = cambios or bool(agregados or eliminados)
+        
+        if invalidados:
+            cambios = True
+            confirmados = datanode.confirmar_invalidaciones(invalidados)
+            logger.info(f"DataNode {host}:{puerto} confirmó {confirmados} bloques borrados")
+        
+        for resultado in completados or []:
+            en_vuelo = datanode.comandos_en_vuelo.pop(resultado.get('id'), None)
+            if en_vuelo:
+                self._finalizar_comando(datanode, en_vuelo['comando'], resultado)
+                cambios = True
+        
+        if cambios:
+            self._guardar_metadata()
+        return self.comandos_para_datanode(datanode)
     
+    @medir_operacion
+    def subir_bloque(self, bloque_id: str, data: bytes, ubicaciones: List[Tuple[str, int]],
+                     offset: int = None) -> bool:
+        """Envía un bloque a todas sus réplicas en paralelo respetando el backpressure de
+        cada DataNode (RESOURCE_EXHAUSTED + retry-after-ms). Con `offset` se escribe solo
+        ese rango sin truncar el bloque (contenedores). Basta con que lo guarde una réplica:
+        las que fallan salen de las ubicaciones del bloque y la re-replicación repone las
+        copias. Retorna False si ninguna lo guardó."""
+        def escribir(ubicacion: Tuple[str, int]) -> bool:
+            host, puerto = ubicacion
+            try:
+                self.cliente_datanodes.escribir_bloque(host, puerto, bloque_id, data, offset=offset)
+                return True
+            except IOError as e:
+                logger.error(f"Error subiendo bloque {bloque_id} a {host}:{puerto}: {str(e)}")
+                return False
+
+        ubicaciones = [tuple(u) for u in ubicaciones]
+        # Cada envío lleva su propia copia del contexto de traza: no puede entrarse en dos hilos a la vez
+        envios = [self.ejecutor_replicas.submit(tracing.propagate(escribir), u) for u in ubicaciones]
+        resultados = [envio.result() for envio in envios]
+        fallidas = [u for u, ok in zip(ubicaciones, resultados) if not ok]
+        if not fallidas:
+            return True
+        if len(fallidas) == len(ubicaciones):
+            return False
+        self._descartar_replicas(bloque_id, fallidas)
+        return True
+
+    @con_escritura
+    def _descartar_replicas(self, bloque_id: str, fallidas: List[Tuple[str, int]]):
+        """Quitar del bloque las réplicas cuya escritura falló; quedan por debajo del factor de replicación"""
+        bloque = self.bloques_metadata.get(bloque_id)
+        if bloque is None or bloque.es_erasure():
+            return
+        for host, puerto in fallidas:
+            bloque.remover_ubicacion(host, puerto)
+            datanode = self._buscar_datanode(host, puerto)
+            if datanode:
+                datanode.remover_bloque(bloque_id, bloque.tamaño)
+                # Lo que llegara a escribirse en ese nodo se borra en su próximo heartbeat
+                datanode.encolar_invalidacion(bloque_id)
+        logger.warning(f"Bloque {bloque_id}: escritura fallida en {fallidas}; "
+                       f"quedan {len(bloque.ubicaciones)} réplicas hasta la re-replicación")
+
+    @medir_operacion
+    @con_escritura
     def verificar_datanodes_inactivos(self, timeout_minutos: int = 5) -> List[str]:
         """Verificar DataNodes que no han enviado heartbeat recientemente"""
         datanodes_inactivos = []
@@ -304,26 +744,3 @@ class BloquesServicio:
             self._guardar_metadata()
         
         return datanodes_inactivos
-
-# Implementar correctamente el método subir_bloque (fuera de la clase)
-def subir_bloque(self, bloque_id: str, data: bytes, leader_uri: str) -> bool:
-    """Envía un bloque al DataNode líder para su almacenamiento"""
-    try:
-        response = requests.post(
-            f"{leader_uri}/bloques/{bloque_id}",
-            data=data,
-            headers={'Content-Type': 'application/octet-stream'},
-            timeout=10
-        )
-        
-        if response.status_code != 201:
-            logger.error(f"DataNode respondió con error: {response.text}")
-            return False
-            
-        return True
-        
-    except Exception as e:
-        logger.error(f"Error subiendo bloque {bloque_id} a {leader_uri}: {str(e)}")
-        return False
-
-# Añadir este método a la clase BloquesServicio
\ No newline at end of file
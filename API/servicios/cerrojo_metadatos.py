@@ -0,0 +1,132 @@
+# servicios/cerrojo_metadatos.py
+from contextlib import contextmanager
+from functools import wraps
+import threading
+
+
+class CerrojoLectorEscritor:
+    """Cerrojo de lectores/escritor reentrante con turnos por fases.
+
+    Varias lecturas (resolver rutas, listar, ubicar bloques) avanzan en paralelo;
+    una escritura espera a que salgan los lectores y los excluye mientras dura.
+    Los turnos alternan por fases: en cuanto un escritor espera no entran lectores
+    nuevos, y al salir un escritor pasan antes del siguiente los lectores que ya
+    esperaban. Así ni la reparación en segundo plano se queda sin turno bajo una
+    carga de lecturas continua, ni las lecturas bajo escrituras encadenadas.
+
+    Es reentrante por hilo: quien escribe puede volver a leer o escribir, y quien
+    lee puede volver a leer aunque haya escritores esperando. Pasar de lectura a
+    escritura no está permitido (dos lectores que suben se bloquearían entre sí).
+    """
+
+    def __init__(self):
+        self._condicion = threading.Condition(threading.Lock())
+        self._lectores = 0
+        self._lectores_esperando = 0
+        # Lectores que pueden entrar aunque haya escritores esperando (los que esperaban al salir el escritor)
+        self._turno_lectores = 0
+        self._escritores_esperando = 0
+        self._escritor = None
+        self._profundidad_escritura = 0
+        self._local = threading.local()
+
+    def _lecturas_del_hilo(self) -> int:
+        return getattr(self._local, 'lecturas', 0)
+
+    def adquirir_lectura(self):
+        lecturas = self._lecturas_del_hilo()
+        if lecturas:
+            self._local.lecturas = lecturas + 1
+            return
+        with self._condicion:
+            self._lectores_esperando += 1
+            try:
+                while self._escritor is not None or (self._escritores_esperando and not self._turno_lectores):
+                    self._condicion.wait()
+            finally:
+                self._lectores_esperando -= 1
+            if self._turno_lectores:
+                self._turno_lectores -= 1
+            self._lectores += 1
+        self._local.lecturas = 1
+
+    def liberar_lectura(self):
+        self._local.lecturas -= 1
+        if self._local.lecturas:
+            return
+        with self._condicion:
+            self._lectores -= 1
+            if not self._lectores:
+                self._condicion.notify_all()
+
+    def adquirir_escritura(self):
+        yo = threading.get_ident()
+        if self._escritor == yo:
+            self._profundidad_escritura += 1
+            return
+        if self._lecturas_del_hilo():
+            raise RuntimeError("No se puede pasar de lectura a escritura sin liberar la lectura")
+        with self._condicion:
+            self._escritores_esperando += 1
+            try:
+                while (self._escritor is not None or self._lectores
+                       or (self._turno_lectores and self._lectores_esperando)):
+                    self._condicion.wait()
+            finally:
+                self._escritores_esperando -= 1
+            self._turno_lectores = 0
+            self._escritor = yo
+            self._profundidad_escritura = 1
+
+    def liberar_escritura(self):
+        self._profundidad_escritura -= 1
+        if self._profundidad_escritura:
+            return
+        with self._condicion:
+            self._escritor = None
+            self._turno_lectores = self._lectores_esperando
+            self._condicion.notify_all()
+
+    @contextmanager
+    def lectura(self):
+        # El escritor ya excluye a todos: su lectura cuenta como una escritura anidada
+        if self._escritor == threading.get_ident():
+            with self.escritura():
+                yield
+            return
+        self.adquirir_lectura()
+        try:
+            yield
+        finally:
+            self.liberar_lectura()
+
+    @contextmanager
+    def escritura(self):
+        self.adquirir_escritura()
+        try:
+            yield
+        finally:
+            self.liberar_escritura()
+
+
+# Un único cerrojo para el espacio de nombres y el mapa de bloques: muchas
+# operaciones tocan ambos y así no hay orden de adquisición que respetar.
+cerrojo_metadatos = CerrojoLectorEscritor()
+
+
+def con_lectura(metodo):
+    """Decorador: ejecuta el método con el cerrojo de metadatos en modo lectura"""
+    @wraps(metodo)
+    def envoltura(*args, **kwargs):
+        with cerrojo_metadatos.lectura():
+            return metodo(*args, **kwargs)
+    return envoltura
+
+
+def con_escritura(metodo):
+    """Decorador: ejecuta el método con el cerrojo de metadatos en modo escritura"""
+    @wraps(metodo)
+    def envoltura(*args, **kwargs):
+        with cerrojo_metadatos.escritura():
+            return metodo(*args, **kwargs)
+    return envoltura
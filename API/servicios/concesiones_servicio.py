@@ -0,0 +1,185 @@
+# servicios/concesiones_servicio.py
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, Optional
+from modelos.archivo_metadata import ArchivoMetadata
+from servicios.cerrojo_metadatos import con_escritura
+from config import LEASE_DURATION
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Estado de los bloques reservados por un anexado que aún no se ha completado
+EN_CONSTRUCCION = 'en_construccion'
+
+
+class ConcesionesServicio:
+    """Anexado a archivos existentes con una concesión (lease) de escritor único.
+
+    Abrir un anexado concede el archivo a un solo cliente y planifica la escritura:
+    primero se rellena el último bloque si está a medias (escritura parcial en el
+    DataNode), después van bloques nuevos. Los bloques nuevos quedan en
+    construcción y fuera del archivo hasta completar; los lectores siguen viendo el
+    tamaño anterior. La concesión caduca si no se renueva en LEASE_DURATION
+    segundos, y entonces el anexado se abandona y sus bloques nuevos se liberan.
+    Las concesiones viven solo en memoria: al arrancar se liberan los bloques que
+    quedaron en construcción.
+    """
+
+    def __init__(self, archivos_servicio, bloques_servicio):
+        self.archivos_servicio = archivos_servicio
+        self.bloques_servicio = bloques_servicio
+        self.duracion = LEASE_DURATION
+        self.concesiones: Dict[str, Dict] = {}  # concesion_id -> concesión
+        self.por_archivo: Dict[int, str] = {}  # inodo_id -> concesion_id
+        self._liberar_huerfanos()
+
+    def _liberar_huerfanos(self):
+        """Bloques de anexados que no llegaron a completarse antes de reiniciar el NameNode"""
+        huerfanos = [bloque_id for bloque_id, bloque in self.bloques_servicio.bloques_metadata.items()
+                     if bloque.estado == EN_CONSTRUCCION]
+        if huerfanos:
+            self.bloques_servicio.liberar_bloques(huerfanos)
+            logger.info(f"Liberados {len(huerfanos)} bloques de anexados sin completar")
+
+    def _vigente(self, concesion_id: str, usuario: str) -> Dict:
+        concesion = self.concesiones.get(concesion_id)
+        if concesion is None or concesion['expira'] <= time.time():
+            if concesion is not None:
+                self._abandonar(concesion)
+            raise ValueError('La concesión no existe o ha caducado')
+        if concesion['usuario'] != usuario:
+            raise PermissionError('La concesión pertenece a otro usuario')
+        return concesion
+
+    def _reanudable(self, bloque) -> bool:
+        """El último bloque se rellena en su sitio si está a medias, sin comprimir y no compartido"""
+        return (bloque is not None and 0 < bloque.tamaño < self.bloques_servicio.block_size
+                and bloque.codec in (None, '', 'none') and bloque.referencias == 1 and not bloque.es_erasure())
+
+    @con_escritura
+    def abrir(self, ruta: str, tamaño: int, usuario: str) -> Dict:
+        """Concede el archivo a `usuario` y reserva lo necesario para anexar `tamaño` bytes"""
+        if tamaño <= 0:
+            raise ValueError('El tamaño a anexar debe ser positivo')
+        archivo = self.archivos_servicio.obtener_archivo(ruta)
+        if not archivo:
+            raise LookupError(f'El archivo {ruta} no existe')
+        if archivo.contenedor or archivo.redundancia != 'replicacion':
+            raise ValueError(f'{ruta} no admite anexados: solo archivos replicados con bloques propios')
+
+        actual = self.por_archivo.get(archivo.inodo_id)
+        if actual is not None:
+            concesion = self.concesiones[actual]
+            if concesion['expira'] > time.time():
+                raise ValueError(f'{ruta} ya tiene un escritor ({concesion["usuario"]}) hasta que caduque su concesión')
+            self._abandonar(concesion)
+
+        ultimo = None
+        restante = tamaño
+        bloque = self.bloques_servicio.obtener_bloque(archivo.bloques[-1]) if archivo.bloques else None
+        if self._reanudable(bloque):
+            longitud = min(self.bloques_servicio.block_size - bloque.tamaño, tamaño)
+            ultimo = {'bloque_id': bloque.bloque_id, 'offset': bloque.tamaño, 'longitud': longitud,
+                      'ubicaciones': bloque.ubicaciones}
+            restante -= longitud
+            # Mientras cambia, ningún archivo nuevo debe deduplicarse contra su contenido anterior
+            self.bloques_servicio.desindexar_digest(bloque)
+
+        nuevos = []
+        if restante:
+            nuevos = self.bloques_servicio.crear_bloques_para_archivo(archivo.nombre, restante,
+                                                                      posicion_inicial=len(archivo.bloques))
+            for nuevo in nuevos:
+                nuevo.estado = EN_CONSTRUCCION
+            self.bloques_servicio._guardar_metadata()
+
+        concesion = {
+            'concesion_id': str(uuid.uuid4()),
+            'archivo': archivo,
+            'usuario': usuario,
+            'tamaño': tamaño,
+            'ultimo': ultimo,
+            'bloques': [b.bloque_id for b in nuevos],
+            'expira': time.time() + self.duracion
+        }
+        self.concesiones[concesion['concesion_id']] = concesion
+        self.por_archivo[archivo.inodo_id] = concesion['concesion_id']
+        logger.info(f"Concesión de anexado sobre {ruta} para {usuario}: {tamaño} bytes, "
+                    f"{'relleno del último bloque y ' if ultimo else ''}{len(nuevos)} bloques nuevos")
+        return {
+            'concesion_id': concesion['concesion_id'],
+            'duracion': self.duracion,
+            'archivo': archivo.to_dict(),
+            'ultimo': ultimo,
+            'bloques': [b.to_dict() for b in nuevos]
+        }
+
+    @con_escritura
+    def renovar(self, concesion_id: str, usuario: str) -> float:
+        """Prolonga la concesión; retorna los segundos de vigencia"""
+        concesion = self._vigente(concesion_id, usuario)
+        concesion['expira'] = time.time() + self.duracion
+        return self.duracion
+
+    @con_escritura
+    def completar(self, concesion_id: str, usuario: str, checksum_ultimo: Optional[str] = None) -> ArchivoMetadata:
+        """Incorpora lo anexado al archivo y libera la concesión.
+        `checksum_ultimo` es el que devolvió el DataNode tras rellenar el último bloque."""
+        concesion = self._vigente(concesion_id, usuario)
+        archivo = concesion['archivo']
+        if concesion['ultimo'] and not checksum_ultimo:
+            raise ValueError('Falta el checksum del último bloque rellenado')
+        if not self.archivos_servicio.en_namespace(archivo):
+            self._abandonar(concesion)
+            raise LookupError('El archivo se eliminó durante el anexado')
+
+        self._soltar(concesion)
+        ahora = datetime.now().isoformat()
+        if concesion['ultimo']:
+            bloque = self.bloques_servicio.obtener_bloque(concesion['ultimo']['bloque_id'])
+            bloque.tamaño += concesion['ultimo']['longitud']
+            bloque.tamaño_almacenado = bloque.tamaño
+            bloque.fecha_modificacion = ahora
+            self.bloques_servicio.registrar_checksum(bloque, checksum_ultimo)
+        for bloque_id in concesion['bloques']:
+            nuevo = self.bloques_servicio.obtener_bloque(bloque_id)
+            nuevo.estado = 'activo'
+            self.bloques_servicio.verificar_digest(nuevo)
+            archivo.agregar_bloque(bloque_id)
+        archivo.tamaño_total += concesion['tamaño']
+        archivo.fecha_modificacion = ahora
+        self.bloques_servicio._guardar_metadata()
+        self.archivos_servicio.guardar_archivo(archivo)
+        return archivo
+
+    @con_escritura
+    def abandonar(self, concesion_id: str, usuario: str):
+        """El escritor desiste: el archivo queda como estaba y se liberan sus bloques nuevos"""
+        self._abandonar(self._vigente(concesion_id, usuario))
+
+    @con_escritura
+    def expirar(self) -> int:
+        """Abandona los anexados cuya concesión caducó (se llama desde el monitor)"""
+        caducadas = [c for c in self.concesiones.values() if c['expira'] <= time.time()]
+        for concesion in caducadas:
+            logger.warning(f"Concesión de anexado sobre {concesion['archivo'].ruta} caducada")
+            self._abandonar(concesion)
+        return len(caducadas)
+
+    def _soltar(self, concesion: Dict):
+        del self.concesiones[concesion['concesion_id']]
+        if self.por_archivo.get(concesion['archivo'].inodo_id) == concesion['concesion_id']:
+            del self.por_archivo[concesion['archivo'].inodo_id]
+
+    def _abandonar(self, concesion: Dict):
+        self._soltar(concesion)
+        # Lo escrito en el último bloque más allá de su tamaño no se lee y el próximo anexado lo sobrescribe;
+        # hasta su tamaño el contenido no cambió y puede volver a deduplicarse
+        if concesion['ultimo']:
+            bloque = self.bloques_servicio.obtener_bloque(concesion['ultimo']['bloque_id'])
+            if bloque:
+                self.bloques_servicio.verificar_digest(bloque)
+        self.bloques_servicio.liberar_bloques(concesion['bloques'])
@@ -0,0 +1,305 @@
+# servicios/contenedores_servicio.py
+import os
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+from modelos.archivo_metadata import ArchivoMetadata
+from modelos.bloque_info import BloqueInfo, DataNodeInfo
+from servicios.bloques_servicio import COMANDO_COMPACTAR
+from servicios.cerrojo_metadatos import con_lectura, con_escritura
+from config import SMALL_FILE_THRESHOLD, CONTAINER_BLOCK_SIZE, COMPACTION_GARBAGE_RATIO, SMALL_FILE_RESERVATION_TTL
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class ContenedoresServicio:
+    """Empaqueta archivos pequeños en bloques contenedor compartidos.
+
+    Cada archivo pequeño ocupa un rango (offset, longitud) dentro de un contenedor
+    en lugar de tener su propio BloqueInfo y su propio archivo en el DataNode.
+    El rango se reserva primero y el archivo solo aparece en el namespace al
+    confirmar que los datos están escritos; una reserva abandonada o caducada
+    deja su rango como bytes muertos que recupera la compactación.
+    """
+
+    def __init__(self, archivos_servicio, bloques_servicio):
+        self.archivos_servicio = archivos_servicio
+        self.bloques_servicio = bloques_servicio
+        self.umbral = SMALL_FILE_THRESHOLD
+        self.capacidad = CONTAINER_BLOCK_SIZE
+        self.contenedor_abierto: Optional[str] = self._buscar_contenedor_abierto()
+        # Rangos reservados cuyo archivo aún no existe: reserva_id -> reserva
+        self.reservas: Dict[str, Dict] = {}
+        self.duracion_reserva = SMALL_FILE_RESERVATION_TTL
+        # Compactaciones enviadas a las réplicas: contenedor viejo -> plan
+        self.compactaciones: Dict[str, Dict] = {}
+        bloques_servicio.registrar_manejador(COMANDO_COMPACTAR, self._compactacion_confirmada)
+
+    def _buscar_contenedor_abierto(self) -> Optional[str]:
+        """Recuperar tras un reinicio el contenedor con más espacio libre"""
+        candidatos = [b for b in self.bloques_servicio.bloques_metadata.values()
+                      if b.es_contenedor and b.tamaño < self.capacidad]
+        if not candidatos:
+            return None
+        return min(candidatos, key=lambda b: b.tamaño).bloque_id
+
+    def es_pequeño(self, tamaño: int) -> bool:
+        """Indica si un archivo de este tamaño se empaqueta en un contenedor"""
+        return tamaño < self.umbral
+
+    def _nuevo_contenedor(self) -> BloqueInfo:
+        """Crear un contenedor vacío replicado en los DataNodes seleccionados"""
+        contenedor = BloqueInfo(archivo_nombre="", posicion=0)
+        contenedor.es_contenedor = True
+        for datanode in self.bloques_servicio.seleccionar_datanodes_para_escritura():
+            contenedor.agregar_ubicacion(datanode.host, datanode.puerto)
+            datanode.agregar_bloque(contenedor.bloque_id, 0)
+        self.bloques_servicio.bloques_metadata[contenedor.bloque_id] = contenedor
+        self.contenedor_abierto = contenedor.bloque_id
+        logger.info(f"Nuevo contenedor de archivos pequeños: {contenedor.bloque_id}")
+        return contenedor
+
+    def _ajustar_espacio(self, contenedor: BloqueInfo, delta: int):
+        """Actualizar el espacio usado en los DataNodes que guardan el contenedor"""
+        for datanode in self.bloques_servicio.datanodes.values():
+            if (datanode.host, datanode.puerto) in contenedor.ubicaciones:
+                datanode.espacio_usado = max(0, datanode.espacio_usado + delta)
+
+    @con_escritura
+    def reservar(self, ruta: str, tamaño: int, usuario: str) -> Tuple[Dict, BloqueInfo]:
+        """Reservar un rango del contenedor abierto para un archivo pequeño que aún no existe.
+
+        Retorna (reserva, contenedor); el cliente escribe los datos en reserva['offset'] de
+        todas las réplicas del contenedor y después llama a `confirmar`.
+        """
+        if self.archivos_servicio.obtener_archivo(ruta):
+            raise ValueError(f"El archivo {ruta} ya existe")
+
+        contenedor = self.bloques_servicio.obtener_bloque(self.contenedor_abierto) if self.contenedor_abierto else None
+        if contenedor is None or contenedor.tamaño + tamaño > self.capacidad:
+            contenedor = self._nuevo_contenedor()
+
+        # El espacio se ocupa ya; los bytes solo cuentan como vivos cuando el archivo existe
+        offset = contenedor.tamaño
+        contenedor.tamaño += tamaño
+        self._ajustar_espacio(contenedor, tamaño)
+
+        reserva = {
+            'reserva_id': str(uuid.uuid4()),
+            'ruta': ruta,
+            'usuario': usuario,
+            'bloque_id': contenedor.bloque_id,
+            'offset': offset,
+            'longitud': tamaño,
+            'expira': time.time() + self.duracion_reserva
+        }
+        self.reservas[reserva['reserva_id']] = reserva
+        self.bloques_servicio._guardar_metadata()
+        return reserva, contenedor
+
+    def _reserva(self, reserva_id: str, usuario: str) -> Dict:
+        reserva = self.reservas.get(reserva_id)
+        if reserva is None:
+            raise LookupError('La reserva no existe o ha caducado')
+        if reserva['usuario'] != usuario:
+            raise PermissionError('La reserva pertenece a otro usuario')
+        return reserva
+
+    @con_escritura
+    def confirmar(self, reserva_id: str, usuario: str) -> ArchivoMetadata:
+        """Crear el archivo de una reserva cuyos datos ya están en el contenedor"""
+        reserva = self._reserva(reserva_id, usuario)
+        contenedor = self.bloques_servicio.obtener_bloque(reserva['bloque_id'])
+        if contenedor is None:
+            del self.reservas[reserva_id]
+            raise LookupError('El contenedor de la reserva ya no existe')
+
+        ruta = reserva['ruta']
+        del self.reservas[reserva_id]
+        directorio_padre = os.path.dirname(ruta) or '/'
+        if not self.archivos_servicio.directorio_existe(directorio_padre):
+            self.archivos_servicio.crear_directorio(directorio_padre)
+        archivo = self.archivos_servicio.crear_archivo(ruta, usuario)
+
+        archivo.contenedor = {
+            'bloque_id': contenedor.bloque_id,
+            'offset': reserva['offset'],
+            'longitud': reserva['longitud']
+        }
+        archivo.tamaño_total = reserva['longitud']
+        contenedor.bytes_vivos += reserva['longitud']
+
+        self.bloques_servicio._guardar_metadata()
+        self.archivos_servicio.guardar_archivo(archivo)
+        return archivo
+
+    @con_escritura
+    def abandonar(self, reserva_id: str, usuario: str):
+        """El cliente no pudo escribir los datos: el rango queda como bytes muertos"""
+        reserva = self._reserva(reserva_id, usuario)
+        del self.reservas[reserva_id]
+        logger.info(f"Reserva de {reserva['ruta']} en {reserva['bloque_id']} abandonada")
+
+    @con_escritura
+    def expirar_reservas(self) -> int:
+        """Descarta las reservas que nadie confirmó a tiempo (se llama desde el monitor)"""
+        ahora = time.time()
+        caducadas = [r for r in self.reservas.values() if r['expira'] <= ahora]
+        for reserva in caducadas:
+            logger.warning(f"Reserva de {reserva['ruta']} en {reserva['bloque_id']} caducada sin confirmar")
+            del self.reservas[reserva['reserva_id']]
+        return len(caducadas)
+
+    def subir(self, ruta: str, datos: bytes, usuario: str) -> ArchivoMetadata:
+        """Reservar, escribir en todas las réplicas del contenedor y confirmar; lo usan las
+        subidas que pasan por el NameNode. La escritura va fuera del cerrojo."""
+        reserva, contenedor = self.reservar(ruta, len(datos), usuario)
+        if not self.bloques_servicio.subir_bloque(contenedor.bloque_id, datos, contenedor.ubicaciones,
+                                                  offset=reserva['offset']):
+            self.abandonar(reserva['reserva_id'], usuario)
+            raise IOError(f"Error escribiendo en el contenedor {contenedor.bloque_id}")
+        return self.confirmar(reserva['reserva_id'], usuario)
+
+    @con_escritura
+    def liberar(self, archivo: ArchivoMetadata, guardar: bool = True) -> bool:
+        """Marcar como muertos los bytes de un archivo empaquetado eliminado"""
+        if not archivo.contenedor:
+            return False
+
+        contenedor = self.bloques_servicio.obtener_bloque(archivo.contenedor['bloque_id'])
+        if not contenedor:
+            return False
+
+        contenedor.bytes_vivos = max(0, contenedor.bytes_vivos - archivo.contenedor['longitud'])
+        if contenedor.bytes_vivos == 0 and contenedor.bloque_id != self.contenedor_abierto:
+            self.bloques_servicio.eliminar_bloque(contenedor.bloque_id, guardar=guardar)
+        elif guardar:
+            self.bloques_servicio._guardar_metadata()
+        return True
+
+    @con_lectura
+    def contenedores_a_compactar(self) -> List[BloqueInfo]:
+        """Contenedores cerrados cuya fracción de bytes muertos supera el umbral"""
+        # Con reservas pendientes un archivo puede aparecer en el contenedor durante la copia
+        reservados = {r['bloque_id'] for r in self.reservas.values()}
+        return [b for b in self.bloques_servicio.bloques_metadata.values()
+                if b.es_contenedor and b.bloque_id != self.contenedor_abierto and b.tamaño > 0
+                and b.bloque_id not in self.compactaciones and b.bloque_id not in reservados
+                and (b.tamaño - b.bytes_vivos) / b.tamaño >= COMPACTION_GARBAGE_RATIO]
+
+    @con_escritura
+    def compactar(self) -> int:
+        """Programar la compactación de los contenedores con demasiados bytes muertos.
+
+        Retorna cuántas compactaciones se programaron; se aplican cuando todas las
+        réplicas confirman la copia en su heartbeat.
+        """
+        programadas = 0
+        for contenedor in self.contenedores_a_compactar():
+            try:
+                self._programar_compactacion(contenedor)
+                programadas += 1
+            except Exception as e:
+                logger.error(f"Error compactando contenedor {contenedor.bloque_id}: {e}")
+        return programadas
+
+    def _miembros(self, bloque_id: str) -> List[ArchivoMetadata]:
+        """Archivos empaquetados en un contenedor, por offset"""
+        return sorted(
+            (a for a in self.archivos_servicio.iterar_archivos()
+             if a.contenedor and a.contenedor['bloque_id'] == bloque_id),
+            key=lambda a: a.contenedor['offset']
+        )
+
+    def _programar_compactacion(self, contenedor: BloqueInfo):
+        """Enviar a cada réplica la copia local de los miembros vivos a un contenedor nuevo"""
+        miembros = self._miembros(contenedor.bloque_id)
+        if not miembros:
+            self.bloques_servicio.eliminar_bloque(contenedor.bloque_id)
+            return
+
+        nuevo = BloqueInfo(archivo_nombre="", posicion=0)
+        nuevo.es_contenedor = True
+        nuevo.ubicaciones = list(contenedor.ubicaciones)
+
+        rangos = []
+        for archivo in miembros:
+            rangos.append({
+                'src_offset': archivo.contenedor['offset'],
+                'length': archivo.contenedor['longitud'],
+                'dst_offset': nuevo.tamaño
+            })
+            nuevo.tamaño += archivo.contenedor['longitud']
+
+        # La copia es local en cada réplica: no viajan datos por la red
+        pendientes = set()
+        for host, puerto in contenedor.ubicaciones:
+            datanode = self.bloques_servicio._buscar_datanode(host, puerto)
+            if datanode is None:
+                raise Exception(f"DataNode {host}:{puerto} desconocido")
+            self.bloques_servicio.encolar_comando(datanode, COMANDO_COMPACTAR, origen=contenedor.bloque_id,
+                                                  destino=nuevo.bloque_id, rangos=rangos)
+            pendientes.add((host, puerto))
+
+        self.compactaciones[contenedor.bloque_id] = {
+            'nuevo': nuevo,
+            'rangos': rangos,
+            'pendientes': pendientes,
+            'fallida': False
+        }
+        logger.info(f"Compactación de {contenedor.bloque_id} programada en {len(pendientes)} réplicas")
+
+    @con_escritura
+    def _compactacion_confirmada(self, datanode: DataNodeInfo, comando: Dict, resultado: Dict):
+        """Resultado de una réplica; con todas confirmadas se cambia al contenedor nuevo"""
+        plan = self.compactaciones.get(comando['origen'])
+        if plan is None:
+            return
+        plan['pendientes'].discard((datanode.host, datanode.puerto))
+        if not resultado.get('exito'):
+            plan['fallida'] = True
+            logger.warning(f"Compactación de {comando['origen']} fallida en {datanode.host}:{datanode.puerto}: "
+                           f"{resultado.get('error')}")
+        if plan['pendientes']:
+            return
+
+        del self.compactaciones[comando['origen']]
+        contenedor = self.bloques_servicio.obtener_bloque(comando['origen'])
+        nuevo = plan['nuevo']
+        if plan['fallida'] or contenedor is None:
+            # El contenedor viejo sigue siendo válido (o ya no existe): se descarta la copia
+            self._descartar_copia(nuevo)
+            return
+        self._aplicar_compactacion(contenedor, nuevo, plan['rangos'])
+
+    def _descartar_copia(self, nuevo: BloqueInfo):
+        for host, puerto in nuevo.ubicaciones:
+            datanode = self.bloques_servicio._buscar_datanode(host, puerto)
+            if datanode:
+                datanode.encolar_invalidacion(nuevo.bloque_id)
+        self.bloques_servicio._guardar_metadata()
+
+    def _aplicar_compactacion(self, contenedor: BloqueInfo, nuevo: BloqueInfo, rangos: List[Dict]) -> int:
+        """Reapuntar los miembros que siguen vivos al contenedor nuevo y liberar el viejo"""
+        destino = {r['src_offset']: r['dst_offset'] for r in rangos}
+        miembros = self._miembros(contenedor.bloque_id)
+        for archivo in miembros:
+            archivo.contenedor = {
+                'bloque_id': nuevo.bloque_id,
+                'offset': destino[archivo.contenedor['offset']],
+                'longitud': archivo.contenedor['longitud']
+            }
+        # Los miembros borrados durante la copia quedan como bytes muertos del nuevo
+        nuevo.bytes_vivos = sum(a.contenedor['longitud'] for a in miembros)
+
+        for datanode in self.bloques_servicio.datanodes.values():
+            if (datanode.host, datanode.puerto) in nuevo.ubicaciones:
+                datanode.agregar_bloque(nuevo.bloque_id, nuevo.tamaño)
+        self.bloques_servicio.bloques_metadata[nuevo.bloque_id] = nuevo
+
+        recuperados = contenedor.tamaño - nuevo.tamaño
+        self.bloques_servicio.eliminar_bloque(contenedor.bloque_id)
+        self.archivos_servicio._guardar_metadata()
+        logger.info(f"Contenedor {contenedor.bloque_id} compactado: {len(miembros)} archivos, {recuperados} bytes recuperados")
+        return recuperados
@@ -0,0 +1,300 @@
+# servicios/datanode_cliente.py
+import os
+import random
+import sys
+import threading
+import time
+from typing import Callable, Dict, Tuple
+from urllib.parse import urlsplit
+import logging
+import grpc
+from servicios import metricas
+# Permite importar el paquete common y los protos compartidos con los DataNodes
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'datanode_grpc')))
+
+import protos.datanode_pb2 as datanode_pb2
+import protos.datanode_pb2_grpc as datanode_pb2_grpc
+from common.utils import tracing
+from common.utils.block_stream import write_requests
+from config import (BLOCK_SIZE, REQUEST_TIMEOUT, MAX_RETRIES, DATANODE_CONNECT_TIMEOUT,
+                    RETRY_BACKOFF_BASE, RETRY_BACKOFF_MAX, CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_OPEN_SECONDS)
+
+logger = logging.getLogger(__name__)
+
+# Estados del circuito de cada DataNode
+CIRCUITO_CERRADO = 'cerrado'
+CIRCUITO_ABIERTO = 'abierto'
+CIRCUITO_SEMIABIERTO = 'semiabierto'
+
+# Códigos que indican un nodo caído o que no responde: cuentan para el circuito
+CODIGOS_FALLO = (grpc.StatusCode.UNAVAILABLE, grpc.StatusCode.DEADLINE_EXCEEDED)
+# Admisión del DataNode: está vivo pero saturado, se reintenta sin contar fallo
+CODIGO_SATURACION = grpc.StatusCode.RESOURCE_EXHAUSTED
+# Metadata con la que el DataNode sugiere la espera y con la que identifica al cliente
+CLAVE_RETRY_AFTER = 'retry-after-ms'
+METADATA_CLIENTE = (('x-client-id', 'namenode'),)
+
+# Un bloque completo cabe en un mensaje, igual que en los DataNodes
+OPCIONES_CANAL = [
+    ('grpc.max_receive_message_length', BLOCK_SIZE + 1024 * 1024),
+    ('grpc.max_send_message_length', BLOCK_SIZE + 1024 * 1024),
+]
+
+
+class CircuitoAbiertoError(IOError):
+    """El DataNode falló repetidamente y sus llamadas se rechazan sin tocar la red"""
+
+
+class _ConexionDataNode:
+    """Canal gRPC, circuito y contadores de un DataNode"""
+
+    def __init__(self, host: str, puerto: int):
+        self.host = host
+        self.puerto = puerto
+        self.nombre = f"{host}:{puerto}"
+        # Un solo canal HTTP/2 multiplexa todas las llamadas concurrentes al nodo
+        self.canal = grpc.insecure_channel(self.nombre, options=OPCIONES_CANAL)
+        self.stub = datanode_pb2_grpc.DataNodeServiceStub(self.canal)
+        self.estado_canal = grpc.ChannelConnectivity.IDLE
+        self.canal.subscribe(self._al_cambiar_canal)
+        self.cerrojo = threading.Lock()
+        self.estado = CIRCUITO_CERRADO
+        self.fallos_seguidos = 0
+        self.abierto_hasta = 0.0
+        self.sonda_en_curso = False
+        self.llamadas = 0
+        self.errores = 0
+        self.reintentos = 0
+        self.rechazadas = 0
+        self.segundos_total = 0.0
+        self.ultima_latencia_ms = 0.0
+
+    def _al_cambiar_canal(self, estado: grpc.ChannelConnectivity):
+        self.estado_canal = estado
+
+    def to_dict(self) -> Dict:
+        return {
+            'host': self.host,
+            'puerto': self.puerto,
+            'circuito': self.estado,
+            'fallos_seguidos': self.fallos_seguidos,
+            'llamadas': self.llamadas,
+            'errores': self.errores,
+            'reintentos': self.reintentos,
+            'rechazadas': self.rechazadas,
+            'latencia_media_ms': (self.segundos_total / self.llamadas * 1000) if self.llamadas else 0.0,
+            'ultima_latencia_ms': self.ultima_latencia_ms
+        }
+
+
+class ClienteDataNodes:
+    """Transporte gRPC del NameNode hacia los DataNodes.
+
+    Mantiene un canal por nodo, reutilizado por todas las llamadas (sin handshake
+    en cada bloque). Si el canal no está conectado se espera a lo sumo
+    DATANODE_CONNECT_TIMEOUT a que lo esté (nada si la última conexión falló),
+    para que un host caído no retenga un hilo REQUEST_TIMEOUT segundos.
+    RESOURCE_EXHAUSTED es el backpressure del DataNode: se reintenta tras la
+    espera de su metadata 'retry-after-ms' sin contar como fallo. UNAVAILABLE y DEADLINE_EXCEEDED cuentan para el circuito y
+    se reintentan con backoff exponencial con jitter solo si la llamada es
+    idempotente o no llegó a enviarse. Tras CIRCUIT_FAILURE_THRESHOLD fallos
+    seguidos el circuito del nodo se abre: sus llamadas fallan en el acto durante
+    CIRCUIT_OPEN_SECONDS y después una sola llamada de sonda decide si se cierra.
+    `al_abrir`/`al_cerrar` reciben (host, puerto) para reflejar el cambio en la
+    vida del nodo.
+    """
+
+    def __init__(self, al_abrir: Callable[[str, int], None] = None,
+                 al_cerrar: Callable[[str, int], None] = None):
+        self.al_abrir = al_abrir
+        self.al_cerrar = al_cerrar
+        self.conexiones: Dict[Tuple[str, int], _ConexionDataNode] = {}
+        self._cerrojo = threading.Lock()
+
+    @staticmethod
+    def direccion(uri: str) -> Tuple[str, int]:
+        """(host, puerto) de una URI como las de BloqueInfo.get_leader_uri()"""
+        partes = urlsplit(uri)
+        return partes.hostname, partes.port
+
+    def _conexion(self, host: str, puerto: int) -> _ConexionDataNode:
+        conexion = self.conexiones.get((host, puerto))
+        if conexion is None:
+            with self._cerrojo:
+                conexion = self.conexiones.get((host, puerto))
+                if conexion is None:
+                    conexion = self.conexiones[(host, puerto)] = _ConexionDataNode(host, puerto)
+        return conexion
+
+    def disponible(self, host: str, puerto: int) -> bool:
+        """False mientras el circuito del nodo esté abierto"""
+        conexion = self.conexiones.get((host, puerto))
+        return conexion is None or conexion.estado != CIRCUITO_ABIERTO or time.time() >= conexion.abierto_hasta
+
+    def _admitir(self, conexion: _ConexionDataNode):
+        """Dejar pasar la llamada según el circuito; en semiabierto pasa una sola sonda"""
+        with conexion.cerrojo:
+            if conexion.estado == CIRCUITO_CERRADO:
+                return
+            if conexion.estado == CIRCUITO_ABIERTO and time.time() >= conexion.abierto_hasta:
+                conexion.estado = CIRCUITO_SEMIABIERTO
+            if conexion.estado == CIRCUITO_SEMIABIERTO and not conexion.sonda_en_curso:
+                conexion.sonda_en_curso = True
+                return
+            conexion.rechazadas += 1
+        raise CircuitoAbiertoError(f"Circuito abierto hacia {conexion.host}:{conexion.puerto}")
+
+    def _exito(self, conexion: _ConexionDataNode):
+        with conexion.cerrojo:
+            cerrado = conexion.estado != CIRCUITO_CERRADO
+            conexion.estado = CIRCUITO_CERRADO
+            conexion.fallos_seguidos = 0
+            conexion.sonda_en_curso = False
+        if cerrado:
+            metricas.CIRCUITO_ABIERTO.labels(conexion.nombre).set(0)
+            logger.info(f"Circuito hacia {conexion.host}:{conexion.puerto} cerrado: el DataNode responde")
+            self._notificar(self.al_cerrar, conexion)
+
+    def _fallo(self, conexion: _ConexionDataNode):
+        with conexion.cerrojo:
+            conexion.errores += 1
+            conexion.fallos_seguidos += 1
+            conexion.sonda_en_curso = False
+            abre = (conexion.estado == CIRCUITO_SEMIABIERTO
+                    or (conexion.estado == CIRCUITO_CERRADO and conexion.fallos_seguidos >= CIRCUIT_FAILURE_THRESHOLD))
+            if abre:
+                conexion.estado = CIRCUITO_ABIERTO
+                conexion.abierto_hasta = time.time() + CIRCUIT_OPEN_SECONDS
+        if abre:
+            metricas.CIRCUITO_ABIERTO.labels(conexion.nombre).set(1)
+            logger.warning(f"Circuito hacia {conexion.host}:{conexion.puerto} abierto tras "
+                           f"{conexion.fallos_seguidos} fallos seguidos")
+            self._notificar(self.al_abrir, conexion)
+
+    @staticmethod
+    def _notificar(callback, conexion: _ConexionDataNode):
+        if callback is None:
+            return
+        try:
+            callback(conexion.host, conexion.puerto)
+        except Exception as e:
+            logger.error(f"Error notificando el circuito de {conexion.host}:{conexion.puerto}: {e}")
+
+    @staticmethod
+    def _espera(intento: int, error: grpc.RpcError = None) -> float:
+        """'retry-after-ms' del DataNode si lo envía; si no, backoff exponencial con jitter completo"""
+        if error is not None:
+            for clave, valor in (error.trailing_metadata() or ()):
+                if clave == CLAVE_RETRY_AFTER:
+                    try:
+                        return int(valor) / 1000
+                    except ValueError:
+                        break
+        return random.uniform(0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_BASE * (2 ** intento)))
+
+    @staticmethod
+    def _conectar(conexion: _ConexionDataNode) -> bool:
+        """Espera a lo sumo DATANODE_CONNECT_TIMEOUT a que el canal esté listo; si el último
+        intento de conexión acaba de fallar no se espera (gRPC reconecta con su propio backoff)"""
+        if conexion.estado_canal == grpc.ChannelConnectivity.READY:
+            return True
+        if conexion.estado_canal == grpc.ChannelConnectivity.TRANSIENT_FAILURE:
+            return False
+        try:
+            grpc.channel_ready_future(conexion.canal).result(timeout=DATANODE_CONNECT_TIMEOUT)
+            return True
+        except grpc.FutureTimeoutError:
+            return False
+
+    def llamar(self, host: str, puerto: int, metodo: str, peticion, idempotente: bool = False,
+               timeout: float = None):
+        """Ejecutar la RPC `metodo` del DataNode y retornar su respuesta. En las RPC con
+        stream de entrada `peticion` es una función que crea el iterador de mensajes,
+        porque cada reintento necesita uno nuevo.
+
+        Lanza IOError (o CircuitoAbiertoError) si no se obtuvo respuesta; un error
+        de la propia operación (NOT_FOUND, INVALID_ARGUMENT...) no se reintenta ni
+        cuenta para el circuito.
+        """
+        conexion = self._conexion(host, puerto)
+        with tracing.span(f"datanode.{metodo}", datanode=conexion.nombre) as atributos:
+            respuesta = self._llamar(conexion, metodo, peticion, idempotente, timeout)
+            atributos['reintentos'] = conexion.reintentos
+            return respuesta
+
+    def _llamar(self, conexion: _ConexionDataNode, metodo: str, peticion, idempotente: bool, timeout: float):
+        rpc = getattr(conexion.stub, metodo)
+        for intento in range(MAX_RETRIES + 1):
+            self._admitir(conexion)
+            ultimo = intento == MAX_RETRIES
+            if not self._conectar(conexion):
+                # La llamada no llegó a enviarse: siempre se puede reintentar
+                self._fallo(conexion)
+                if ultimo:
+                    raise IOError(f"{metodo} a {conexion.nombre}: sin conexión tras {DATANODE_CONNECT_TIMEOUT}s")
+                espera = self._espera(intento)
+                logger.warning(f"{metodo} a {conexion.nombre}: sin conexión, reintento en {espera:.2f}s")
+                conexion.reintentos += 1
+                time.sleep(espera)
+                continue
+
+            inicio = time.perf_counter()
+            try:
+                # El DataNode cuelga sus spans del de esta llamada
+                respuesta = rpc(peticion() if callable(peticion) else peticion,
+                                timeout=timeout or REQUEST_TIMEOUT,
+                                metadata=METADATA_CLIENTE + tracing.grpc_metadata())
+            except grpc.RpcError as e:
+                self._medir(conexion, metodo, inicio)
+                codigo = e.code()
+                if codigo == CODIGO_SATURACION:
+                    # El nodo está vivo y aplica backpressure: no cuenta para el circuito
+                    self._exito(conexion)
+                    if ultimo:
+                        raise IOError(f"{metodo} a {conexion.nombre}: DataNode saturado ({e.details()})") from e
+                    espera = self._espera(intento, e)
+                    logger.warning(f"DataNode {conexion.nombre} saturado, reintento en {espera:.2f}s")
+                elif codigo in CODIGOS_FALLO:
+                    self._fallo(conexion)
+                    if ultimo or not idempotente:
+                        raise IOError(f"{metodo} a {conexion.nombre} falló: {codigo.name} {e.details()}") from e
+                    espera = self._espera(intento)
+                    logger.warning(f"{metodo} a {conexion.nombre} falló ({codigo.name}), reintento en {espera:.2f}s")
+                else:
+                    self._exito(conexion)
+                    raise IOError(f"{metodo} a {conexion.nombre} rechazado: {codigo.name} {e.details()}") from e
+                conexion.reintentos += 1
+                time.sleep(espera)
+                continue
+
+            self._medir(conexion, metodo, inicio)
+            self._exito(conexion)
+            return respuesta
+
+    @staticmethod
+    def _medir(conexion: _ConexionDataNode, metodo: str, inicio: float):
+        duracion = time.perf_counter() - inicio
+        metricas.LLAMADAS_DATANODE.labels(conexion.nombre, metodo).observe(duracion)
+        conexion.llamadas += 1
+        conexion.segundos_total += duracion
+        conexion.ultima_latencia_ms = duracion * 1000
+
+    def escribir_bloque(self, host: str, puerto: int, bloque_id: str, datos: bytes, offset: int = None):
+        """WriteBlockStream sin comprimir; con `offset` se escribe solo ese rango sin truncar el
+        bloque. Los datos van en trozos para que el DataNode admita la escritura antes de
+        recibirlos. Escribir un bloque (o un rango) con el mismo contenido es idempotente:
+        se reintenta."""
+        def peticiones():
+            return write_requests(datanode_pb2.WriteBlockRequest, bloque_id, datos, raw_size=len(datos),
+                                  offset=offset or 0, partial_write=offset is not None)
+        return self.llamar(host, puerto, 'WriteBlockStream', peticiones, idempotente=True)
+
+    def checksum_bloque(self, host: str, puerto: int, bloque_id: str, longitud: int = 0) -> str:
+        """SHA-256 que calcula el DataNode sobre los primeros `longitud` bytes del bloque (0 = entero)"""
+        peticion = datanode_pb2.BlockChecksumRequest(block_id=bloque_id, length=longitud)
+        return self.llamar(host, puerto, 'BlockChecksum', peticion, idempotente=True).checksum
+
+    def estadisticas(self) -> Dict:
+        """Latencias, errores y estado del circuito por DataNode"""
+        return {f"{host}:{puerto}": conexion.to_dict() for (host, puerto), conexion in self.conexiones.items()}
@@ -0,0 +1,113 @@
+# servicios/grabador_carga.py
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from google.protobuf.json_format import MessageToDict
+from config import WORKLOAD_RECORD_FILE
+
+# Rutas de observación del propio NameNode, que no son carga de metadatos
+RUTAS_EXCLUIDAS = ('/metrics', '/health', '/status')
+# Claves con los IDs de bloque que asigna el NameNode (JSON REST y mensajes gRPC)
+CLAVES_ID_BLOQUE = ('bloque_id', 'block_id')
+
+
+def ids_de_bloque(cuerpo) -> List[str]:
+    """IDs de bloque de una respuesta en orden de aparición; la reproducción los usa para
+    traducir los IDs grabados a los que asigne el NameNode nuevo"""
+    ids = []
+    pendientes = [cuerpo]
+    while pendientes:
+        valor = pendientes.pop()
+        if isinstance(valor, dict):
+            for clave, hijo in valor.items():
+                if clave in CLAVES_ID_BLOQUE and isinstance(hijo, str):
+                    ids.append(hijo)
+                else:
+                    pendientes.append(hijo)
+        elif isinstance(valor, list):
+            pendientes.extend(reversed(valor))
+    return ids
+
+
+class GrabadorCarga:
+    """Graba cada petición de metadatos (REST y gRPC) como una línea JSONL.
+
+    Cada entrada lleva el instante de inicio, la operación, sus argumentos, el
+    resultado y la duración en el NameNode, para reproducirla después con
+    benchmarks/reproducir_carga.py. Los cuerpos binarios (subidas de datos) se
+    anotan solo con su tamaño. Sin ruta configurada no graba nada.
+    """
+
+    def __init__(self, ruta: Optional[str] = None):
+        self.ruta = ruta
+        self._archivo = open(ruta, 'a', buffering=1) if ruta else None
+        self._cerrojo = threading.Lock()
+
+    @property
+    def activo(self) -> bool:
+        return self._archivo is not None
+
+    def _escribir(self, entrada: Dict):
+        linea = json.dumps(entrada, ensure_ascii=False, default=str)
+        with self._cerrojo:
+            self._archivo.write(linea + '\n')
+
+    def grabar_peticion(self, request, response, inicio: float, duracion: float):
+        """Petición REST ya respondida (se llama desde after_request)"""
+        if not self.activo or request.path in RUTAS_EXCLUIDAS:
+            return
+        entrada = {
+            'ts': inicio,
+            'protocolo': 'rest',
+            'operacion': request.endpoint or 'sin_ruta',
+            'metodo': request.method,
+            'ruta': request.path,
+            'query': request.query_string.decode('utf-8'),
+            'usuario': request.authorization.username if request.authorization else None,
+            'estado': response.status_code,
+            'duracion_ms': duracion * 1000,
+        }
+        if request.is_json:
+            entrada['json'] = request.get_json(silent=True)
+        elif request.content_length:
+            entrada['bytes_cuerpo'] = request.content_length
+        if response.is_json and not response.is_streamed:
+            ids = ids_de_bloque(response.get_json(silent=True))
+            if ids:
+                entrada['ids_respuesta'] = ids
+        self._escribir(entrada)
+
+    @contextmanager
+    def grabar_rpc(self, metodo: str, mensaje, context, usuario: str):
+        """Envuelve una RPC de ClientProtocol; el bloque guarda la respuesta en resultado['respuesta']"""
+        if not self.activo:
+            yield {}
+            return
+        resultado = {}
+        inicio, t0 = time.time(), time.perf_counter()
+        try:
+            yield resultado
+        finally:
+            # context.abort lanza una excepción; el código ya quedó fijado en el contexto
+            codigo = getattr(context, 'code', lambda: None)()
+            entrada = {
+                'ts': inicio,
+                'protocolo': 'grpc',
+                'operacion': f"grpc.{metodo}",
+                'metodo': metodo,
+                'tipo_mensaje': mensaje.DESCRIPTOR.name,
+                'mensaje': MessageToDict(mensaje, preserving_proto_field_name=True),
+                'usuario': usuario,
+                'estado': codigo.name if codigo else 'OK',
+                'duracion_ms': (time.perf_counter() - t0) * 1000,
+            }
+            if resultado.get('respuesta') is not None:
+                ids = ids_de_bloque(MessageToDict(resultado['respuesta'], preserving_proto_field_name=True))
+                if ids:
+                    entrada['ids_respuesta'] = ids
+            self._escribir(entrada)
+
+
+grabador = GrabadorCarga(WORKLOAD_RECORD_FILE)
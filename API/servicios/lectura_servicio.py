@@ -0,0 +1,89 @@
+# servicios/lectura_servicio.py
+import os
+import sys
+import threading
+from typing import Dict, Iterator, List
+import grpc
+from config import BLOCK_SIZE, REQUEST_TIMEOUT
+# Permite importar el paquete common y los protos compartidos con los DataNodes
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'datanode_grpc')))
+
+import protos.datanode_pb2 as datanode_pb2
+import protos.datanode_pb2_grpc as datanode_pb2_grpc
+from common.utils import erasure, tracing
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Mismos límites que los DataNodes: un bloque completo cabe en una respuesta de ReadBlock
+OPCIONES_CANAL = [
+    ('grpc.max_receive_message_length', BLOCK_SIZE + 1024 * 1024),
+    ('grpc.max_send_message_length', BLOCK_SIZE + 1024 * 1024),
+]
+
+
+class LecturaServicio:
+    """Lectura de archivos desde los DataNodes para servirlos por HTTP (GET /stream).
+
+    Recibe los bloques ya recortados al rango pedido (common.utils.byte_ranges)
+    y de cada uno pide al DataNode solo su rango con ReadBlock, probando las
+    réplicas en orden. Los bloques con codificación por borrado se reconstruyen
+    con k celdas cualesquiera y se recortan después. Los datos se entregan
+    bloque a bloque, así que la memoria queda acotada a un bloque por descarga.
+    """
+
+    def __init__(self):
+        self._canales: Dict[str, grpc.Channel] = {}
+        self._cerrojo = threading.Lock()
+
+    def _stub(self, direccion: str):
+        """Un canal por DataNode, reutilizado entre descargas"""
+        with self._cerrojo:
+            canal = self._canales.get(direccion)
+            if canal is None:
+                canal = self._canales[direccion] = grpc.insecure_channel(direccion, options=OPCIONES_CANAL)
+        return datanode_pb2_grpc.DataNodeServiceStub(canal)
+
+    def _leer(self, direccion: str, bloque_id: str, offset: int = 0, longitud: int = 0) -> bytes:
+        # Sin passthrough el DataNode devuelve los datos ya descomprimidos
+        peticion = datanode_pb2.ReadBlockRequest(block_id=bloque_id, passthrough=False,
+                                                 offset=offset, length=longitud)
+        with tracing.span('ReadBlock', datanode=direccion, block_id=bloque_id) as atributos:
+            respuesta = self._stub(direccion).ReadBlock(peticion, timeout=REQUEST_TIMEOUT,
+                                                         metadata=tracing.grpc_metadata())
+            atributos['bytes'] = len(respuesta.data)
+        return respuesta.data
+
+    def _leer_replicado(self, bloque: Dict) -> bytes:
+        errores = []
+        for host, puerto in bloque['ubicaciones']:
+            try:
+                return self._leer(f"{host}:{puerto}", bloque['bloque_id'], bloque['offset'], bloque['longitud'])
+            except grpc.RpcError as e:
+                errores.append(f"{host}:{puerto} {e.code().name}")
+        raise IOError(f"No hay réplicas disponibles para el bloque {bloque['bloque_id']}: {', '.join(errores)}")
+
+    def _leer_erasure(self, bloque: Dict) -> bytes:
+        k, m = bloque['ec_k'], bloque['ec_m']
+        celdas = {}
+        for indice, (host, puerto) in enumerate(bloque['ubicaciones']):
+            if len(celdas) == k:
+                break
+            try:
+                celdas[indice] = self._leer(f"{host}:{puerto}", f"{bloque['bloque_id']}_c{indice}")
+            except grpc.RpcError as e:
+                logger.warning(f"Celda {indice} del bloque {bloque['bloque_id']} no disponible: {e.code().name}")
+        if len(celdas) < k:
+            raise IOError(f"Bloque {bloque['bloque_id']} irrecuperable: {len(celdas)}/{k} celdas")
+        datos = erasure.decode(celdas, k, m, bloque['tamaño'])
+        return datos[bloque['offset']:bloque['offset'] + bloque['longitud']]
+
+    def leer(self, bloques: List[Dict]) -> Iterator[bytes]:
+        """Datos de cada bloque (recortado a su parte del rango), en orden"""
+        for bloque in bloques:
+            if bloque.get('ec_k'):
+                yield self._leer_erasure(bloque)
+            else:
+                yield self._leer_replicado(bloque)
@@ -0,0 +1,92 @@
+# servicios/metricas.py
+import os
+import sys
+import time
+from functools import wraps
+from prometheus_client import (Counter, Histogram, Gauge, REGISTRY, CONTENT_TYPE_LATEST, generate_latest)
+from prometheus_client.core import GaugeMetricFamily
+# Permite importar el paquete common
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from common.utils import tracing
+
+# Desde una búsqueda en memoria hasta una subida de bloque de 64MB
+BUCKETS_LATENCIA = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+PETICIONES_HTTP = Histogram('dfs_namenode_http_request_seconds', 'Duración de las peticiones REST del NameNode',
+                            ['method', 'endpoint', 'status'], buckets=BUCKETS_LATENCIA)
+OPERACIONES_BLOQUES = Histogram('dfs_namenode_block_operation_seconds',
+                                'Duración de las operaciones de BloquesServicio, incluida la espera del cerrojo',
+                                ['operation'], buckets=BUCKETS_LATENCIA)
+PERSISTENCIA = Histogram('dfs_namenode_persist_seconds', 'Tiempo de escritura de los metadatos a disco',
+                         ['store'], buckets=BUCKETS_LATENCIA)
+HEARTBEATS = Histogram('dfs_namenode_heartbeat_seconds', 'Procesamiento de un heartbeat de DataNode',
+                       ['transport'], buckets=BUCKETS_LATENCIA)
+CACHE = Counter('dfs_namenode_cache_requests_total', 'Consultas a las cachés del NameNode', ['cache', 'result'])
+LLAMADAS_DATANODE = Histogram('dfs_namenode_datanode_call_seconds', 'Llamadas gRPC del NameNode a los DataNodes',
+                              ['datanode', 'method'], buckets=BUCKETS_LATENCIA)
+CIRCUITO_ABIERTO = Gauge('dfs_namenode_datanode_circuit_open', '1 si el circuito hacia el DataNode está abierto',
+                         ['datanode'])
+
+
+def medir_operacion(metodo):
+    """Decorador: histograma de duración por nombre de método (va por fuera del cerrojo)
+    y, con las trazas activas, un span con el mismo nombre"""
+    histograma = OPERACIONES_BLOQUES.labels(metodo.__name__)
+    con_traza = tracing.traced(f"bloques.{metodo.__name__}")(metodo)
+
+    @wraps(metodo)
+    def envoltura(*args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return con_traza(*args, **kwargs)
+        finally:
+            histograma.observe(time.perf_counter() - inicio)
+    return envoltura
+
+
+def medir_persistencia(almacen: str):
+    """Decorador para _guardar_metadata: tiempo de serializar y escribir `almacen` a disco"""
+    def decorador(metodo):
+        histograma = PERSISTENCIA.labels(almacen)
+        con_traza = tracing.traced(f"persistencia.{almacen}")(metodo)
+
+        @wraps(metodo)
+        def envoltura(*args, **kwargs):
+            with histograma.time():
+                return con_traza(*args, **kwargs)
+        return envoltura
+    return decorador
+
+
+def contar_cache(cache: str, acierto: bool):
+    CACHE.labels(cache, 'hit' if acierto else 'miss').inc()
+
+
+class ColectorReplicacion:
+    """Backlog de replicación leído en cada scrape con una sola pasada bajo el cerrojo de lectura"""
+
+    def __init__(self, bloques_servicio):
+        self.bloques_servicio = bloques_servicio
+
+    def collect(self):
+        pendientes = self.bloques_servicio.backlog_replicacion()
+        descripciones = {
+            'bajo_replicados': ('dfs_namenode_under_replicated_blocks', 'Bloques con menos réplicas de las esperadas'),
+            'replicaciones_en_curso': ('dfs_namenode_pending_replications', 'Transferencias de réplica programadas'),
+            'comandos_en_cola': ('dfs_namenode_queued_commands', 'Comandos esperando un heartbeat'),
+            'comandos_en_vuelo': ('dfs_namenode_inflight_commands', 'Comandos enviados sin confirmar'),
+            'invalidaciones': ('dfs_namenode_pending_invalidations', 'Bloques pendientes de borrado físico'),
+            'datanodes_activos': ('dfs_namenode_live_datanodes', 'DataNodes activos'),
+        }
+        for clave, (nombre, ayuda) in descripciones.items():
+            yield GaugeMetricFamily(nombre, ayuda, value=pendientes[clave])
+
+
+def registrar_colector_replicacion(bloques_servicio):
+    REGISTRY.register(ColectorReplicacion(bloques_servicio))
+
+
+def exportar():
+    """Cuerpo y Content-Type de la respuesta de /metrics"""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,96 @@
+# servicios/reclamacion_servicio.py
+from typing import Optional
+from config import RECLAIM_BATCH_SIZE
+from servicios.cerrojo_metadatos import con_escritura
+import logging
+import threading
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class ReclamacionServicio:
+    """Libera en segundo plano los inodos y bloques de los subárboles borrados.
+
+    El borrado masivo solo desengancha el subárbol; aquí se recorre por lotes,
+    de las hojas hacia arriba, para que tras un reinicio lo pendiente siga
+    colgando de su raíz en la papelera y se retome desde donde quedó.
+    """
+
+    def __init__(self, archivos_servicio, bloques_servicio, contenedores_servicio):
+        self.archivos_servicio = archivos_servicio
+        self.bloques_servicio = bloques_servicio
+        self.contenedores_servicio = contenedores_servicio
+        self.tamaño_lote = RECLAIM_BATCH_SIZE
+        self.archivos_reclamados = 0
+        self._hilo: Optional[threading.Thread] = None
+
+    def pendientes(self) -> int:
+        """Número de subárboles que esperan reclamación"""
+        return len(self.archivos_servicio.papelera)
+
+    @con_escritura
+    def reclamar_lote(self) -> int:
+        """Liberar hasta `tamaño_lote` inodos de la papelera; retorna cuántos se liberaron.
+        Cada lote toma el cerrojo de escritura por separado, así las lecturas avanzan entre lotes."""
+        papelera = self.archivos_servicio.papelera
+        inodos = self.archivos_servicio.inodos
+        bloques = []
+        liberados = 0
+
+        while papelera and liberados < self.tamaño_lote:
+            # Descender hasta un directorio sin subdirectorios
+            directorio = papelera[0]
+            while directorio.subdirectorios:
+                directorio = next(iter(directorio.subdirectorios.values()))
+
+            while directorio.archivos and liberados < self.tamaño_lote:
+                _, archivo = directorio.archivos.popitem()
+                if archivo.contenedor:
+                    self.contenedores_servicio.liberar(archivo, guardar=False)
+                bloques.extend(archivo.bloques)
+                inodos.pop(archivo.inodo_id, None)
+                liberados += 1
+
+            if directorio.archivos:
+                break
+
+            # Directorio vacío: se suelta de su padre, o de la papelera si es la raíz del subárbol
+            if directorio.padre is not None:
+                directorio.padre.remover_subdirectorio(directorio.nombre)
+            else:
+                papelera.pop(0)
+            inodos.pop(directorio.inodo_id, None)
+            liberados += 1
+
+        if liberados:
+            self.bloques_servicio.liberar_bloques(bloques)
+            self.archivos_servicio._guardar_metadata()
+            self.archivos_reclamados += liberados
+        return liberados
+
+    def reclamar(self) -> int:
+        """Vaciar la papelera por completo"""
+        total = 0
+        while self.archivos_servicio.papelera:
+            total += self.reclamar_lote()
+        if total:
+            logger.info(f"Reclamación completada: {total} inodos liberados")
+        return total
+
+    def _ejecutar(self):
+        evento = self.archivos_servicio.papelera_evento
+        while True:
+            evento.wait(timeout=60)
+            evento.clear()
+            try:
+                self.reclamar()
+            except Exception as e:
+                logger.error(f"Error en la reclamación de subárboles: {e}")
+
+    def iniciar(self):
+        """Arrancar el hilo de reclamación (se despierta con cada borrado masivo)"""
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._ejecutar, daemon=True)
+            self._hilo.start()
+            if self.archivos_servicio.papelera:
+                self.archivos_servicio.papelera_evento.set()
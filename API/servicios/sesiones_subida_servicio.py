@@ -0,0 +1,249 @@
+# servicios/sesiones_subida_servicio.py
+import os
+import json
+import time
+import uuid
+from typing import Dict
+from modelos.archivo_metadata import ArchivoMetadata
+from servicios.cerrojo_metadatos import con_escritura
+from config import NAMENODE_METADATA_DIR, UPLOAD_SESSION_TTL
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Estado de los bloques de una subida que aún no se ha completado
+PENDIENTE = 'pendiente'
+
+
+class SesionesSubidaServicio:
+    """Subidas reanudables: el archivo solo aparece en el namespace al completar la sesión.
+
+    Abrir una subida reserva los bloques como pendientes, fuera de cualquier archivo.
+    El cliente los escribe en los DataNodes y los confirma (/blocks/<id>/confirm o ConfirmBlock),
+    que deja en el bloque el checksum recibido; la sesión lista qué bloques están
+    confirmados y con qué checksum. Si la subida se corta, volver a abrirla con la
+    misma ruta y tamaño devuelve la misma sesión y el cliente reenvía solo los
+    bloques sin confirmar o cuyo checksum no coincide con el de su copia local.
+    Un bloque sin confirmar, o confirmado pero sin ninguna réplica en un DataNode
+    activo, se recoloca en DataNodes disponibles al consultar la sesión.
+
+    Las sesiones se guardan en disco para sobrevivir a un reinicio del NameNode y
+    caducan tras UPLOAD_SESSION_TTL segundos sin actividad, liberando sus bloques.
+    """
+
+    def __init__(self, archivos_servicio, bloques_servicio):
+        self.archivos_servicio = archivos_servicio
+        self.bloques_servicio = bloques_servicio
+        self.duracion = UPLOAD_SESSION_TTL
+        self.sesiones: Dict[str, Dict] = {}  # sesion_id -> sesión
+        self.por_ruta: Dict[str, str] = {}  # ruta -> sesion_id
+        self.por_bloque: Dict[str, str] = {}  # bloque_id -> sesion_id
+        self._cargar_sesiones()
+
+    def _archivo_sesiones(self) -> str:
+        return os.path.join(NAMENODE_METADATA_DIR, 'sesiones_subida.json')
+
+    def _cargar_sesiones(self):
+        """Recupera las sesiones guardadas y libera los bloques pendientes que no pertenecen a ninguna"""
+        try:
+            if os.path.exists(self._archivo_sesiones()):
+                with open(self._archivo_sesiones(), 'r') as f:
+                    for sesion in json.load(f).values():
+                        self._indexar(sesion)
+        except Exception as e:
+            logger.error(f"Error cargando sesiones de subida: {e}")
+
+        huerfanos = [bloque_id for bloque_id, bloque in self.bloques_servicio.bloques_metadata.items()
+                     if bloque.estado == PENDIENTE and bloque_id not in self.por_bloque]
+        if huerfanos:
+            self.bloques_servicio.liberar_bloques(huerfanos)
+            logger.info(f"Liberados {len(huerfanos)} bloques de subidas sin sesión")
+
+    def _guardar_sesiones(self):
+        try:
+            temporal = self._archivo_sesiones() + '.tmp'
+            with open(temporal, 'w') as f:
+                json.dump(self.sesiones, f, indent=2)
+            os.replace(temporal, self._archivo_sesiones())
+        except Exception as e:
+            logger.error(f"Error guardando sesiones de subida: {e}")
+
+    def _indexar(self, sesion: Dict):
+        self.sesiones[sesion['sesion_id']] = sesion
+        self.por_ruta[sesion['ruta']] = sesion['sesion_id']
+        for bloque_id in sesion['bloques']:
+            self.por_bloque[bloque_id] = sesion['sesion_id']
+
+    def _vigente(self, sesion_id: str, usuario: str) -> Dict:
+        sesion = self.sesiones.get(sesion_id)
+        if sesion is None:
+            raise LookupError('La sesión de subida no existe o ha caducado')
+        if sesion['usuario'] != usuario:
+            raise PermissionError('La sesión de subida pertenece a otro usuario')
+        sesion['actividad'] = time.time()
+        return sesion
+
+    def _disponible(self, bloque) -> bool:
+        return any(self._datanode_activo(host, puerto) for host, puerto in bloque.ubicaciones)
+
+    def _datanode_activo(self, host: str, puerto: int) -> bool:
+        datanode = self.bloques_servicio._buscar_datanode(host, puerto)
+        return (datanode is not None and datanode.estado == 'activo'
+                and self.bloques_servicio.cliente_datanodes.disponible(host, puerto))
+
+    def _recolocar(self, sesion: Dict) -> int:
+        """Sustituye los bloques que ya no pueden escribirse o leerse donde se planificaron"""
+        recolocados = 0
+        for indice, bloque_id in enumerate(sesion['bloques']):
+            bloque = self.bloques_servicio.obtener_bloque(bloque_id)
+            pendiente = not bloque.checksum and not all(self._datanode_activo(h, p) for h, p in bloque.ubicaciones)
+            perdido = bloque.checksum and not self._disponible(bloque)
+            if not (pendiente or perdido):
+                continue
+            try:
+                nuevo = self.bloques_servicio.crear_bloque(bloque.archivo_nombre, bloque.posicion, bloque.tamaño,
+                                                           guardar=False)
+            except ValueError as e:
+                # Sin DataNodes de sobra se conserva el plan; el cliente reintentará donde estaba
+                logger.warning(f"No se pudo recolocar el bloque {bloque_id}: {e}")
+                break
+            nuevo.estado = PENDIENTE
+            self.bloques_servicio.liberar_bloques([bloque_id], guardar=False)
+            del self.por_bloque[bloque_id]
+            sesion['bloques'][indice] = nuevo.bloque_id
+            self.por_bloque[nuevo.bloque_id] = sesion['sesion_id']
+            recolocados += 1
+        if recolocados:
+            self.bloques_servicio._guardar_metadata()
+            logger.info(f"Subida de {sesion['ruta']}: {recolocados} bloques recolocados en DataNodes activos")
+        return recolocados
+
+    def _estado(self, sesion: Dict, reanudada: bool = False) -> Dict:
+        bloques = []
+        for bloque_id in sesion['bloques']:
+            bloque = self.bloques_servicio.obtener_bloque(bloque_id).to_dict()
+            bloque['confirmado'] = bloque['checksum'] or None
+            bloques.append(bloque)
+        return {
+            'sesion_id': sesion['sesion_id'],
+            'ruta': sesion['ruta'],
+            'tamaño': sesion['tamaño'],
+            'reanudada': reanudada,
+            'confirmados': sum(1 for b in bloques if b['confirmado']),
+            'bloques': bloques
+        }
+
+    @con_escritura
+    def abrir(self, ruta: str, tamaño: int, usuario: str) -> Dict:
+        """Abre la subida de `tamaño` bytes a `ruta`, o reanuda la que `usuario` dejó a medias"""
+        if tamaño <= 0:
+            raise ValueError('El tamaño a subir debe ser positivo')
+        if self.archivos_servicio.obtener_archivo(ruta):
+            raise ValueError(f'El archivo {ruta} ya existe')
+
+        actual = self.sesiones.get(self.por_ruta.get(ruta))
+        if actual is not None:
+            if actual['usuario'] != usuario:
+                raise ValueError(f'{ruta} ya tiene una subida en curso de {actual["usuario"]}')
+            if actual['tamaño'] == tamaño:
+                actual['actividad'] = time.time()
+                self._recolocar(actual)
+                self._guardar_sesiones()
+                estado = self._estado(actual, reanudada=True)
+                logger.info(f"Subida de {ruta} reanudada: {estado['confirmados']}/{len(estado['bloques'])} "
+                            f"bloques confirmados")
+                return estado
+            # El archivo local cambió de tamaño: la subida anterior ya no sirve
+            self._abandonar(actual)
+
+        bloques = self.bloques_servicio.crear_bloques_para_archivo(os.path.basename(ruta), tamaño)
+        for bloque in bloques:
+            bloque.estado = PENDIENTE
+        self.bloques_servicio._guardar_metadata()
+
+        sesion = {
+            'sesion_id': str(uuid.uuid4()),
+            'ruta': ruta,
+            'usuario': usuario,
+            'tamaño': tamaño,
+            'bloques': [b.bloque_id for b in bloques],
+            'actividad': time.time()
+        }
+        self._indexar(sesion)
+        self._guardar_sesiones()
+        logger.info(f"Subida de {ruta} abierta para {usuario}: {tamaño} bytes en {len(bloques)} bloques")
+        return self._estado(sesion)
+
+    @con_escritura
+    def estado(self, sesion_id: str, usuario: str) -> Dict:
+        """Bloques de la subida con el checksum confirmado de cada uno (None si falta)"""
+        sesion = self._vigente(sesion_id, usuario)
+        if self._recolocar(sesion):
+            self._guardar_sesiones()
+        return self._estado(sesion)
+
+    def bloque_confirmado(self, bloque_id: str):
+        """Llamado al confirmar un bloque: mantiene viva la sesión a la que pertenece"""
+        sesion = self.sesiones.get(self.por_bloque.get(bloque_id))
+        if sesion is not None:
+            sesion['actividad'] = time.time()
+
+    def pertenece(self, bloque_id: str) -> bool:
+        return bloque_id in self.por_bloque
+
+    @con_escritura
+    def completar(self, sesion_id: str, usuario: str) -> ArchivoMetadata:
+        """Crea el archivo con los bloques de la sesión; todos deben estar confirmados"""
+        sesion = self._vigente(sesion_id, usuario)
+        bloques = [self.bloques_servicio.obtener_bloque(bloque_id) for bloque_id in sesion['bloques']]
+        faltan = [b.bloque_id for b in bloques if not b.checksum]
+        if faltan:
+            raise ValueError(f'Faltan {len(faltan)} bloques por confirmar: {", ".join(faltan[:5])}')
+
+        ruta = sesion['ruta']
+        directorio_padre = os.path.dirname(ruta) or '/'
+        if not self.archivos_servicio.directorio_existe(directorio_padre):
+            self.archivos_servicio.crear_directorio(directorio_padre)
+        archivo = self.archivos_servicio.crear_archivo(ruta, usuario)
+
+        self._soltar(sesion)
+        for bloque in bloques:
+            bloque.estado = 'activo'
+            self.bloques_servicio.verificar_digest(bloque)
+        archivo.bloques = list(sesion['bloques'])
+        archivo.tamaño_total = sesion['tamaño']
+        self.bloques_servicio._guardar_metadata()
+        self.archivos_servicio.guardar_archivo(archivo)
+        self._guardar_sesiones()
+        logger.info(f"Subida de {ruta} completada: {len(bloques)} bloques")
+        return archivo
+
+    @con_escritura
+    def abandonar(self, sesion_id: str, usuario: str):
+        """El cliente desiste: se liberan los bloques de la sesión"""
+        self._abandonar(self._vigente(sesion_id, usuario))
+        self._guardar_sesiones()
+
+    @con_escritura
+    def expirar(self) -> int:
+        """Abandona las subidas sin actividad en UPLOAD_SESSION_TTL segundos (se llama desde el monitor)"""
+        limite = time.time() - self.duracion
+        caducadas = [s for s in self.sesiones.values() if s['actividad'] <= limite]
+        for sesion in caducadas:
+            logger.warning(f"Subida de {sesion['ruta']} caducada sin completarse")
+            self._abandonar(sesion)
+        if caducadas:
+            self._guardar_sesiones()
+        return len(caducadas)
+
+    def _soltar(self, sesion: Dict):
+        del self.sesiones[sesion['sesion_id']]
+        if self.por_ruta.get(sesion['ruta']) == sesion['sesion_id']:
+            del self.por_ruta[sesion['ruta']]
+        for bloque_id in sesion['bloques']:
+            self.por_bloque.pop(bloque_id, None)
+
+    def _abandonar(self, sesion: Dict):
+        self._soltar(sesion)
+        self.bloques_servicio.liberar_bloques(sesion['bloques'])
@@ -0,0 +1,123 @@
+# servicios/subida_servicio.py
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import List, Tuple
+from modelos.archivo_metadata import ArchivoMetadata
+from modelos.bloque_info import BloqueInfo
+from servicios.cerrojo_metadatos import cerrojo_metadatos
+from config import STREAM_UPLOAD_INFLIGHT_BLOCKS, STREAM_UPLOAD_WORKERS, STREAM_READ_CHUNK
+# Permite importar el paquete common
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from common.utils import tracing
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class SubidaServicio:
+    """Subida en streaming: los bloques se cortan según llega el cuerpo de la petición.
+
+    Cada bloque completo se reserva en el NameNode y se envía a todas sus réplicas
+    en un hilo aparte mientras se sigue leyendo el siguiente, con a lo sumo
+    `bloques_en_vuelo` envíos a la vez por subida: la memoria queda acotada a
+    unos pocos bloques sin importar el tamaño del archivo. El archivo solo se
+    crea en el espacio de nombres cuando todos sus bloques están confirmados.
+    """
+
+    def __init__(self, archivos_servicio, bloques_servicio, contenedores_servicio):
+        self.archivos_servicio = archivos_servicio
+        self.bloques_servicio = bloques_servicio
+        self.contenedores_servicio = contenedores_servicio
+        self.bloques_en_vuelo = STREAM_UPLOAD_INFLIGHT_BLOCKS
+        self.ejecutor = ThreadPoolExecutor(max_workers=STREAM_UPLOAD_WORKERS, thread_name_prefix='subida')
+
+    @staticmethod
+    def _leer_bloque(stream, tamaño: int) -> bytes:
+        """Leer hasta `tamaño` bytes del cuerpo; menos solo si el cuerpo terminó"""
+        fragmentos, leidos = [], 0
+        while leidos < tamaño:
+            fragmento = stream.read(min(STREAM_READ_CHUNK, tamaño - leidos))
+            if not fragmento:
+                break
+            fragmentos.append(fragmento)
+            leidos += len(fragmento)
+        return b''.join(fragmentos)
+
+    def _enviar(self, bloque: BloqueInfo, datos: bytes):
+        with tracing.span('subida.enviar_bloque', bloque_id=bloque.bloque_id, posicion=bloque.posicion,
+                          bytes=len(datos)):
+            if not self.bloques_servicio.subir_bloque(bloque.bloque_id, datos, bloque.ubicaciones):
+                raise IOError(f"Error subiendo bloque {bloque.bloque_id}")
+
+    def _registrar(self, ruta: str, usuario: str) -> ArchivoMetadata:
+        """Crear el archivo (y sus directorios); el llamador debe tener el cerrojo de escritura"""
+        directorio_padre = os.path.dirname(ruta) or '/'
+        if not self.archivos_servicio.directorio_existe(directorio_padre):
+            self.archivos_servicio.crear_directorio(directorio_padre)
+        return self.archivos_servicio.crear_archivo(ruta, usuario)
+
+    def _subir_bloques(self, nombre: str, primero: bytes, stream) -> Tuple[List[BloqueInfo], int]:
+        """Enviar los bloques según se completan; retorna los bloques confirmados y el tamaño total"""
+        block_size = self.bloques_servicio.block_size
+        en_vuelo = threading.Semaphore(self.bloques_en_vuelo)
+        fallos = []
+        bloques, futuros = [], []
+
+        def terminado(futuro):
+            en_vuelo.release()
+            if futuro.exception():
+                fallos.append(futuro.exception())
+
+        datos, total = primero, 0
+        try:
+            while datos and not fallos:
+                bloque = self.bloques_servicio.crear_bloque(nombre, len(bloques), len(datos))
+                bloques.append(bloque)
+                # Memoria acotada: no se lee más hasta que un envío termine
+                en_vuelo.acquire()
+                futuro = self.ejecutor.submit(tracing.propagate(self._enviar), bloque, datos)
+                futuro.add_done_callback(terminado)
+                futuros.append(futuro)
+                total += len(datos)
+                if len(datos) < block_size:
+                    break
+                with tracing.span('subida.leer_cuerpo', posicion=len(bloques)):
+                    datos = self._leer_bloque(stream, block_size)
+            wait(futuros)
+            if fallos:
+                raise fallos[0]
+        except Exception:
+            wait(futuros)
+            self.bloques_servicio.liberar_bloques([b.bloque_id for b in bloques])
+            raise
+        return bloques, total
+
+    def subir(self, ruta: str, stream, usuario: str) -> Tuple[ArchivoMetadata, int]:
+        """Subir un archivo leyendo `stream` de forma incremental; retorna (archivo, bloques subidos)"""
+        if self.archivos_servicio.obtener_archivo(ruta):
+            raise ValueError(f"El archivo {ruta} ya existe")
+
+        block_size = self.bloques_servicio.block_size
+        primero = self._leer_bloque(stream, block_size)
+        if len(primero) < block_size and self.contenedores_servicio.es_pequeño(len(primero)):
+            # El cuerpo completo cabe bajo el umbral: se anexa a un contenedor como en /upload
+            return self.contenedores_servicio.subir(ruta, primero, usuario), 0
+
+        bloques, total = self._subir_bloques(os.path.basename(ruta), primero, stream)
+
+        # Todos los bloques confirmados: recién ahora el archivo aparece en el espacio de nombres
+        try:
+            with tracing.span('subida.registrar', bloques=len(bloques)), cerrojo_metadatos.escritura():
+                archivo = self._registrar(ruta, usuario)
+                archivo.bloques = [b.bloque_id for b in bloques]
+                archivo.tamaño_total = total
+                self.archivos_servicio.guardar_archivo(archivo)
+        except Exception:
+            self.bloques_servicio.liberar_bloques([b.bloque_id for b in bloques])
+            raise
+
+        logger.info(f"Subida en streaming de {ruta}: {len(bloques)} bloques, {total} bytes")
+        return archivo, len(bloques)
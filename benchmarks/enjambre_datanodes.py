@@ -0,0 +1,366 @@
+"""Simulador de un enjambre de DataNodes contra el NameNode.
+
+Emula miles de DataNodes ligeros desde un solo proceso (asyncio + httpx) que
+hablan con el NameNode igual que los reales por REST: se registran
+(/datanodes/register), envían heartbeats con jitter (/datanodes/heartbeat) con
+el delta de bloques desde el anterior, y mandan el reporte completo al
+arrancar, cada --reporte-cada latidos y cuando el NameNode lo pide. Atienden
+los comandos 'reporte_completo' y 're_registrar'. Cada --periodo-caidas
+segundos una fracción de los nodos vivos deja de latir durante --duracion-caida
+segundos y después vuelve a registrarse con su reporte completo.
+
+A la vez, una sonda hace operaciones de metadatos de cliente (asignar, bloques
+de un archivo, listar) desde el final de la rampa, para medir cómo afecta la
+tormenta a los clientes. Se corre primero una fase base con --nodos-base nodos
+y después la del enjambre.
+
+Por fase se mide la latencia de registros, latidos y reportes (p50/p95/p99), los
+latidos perdidos (error o timeout) y atrasados (más de 2 intervalos entre dos
+latidos de un nodo), la latencia de la sonda, el tiempo de heartbeat y de
+persistencia que reporta el propio NameNode en /metrics y, si el NameNode lo
+lanza el simulador, su CPU y RSS. También se mide el retraso del bucle de
+eventos: si es alto, el cuello de botella es el simulador y no el NameNode.
+
+Uso (desde la raíz del repositorio):
+    python benchmarks/enjambre_datanodes.py --nodos 2000 --duracion 60 --salida enjambre.json
+    python benchmarks/enjambre_datanodes.py --namenode http://10.0.0.5:8080 --nodos 5000
+Sin --namenode se lanza un NameNode local con metadatos temporales.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from rendimiento_cluster import URL_NAMENODE, MiniCluster, Monitor, preparar_protos
+from common.config import default_block_size, default_usuario, default_password, heartbeat_interval
+
+COMANDO_REPORTE = 'reporte_completo'
+COMANDO_REREGISTRO = 're_registrar'
+# Series de /metrics del NameNode que se comparan antes y después de cada fase
+SERIES_SERVIDOR = {
+    'heartbeat_rest': 'dfs_namenode_heartbeat_seconds_{}{{transport="rest"}}',
+    'persistencia_bloques': 'dfs_namenode_persist_seconds_{}{{store="bloques"}}',
+}
+
+
+def _percentil(ordenadas: list, fraccion: float) -> float:
+    return ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * fraccion))] * 1000 if ordenadas else 0.0
+
+
+class Registro:
+    """Latencias y fallos por tipo de llamada de una fase"""
+
+    def __init__(self):
+        self.latencias = defaultdict(list)
+        self.fallos = Counter()
+        self.motivos = Counter()
+        self.atrasados = 0
+        self.caidas = 0
+        self.reingresos = 0
+        self.reregistros = 0
+        self.retraso_bucle = []
+
+    def exito(self, tipo: str, segundos: float):
+        self.latencias[tipo].append(segundos)
+
+    def fallo(self, tipo: str, motivo: str):
+        self.fallos[tipo] += 1
+        self.motivos[f"{tipo}: {motivo}"] += 1
+
+    def resumen(self, tipo: str) -> dict:
+        ordenadas = sorted(self.latencias[tipo])
+        total = len(ordenadas) + self.fallos[tipo]
+        return {
+            'llamadas': total,
+            'fallos': self.fallos[tipo],
+            'tasa_fallos': round(self.fallos[tipo] / total, 4) if total else 0.0,
+            'p50_ms': round(_percentil(ordenadas, 0.5), 2),
+            'p95_ms': round(_percentil(ordenadas, 0.95), 2),
+            'p99_ms': round(_percentil(ordenadas, 0.99), 2),
+            'max_ms': round(ordenadas[-1] * 1000, 2) if ordenadas else 0.0,
+        }
+
+
+async def _llamar(cliente: httpx.AsyncClient, registro: Registro, tipo: str, metodo: str, ruta: str, **kwargs):
+    """Una petición cronometrada; retorna el JSON de la respuesta o None si falló"""
+    inicio = time.perf_counter()
+    try:
+        response = await cliente.request(metodo, ruta, **kwargs)
+    except httpx.TimeoutException:
+        registro.fallo(tipo, 'timeout')
+        return None
+    except httpx.HTTPError as e:
+        registro.fallo(tipo, e.__class__.__name__)
+        return None
+    if response.status_code >= 400:
+        registro.fallo(tipo, f"HTTP {response.status_code}")
+        return None
+    registro.exito(tipo, time.perf_counter() - inicio)
+    return response.json()
+
+
+class NodoVirtual:
+    """Un DataNode sin almacenamiento: solo su ciclo de vida frente al NameNode"""
+
+    def __init__(self, indice: int, fase: str, args):
+        # Direcciones únicas por fase; el NameNode nunca se conecta a ellas fuera de una subida
+        self.host = f"sim-{fase}-{indice}"
+        self.puerto = 50051
+        self.args = args
+        self.bloques = [f"sim-{fase}-{indice}-{j}" for j in range(args.bloques_por_nodo)]
+        self.agregados = []
+        self.reporte_pendiente = True
+        self.latidos = 0
+        self.caido_hasta = 0.0
+        self.ultimo_latido = None
+
+    async def registrar(self, cliente, registro: Registro) -> bool:
+        self.reporte_pendiente = True
+        self.ultimo_latido = None
+        return await _llamar(cliente, registro, 'registro', 'POST', '/datanodes/register', json={
+            'host': self.host, 'puerto': self.puerto, 'espacio_total': 10 ** 12}) is not None
+
+    async def latir(self, cliente, registro: Registro):
+        self.latidos += 1
+        nuevos = [f"{self.host}-n{self.latidos}-{j}" for j in range(self.args.nuevos_por_latido)]
+        self.bloques.extend(nuevos)
+        self.agregados.extend(nuevos)
+        estado = {'espacio_usado': len(self.bloques) * default_block_size, 'espacio_total': 10 ** 12,
+                  'capacidad': 2}
+        completo = self.reporte_pendiente or (self.args.reporte_cada and self.latidos % self.args.reporte_cada == 0)
+        if completo:
+            estado['bloques'] = self.bloques
+        else:
+            estado['bloques_agregados'] = self.agregados
+        respuesta = await _llamar(cliente, registro, 'reporte' if completo else 'latido', 'POST',
+                                  '/datanodes/heartbeat', json={'host': self.host, 'puerto': self.puerto,
+                                                                'estado_info': estado})
+        if respuesta is None:
+            # Sin confirmación el delta se reenvía en el siguiente latido
+            return
+        self.agregados = []
+        self.reporte_pendiente = False
+
+        ahora = time.monotonic()
+        if self.ultimo_latido and ahora - self.ultimo_latido > 2 * self.args.intervalo:
+            registro.atrasados += 1
+        self.ultimo_latido = ahora
+
+        for comando in respuesta.get('comandos', []):
+            if comando.get('tipo') == COMANDO_REPORTE:
+                self.reporte_pendiente = True
+            elif comando.get('tipo') == COMANDO_REREGISTRO:
+                registro.reregistros += 1
+                await self.registrar(cliente, registro)
+
+    async def vivir(self, cliente, registro: Registro, fin: float):
+        # Rampa de arranque: con --rampa 0 todos se registran a la vez
+        await asyncio.sleep(random.uniform(0, self.args.rampa))
+        while not await self.registrar(cliente, registro):
+            if time.monotonic() >= fin:
+                return
+            await asyncio.sleep(self.args.intervalo)
+        while True:
+            espera = self.args.intervalo * random.uniform(1 - self.args.jitter, 1 + self.args.jitter)
+            if time.monotonic() + espera >= fin:
+                return
+            await asyncio.sleep(espera)
+            if self.caido_hasta:
+                if time.monotonic() < self.caido_hasta:
+                    continue
+                # Reingreso tras la caída: registro y reporte completo
+                self.caido_hasta = 0.0
+                registro.reingresos += 1
+                await self.registrar(cliente, registro)
+            await self.latir(cliente, registro)
+
+
+async def _caos(nodos: list, registro: Registro, fin: float, args):
+    while time.monotonic() + args.periodo_caidas < fin:
+        await asyncio.sleep(args.periodo_caidas)
+        vivos = [n for n in nodos if not n.caido_hasta and n.ultimo_latido]
+        for nodo in random.sample(vivos, int(len(vivos) * args.caidas)):
+            nodo.caido_hasta = time.monotonic() + args.duracion_caida
+            registro.caidas += 1
+
+
+async def _sondear(cliente, registro: Registro, fin: float, fase: str, args):
+    """Operaciones de metadatos de un cliente mientras el enjambre late, desde el final de la rampa"""
+    auth = (default_usuario, default_password)
+    numero = 0
+    # Antes no hay DataNodes suficientes para asignar bloques
+    await asyncio.sleep(args.rampa)
+    while time.monotonic() < fin:
+        ruta = f"/enjambre_{fase}_{numero}"
+        numero += 1
+        await _llamar(cliente, registro, 'cliente_asignar', 'POST', '/api/archivos/asignar',
+                      json={'ruta': ruta, 'tamaño': default_block_size}, auth=auth)
+        await _llamar(cliente, registro, 'cliente_bloques', 'GET', f"/api/archivos/bloques{ruta}", auth=auth)
+        await _llamar(cliente, registro, 'cliente_listar', 'GET', '/api/archivos/listar',
+                      params={'ruta': '/', 'limite': 20}, auth=auth)
+        await asyncio.sleep(1 / args.sondas_por_segundo)
+
+
+async def _medir_bucle(registro: Registro, fin: float):
+    """Retraso del bucle de eventos: cuánto tarda en despertar una espera de 50 ms"""
+    while time.monotonic() < fin:
+        inicio = time.perf_counter()
+        await asyncio.sleep(0.05)
+        registro.retraso_bucle.append(time.perf_counter() - inicio - 0.05)
+
+
+async def _metricas_servidor(cliente) -> dict:
+    """Sumas y cuentas de las series de SERIES_SERVIDOR en /metrics del NameNode"""
+    try:
+        texto = (await cliente.get('/metrics')).text
+    except httpx.HTTPError:
+        return {}
+    valores = {}
+    for nombre, serie in SERIES_SERVIDOR.items():
+        for campo in ('sum', 'count'):
+            encontrado = re.search(re.escape(serie.format(campo)) + r' (\S+)', texto)
+            valores[(nombre, campo)] = float(encontrado.group(1)) if encontrado else 0.0
+    return valores
+
+
+async def ejecutar_fase(fase: str, num_nodos: int, duracion: float, args, grupos: dict = None) -> dict:
+    registro = Registro()
+    limites = httpx.Limits(max_connections=args.conexiones, max_keepalive_connections=args.conexiones)
+    async with httpx.AsyncClient(base_url=args.namenode, limits=limites, timeout=args.timeout) as cliente:
+        antes = await _metricas_servidor(cliente)
+        monitor = Monitor(grupos) if grupos else None
+        if monitor:
+            monitor.start()
+        fin = time.monotonic() + duracion
+        nodos = [NodoVirtual(i, fase, args) for i in range(num_nodos)]
+        inicio = time.perf_counter()
+        await asyncio.gather(*(nodo.vivir(cliente, registro, fin) for nodo in nodos),
+                             _sondear(cliente, registro, fin, fase, args),
+                             _medir_bucle(registro, fin),
+                             _caos(nodos, registro, fin, args) if args.caidas else asyncio.sleep(0))
+        transcurrido = time.perf_counter() - inicio
+        despues = await _metricas_servidor(cliente)
+
+    servidor = {}
+    for nombre in SERIES_SERVIDOR:
+        cuenta = despues.get((nombre, 'count'), 0.0) - antes.get((nombre, 'count'), 0.0)
+        suma = despues.get((nombre, 'sum'), 0.0) - antes.get((nombre, 'sum'), 0.0)
+        servidor[nombre] = {'llamadas': int(cuenta), 'media_ms': round(suma / cuenta * 1000, 2) if cuenta else 0.0}
+
+    latidos = registro.resumen('latido')
+    retraso = sorted(registro.retraso_bucle)
+    return {
+        'nodos': num_nodos,
+        'duracion_s': round(transcurrido, 1),
+        'latidos_por_s': round((latidos['llamadas'] + registro.resumen('reporte')['llamadas']) / transcurrido, 1),
+        'registro': registro.resumen('registro'),
+        'latido': latidos,
+        'reporte': registro.resumen('reporte'),
+        'latidos_atrasados': registro.atrasados,
+        'caidas': registro.caidas,
+        'reingresos': registro.reingresos,
+        'reregistros_pedidos': registro.reregistros,
+        'cliente': {op: registro.resumen(f"cliente_{op}") for op in ('asignar', 'bloques', 'listar')},
+        'servidor': servidor,
+        'retraso_bucle_p99_ms': round(_percentil(retraso, 0.99), 1),
+        'recursos_namenode': monitor.resumen(transcurrido)['namenode'] if monitor else None,
+        'fallos_frecuentes': dict(registro.motivos.most_common(5)),
+    }
+
+
+def _imprimir(fase: str, r: dict):
+    print(f"\n== {fase}: {r['nodos']} nodos, {r['duracion_s']} s, {r['latidos_por_s']} latidos/s ==")
+    print(f"{'llamada':<18}{'total':>8}{'fallos':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    filas = [('registro', r['registro']), ('latido', r['latido']), ('reporte', r['reporte'])] + [
+        (f"cliente {op}", resumen) for op, resumen in r['cliente'].items()]
+    for nombre, s in filas:
+        print(f"{nombre:<18}{s['llamadas']:>8}{s['fallos']:>8}{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}"
+              f"{s['p99_ms']:>10.1f}{s['max_ms']:>10.1f}")
+    print(f"latidos atrasados {r['latidos_atrasados']}, caídas {r['caidas']}, reingresos {r['reingresos']}, "
+          f"re-registros pedidos {r['reregistros_pedidos']}")
+    for nombre, s in r['servidor'].items():
+        print(f"NameNode {nombre}: {s['llamadas']} llamadas, media {s['media_ms']} ms")
+    if r['recursos_namenode']:
+        recursos = r['recursos_namenode']
+        print(f"NameNode CPU {recursos['cpu_nucleos']} núcleos, RSS máx {recursos['rss_max_mb']} MB")
+    if r['retraso_bucle_p99_ms'] > 100:
+        print(f"⚠️  Retraso p99 del bucle del simulador {r['retraso_bucle_p99_ms']} ms: "
+              f"las latencias incluyen la saturación del propio simulador")
+    for motivo, veces in r['fallos_frecuentes'].items():
+        print(f"  ✗ {motivo} ({veces})")
+
+
+async def simular(args, grupos: dict = None) -> dict:
+    fases = {}
+    for fase, nodos, duracion in (('base', args.nodos_base, args.duracion_base),
+                                  ('enjambre', args.nodos, args.duracion)):
+        fases[fase] = await ejecutar_fase(fase, nodos, duracion, args, grupos)
+        _imprimir(fase, fases[fase])
+
+    base, enjambre = fases['base']['cliente'], fases['enjambre']['cliente']
+    print("\nEfecto sobre el cliente (p99 enjambre / p99 base):")
+    for op in base:
+        factor = enjambre[op]['p99_ms'] / base[op]['p99_ms'] if base[op]['p99_ms'] else None
+        print(f"  {op:<10}{base[op]['p99_ms']:>10.1f} ms -> {enjambre[op]['p99_ms']:>10.1f} ms"
+              + (f"  ({factor:.1f}x)" if factor else ''))
+    return fases
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--namenode', help=f"URL de un NameNode ya en marcha (p. ej. {URL_NAMENODE}); "
+                                           f"sin ella se lanza uno local")
+    parser.add_argument('--nodos', type=int, default=1000, help='DataNodes virtuales de la fase del enjambre')
+    parser.add_argument('--nodos-base', type=int, default=3, help='DataNodes de la fase base')
+    parser.add_argument('--duracion', type=float, default=60, help='segundos de la fase del enjambre')
+    parser.add_argument('--duracion-base', type=float, default=15, help='segundos de la fase base')
+    parser.add_argument('--intervalo', type=float, default=heartbeat_interval, help='segundos entre latidos')
+    parser.add_argument('--jitter', type=float, default=0.2, help='variación relativa del intervalo')
+    parser.add_argument('--rampa', type=float, default=5, help='segundos en los que se reparten los registros')
+    parser.add_argument('--bloques-por-nodo', type=int, default=1000, help='bloques del reporte inicial')
+    parser.add_argument('--nuevos-por-latido', type=int, default=1, help='bloques agregados entre latidos')
+    parser.add_argument('--reporte-cada', type=int, default=0, help='latidos entre reportes completos (0: nunca)')
+    parser.add_argument('--caidas', type=float, default=0.05, help='fracción de nodos vivos que cae en cada ronda')
+    parser.add_argument('--periodo-caidas', type=float, default=15, help='segundos entre rondas de caídas')
+    parser.add_argument('--duracion-caida', type=float, default=10, help='segundos que un nodo pasa caído')
+    parser.add_argument('--sondas-por-segundo', type=float, default=5, help='ciclos por segundo de la sonda')
+    parser.add_argument('--conexiones', type=int, default=100, help='conexiones HTTP simultáneas al NameNode')
+    parser.add_argument('--timeout', type=float, default=heartbeat_interval,
+                        help='segundos tras los que un latido se da por perdido')
+    parser.add_argument('--replicacion', type=int, default=2, help='factor de replicación del NameNode lanzado')
+    parser.add_argument('--salida', help='JSON con los resultados')
+    args = parser.parse_args()
+    if args.nodos_base < args.replicacion:
+        parser.error('la fase base necesita al menos tantos nodos como el factor de replicación')
+
+    if args.namenode:
+        fases = asyncio.run(simular(args))
+    else:
+        directorio = tempfile.mkdtemp(prefix='enjambre_datanodes_')
+        args.namenode = URL_NAMENODE
+        try:
+            with MiniCluster(directorio, 0, default_block_size, args.replicacion,
+                             preparar_protos(directorio)) as cluster:
+                fases = asyncio.run(simular(args, {'namenode': cluster.grupos()['namenode']}))
+        finally:
+            shutil.rmtree(directorio, ignore_errors=True)
+
+    if args.salida:
+        with open(args.salida, 'w') as f:
+            json.dump({'parametros': vars(args), 'fases': fases}, f, indent=2, ensure_ascii=False)
+        print(f"Resultados en {args.salida}")
+
+
+if __name__ == '__main__':
+    main()
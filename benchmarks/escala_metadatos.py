@@ -0,0 +1,217 @@
+"""Microbenchmarks de escala de los metadatos del NameNode.
+
+Puebla ArchivosServicio y BloquesServicio con N archivos sintéticos (cada uno
+con --bloques-por-archivo bloques) para cada escala pedida y mide:
+  persistencia    _guardar_metadata de cada servicio y _cargar_metadata (lo que
+                  cuesta arrancar el NameNode), más el tamaño de los JSON
+  alta            crear_bloques_para_archivo por bloque, en memoria y con la
+                  escritura a disco que hace en cada llamada
+  consulta        latencia de obtener_bloques_archivo para archivos al azar
+  recorridos      verificar_replicacion y obtener_estadisticas completos
+  memoria         RSS por objeto (archivo o bloque) tras poblar
+
+Cada escala corre en un proceso nuevo para que la memoria y los tiempos de
+carga no arrastren la escala anterior. Al final se imprime, para cada medida,
+el exponente k de t ∝ N^k entre escalas consecutivas: k ≈ 1 en una operación
+que debería ser O(1) delata un recorrido completo, y k > 1 un muro de escala.
+
+Uso (desde la raíz del repositorio):
+    python benchmarks/escala_metadatos.py --escalas 10000,100000,1000000 --salida escala.json
+
+Con 10^7 archivos hacen falta decenas de GB de RAM y cada escritura persistida
+tarda minutos; --persistidas 0 omite esas escrituras.
+"""
+import argparse
+import gc
+import json
+import logging
+import math
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import psutil
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'API')))
+
+DATANODES = [('10.0.0.%d' % i, 50051) for i in range(1, 7)]
+ARCHIVOS_POR_DIRECTORIO = 1000
+ALTAS_EN_MEMORIA = 1000
+
+# Medidas de tiempo para las que se calcula el exponente de crecimiento
+CURVAS = ('guardar_archivos_s', 'guardar_bloques_s', 'cargar_archivos_s', 'cargar_bloques_s',
+          'crear_bloque_us', 'crear_persistido_ms', 'obtener_bloques_p50_ms',
+          'verificar_replicacion_ms', 'obtener_estadisticas_ms', 'rss_por_objeto_bytes')
+
+
+def _sin_persistencia(*servicios):
+    """Las altas masivas no escriben a disco (una escritura completa por alta sería O(N^2))"""
+    for servicio in servicios:
+        servicio._guardar_metadata = lambda: None
+
+
+def _con_persistencia(*servicios):
+    for servicio in servicios:
+        servicio.__dict__.pop('_guardar_metadata', None)
+
+
+def _cronometrar(funcion, *args) -> float:
+    inicio = time.perf_counter()
+    funcion(*args)
+    return time.perf_counter() - inicio
+
+
+def medir_escala(num_archivos: int, bloques_por_archivo: int, muestras: int, persistidas: int) -> dict:
+    """Se ejecuta en un proceso propio: los servicios leen la configuración al importarse"""
+    import config
+    directorio = tempfile.mkdtemp(prefix='escala_metadatos_')
+    config.NAMENODE_METADATA_DIR = directorio
+    config.DATANODE_PORTS = []
+    logging.disable(logging.WARNING)
+
+    from servicios.archivos_servicio import ArchivosServicio
+    from servicios.bloques_servicio import BloquesServicio
+
+    proceso = psutil.Process()
+    try:
+        archivos_servicio = ArchivosServicio()
+        bloques_servicio = BloquesServicio()
+        for host, puerto in DATANODES:
+            bloques_servicio.registrar_datanode(host, puerto, espacio_total=10 ** 18)
+        gc.collect()
+        rss_inicial = proceso.memory_info().rss
+
+        _sin_persistencia(archivos_servicio, bloques_servicio)
+        tamaño_archivo = bloques_por_archivo * bloques_servicio.block_size
+        nombres = []
+        inicio = time.perf_counter()
+        for i in range(num_archivos):
+            if i % ARCHIVOS_POR_DIRECTORIO == 0:
+                carpeta = f"/bench/d{i // ARCHIVOS_POR_DIRECTORIO:05d}"
+                archivos_servicio.crear_directorio(carpeta)
+            archivo = archivos_servicio.crear_archivo(f"{carpeta}/f{i}", 'admin')
+            bloques = bloques_servicio.crear_bloques_para_archivo(archivo.nombre, tamaño_archivo)
+            archivo.bloques = [b.bloque_id for b in bloques]
+            nombres.append(archivo.nombre)
+        poblar_s = time.perf_counter() - inicio
+
+        gc.collect()
+        num_bloques = len(bloques_servicio.bloques_metadata)
+        rss_por_objeto = (proceso.memory_info().rss - rss_inicial) / (num_archivos + num_bloques)
+        _con_persistencia(archivos_servicio, bloques_servicio)
+
+        resultado = {
+            'archivos': num_archivos,
+            'bloques': num_bloques,
+            'poblar_s': poblar_s,
+            'rss_mb': proceso.memory_info().rss / 1024 ** 2,
+            'rss_por_objeto_bytes': rss_por_objeto,
+            'guardar_archivos_s': _cronometrar(archivos_servicio._guardar_metadata),
+            'guardar_bloques_s': _cronometrar(bloques_servicio._guardar_metadata),
+            'disco_mb': sum(os.path.getsize(os.path.join(directorio, n)) for n in os.listdir(directorio)) / 1024 ** 2,
+        }
+
+        # Arranque: un servicio nuevo lee lo que se acaba de guardar
+        inicio = time.perf_counter()
+        cargado = ArchivosServicio()
+        resultado['cargar_archivos_s'] = time.perf_counter() - inicio
+        assert sum(1 for _ in cargado.iterar_archivos()) == num_archivos
+        del cargado
+        inicio = time.perf_counter()
+        cargado = BloquesServicio()
+        resultado['cargar_bloques_s'] = time.perf_counter() - inicio
+        assert len(cargado.bloques_metadata) == num_bloques
+        del cargado
+        gc.collect()
+
+        # Alta de un archivo de un bloque: coste propio y coste con su escritura completa a disco
+        _sin_persistencia(bloques_servicio)
+        inicio = time.perf_counter()
+        for i in range(ALTAS_EN_MEMORIA):
+            bloques_servicio.crear_bloques_para_archivo(f"alta_memoria_{i}", bloques_servicio.block_size)
+        resultado['crear_bloque_us'] = (time.perf_counter() - inicio) / ALTAS_EN_MEMORIA * 1e6
+        _con_persistencia(bloques_servicio)
+        tiempos = [_cronometrar(bloques_servicio.crear_bloques_para_archivo, f"alta_disco_{i}",
+                                bloques_servicio.block_size) for i in range(persistidas)]
+        resultado['crear_persistido_ms'] = sorted(tiempos)[len(tiempos) // 2] * 1000 if tiempos else None
+
+        latencias = sorted(_cronometrar(bloques_servicio.obtener_bloques_archivo, nombre)
+                           for nombre in random.sample(nombres, min(muestras, len(nombres))))
+        resultado['obtener_bloques_p50_ms'] = latencias[len(latencias) // 2] * 1000
+        resultado['obtener_bloques_p99_ms'] = latencias[min(len(latencias) - 1, int(len(latencias) * 0.99))] * 1000
+
+        resultado['verificar_replicacion_ms'] = min(
+            _cronometrar(bloques_servicio.verificar_replicacion) for _ in range(3)) * 1000
+        resultado['obtener_estadisticas_ms'] = min(
+            _cronometrar(bloques_servicio.obtener_estadisticas) for _ in range(3)) * 1000
+        return resultado
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+def exponentes(escalas: list, resultados: list) -> dict:
+    """k de t ∝ N^k entre cada par de escalas consecutivas"""
+    curvas = {}
+    for medida in CURVAS:
+        tramos = []
+        for anterior, actual in zip(resultados, resultados[1:]):
+            if anterior.get(medida) and actual.get(medida) and anterior['archivos'] != actual['archivos']:
+                tramos.append(round(math.log(actual[medida] / anterior[medida]) /
+                                    math.log(actual['archivos'] / anterior['archivos']), 2))
+            else:
+                tramos.append(None)
+        curvas[medida] = tramos
+    return curvas
+
+
+def _celda(valor, ancho: int, decimales: int = 2) -> str:
+    return f"{'-':>{ancho}}" if valor is None else f"{valor:>{ancho}.{decimales}f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--escalas', default='10000,100000,1000000', help='archivos por escala, separados por comas')
+    parser.add_argument('--bloques-por-archivo', type=int, default=1)
+    parser.add_argument('--muestras', type=int, default=50, help='consultas de obtener_bloques_archivo por escala')
+    parser.add_argument('--persistidas', type=int, default=3,
+                        help='altas con escritura a disco por escala (0 para omitirlas)')
+    parser.add_argument('--salida', help='JSON con los resultados y las curvas')
+    args = parser.parse_args()
+
+    escalas = [int(float(e)) for e in args.escalas.split(',')]
+    print(f"{'archivos':>10}{'bloques':>10}{'poblar s':>10}{'guardar s':>11}{'cargar s':>10}{'disco MB':>10}"
+          f"{'alta µs':>9}{'alta+disco ms':>15}{'bloques_archivo ms':>20}{'verificar ms':>14}"
+          f"{'estadíst. ms':>14}{'B/objeto':>10}")
+    resultados = []
+    for escala in escalas:
+        # Proceso nuevo por escala: RSS y tiempos de carga sin restos de la anterior
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+            r = pool.submit(medir_escala, escala, args.bloques_por_archivo, args.muestras, args.persistidas).result()
+        resultados.append(r)
+        print(f"{r['archivos']:>10}{r['bloques']:>10}{r['poblar_s']:>10.1f}"
+              f"{r['guardar_archivos_s'] + r['guardar_bloques_s']:>11.2f}"
+              f"{r['cargar_archivos_s'] + r['cargar_bloques_s']:>10.2f}{r['disco_mb']:>10.1f}"
+              f"{r['crear_bloque_us']:>9.1f}{_celda(r['crear_persistido_ms'], 15, 1)}"
+              f"{r['obtener_bloques_p50_ms']:>20.3f}{r['verificar_replicacion_ms']:>14.1f}"
+              f"{r['obtener_estadisticas_ms']:>14.1f}{r['rss_por_objeto_bytes']:>10.0f}")
+
+    curvas = exponentes(escalas, resultados)
+    if len(resultados) > 1:
+        print("\nExponente k de t ∝ N^k entre escalas consecutivas (≈0 constante, ≈1 lineal, >1 superlineal):")
+        for medida, tramos in curvas.items():
+            print(f"  {medida:<26}" + ''.join(_celda(k, 8) for k in tramos))
+
+    if args.salida:
+        with open(args.salida, 'w') as f:
+            json.dump({'parametros': vars(args), 'resultados': resultados, 'exponentes': curvas},
+                      f, indent=2, ensure_ascii=False)
+        print(f"Resultados en {args.salida}")
+
+
+if __name__ == '__main__':
+    main()
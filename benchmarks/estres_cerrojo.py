@@ -0,0 +1,188 @@
+"""Prueba de estrés del cerrojo de metadatos del NameNode.
+
+Lanza N hilos que resuelven rutas y ubican los bloques de archivos al azar
+(lo que hace cada GET /api/archivos/bloques) mientras un hilo de fondo repite
+el ciclo del monitor: pierde réplicas, detecta la replicación insuficiente,
+programa las copias y las confirma con heartbeats de los DataNodes.
+
+Compara dos modos con los mismos hilos:
+  exclusivo       las lecturas toman el cerrojo en modo escritura (un mutex global)
+  lector-escritor las lecturas comparten el cerrojo; solo la reparación excluye
+
+Con el GIL, el trabajo puro en Python no escala con hilos en ningún modo; lo que
+el cerrojo de lectura permite solapar es el tiempo que una petición pasa dentro
+de la sección crítica sin CPU (serializar y enviar la respuesta, E/S). Ese
+tiempo se modela con --latencia-ms.
+
+Uso (desde la raíz del repositorio):
+    python benchmarks/estres_cerrojo.py --hilos 1,2,4,8 --duracion 3
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'API')))
+
+import config
+
+# Los metadatos del benchmark van a un directorio temporal, nunca al del NameNode
+config.NAMENODE_METADATA_DIR = tempfile.mkdtemp(prefix='estres_cerrojo_')
+
+from servicios.archivos_servicio import ArchivosServicio
+from servicios.bloques_servicio import BloquesServicio, COMANDO_TRANSFERIR
+from servicios.cerrojo_metadatos import cerrojo_metadatos
+
+DATANODES = [('10.0.0.%d' % i, 50051) for i in range(1, 7)]
+
+
+def preparar(num_archivos: int, persistir: bool):
+    archivos_servicio = ArchivosServicio()
+    bloques_servicio = BloquesServicio()
+    if not persistir:
+        # Sin disco: se mide solo la contención del cerrojo
+        archivos_servicio._guardar_metadata = lambda: None
+        bloques_servicio._guardar_metadata = lambda: None
+
+    for datanode in list(bloques_servicio.datanodes.values()):
+        datanode.estado = 'inactivo'
+    for host, puerto in DATANODES:
+        bloques_servicio.registrar_datanode(host, puerto)
+
+    rutas = []
+    for i in range(num_archivos):
+        ruta = f"/bench/d{i % 64:02d}/f{i}"
+        archivos_servicio.crear_directorio(os.path.dirname(ruta))
+        archivo = archivos_servicio.crear_archivo(ruta, 'admin')
+        bloques = bloques_servicio.crear_bloques_para_archivo(archivo.nombre, 3 * bloques_servicio.block_size)
+        archivo.bloques = [b.bloque_id for b in bloques]
+        rutas.append(ruta)
+    return archivos_servicio, bloques_servicio, rutas
+
+
+class Reparador(threading.Thread):
+    """Ciclo del monitor en bucle: cada vuelta se pierden réplicas y se reparan"""
+
+    def __init__(self, bloques_servicio, perdidas_por_ciclo: int):
+        super().__init__(daemon=True)
+        self.bloques_servicio = bloques_servicio
+        self.perdidas_por_ciclo = perdidas_por_ciclo
+        self.detener = threading.Event()
+        self.reparados = 0
+        self.ciclos = 0
+        self._en_curso = {}  # (host, puerto) -> comandos recibidos en el heartbeat anterior
+
+    def _perder_replicas(self):
+        with cerrojo_metadatos.escritura():
+            bloques = random.sample(list(self.bloques_servicio.bloques_metadata.values()),
+                                    self.perdidas_por_ciclo)
+            for bloque in bloques:
+                if bloque.bloque_id not in self.bloques_servicio.replicaciones_en_curso and len(bloque.ubicaciones) > 1:
+                    bloque.ubicaciones.pop()
+
+    def _heartbeats(self):
+        for host, puerto in DATANODES:
+            completados = [{
+                'id': comando['id'],
+                'exito': True,
+                'destinos_ok': [[d['host'], d['puerto']] for d in comando['destinos']]
+            } for comando in self._en_curso.pop((host, puerto), []) if comando['tipo'] == COMANDO_TRANSFERIR]
+            self.reparados += len(completados)
+            comandos = self.bloques_servicio.heartbeat_datanode(
+                host, puerto, estado_info={'capacidad': 10 ** 6}, completados=completados
+            )
+            self._en_curso[(host, puerto)] = comandos
+
+    def run(self):
+        while not self.detener.is_set():
+            self._perder_replicas()
+            for bloque_id in self.bloques_servicio.verificar_replicacion():
+                self.bloques_servicio.reparar_replicacion(bloque_id)
+            self._heartbeats()
+            self.ciclos += 1
+
+
+def lector(archivos_servicio, bloques_servicio, rutas, modo: str, latencia: float,
+           fin: float, latencias: list, sin_replicas: list, inicio: threading.Barrier):
+    seccion = cerrojo_metadatos.escritura if modo == 'exclusivo' else cerrojo_metadatos.lectura
+    propias = []
+    vacias = 0
+    inicio.wait()
+    while time.perf_counter() < fin:
+        ruta = random.choice(rutas)
+        t0 = time.perf_counter()
+        with seccion():
+            archivo = archivos_servicio.obtener_archivo(ruta)
+            ubicaciones = [bloques_servicio.obtener_bloque(b).ubicaciones for b in archivo.bloques]
+            # El reparador nunca quita la última réplica: un bloque sin ubicaciones
+            # indica que la lectura vio un estado a medio modificar
+            vacias += sum(1 for u in ubicaciones if not u)
+            if latencia:
+                time.sleep(latencia)
+        propias.append(time.perf_counter() - t0)
+    latencias.extend(propias)
+    sin_replicas.append(vacias)
+
+
+def medir(archivos_servicio, bloques_servicio, rutas, modo: str, hilos: int,
+          duracion: float, latencia: float, perdidas: int) -> dict:
+    reparador = Reparador(bloques_servicio, perdidas)
+    latencias = []
+    sin_replicas = []
+    inicio = threading.Barrier(hilos + 1)
+    fin = time.perf_counter() + duracion + 0.05
+    lectores = [threading.Thread(target=lector, args=(archivos_servicio, bloques_servicio, rutas, modo,
+                                                       latencia, fin, latencias, sin_replicas, inicio))
+                for _ in range(hilos)]
+    reparador.start()
+    for hilo in lectores:
+        hilo.start()
+    inicio.wait()
+    for hilo in lectores:
+        hilo.join()
+    reparador.detener.set()
+    reparador.join()
+
+    latencias.sort()
+    return {
+        'lecturas_s': len(latencias) / duracion,
+        'p99_ms': latencias[int(len(latencias) * 0.99)] * 1000 if latencias else 0,
+        'reparados': reparador.reparados,
+        'ciclos': reparador.ciclos,
+        'sin_replicas': sum(sin_replicas)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--hilos', default='1,2,4,8,16', help='hilos lectores a probar, separados por comas')
+    parser.add_argument('--duracion', type=float, default=3.0, help='segundos por medición')
+    parser.add_argument('--archivos', type=int, default=2000)
+    parser.add_argument('--latencia-ms', type=float, default=1.0,
+                        help='tiempo sin CPU que cada lectura pasa dentro de la sección crítica')
+    parser.add_argument('--perdidas', type=int, default=20, help='réplicas perdidas por ciclo del reparador')
+    parser.add_argument('--persistir', action='store_true', help='guardar los metadatos en disco en cada cambio')
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    archivos_servicio, bloques_servicio, rutas = preparar(args.archivos, args.persistir)
+    print(f"{args.archivos} archivos, {len(bloques_servicio.bloques_metadata)} bloques, "
+          f"latencia en sección crítica {args.latencia_ms} ms, metadatos en {config.NAMENODE_METADATA_DIR}")
+    print(f"{'modo':<16}{'hilos':>6}{'lecturas/s':>13}{'escalado':>10}{'p99 ms':>9}{'reparados':>11}{'ciclos':>8}{'sin réplica':>13}")
+
+    for modo in ('exclusivo', 'lector-escritor'):
+        base = None
+        for hilos in [int(h) for h in args.hilos.split(',')]:
+            r = medir(archivos_servicio, bloques_servicio, rutas, modo, hilos,
+                      args.duracion, args.latencia_ms / 1000, args.perdidas)
+            base = base or r['lecturas_s']
+            print(f"{modo:<16}{hilos:>6}{r['lecturas_s']:>13.0f}{r['lecturas_s'] / base:>9.2f}x"
+                  f"{r['p99_ms']:>9.2f}{r['reparados']:>11}{r['ciclos']:>8}{r['sin_replicas']:>13}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,507 @@
+"""Benchmark de put/get de extremo a extremo sobre un mini-clúster local.
+
+Arranca un NameNode (API/app.py) y N DataNodes gRPC en localhost, con metadatos
+y almacenamiento en directorios temporales, y pasa cargas parametrizadas por el
+cliente (client_cli): tamaño de archivo, tamaño de bloque, clientes
+concurrentes y factor de replicación. Cada combinación de tamaño de bloque y
+replicación usa un clúster nuevo, porque el NameNode los fija al arrancar.
+
+Para cada carga se miden put y get por separado: MB/s agregados, latencia
+p50/p99 por operación, CPU y RSS máximo del NameNode, de los DataNodes y de los
+clientes, y bytes escritos en el disco de los DataNodes. Cada get se compara
+byte a byte (SHA-256) con el archivo subido.
+
+Cada cliente concurrente es un proceso aparte, para que el GIL del harness no
+limite el paralelismo. Se usan los puertos por defecto (REST 8080, heartbeats gRPC
+50050, clientes gRPC 50049, DataNodes 50051+i, métricas 9100+i), así que no debe haber otro clúster
+corriendo en la máquina.
+
+Uso (desde la raíz del repositorio):
+    python benchmarks/rendimiento_cluster.py --tamaños 256K,8M,64M --concurrencia 1,4 --salida antes.json
+    python benchmarks/rendimiento_cluster.py --tamaños 256K,8M,64M --concurrencia 1,4 --salida despues.json \\
+        --comparar antes.json
+"""
+import argparse
+import contextlib
+import datetime
+import hashlib
+import io
+import json
+import os
+import platform
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import psutil
+import requests
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, RAIZ)
+
+from common.config import (default_block_size, default_namenode_port, namenode_grpc_port, namenode_client_grpc_port,
+                           grpc_base_port)
+
+URL_NAMENODE = f"http://localhost:{default_namenode_port}"
+UNIDADES = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+MIB = 1024 * 1024
+
+
+def a_bytes(texto: str) -> int:
+    """'256K', '8M', '1G' o un número de bytes"""
+    texto = texto.strip().upper().rstrip('B')
+    if texto[-1] in UNIDADES:
+        return int(float(texto[:-1]) * UNIDADES[texto[-1]])
+    return int(texto)
+
+
+def legible(num_bytes: int) -> str:
+    for sufijo, factor in (('G', UNIDADES['G']), ('M', UNIDADES['M']), ('K', UNIDADES['K'])):
+        if num_bytes >= factor and num_bytes % factor == 0:
+            return f"{num_bytes // factor}{sufijo}"
+    return str(num_bytes)
+
+
+def preparar_protos(directorio: str) -> str:
+    """Directorio a añadir al PYTHONPATH para importar `protos`; los compila si no están generados"""
+    fuente = os.path.join(RAIZ, 'datanode_grpc')
+    if os.path.exists(os.path.join(fuente, 'protos', 'datanode_pb2.py')):
+        return fuente
+    from grpc_tools import protoc
+    destino = os.path.join(directorio, 'pb')
+    os.makedirs(destino, exist_ok=True)
+    for proto in ('namenode.proto', 'datanode.proto'):
+        codigo = protoc.main(['protoc', f'-I{fuente}', f'--python_out={destino}', f'--grpc_python_out={destino}',
+                              os.path.join(fuente, 'protos', proto)])
+        if codigo != 0:
+            raise RuntimeError(f"No se pudo compilar {proto}")
+    return destino
+
+
+def _arbol(proceso: psutil.Process) -> list:
+    try:
+        return [proceso] + proceso.children(recursive=True)
+    except psutil.NoSuchProcess:
+        return []
+
+
+def _cpu_segundos(procesos: list) -> float:
+    total = 0.0
+    for proceso in procesos:
+        try:
+            tiempos = proceso.cpu_times()
+            total += tiempos.user + tiempos.system
+        except psutil.NoSuchProcess:
+            pass
+    return total
+
+
+def _rss(procesos: list) -> int:
+    total = 0
+    for proceso in procesos:
+        try:
+            total += proceso.memory_info().rss
+        except psutil.NoSuchProcess:
+            pass
+    return total
+
+
+def _bytes_en_disco(directorio: str) -> int:
+    total = 0
+    for raiz, _, archivos in os.walk(directorio):
+        for nombre in archivos:
+            try:
+                total += os.path.getsize(os.path.join(raiz, nombre))
+            except OSError:
+                pass
+    return total
+
+
+class MiniCluster:
+    """NameNode y DataNodes como subprocesos, cada uno con su log en `directorio`"""
+
+    def __init__(self, directorio: str, datanodes: int, tamaño_bloque: int, replicacion: int, pythonpath: str):
+        self.directorio = directorio
+        self.num_datanodes = datanodes
+        self.tamaño_bloque = tamaño_bloque
+        self.replicacion = replicacion
+        self.pythonpath = pythonpath
+        self.namenode = None
+        self.datanodes = []
+        self.almacenes = []
+
+    def __enter__(self):
+        try:
+            self.iniciar()
+        except BaseException:
+            self.detener()
+            raise
+        return self
+
+    def __exit__(self, *_):
+        self.detener()
+
+    def _lanzar(self, nombre: str, cwd: str, entorno: dict) -> subprocess.Popen:
+        log = open(os.path.join(self.directorio, f"{nombre}.log"), 'w')
+        entorno = {**os.environ, 'PYTHONPATH': os.pathsep.join([self.pythonpath, RAIZ]),
+                   'PYTHONUNBUFFERED': '1', **entorno}
+        # Sesión propia para poder terminar el proceso junto con sus hijos
+        return subprocess.Popen([sys.executable, os.path.basename(entorno.pop('_SCRIPT'))], cwd=cwd, env=entorno,
+                                stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+
+    def _esperar(self, condicion, descripcion: str, timeout: float = 30):
+        limite = time.time() + timeout
+        while time.time() < limite:
+            for nombre, proceso in [('namenode', self.namenode)] + [
+                    (f"datanode-{i + 1}", p) for i, p in enumerate(self.datanodes)]:
+                if proceso.poll() is not None:
+                    raise RuntimeError(f"{nombre} terminó al arrancar; ver {self.directorio}/{nombre}.log")
+            try:
+                if condicion():
+                    return
+            except requests.RequestException:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError(f"Tiempo agotado esperando {descripcion}; logs en {self.directorio}")
+
+    def iniciar(self):
+        for puerto in [default_namenode_port, namenode_grpc_port, namenode_client_grpc_port] + [
+                grpc_base_port + i for i in range(1, self.num_datanodes + 1)]:
+            with socket.socket() as s:
+                if s.connect_ex(('localhost', puerto)) == 0:
+                    raise RuntimeError(f"El puerto {puerto} ya está en uso: detén el clúster que lo ocupa")
+
+        self.namenode = self._lanzar('namenode', os.path.join(RAIZ, 'API'), {
+            '_SCRIPT': 'app.py',
+            'NAMENODE_METADATA_DIR': os.path.join(self.directorio, 'namenode'),
+            'DATANODE_PORTS': '',
+            'NAMENODE_DEBUG': 'false',
+            'BLOCK_SIZE': str(self.tamaño_bloque),
+            'REPLICATION_FACTOR': str(self.replicacion),
+        })
+        self._esperar(lambda: requests.get(f"{URL_NAMENODE}/health", timeout=1).ok, 'al NameNode')
+
+        for node_id in range(1, self.num_datanodes + 1):
+            almacen = os.path.join(self.directorio, f"datanode-{node_id}")
+            self.almacenes.append(almacen)
+            self.datanodes.append(self._lanzar(f"datanode-{node_id}", os.path.join(RAIZ, 'datanode_grpc'), {
+                '_SCRIPT': 'server.py',
+                'NODE_ID': str(node_id),
+                'NAMENODE_HOST': 'localhost',
+                'DATANODE_HOST': 'localhost',
+                'STORAGE_DIR': almacen,
+            }))
+
+        def registrados():
+            estado = requests.get(f"{URL_NAMENODE}/status", timeout=1).json()['data']
+            return estado['datanodes_activos'] >= self.num_datanodes
+        self._esperar(registrados, f"el registro de {self.num_datanodes} DataNodes")
+
+    def detener(self):
+        for proceso in [self.namenode] + self.datanodes:
+            if proceso is None or proceso.poll() is not None:
+                continue
+            with contextlib.suppress(ProcessLookupError):
+                os.killpg(proceso.pid, signal.SIGTERM)
+        for proceso in [self.namenode] + self.datanodes:
+            if proceso is None:
+                continue
+            try:
+                proceso.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                with contextlib.suppress(ProcessLookupError):
+                    os.killpg(proceso.pid, signal.SIGKILL)
+                proceso.wait()
+
+    def grupos(self) -> dict:
+        return {
+            'namenode': _arbol(psutil.Process(self.namenode.pid)),
+            'datanodes': [p for d in self.datanodes for p in _arbol(psutil.Process(d.pid))],
+        }
+
+    def bytes_almacenados(self) -> int:
+        return sum(_bytes_en_disco(almacen) for almacen in self.almacenes)
+
+
+class Monitor(threading.Thread):
+    """CPU consumida y RSS máximo de cada grupo de procesos mientras dura una fase"""
+
+    def __init__(self, grupos: dict, intervalo: float = 0.1):
+        super().__init__(daemon=True)
+        self.grupos = grupos
+        self.intervalo = intervalo
+        self.detener = threading.Event()
+        self.cpu_inicial = {nombre: _cpu_segundos(procesos) for nombre, procesos in grupos.items()}
+        self.rss_maximo = {nombre: _rss(procesos) for nombre, procesos in grupos.items()}
+
+    def run(self):
+        while not self.detener.wait(self.intervalo):
+            for nombre, procesos in self.grupos.items():
+                self.rss_maximo[nombre] = max(self.rss_maximo[nombre], _rss(procesos))
+
+    def resumen(self, duracion: float) -> dict:
+        self.detener.set()
+        self.join()
+        resumen = {}
+        for nombre, procesos in self.grupos.items():
+            cpu = _cpu_segundos(procesos) - self.cpu_inicial[nombre]
+            resumen[nombre] = {
+                'cpu_s': round(cpu, 3),
+                'cpu_nucleos': round(cpu / duracion, 2) if duracion else 0.0,
+                'rss_max_mb': round(self.rss_maximo[nombre] / MIB, 1),
+            }
+        return resumen
+
+
+# ================== Procesos cliente ==================
+
+_cliente = {}
+
+
+def _iniciar_cliente(rutas: list, descargas: str, codec: str, grpc: bool):
+    """Inicializador de cada proceso cliente: importa client_cli una sola vez"""
+    for ruta in reversed(rutas):
+        sys.path.insert(0, ruta)
+    os.chdir(descargas)
+    from commands import put, get
+    from services import metadata_client
+    if grpc:
+        metadata_client.use_grpc()
+    _cliente.update(put=put, get=get, codec=codec)
+
+
+def _calentar(segundos: float):
+    time.sleep(segundos)
+
+
+def _operacion(tipo: str, ruta_local: str, digest: str) -> dict:
+    """Un put o un get completo con el cliente; la salida del cliente se descarta salvo para errores"""
+    nombre = os.path.basename(ruta_local)
+    salida = io.StringIO()
+    inicio = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(salida):
+            if tipo == 'put':
+                _cliente['put'].put_file(ruta_local, codec=_cliente['codec'])
+            else:
+                _cliente['get'].run(nombre)
+    except Exception as e:
+        return {'ok': False, 'segundos': time.perf_counter() - inicio, 'error': f"{e.__class__.__name__}: {e}"}
+    segundos = time.perf_counter() - inicio
+
+    texto = salida.getvalue()
+    if tipo == 'put':
+        # put_file informa de los fallos por pantalla sin lanzar excepción
+        ok = 'exitosamente' in texto or 'empaquetado' in texto
+    else:
+        with open(nombre, 'rb') as f:
+            ok = hashlib.file_digest(f, 'sha256').hexdigest() == digest
+        os.remove(nombre)
+        texto = texto if ok else 'contenido distinto del subido'
+    lineas = texto.strip().splitlines()
+    return {'ok': ok, 'segundos': segundos, 'error': None if ok else (lineas[-1] if lineas else 'sin salida')}
+
+
+# ================== Cargas ==================
+
+def _percentil(ordenadas: list, fraccion: float) -> float:
+    return ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * fraccion))] * 1000 if ordenadas else 0.0
+
+
+def _fase(pool, tipo: str, rutas: list, digest: str, tamaño: int, grupos: dict) -> dict:
+    monitor = Monitor(grupos)
+    monitor.start()
+    inicio = time.perf_counter()
+    resultados = [f.result() for f in [pool.submit(_operacion, tipo, ruta, digest) for ruta in rutas]]
+    duracion = time.perf_counter() - inicio
+    recursos = monitor.resumen(duracion)
+
+    latencias = sorted(r['segundos'] for r in resultados if r['ok'])
+    errores = [r['error'] for r in resultados if not r['ok']]
+    return {
+        'operaciones': len(resultados),
+        'errores': len(errores),
+        'primer_error': errores[0] if errores else None,
+        'duracion_s': round(duracion, 3),
+        'mb_s': round(len(latencias) * tamaño / MIB / duracion, 2),
+        'ops_s': round(len(latencias) / duracion, 2),
+        'p50_ms': round(_percentil(latencias, 0.5), 2),
+        'p99_ms': round(_percentil(latencias, 0.99), 2),
+        'max_ms': round(latencias[-1] * 1000, 2) if latencias else 0.0,
+        'recursos': recursos,
+    }
+
+
+def _archivo_origen(directorio: str, tamaño: int) -> tuple:
+    """Archivo de datos aleatorios (incompresibles) de `tamaño` bytes y su SHA-256"""
+    ruta = os.path.join(directorio, f"origen_{tamaño}.bin")
+    digest = hashlib.sha256()
+    with open(ruta, 'wb') as f:
+        restante = tamaño
+        while restante:
+            trozo = os.urandom(min(restante, 4 * MIB))
+            f.write(trozo)
+            digest.update(trozo)
+            restante -= len(trozo)
+    return ruta, digest.hexdigest()
+
+
+def ejecutar_carga(cluster: MiniCluster, args, rutas_cliente: list, directorio: str,
+                   tamaño: int, concurrencia: int) -> dict:
+    clave = (f"archivo={legible(tamaño)} bloque={legible(cluster.tamaño_bloque)} "
+             f"rep={cluster.replicacion} conc={concurrencia}")
+    origen, digest = _archivo_origen(directorio, tamaño)
+    # put usa el nombre del archivo local como ruta en el DFS: un enlace por operación
+    carpeta = os.path.join(directorio, f"carga_{tamaño}_{concurrencia}")
+    descargas = os.path.join(carpeta, 'descargas')
+    os.makedirs(descargas)
+    rutas = []
+    for i in range(args.operaciones):
+        ruta = os.path.join(carpeta, f"bench_{legible(tamaño)}_c{concurrencia}_{i}.bin")
+        os.link(origen, ruta)
+        rutas.append(ruta)
+
+    with ProcessPoolExecutor(max_workers=concurrencia, initializer=_iniciar_cliente,
+                             initargs=(rutas_cliente, descargas, args.codec, args.grpc)) as pool:
+        # Arrancar todos los procesos cliente antes de medir
+        list(pool.map(_calentar, [0.2] * concurrencia))
+        propios = {p.pid for grupo in cluster.grupos().values() for p in grupo}
+        grupos = {**cluster.grupos(),
+                  'clientes': [p for p in psutil.Process().children() if p.pid not in propios]}
+
+        disco_antes = cluster.bytes_almacenados()
+        put = _fase(pool, 'put', rutas, digest, tamaño, grupos)
+        escritos = cluster.bytes_almacenados() - disco_antes
+        get = _fase(pool, 'get', rutas, digest, tamaño, grupos)
+
+    os.remove(origen)
+    shutil.rmtree(carpeta)
+    return {
+        'clave': clave,
+        'tamaño_archivo': tamaño,
+        'tamaño_bloque': cluster.tamaño_bloque,
+        'replicacion': cluster.replicacion,
+        'concurrencia': concurrencia,
+        'datanodes': cluster.num_datanodes,
+        'put': put,
+        'get': get,
+        'disco_escrito_bytes': escritos,
+        # Bytes en disco por byte lógico subido: ~ factor de replicación (+ cabeceras)
+        'amplificacion_escritura': round(escritos / (tamaño * (args.operaciones - put['errores'])), 3)
+        if put['errores'] < args.operaciones else None,
+    }
+
+
+def _fila(carga: dict) -> str:
+    put, get = carga['put'], carga['get']
+    return (f"{carga['clave']:<40}{put['mb_s']:>9.1f}{put['p50_ms']:>9.1f}{put['p99_ms']:>9.1f}"
+            f"{get['mb_s']:>9.1f}{get['p50_ms']:>9.1f}{get['p99_ms']:>9.1f}"
+            f"{put['recursos']['namenode']['cpu_s']:>8.2f}{put['recursos']['datanodes']['cpu_s']:>8.2f}"
+            f"{put['errores'] + get['errores']:>6}")
+
+
+def comparar(actual: dict, ruta_base: str):
+    """Diferencias de MB/s y p99 respecto a una ejecución anterior, carga a carga"""
+    with open(ruta_base) as f:
+        anterior = json.load(f)
+    base = {c['clave']: c for c in anterior['cargas']}
+    print(f"\nComparación con {ruta_base} (commit {anterior.get('commit')}, {anterior.get('fecha')}):")
+    print(f"{'carga':<40}{'put MB/s':>14}{'put p99':>12}{'get MB/s':>14}{'get p99':>12}")
+
+    def delta(nuevo, viejo):
+        return f"{(nuevo - viejo) / viejo * 100:+.1f}%" if viejo else 'n/a'
+
+    for carga in actual['cargas']:
+        previa = base.get(carga['clave'])
+        if not previa:
+            print(f"{carga['clave']:<40}  (sin carga equivalente en la base)")
+            continue
+        columnas = []
+        for fase in ('put', 'get'):
+            columnas.append(f"{delta(carga[fase]['mb_s'], previa[fase]['mb_s']):>14}")
+            columnas.append(f"{delta(carga[fase]['p99_ms'], previa[fase]['p99_ms']):>12}")
+        print(f"{carga['clave']:<40}{''.join(columnas)}")
+
+
+def _commit() -> str:
+    try:
+        # '-dirty' distingue una medición con cambios sin commitear de la del commit base
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=RAIZ, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--datanodes', type=int, default=3)
+    parser.add_argument('--tamaños', default='256K,8M,64M', help='tamaños de archivo, separados por comas')
+    parser.add_argument('--bloques', default='64M', help='tamaños de bloque del NameNode, separados por comas')
+    parser.add_argument('--replicacion', default='2', help='factores de replicación, separados por comas')
+    parser.add_argument('--concurrencia', default='1,4', help='clientes simultáneos, separados por comas')
+    parser.add_argument('--operaciones', type=int, default=8, help='puts (y luego gets) por carga')
+    parser.add_argument('--codec', default='none', help='compresión de los bloques en el cliente')
+    parser.add_argument('--grpc', action='store_true', help='metadatos por el protocolo gRPC del NameNode')
+    parser.add_argument('--salida', default=f"rendimiento_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    parser.add_argument('--comparar', help='JSON de una ejecución anterior con el que comparar')
+    parser.add_argument('--conservar', action='store_true', help='no borrar el directorio temporal (logs)')
+    args = parser.parse_args()
+
+    tamaños = [a_bytes(t) for t in args.tamaños.split(',')]
+    bloques = [a_bytes(b) for b in args.bloques.split(',')]
+    replicaciones = [int(r) for r in args.replicacion.split(',')]
+    concurrencias = [int(c) for c in args.concurrencia.split(',')]
+    if max(replicaciones) > args.datanodes:
+        parser.error(f"replicación {max(replicaciones)} con solo {args.datanodes} DataNodes")
+    if max(bloques) > default_block_size:
+        parser.error(f"los DataNodes aceptan mensajes de hasta {legible(default_block_size)} por bloque")
+
+    directorio = tempfile.mkdtemp(prefix='rendimiento_cluster_')
+    pythonpath = preparar_protos(directorio)
+    rutas_cliente = [os.path.join(RAIZ, 'client_cli'), RAIZ, pythonpath]
+    resultado = {
+        'fecha': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': _commit(),
+        'maquina': {'cpus': os.cpu_count(), 'memoria_gb': round(psutil.virtual_memory().total / 1024 ** 3, 1),
+                    'python': platform.python_version(), 'plataforma': platform.platform()},
+        'parametros': vars(args),
+        'cargas': [],
+    }
+
+    print(f"{args.datanodes} DataNodes, {args.operaciones} operaciones por carga; logs en {directorio}")
+    print(f"{'carga':<40}{'put MB/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'get MB/s':>9}{'p50 ms':>9}{'p99 ms':>9}"
+          f"{'NN cpu':>8}{'DN cpu':>8}{'err':>6}")
+    try:
+        for tamaño_bloque in bloques:
+            for replicacion in replicaciones:
+                subdirectorio = os.path.join(directorio, f"cluster_{legible(tamaño_bloque)}_r{replicacion}")
+                os.makedirs(subdirectorio)
+                with MiniCluster(subdirectorio, args.datanodes, tamaño_bloque, replicacion, pythonpath) as cluster:
+                    for tamaño in tamaños:
+                        for concurrencia in concurrencias:
+                            carga = ejecutar_carga(cluster, args, rutas_cliente, subdirectorio,
+                                                   tamaño, concurrencia)
+                            resultado['cargas'].append(carga)
+                            print(_fila(carga))
+    finally:
+        with open(args.salida, 'w') as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+        print(f"Resultados en {args.salida}")
+        if not args.conservar:
+            shutil.rmtree(directorio, ignore_errors=True)
+
+    errores = [c for c in resultado['cargas'] if c['put']['errores'] or c['get']['errores']]
+    for carga in errores:
+        print(f"⚠️  {carga['clave']}: {carga['put']['primer_error'] or carga['get']['primer_error']}")
+    if args.comparar:
+        comparar(resultado, args.comparar)
+
+
+if __name__ == '__main__':
+    main()
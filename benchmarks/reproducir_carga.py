@@ -0,0 +1,243 @@
+"""Reproduce contra un NameNode nuevo una carga de metadatos grabada.
+
+El NameNode graba su carga (REST y gRPC) si arranca con
+WORKLOAD_RECORD_FILE=<archivo.jsonl>; ver API/servicios/grabador_carga.py.
+Este script la reproduce, por defecto contra un clúster local nuevo (NameNode
+con metadatos temporales y --datanodes DataNodes reales, lanzado con el harness
+de rendimiento_cluster), y mide throughput y latencia por operación.
+
+  --velocidad 1    respeta los tiempos grabados
+  --velocidad 4    los comprime 4 veces
+  --velocidad 0    lo más rápido posible, con --concurrencia peticiones a la vez
+
+Con velocidad > 0 cada petición sale en su instante aunque el NameNode vaya
+atrasado (lazo abierto, como en producción) y el retraso respecto al instante
+programado se informa aparte. Los IDs de bloque grabados se traducen a los que
+asigna el NameNode nuevo, así que las confirmaciones y consultas posteriores
+apuntan a sus bloques; con --velocidad 0 y concurrencia > 1 una operación puede
+adelantarse a la que crea lo que usa. Se informa cuántas respuestas tienen un
+código distinto del grabado. Se omiten las subidas con cuerpo binario y, salvo
+--incluir-datanodes, las llamadas de los DataNodes (los del clúster ya las
+hacen). Todas las peticiones usan las credenciales --usuario/--password.
+
+Uso (desde la raíz del repositorio):
+    cd API && WORKLOAD_RECORD_FILE=/tmp/carga.jsonl python app.py
+    python benchmarks/reproducir_carga.py /tmp/carga.jsonl --velocidad 0 --concurrencia 16 --salida replay.json
+"""
+import argparse
+import base64
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import grpc
+import requests
+from google.protobuf.json_format import MessageToDict, ParseDict
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from rendimiento_cluster import RAIZ, URL_NAMENODE, MiniCluster, a_bytes, preparar_protos
+from common.config import default_usuario, default_password, namenode_grpc_address
+
+# El NameNode lanzado (y los servicios importados aquí) no deben grabar sobre la traza que se reproduce
+os.environ.pop('WORKLOAD_RECORD_FILE', None)
+sys.path.insert(0, os.path.join(RAIZ, 'API'))
+
+from servicios.grabador_carga import ids_de_bloque
+
+UUID = re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}')
+
+
+def cargar_traza(ruta: str, incluir_datanodes: bool) -> tuple:
+    """Entradas reproducibles ordenadas por instante, y cuántas se omiten y por qué"""
+    entradas, omitidas = [], Counter()
+    with open(ruta) as f:
+        for linea in f:
+            try:
+                entrada = json.loads(linea)
+            except json.JSONDecodeError:
+                omitidas['línea incompleta'] += 1
+                continue
+            if 'bytes_cuerpo' in entrada:
+                omitidas['cuerpo binario'] += 1
+            elif entrada.get('ruta', '').startswith('/datanodes/') and not incluir_datanodes:
+                omitidas['llamada de DataNode'] += 1
+            else:
+                entradas.append(entrada)
+    entradas.sort(key=lambda e: e['ts'])
+    return entradas, omitidas
+
+
+class Reproductor:
+    """Envía entradas de la traza al NameNode, traduciendo los IDs de bloque grabados"""
+
+    def __init__(self, url: str, direccion_grpc: str, usuario: str, password: str, timeout: float):
+        self.url = url
+        self.direccion_grpc = direccion_grpc
+        self.auth = (usuario, password)
+        token = base64.b64encode(f"{usuario}:{password}".encode()).decode()
+        self.metadata_grpc = (('authorization', f"Basic {token}"),)
+        self.timeout = timeout
+        self.ids = {}  # ID grabado -> ID asignado en la reproducción
+        self._local = threading.local()
+
+    def _traducir_texto(self, texto: str) -> str:
+        return UUID.sub(lambda m: self.ids.get(m.group(0), m.group(0)), texto) if self.ids else texto
+
+    def _traducir(self, valor):
+        return json.loads(self._traducir_texto(json.dumps(valor))) if self.ids else valor
+
+    def _rest(self, entrada: dict) -> tuple:
+        sesion = getattr(self._local, 'sesion', None)
+        if sesion is None:
+            sesion = self._local.sesion = requests.Session()
+            sesion.auth = self.auth
+        url = self.url + self._traducir_texto(entrada['ruta'])
+        if entrada.get('query'):
+            url += '?' + self._traducir_texto(entrada['query'])
+        kwargs = {'json': self._traducir(entrada['json'])} if entrada.get('json') is not None else {}
+        response = sesion.request(entrada['metodo'], url, timeout=self.timeout, **kwargs)
+        cuerpo = response.json() if response.headers.get('Content-Type', '').startswith('application/json') else None
+        return response.status_code, cuerpo
+
+    def _grpc(self, entrada: dict) -> tuple:
+        import protos.namenode_pb2 as namenode_pb2
+        import protos.namenode_pb2_grpc as namenode_pb2_grpc
+        stub = getattr(self._local, 'stub', None)
+        if stub is None:
+            stub = self._local.stub = namenode_pb2_grpc.ClientProtocolStub(grpc.insecure_channel(self.direccion_grpc))
+        mensaje = ParseDict(self._traducir(entrada['mensaje']), getattr(namenode_pb2, entrada['tipo_mensaje'])())
+        try:
+            respuesta = getattr(stub, entrada['metodo'])(mensaje, metadata=self.metadata_grpc, timeout=self.timeout)
+        except grpc.RpcError as e:
+            return e.code().name, None
+        return 'OK', MessageToDict(respuesta, preserving_proto_field_name=True)
+
+    def ejecutar(self, entrada: dict, programado: float, origen: float) -> dict:
+        retraso = time.perf_counter() - origen - programado if programado is not None else 0.0
+        inicio = time.perf_counter()
+        try:
+            estado, cuerpo = self._grpc(entrada) if entrada['protocolo'] == 'grpc' else self._rest(entrada)
+        except requests.RequestException as e:
+            estado, cuerpo = e.__class__.__name__, None
+        latencia = time.perf_counter() - inicio
+        if cuerpo is not None and entrada.get('ids_respuesta'):
+            self.ids.update(zip(entrada['ids_respuesta'], ids_de_bloque(cuerpo)))
+        exito = estado == 'OK' or (isinstance(estado, int) and estado < 400)
+        return {'operacion': entrada['operacion'], 'estado': estado, 'exito': exito,
+                'coincide': estado == entrada['estado'], 'latencia': latencia, 'retraso': max(0.0, retraso),
+                'latencia_grabada': entrada['duracion_ms'] / 1000}
+
+
+def reproducir(entradas: list, reproductor: Reproductor, velocidad: float, concurrencia: int) -> tuple:
+    """Resultados por entrada y duración total de la reproducción"""
+    origen_traza = entradas[0]['ts']
+    futuros = []
+    with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+        origen = time.perf_counter()
+        for entrada in entradas:
+            programado = None
+            if velocidad:
+                programado = (entrada['ts'] - origen_traza) / velocidad
+                espera = programado - (time.perf_counter() - origen)
+                if espera > 0:
+                    time.sleep(espera)
+            futuros.append(pool.submit(reproductor.ejecutar, entrada, programado, origen))
+        resultados = [f.result() for f in futuros]
+    return resultados, time.perf_counter() - origen
+
+
+def _percentil(ordenadas: list, fraccion: float) -> float:
+    return round(ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * fraccion))] * 1000, 2) if ordenadas else 0.0
+
+
+def resumir(resultados: list) -> dict:
+    latencias = sorted(r['latencia'] for r in resultados)
+    grabadas = sorted(r['latencia_grabada'] for r in resultados)
+    return {
+        'operaciones': len(resultados),
+        'errores': sum(1 for r in resultados if not r['exito']),
+        'codigo_distinto': sum(1 for r in resultados if not r['coincide']),
+        'p50_ms': _percentil(latencias, 0.5),
+        'p99_ms': _percentil(latencias, 0.99),
+        'grabado_p50_ms': _percentil(grabadas, 0.5),
+        'grabado_p99_ms': _percentil(grabadas, 0.99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('traza', help='JSONL grabado con WORKLOAD_RECORD_FILE')
+    parser.add_argument('--velocidad', type=float, default=1.0, help='factor sobre el tiempo real (0: sin esperas)')
+    parser.add_argument('--concurrencia', type=int, default=64, help='peticiones simultáneas como máximo')
+    parser.add_argument('--namenode', help=f"URL de un NameNode ya en marcha (p. ej. {URL_NAMENODE}); "
+                                           f"sin ella se lanza un clúster local nuevo")
+    parser.add_argument('--namenode-grpc', default=namenode_grpc_address, help='dirección gRPC del NameNode')
+    parser.add_argument('--datanodes', type=int, default=3, help='DataNodes del clúster lanzado')
+    parser.add_argument('--bloque', default='64M', help='tamaño de bloque del NameNode lanzado')
+    parser.add_argument('--replicacion', type=int, default=2, help='factor de replicación del NameNode lanzado')
+    parser.add_argument('--incluir-datanodes', action='store_true', help='reproducir también /datanodes/*')
+    parser.add_argument('--usuario', default=default_usuario)
+    parser.add_argument('--password', default=default_password)
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--salida', help='JSON con los resultados')
+    args = parser.parse_args()
+
+    entradas, omitidas = cargar_traza(args.traza, args.incluir_datanodes)
+    if not entradas:
+        parser.error(f"{args.traza} no tiene entradas reproducibles")
+    duracion_grabada = entradas[-1]['ts'] - entradas[0]['ts']
+    print(f"{len(entradas)} entradas en {duracion_grabada:.1f} s grabados"
+          + (f"; omitidas: {dict(omitidas)}" if omitidas else ''))
+
+    directorio = tempfile.mkdtemp(prefix='reproducir_carga_')
+    try:
+        pythonpath = preparar_protos(directorio)
+        sys.path.insert(0, pythonpath)
+        if args.namenode:
+            reproductor = Reproductor(args.namenode, args.namenode_grpc, args.usuario, args.password, args.timeout)
+            resultados, duracion = reproducir(entradas, reproductor, args.velocidad, args.concurrencia)
+        else:
+            with MiniCluster(directorio, args.datanodes, a_bytes(args.bloque), args.replicacion, pythonpath):
+                reproductor = Reproductor(URL_NAMENODE, args.namenode_grpc, args.usuario, args.password,
+                                          args.timeout)
+                resultados, duracion = reproducir(entradas, reproductor, args.velocidad, args.concurrencia)
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+    por_operacion = defaultdict(list)
+    for resultado in resultados:
+        por_operacion[resultado['operacion']].append(resultado)
+    total = resumir(resultados)
+    retrasos = sorted(r['retraso'] for r in resultados)
+    total.update({'duracion_s': round(duracion, 2), 'ops_s': round(len(resultados) / duracion, 1),
+                  'retraso_p99_ms': _percentil(retrasos, 0.99)})
+
+    modo = f"{args.velocidad:g}x" if args.velocidad else 'máxima velocidad'
+    print(f"Reproducción a {modo}: {total['operaciones']} operaciones en {total['duracion_s']} s "
+          f"({total['ops_s']} ops/s), {total['errores']} errores, {total['codigo_distinto']} con código "
+          f"distinto del grabado, retraso p99 {total['retraso_p99_ms']} ms")
+    print(f"{'operación':<40}{'n':>7}{'err':>6}{'dist':>6}{'p50 ms':>9}{'p99 ms':>9}{'grab p50':>10}{'grab p99':>10}")
+    operaciones = {}
+    for operacion, lista in sorted(por_operacion.items(), key=lambda item: -len(item[1])):
+        s = operaciones[operacion] = resumir(lista)
+        print(f"{operacion:<40}{s['operaciones']:>7}{s['errores']:>6}{s['codigo_distinto']:>6}{s['p50_ms']:>9.2f}"
+              f"{s['p99_ms']:>9.2f}{s['grabado_p50_ms']:>10.2f}{s['grabado_p99_ms']:>10.2f}")
+
+    if args.salida:
+        with open(args.salida, 'w') as f:
+            json.dump({'parametros': vars(args), 'traza': {'entradas': len(entradas), 'omitidas': dict(omitidas),
+                                                           'duracion_s': duracion_grabada},
+                       'total': total, 'operaciones': operaciones}, f, indent=2, ensure_ascii=False)
+        print(f"Resultados en {args.salida}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+import os
+import threading
+from services import metadata_client
+from services.rest_client import open_append, renew_append, complete_append, abandon_append
+from services.grpc_client import send_block
+from commands.put import upload_block
+from common.config import default_codec
+
+
+class _LeaseRenewer(threading.Thread):
+    """Renueva la concesión de escritura en segundo plano mientras dura el anexado."""
+
+    def __init__(self, lease_id: str, duration: float):
+        super().__init__(daemon=True)
+        self.lease_id = lease_id
+        self.interval = max(1.0, duration / 3)
+        self.stopped = threading.Event()
+        self.lost = False
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            if not renew_append(self.lease_id):
+                self.lost = True
+                return
+
+    def stop(self):
+        self.stopped.set()
+
+
+def _fill_last_block(f, last: dict) -> str:
+    """Escribe el relleno del último bloque en cada réplica; retorna el checksum que devuelven."""
+    data = f.read(last["longitud"])
+    checksums = set()
+    for host, port in last["ubicaciones"]:
+        response = send_block(f"{host}:{port}", last["bloque_id"], data, "", offset=last["offset"])
+        if response is None:
+            raise IOError(f"La réplica {host}:{port} no aceptó el relleno del bloque {last['bloque_id']}")
+        checksums.add(response.checksum)
+    if len(checksums) != 1:
+        raise IOError(f"Las réplicas del bloque {last['bloque_id']} difieren tras el relleno")
+    print(f"Bloque {last['bloque_id']} rellenado con {len(data)} bytes desde el offset {last['offset']}")
+    return checksums.pop()
+
+
+def run(filepath: str, path: str = None, codec: str = default_codec):
+    """Anexa el contenido de `filepath` al final del archivo `path` del sistema."""
+    if not os.path.exists(filepath):
+        print(f"Archivo no encontrado: {filepath}")
+        return
+    path = path or os.path.basename(filepath)
+    size = os.path.getsize(filepath)
+    print(f"Ejecutando APPEND: {filepath} -> {path} ({size} bytes)")
+    if size == 0:
+        print("Nada que anexar.")
+        return
+
+    plan = open_append(path, size)
+    if not plan:
+        print("No se obtuvo la concesión de escritura")
+        return
+
+    renewer = _LeaseRenewer(plan["concesion_id"], plan["duracion"])
+    renewer.start()
+    try:
+        with open(filepath, 'rb') as f:
+            # Primero el hueco del último bloque, después los bloques nuevos en orden
+            last_checksum = _fill_last_block(f, plan["ultimo"]) if plan["ultimo"] else None
+            for block in plan["bloques"]:
+                if not upload_block(f, block, codec):
+                    raise IOError(f"El bloque {block['bloque_id']} no llegó a todas sus réplicas")
+    except Exception as e:
+        renewer.stop()
+        abandon_append(plan["concesion_id"])
+        print(f"Anexado abandonado: {e}")
+        return
+    renewer.stop()
+
+    archivo = complete_append(plan["concesion_id"], last_checksum)
+    metadata_client.invalidate(path)
+    if not archivo:
+        if renewer.lost:
+            print("La concesión caducó durante el anexado")
+        print("Fallo al completar el anexado")
+        return
+    print(f"Anexado completado: {archivo['ruta']} ocupa {archivo['tamaño_total']} bytes.")
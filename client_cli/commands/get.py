@@ -1,12 +1,92 @@
-from services import rest_client, grpc_client
+import grpc
+from services import metadata_client, grpc_client
 from utils import file_utils
+from common.utils import erasure
+from common.utils.byte_ranges import covering_blocks
 
-def run(filename):
-    print(f"Ejecutando GET: {filename}")
-    block_list = rest_client.get_file_blocks(filename)
+# Códigos de un DataNode que indican ubicaciones obsoletas: ya no tiene el bloque o ya no está
+STALE_LOCATION_CODES = (grpc.StatusCode.NOT_FOUND, grpc.StatusCode.UNAVAILABLE)
+
+
+def _read_replicated(block, stale):
+    """Lee el bloque (o su rango, si es un archivo empaquetado) de la primera réplica que responda.
+    Se descarta lo que haya más allá del tamaño confirmado (un anexado en curso o abandonado)."""
+    if block.get('longitud') == 0:
+        return b''
+    for host, port in block['ubicaciones']:
+        try:
+            data = grpc_client.get_block(f"{host}:{port}", block['bloque_id'],
+                                         offset=block.get('offset', 0), length=block.get('longitud', 0))
+            return data[:block['tamaño']]
+        except grpc.RpcError as e:
+            print(f"Réplica {host}:{port} no disponible para {block['bloque_id']}: {e.code()}")
+            if e.code() in STALE_LOCATION_CODES:
+                stale.add(block['bloque_id'])
+    raise Exception(f"No hay réplicas disponibles para el bloque {block['bloque_id']}")
+
+
+def _read_erasure_coded(block, stale):
+    """Lectura degradada: basta con k celdas cualesquiera para reconstruir el bloque."""
+    k, m = block['ec_k'], block['ec_m']
+    cells = {}
+    for index, (host, port) in enumerate(block['ubicaciones']):
+        if len(cells) == k:
+            break
+        cell_id = f"{block['bloque_id']}_c{index}"
+        try:
+            cells[index] = grpc_client.get_block(f"{host}:{port}", cell_id)
+        except grpc.RpcError as e:
+            print(f"Celda {cell_id} no disponible en {host}:{port}: {e.code()}")
+            if e.code() in STALE_LOCATION_CODES:
+                stale.add(block['bloque_id'])
+    if len(cells) < k:
+        raise Exception(f"Bloque {block['bloque_id']} irrecuperable: {len(cells)}/{k} celdas")
+    if any(index >= k for index in cells):
+        print(f"Reconstruyendo bloque {block['bloque_id']} a partir de paridad")
+    return erasure.decode(cells, k, m, block['tamaño'])
+
+
+def _read_blocks(block_list, stale):
     blocks = []
     for block in block_list:
-        data = grpc_client.get_block(block['leader'], filename, block['index'])
+        if block.get('ec_k'):
+            data = _read_erasure_coded(block, stale)
+            if 'longitud' in block:
+                data = data[block['offset']:block['offset'] + block['longitud']]
+        else:
+            data = _read_replicated(block, stale)
         blocks.append(data)
-    file_utils.merge_blocks(blocks, filename)
-    print("Archivo descargado exitosamente.")
\ No newline at end of file
+    return blocks
+
+
+def _locate(filename, offset, length):
+    """Bloques a leer: todos, o solo la parte de cada uno que cae en el rango pedido."""
+    block_list = metadata_client.get_file_blocks(filename)
+    if offset is None and length is None:
+        return block_list
+    return covering_blocks(block_list, offset or 0, length)
+
+
+def run(filename, offset=None, length=None):
+    ranged = offset is not None or length is not None
+    print(f"Ejecutando GET: {filename}" + (f" (offset {offset or 0}, longitud {length or 'hasta el final'})"
+                                           if ranged else ""))
+    stale = set()
+    try:
+        blocks = _read_blocks(_locate(filename, offset, length), stale)
+    except Exception:
+        if not stale:
+            raise
+        blocks = None
+    if stale:
+        # Las ubicaciones (quizá de la caché) están obsoletas: se olvidan y, si faltó algún
+        # bloque, se vuelven a pedir al NameNode una vez
+        metadata_client.invalidate(filename)
+        if blocks is None:
+            print("Ubicaciones obsoletas; se vuelven a pedir al NameNode")
+            blocks = _read_blocks(_locate(filename, offset, length), set())
+    file_utils.merge_blocks(blocks, file_utils.get_filename(filename))
+    if ranged:
+        print(f"Rango descargado: {sum(len(b) for b in blocks)} bytes.")
+    else:
+        print("Archivo descargado exitosamente.")
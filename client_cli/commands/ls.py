@@ -1,7 +1,12 @@
-from services import rest_client
+from services import metadata_client
 
-def run():
-    print("Ejecutando LS")
-    items = rest_client.list_directory()
-    for item in items:
-        print(item)
\ No newline at end of file
+def run(path="/", limit=None, order=None, fields=None):
+    print(f"Ejecutando LS: {path}")
+    # Las entradas se imprimen según llegan las páginas, sin cargar el directorio completo
+    for item in metadata_client.iter_directory(path, limit, order, fields):
+        if fields:
+            print("\t".join(str(item.get(field, "")) for field in fields))
+        elif item["tipo"] == "directorio":
+            print(f"{item['nombre']}/")
+        else:
+            print(f"{item['nombre']}\t{item['tamaño']}")
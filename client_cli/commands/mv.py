@@ -0,0 +1,9 @@
+from services import metadata_client
+
+def run(source, destination):
+    print(f"Ejecutando MV: {source} -> {destination}")
+    result = metadata_client.rename(source, destination)
+    if not result.get("success"):
+        print(f"Error: {result.get('error')}")
+        return
+    print("Movido exitosamente.")
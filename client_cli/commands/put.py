@@ -1,58 +1,246 @@
 import os
-import math
-import uuid
-from services.rest_client import register_file
+from services import metadata_client
+from services.rest_client import (abandon_small_file, confirm_small_file, query_digests, register_file_dedup,
+                                  register_file_ec, register_small_file, upload_stream)
 from services.grpc_client import send_block
 from common.utils.hashing import calculate_checksum
-from common.config import default_block_size
+from common.utils.compression import compress_block
+from common.utils import erasure, tracing
+from common.config import default_block_size, default_codec, small_file_threshold
 
 
-def put_file(filepath: str):
+def put_file(filepath: str, codec: str = default_codec, dedup: bool = False, ec: bool = False,
+             stream: bool = False, ec_k: int = None, ec_m: int = None) -> bool:
+    """Sube un archivo en el modo pedido; retorna False si el archivo no quedó guardado"""
     if not os.path.exists(filepath):
         print(f"Archivo no encontrado: {filepath}")
-        return
+        return False
+
+    # Solo la subida por bloques tiene equivalente en el protocolo gRPC de clientes
+    if metadata_client.protocol() == "grpc" and (stream or ec or dedup
+                                                  or os.path.getsize(filepath) < small_file_threshold):
+        print("Aviso: este modo de subida solo existe en la API REST; se usará REST en lugar de gRPC")
+
+    if stream:
+        return put_file_stream(filepath)
+    if ec:
+        return put_file_ec(filepath, ec_k, ec_m)
+    # --dedup se respeta también en archivos pequeños: empaquetarlos lo ignoraría sin avisar
+    if dedup:
+        return put_file_dedup(filepath, codec)
+    if os.path.getsize(filepath) < small_file_threshold:
+        return put_small_file(filepath)
 
     file_size = os.path.getsize(filepath)
     file_name = os.path.basename(filepath)
 
-    block_ids = []
-    blocks_data = {}
+    print("Abriendo subida en el NameNode...")
+    with tracing.span('allocate', size=file_size):
+        session = metadata_client.open_upload(file_name, file_size)
+
+    if not session:
+        print("Fallo al registrar archivo en NameNode")
+        return False
+    if session["reanudada"]:
+        print(f"Reanudando subida: {session['confirmados']}/{len(session['bloques'])} bloques ya confirmados")
 
+    print("Enviando bloques a los DataNodes...")
     with open(filepath, 'rb') as f:
-        num_blocks = math.ceil(file_size / default_block_size)
-        for i in range(num_blocks):
-            data = f.read(default_block_size)
-            block_id = str(uuid.uuid4())
+        failed = upload_missing_blocks(f, session["bloques"], codec)
+        if not failed:
+            # Se reenvía lo que al NameNode no le consta (por ejemplo, una confirmación que se perdió)
+            status = metadata_client.upload_status(session["sesion_id"])
+            failed = (upload_missing_blocks(f, status["bloques"], codec, verify=False) if status
+                      else len(session["bloques"]))
+
+    if failed:
+        print(f"Subida interrumpida: {failed} bloques sin confirmar. "
+              f"Vuelva a ejecutar put con el mismo archivo para reanudarla.")
+        return False
+
+    archivo = metadata_client.complete_upload(session["sesion_id"])
+    metadata_client.invalidate(file_name)
+    if not archivo:
+        print("Fallo al completar la subida")
+        return False
+    print("Archivo cargado exitosamente.")
+    return True
+
+
+def upload_missing_blocks(f, blocks: list, codec: str = default_codec, verify: bool = True) -> int:
+    """Envía los bloques de una subida que el NameNode no tiene confirmados o, con `verify`, que se
+    confirmaron con otro contenido (el archivo local cambió). Retorna cuántos no se pudieron confirmar."""
+    failed = skipped = 0
+    offset = 0
+    for block in blocks:
+        # Los bloques llegan en orden y con el tamaño que fijó el NameNode
+        f.seek(offset)
+        offset += block["tamaño"]
+        if block["confirmado"]:
+            if not verify or calculate_checksum(f.read(block["tamaño"])) == block["confirmado"]:
+                skipped += 1
+                continue
+            print(f"Bloque {block['bloque_id']} confirmado con otro contenido; se reenvía")
+            f.seek(offset - block["tamaño"])
+        if not upload_block(f, block, codec):
+            failed += 1
+    if skipped and verify:
+        print(f"{skipped} bloques ya confirmados no se reenvían")
+    return failed
+
+
+def upload_block(f, block: dict, codec: str = default_codec) -> bool:
+    """Lee el bloque de `f`, lo envía a sus réplicas y, si todas lo aceptaron, lo confirma al NameNode.
+    Retorna False si alguna réplica no lo aceptó o la confirmación no llegó."""
+    with tracing.span('block', block_id=block["bloque_id"], position=block["posicion"]):
+        with tracing.span('read_file', bytes=block["tamaño"]):
+            data = f.read(block["tamaño"])
+        with tracing.span('checksum', bytes=len(data)):
             checksum = calculate_checksum(data)
+        # Se omite la compresión si el bloque no comprime lo suficiente
+        with tracing.span('compress', codec=codec) as attributes:
+            payload, block_codec = compress_block(data, codec)
+            attributes['stored_bytes'] = len(payload)
+        datanodes = [f"{host}:{port}" for host, port in block["ubicaciones"]]
+
+        stored = [send_block(node_address, block["bloque_id"], payload, checksum,
+                             codec=block_codec, raw_size=len(data)) for node_address in datanodes]
+        if not all(stored):
+            print(f"Bloque {block['bloque_id']} no llegó a todas sus réplicas {datanodes}")
+            return False
+        with tracing.span('confirm'):
+            confirmed = metadata_client.confirm_block(block["bloque_id"], checksum, block_codec, len(payload))
+    print(f"Bloque {block['bloque_id']} enviado a {datanodes} ({block_codec}, "
+          f"{len(payload)}/{len(data)} bytes)")
+    return confirmed
+
 
-            block_ids.append(block_id)
-            blocks_data[block_id] = {
-                "data": data,
-                "checksum": checksum,
-                "sequence": i,
-                "size": len(data)
-            }
+def put_file_dedup(filepath: str, codec: str = default_codec) -> bool:
+    """Sube solo los bloques cuyo contenido no está ya en el sistema."""
+    file_name = os.path.basename(filepath)
+
+    # Primera pasada: solo digests, sin retener los datos en memoria
+    blocks = []
+    with open(filepath, 'rb') as f:
+        while data := f.read(default_block_size):
+            blocks.append({"digest": calculate_checksum(data), "tamaño": len(data)})
+
+    existing = query_digests([b["digest"] for b in blocks])
+    if existing is not None:
+        print(f"{len(existing['existentes'])}/{len(blocks)} bloques ya existen en el sistema")
 
     print("Registrando archivo en NameNode...")
-    response = register_file(file_name, file_size, block_ids)
+    response = register_file_dedup(file_name, blocks)
+    if not response:
+        print("Fallo al registrar archivo en NameNode")
+        return False
+    metadata_client.invalidate(file_name)
+
+    sent_bytes = 0
+    with open(filepath, 'rb') as f:
+        for sequence, block in enumerate(response["bloques"]):
+            if not block["nuevo"]:
+                continue
+            f.seek(sequence * default_block_size)
+            data = f.read(default_block_size)
+            payload, block_codec = compress_block(data, codec)
+            datanodes = [f"{host}:{port}" for host, port in block["ubicaciones"]]
+
+            stored = [send_block(node_address, block["bloque_id"], payload, block["digest"],
+                                 codec=block_codec, raw_size=len(data)) for node_address in datanodes]
+            if not all(stored) or not metadata_client.confirm_block(block["bloque_id"], block["digest"],
+                                                                    block_codec, len(payload)):
+                # Un archivo con bloques vacíos no debe quedar visible ni prestarle sus bloques a otros
+                print(f"Bloque {block['bloque_id']} no llegó a todas sus réplicas {datanodes}. "
+                      f"Se elimina {file_name}")
+                metadata_client.delete_file(file_name)
+                return False
+            sent_bytes += len(payload)
+
+    nuevos = sum(1 for b in response["bloques"] if b["nuevo"])
+    print(f"Archivo cargado exitosamente: {nuevos} bloques nuevos, "
+          f"{len(blocks) - nuevos} deduplicados, {sent_bytes} bytes enviados.")
+    return True
+
+
+def put_file_ec(filepath: str, k: int = None, m: int = None) -> bool:
+    """Sube un archivo con codificación por borrado: k celdas de datos + m de paridad.
+    Si algún grupo queda con menos de k celdas guardadas no se puede reconstruir: se borra el archivo."""
+    file_size = os.path.getsize(filepath)
+    file_name = os.path.basename(filepath)
 
+    print("Registrando archivo (EC) en NameNode...")
+    response = register_file_ec(file_name, file_size, k, m)
     if not response:
         print("Fallo al registrar archivo en NameNode")
-        return
+        return False
+    metadata_client.invalidate(file_name)
 
-    print("Enviando bloques a los DataNodes...")
-    for block in response["blocks"]:
-        block_id = block["block_id"]
-        datanodes = block["datanodes"]
-        block_data = blocks_data[block_id]
-
-        for node_address in datanodes:
-            send_block(
-                node_address,
-                block_id,
-                block_data["data"],
-                block_data["checksum"]
-            )
-        print(f"Bloque {block_id} enviado a {datanodes}")
+    with open(filepath, 'rb') as f:
+        offset = 0
+        for block in response["bloques"]:
+            # Los grupos llegan en orden y con el tamaño que fijó el NameNode
+            f.seek(offset)
+            offset += block["tamaño"]
+            data = f.read(block["tamaño"])
+            cells = erasure.encode(data, block["ec_k"], block["ec_m"])
+
+            stored = 0
+            for index, (host, port) in enumerate(block["ubicaciones"]):
+                cell_id = f"{block['bloque_id']}_c{index}"
+                if send_block(f"{host}:{port}", cell_id, cells[index], calculate_checksum(cells[index])):
+                    stored += 1
+            if stored < block["ec_k"]:
+                print(f"Bloque {block['bloque_id']}: solo {stored}/{len(cells)} celdas guardadas, "
+                      f"no se podría reconstruir. Se elimina {file_name}")
+                metadata_client.delete_file(file_name)
+                return False
+            if stored < len(cells):
+                print(f"Bloque {block['bloque_id']} guardado con {stored}/{len(cells)} celdas (degradado)")
+            print(f"Bloque {block['bloque_id']} codificado RS({block['ec_k']},{block['ec_m']}) "
+                  f"en {len(cells)} celdas")
 
     print("Archivo cargado exitosamente.")
+    return True
+
+
+def put_small_file(filepath: str) -> bool:
+    """Anexa un archivo pequeño a un contenedor compartido en vez de crear bloques propios."""
+    file_name = os.path.basename(filepath)
+    with open(filepath, 'rb') as f:
+        data = f.read()
+
+    response = register_small_file(file_name, len(data))
+    if not response:
+        print("Fallo al registrar archivo en NameNode")
+        return False
+
+    stored = [send_block(f"{host}:{port}", response["bloque_id"], data, calculate_checksum(data),
+                         offset=response["offset"]) for host, port in response["ubicaciones"]]
+    if not all(stored):
+        print(f"El contenedor {response['bloque_id']} no recibió los datos en todas sus réplicas")
+        abandon_small_file(response["reserva_id"])
+        return False
+
+    # Recién ahora el archivo aparece en el namespace
+    archivo = confirm_small_file(response["reserva_id"])
+    metadata_client.invalidate(file_name)
+    if not archivo:
+        print("Fallo al confirmar el archivo en el NameNode")
+        return False
+    print(f"Archivo empaquetado en {response['bloque_id']} (offset {response['offset']}).")
+    return True
+
+
+def put_file_stream(filepath: str) -> bool:
+    """Sube el archivo a través del NameNode, que envía los bloques a los DataNodes según llegan."""
+    file_name = os.path.basename(filepath)
+    print("Subiendo archivo en streaming al NameNode...")
+    response = upload_stream(file_name, filepath)
+    metadata_client.invalidate(file_name)
+    if not response:
+        print("Fallo al subir el archivo")
+        return False
+    print(f"Archivo cargado exitosamente: {response['bloques_subidos']} bloques, "
+          f"{response['tamaño_total']} bytes.")
+    return True
@@ -1,6 +1,6 @@
-from services import rest_client
+from services import metadata_client
 
 def run(filename):
     print(f"Ejecutando RM: {filename}")
-    rest_client.delete_file(filename)
+    metadata_client.delete_file(filename)
     print("Archivo eliminado exitosamente.")
\ No newline at end of file
@@ -1,6 +1,9 @@
-from services import rest_client
+from services import metadata_client
 
-def run(dirname):
+def run(dirname, recursive=False):
     print(f"Ejecutando RMDIR: {dirname}")
-    rest_client.delete_directory(dirname)
-    print("Carpeta eliminada exitosamente.")
\ No newline at end of file
+    result = metadata_client.delete_directory(dirname, recursive)
+    if not result.get("success"):
+        print(f"Error: {result.get('error')}")
+        return
+    print("Carpeta eliminada exitosamente.")
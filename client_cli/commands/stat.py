@@ -0,0 +1,6 @@
+from services import metadata_client
+
+def run(path):
+    print(f"Ejecutando STAT: {path}")
+    for key, value in metadata_client.stat(path).items():
+        print(f"{key}\t{value}")
@@ -0,0 +1,102 @@
+import glob
+import json
+import os
+from collections import defaultdict
+from common.utils import tracing
+
+BAR_WIDTH = 40
+NAME_WIDTH = 44
+TOP_STAGES = 10
+
+
+def _load_spans(directory: str) -> list:
+    """Spans de todos los componentes: cada proceso escribe su propio <servicio>.jsonl."""
+    spans = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.jsonl'))):
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    spans.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Línea a medias de un proceso que terminó mientras escribía
+                    continue
+    return spans
+
+
+def _latest_trace_id(spans: list) -> str:
+    # Las trazas iniciadas por el cliente antes que las de fondo (registros, heartbeats)
+    roots = [s for s in spans if not s['parent_id']]
+    roots = [s for s in roots if s['service'] == 'client'] or roots or spans
+    return max(roots, key=lambda s: s['start'])['trace_id']
+
+
+def _bar(start: float, duration: float, origin: float, total: float) -> str:
+    offset = int((start - origin) / total * BAR_WIDTH) if total else 0
+    length = max(1, round(duration / total * BAR_WIDTH)) if total else 1
+    offset = min(offset, BAR_WIDTH - 1)
+    return ' ' * offset + '█' * min(length, BAR_WIDTH - offset)
+
+
+def _attributes(span: dict) -> str:
+    text = ' '.join(f"{k}={v}" for k, v in span.get('attributes', {}).items())
+    return text if len(text) <= 60 else text[:57] + '...'
+
+
+def run(trace_id: str = None, directory: str = None):
+    directory = directory or os.environ.get(tracing.TRACE_DIR_ENV, 'traces')
+    spans = _load_spans(directory)
+    if not spans:
+        print(f"No hay spans en {directory} (¿se ejecutó con --trace o DFS_TRACE_DIR?)")
+        return
+
+    trace_id = trace_id or _latest_trace_id(spans)
+    spans = [s for s in spans if s['trace_id'].startswith(trace_id)]
+    if not spans:
+        print(f"No hay spans de la traza {trace_id} en {directory}")
+        return
+
+    ids = {s['span_id'] for s in spans}
+    children = defaultdict(list)
+    roots = []
+    for s in spans:
+        # Sin padre conocido (p. ej. falta el archivo de otro componente) se muestra como raíz
+        if s['parent_id'] in ids:
+            children[s['parent_id']].append(s)
+        else:
+            roots.append(s)
+
+    # Inicios en tiempo de reloj de cada máquina: con relojes desfasados las barras se desplazan
+    origin = min(s['start'] for s in spans)
+    end = max(s['start'] + s['duration_ms'] / 1000 for s in spans)
+    total = end - origin
+    services = sorted({s['service'] for s in spans})
+    print(f"Traza {spans[0]['trace_id']}: {total * 1000:.1f} ms, {len(spans)} spans, "
+          f"servicios: {', '.join(services)}")
+    print(f"{'inicio ms':>10} {'dur ms':>9}  {'servicio':<12} {'span':<{NAME_WIDTH}} |{' ' * BAR_WIDTH}|")
+
+    self_time = defaultdict(float)
+
+    def show(span: dict, depth: int):
+        nested = sorted(children[span['span_id']], key=lambda s: s['start'])
+        # Los hijos en paralelo pueden sumar más que el padre
+        self_time[(span['service'], span['name'])] += max(0.0, span['duration_ms'] -
+                                                          sum(c['duration_ms'] for c in nested))
+        name = ('  ' * depth + span['name'] + (' ✗' if 'error' in span else ''))[:NAME_WIDTH]
+        print(f"{(span['start'] - origin) * 1000:>10.1f} {span['duration_ms']:>9.1f}  "
+              f"{span['service']:<12} {name:<{NAME_WIDTH}} "
+              f"|{_bar(span['start'], span['duration_ms'] / 1000, origin, total):<{BAR_WIDTH}}| "
+              f"{_attributes(span)}")
+        for child in nested:
+            show(child, depth + 1)
+
+    for root in sorted(roots, key=lambda s: s['start']):
+        show(root, 0)
+
+    errors = [s for s in spans if 'error' in s]
+    for s in errors:
+        print(f"✗ {s['service']} {s['name']}: {s['error']}")
+
+    print("\nTiempo propio por etapa (sin contar sus hijos):")
+    for (service, name), ms in sorted(self_time.items(), key=lambda item: -item[1])[:TOP_STAGES]:
+        share = ms / (total * 1000) * 100 if total else 0
+        print(f"{ms:>10.1f} ms {share:>5.1f}%  {service:<12} {name}")
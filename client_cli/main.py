@@ -1,14 +1,95 @@
+import os
 import sys
-from commands import put, get, ls, cd, mkdir, rmdir, rm
+from commands import put, get, ls, cd, mkdir, rmdir, rm, stat, mv, trace, append
+from services import metadata_client
+from common.utils import tracing
+
+
+def run_command(cmd):
+    if cmd == "put":
+        options = {"dedup": "--dedup" in sys.argv, "ec": "--ec" in sys.argv, "stream": "--stream" in sys.argv}
+        # Las celdas EC se guardan sin comprimir; k y m solo aplican con --ec
+        if options["ec"] and "--codec" in sys.argv:
+            print("--codec no se puede combinar con --ec: las celdas EC se guardan sin comprimir")
+            sys.exit(1)
+        if not options["ec"] and ("--ec-k" in sys.argv or "--ec-m" in sys.argv):
+            print("--ec-k y --ec-m requieren --ec")
+            sys.exit(1)
+        if "--codec" in sys.argv:
+            options["codec"] = sys.argv[sys.argv.index("--codec") + 1]
+        if "--ec-k" in sys.argv:
+            options["ec_k"] = int(sys.argv[sys.argv.index("--ec-k") + 1])
+        if "--ec-m" in sys.argv:
+            options["ec_m"] = int(sys.argv[sys.argv.index("--ec-m") + 1])
+        if not put.put_file(sys.argv[2], **options):
+            sys.exit(1)
+    elif cmd == "append":
+        options = {}
+        if "--codec" in sys.argv:
+            options["codec"] = sys.argv[sys.argv.index("--codec") + 1]
+        target = sys.argv[3] if len(sys.argv) > 3 and not sys.argv[3].startswith("--") else None
+        append.run(sys.argv[2], target, **options)
+    elif cmd == "get":
+        options = {}
+        if "--offset" in sys.argv:
+            options["offset"] = int(sys.argv[sys.argv.index("--offset") + 1])
+        if "--length" in sys.argv:
+            options["length"] = int(sys.argv[sys.argv.index("--length") + 1])
+        get.run(sys.argv[2], **options)
+    elif cmd == "ls":
+        options = {}
+        if "--limit" in sys.argv:
+            options["limit"] = int(sys.argv[sys.argv.index("--limit") + 1])
+        if "--sort" in sys.argv:
+            options["order"] = sys.argv[sys.argv.index("--sort") + 1]
+        if "--fields" in sys.argv:
+            options["fields"] = sys.argv[sys.argv.index("--fields") + 1].split(",")
+        path = sys.argv[2] if len(sys.argv) > 2 and not sys.argv[2].startswith("--") else "/"
+        ls.run(path, **options)
+    elif cmd == "rmdir":
+        rmdir.run(sys.argv[2], recursive="-r" in sys.argv)
+    elif cmd == "rm":
+        rm.run(sys.argv[2])
+    elif cmd == "stat":
+        stat.run(sys.argv[2])
+    elif cmd == "mv":
+        mv.run(sys.argv[2], sys.argv[3])
+    elif cmd == "trace":
+        directory = sys.argv[sys.argv.index("--dir") + 1] if "--dir" in sys.argv else None
+        trace_id = sys.argv[2] if len(sys.argv) > 2 and not sys.argv[2].startswith("--") else None
+        trace.run(trace_id, directory)
+    else:
+        print(f"Comando no reconocido: {cmd}")
+
 
 if __name__ == '__main__':
-    if len(sys.argv) < 3:
-        print("Uso: python main.py put <archivo>")
+    if "--grpc" in sys.argv:
+        sys.argv.remove("--grpc")
+        metadata_client.use_grpc()
+
+    traced = "--trace" in sys.argv
+    if traced:
+        sys.argv.remove("--trace")
+        tracing.configure("client", os.environ.get(tracing.TRACE_DIR_ENV, "traces"))
+
+    if len(sys.argv) < 2 or (len(sys.argv) < 3 and sys.argv[1] not in ("ls", "trace")):
+        print("Uso: python main.py put <archivo> [--codec none|lz4|zstd] [--dedup] [--stream]")
+        print("     python main.py put <archivo> --ec [--ec-k K] [--ec-m M]: RS(K, M), por defecto la del NameNode")
+        print("     python main.py ls [ruta] [--limit N] [--sort nombre|tamaño|fecha_modificacion] [--fields a,b]")
+        print("     python main.py get <archivo> [--offset N] [--length N]: solo ese rango de bytes")
+        print("     python main.py append <archivo> [ruta] [--codec none|lz4|zstd]: anexa al final de un archivo existente")
+        print("     python main.py mv <origen> <destino> | stat <ruta>")
+        print("     python main.py trace [trace_id] [--dir traces]: cascada de una traza (la última si se omite)")
+        print("     --grpc: metadatos por el protocolo gRPC del NameNode (o DFS_METADATA_PROTOCOL=grpc)")
+        print("     --trace: registra la operación en $DFS_TRACE_DIR (por defecto ./traces)")
         sys.exit(1)
 
     cmd = sys.argv[1]
 
-    if cmd == "put":
-        put.put_file(sys.argv[2])
+    if traced:
+        with tracing.span(cmd, args=" ".join(sys.argv[2:])):
+            trace_id = tracing.current_trace_id()
+            run_command(cmd)
+        print(f"Traza {trace_id}: python main.py trace {trace_id}")
     else:
-        print(f"Comando no reconocido: {cmd}")
\ No newline at end of file
+        run_command(cmd)
@@ -1,30 +1,83 @@
+import time
+import uuid
 import grpc
 import protos.datanode_pb2_grpc as datanode_pb2_grpc
 import protos.datanode_pb2      as datanode_pb2
+from common.config import admission_retry_after_ms, max_admission_retries, default_block_size
+from common.utils.compression import CODEC_NONE, decompress
+from common.utils import tracing
+from common.utils.block_stream import write_requests
 
+# Identificador estable del cliente para la equidad en los DataNodes
+CLIENT_ID = str(uuid.uuid4())
+_METADATA = (('x-client-id', CLIENT_ID),)
+# Mismos límites que el servidor: sin ellos gRPC corta en 4 MiB las respuestas de
+# ReadBlock con RESOURCE_EXHAUSTED, que aquí se confundiría con backpressure
+_CHANNEL_OPTIONS = [
+    ('grpc.max_receive_message_length', default_block_size + 1024 * 1024),
+    ('grpc.max_send_message_length', default_block_size + 1024 * 1024),
+]
 
-def send_block(address: str, block_id: str, data: bytes, checksum: str):
-    channel = grpc.insecure_channel(address)
+
+def _retry_after_seconds(error: grpc.RpcError, attempt: int) -> float:
+    """Espera sugerida por el DataNode (metadata 'retry-after-ms') o backoff exponencial."""
+    for key, value in (error.trailing_metadata() or ()):
+        if key == 'retry-after-ms':
+            return int(value) / 1000
+    return admission_retry_after_ms * (2 ** attempt) / 1000
+
+
+def _call_with_backpressure(call, make_request, description: str):
+    """Ejecuta una RPC reintentando mientras el DataNode responda RESOURCE_EXHAUSTED.
+    `make_request` crea la petición en cada intento (un stream de escritura no se puede repetir)."""
+    for attempt in range(max_admission_retries + 1):
+        try:
+            return call(make_request(), metadata=_METADATA + tracing.grpc_metadata())
+        except grpc.RpcError as e:
+            if e.code() != grpc.StatusCode.RESOURCE_EXHAUSTED or attempt == max_admission_retries:
+                raise
+            wait = _retry_after_seconds(e, attempt)
+            print(f"DataNode saturado ({description}), reintentando en {wait:.2f}s")
+            time.sleep(wait)
+
+
+def send_block(address: str, block_id: str, data: bytes, checksum: str,
+               codec: str = CODEC_NONE, raw_size: int = 0, offset: int = None):
+    """Envía un bloque; `data` ya viene comprimido con `codec` si corresponde.
+    Con `offset` se escribe solo ese rango del bloque (contenedores y anexados).
+    Retorna la respuesta del DataNode, o None si falló."""
+    channel = grpc.insecure_channel(address, options=_CHANNEL_OPTIONS)
     stub = datanode_pb2_grpc.DataNodeServiceStub(channel)
 
-    request = datanode_pb2.WriteBlockRequest(
-        block_id=block_id,
-        data=data
-    )
+    def make_requests():
+        # En trozos: el DataNode decide la admisión antes de recibir los datos
+        return write_requests(datanode_pb2.WriteBlockRequest, block_id, data,
+                              codec=codec, raw_size=raw_size or len(data),
+                              offset=offset or 0, partial_write=offset is not None)
 
     try:
-        response = stub.WriteBlock(request)
+        with tracing.span('WriteBlock', datanode=address, block_id=block_id, bytes=len(data)):
+            response = _call_with_backpressure(stub.WriteBlockStream, make_requests, f"bloque {block_id}")
         if not response.success:
             print(f"Error al enviar bloque {block_id}: {response.message}")
+            return None
+        return response
     except grpc.RpcError as e:
         print(f"Fallo gRPC con {address} para bloque {block_id}: {e}")
+        return None
 
-def get_block(host, filename, index):
-    with grpc.insecure_channel(f"{host}:50051") as channel:
-        stub = datanode_pb2_grpc.DataNodeStub(channel)
-        request = datanode_pb2.BlockRequest(
-            filename=filename,
-            index=index
+def get_block(address, block_id, passthrough=True, offset=0, length=0):
+    """Lee un bloque; con passthrough viaja comprimido y se descomprime aquí.
+    `offset`/`length` piden solo un rango (length 0 = hasta el final)."""
+    with grpc.insecure_channel(address, options=_CHANNEL_OPTIONS) as channel:
+        stub = datanode_pb2_grpc.DataNodeServiceStub(channel)
+        request = datanode_pb2.ReadBlockRequest(
+            block_id=block_id,
+            passthrough=passthrough,
+            offset=offset,
+            length=length
         )
-        response = stub.DownloadBlock(request)
-        return response.data
\ No newline at end of file
+        with tracing.span('ReadBlock', datanode=address, block_id=block_id) as attributes:
+            response = _call_with_backpressure(stub.ReadBlock, lambda: request, f"bloque {block_id}")
+            attributes['bytes'] = len(response.data)
+        return decompress(response.data, response.codec)
@@ -0,0 +1,205 @@
+import base64
+import grpc
+import protos.namenode_pb2_grpc as namenode_pb2_grpc
+import protos.namenode_pb2      as namenode_pb2
+from common.config import namenode_client_grpc_address, default_usuario, default_password
+from common.utils import tracing
+
+# Misma autenticación básica que la API REST, enviada como metadata
+_TOKEN = base64.b64encode(f"{default_usuario}:{default_password}".encode()).decode()
+_METADATA = (('authorization', f"Basic {_TOKEN}"),)
+
+
+def _metadata() -> tuple:
+    """Credenciales más la traza en curso, para que el NameNode cuelgue sus spans de ella"""
+    return _METADATA + tracing.grpc_metadata()
+
+
+# Un único canal por proceso: las llamadas reutilizan la conexión HTTP/2
+_stub = None
+
+
+def _client():
+    global _stub
+    if _stub is None:
+        _stub = namenode_pb2_grpc.ClientProtocolStub(grpc.insecure_channel(namenode_client_grpc_address))
+    return _stub
+
+
+def _status_to_dict(status) -> dict:
+    """FileStatus con las mismas claves que devuelve la API REST"""
+    entry = {
+        "nombre": status.name,
+        "tipo": status.type,
+        "tamaño": status.size,
+        "fecha_modificacion": status.modified,
+        "permisos": status.permissions,
+        "usuario": status.owner,
+        "inodo_id": status.inode_id
+    }
+    if status.path:
+        entry["ruta"] = status.path
+    return entry
+
+
+def _block_to_dict(block) -> dict:
+    """BlockLocation con las mismas claves que devuelve la API REST"""
+    result = {
+        "bloque_id": block.block_id,
+        "posicion": block.position,
+        "tamaño": block.size,
+        "ubicaciones": [[location.host, location.port] for location in block.locations],
+        "checksum": block.checksum or None,
+        "codec": block.codec or None,
+        "ec_k": block.ec_k,
+        "ec_m": block.ec_m,
+        "tamaño_celda": block.cell_size
+    }
+    if block.packed:
+        result["offset"] = block.offset
+        result["longitud"] = block.length
+    return result
+
+
+def allocate_file(path: str, file_size: int):
+    """Registra un archivo y reserva sus bloques replicados; retorna {archivo, bloques}"""
+    try:
+        response = _client().CreateFile(namenode_pb2.CreateFileRequest(path=path, size=file_size),
+                                        metadata=_metadata())
+    except grpc.RpcError as e:
+        print(f"Error del NameNode: {e.code().name} {e.details()}")
+        return None
+    return {"archivo": _status_to_dict(response.file),
+            "bloques": [_block_to_dict(block) for block in response.blocks]}
+
+
+def get_file_locations(filename):
+    """Atributos del archivo y sus bloques en orden; retorna {archivo, bloques}"""
+    response = _client().GetBlockLocations(namenode_pb2.PathRequest(path=filename), metadata=_metadata())
+    return {"archivo": _status_to_dict(response.file),
+            "bloques": [_block_to_dict(block) for block in response.blocks]}
+
+
+def get_file_blocks(filename):
+    """Bloques del archivo en orden, con ubicaciones, codec y parámetros EC"""
+    return get_file_locations(filename)["bloques"]
+
+
+def list_directory(path: str = "/", limit: int = None, cursor: str = None, order: str = None, fields: list = None):
+    """Pide una página del listado de un directorio; retorna {entradas, siguiente_cursor}"""
+    request = namenode_pb2.ListRequest(path=path, limit=limit or 0, cursor=cursor or "", order=order or "")
+    response = _client().List(request, metadata=_metadata())
+    entries = [_status_to_dict(entry) for entry in response.entries]
+    if fields:
+        entries = [{field: entry.get(field) for field in fields} for entry in entries]
+    return {"entradas": entries, "siguiente_cursor": response.next_cursor or None}
+
+
+def iter_directory(path: str = "/", limit: int = None, order: str = None, fields: list = None):
+    """Recorre el directorio página a página siguiendo el cursor"""
+    cursor = None
+    while True:
+        page = list_directory(path, limit, cursor, order, fields)
+        yield from page["entradas"]
+        cursor = page["siguiente_cursor"]
+        if not cursor:
+            break
+
+
+def stat(path: str):
+    """Atributos de un archivo o directorio"""
+    return _status_to_dict(_client().Stat(namenode_pb2.PathRequest(path=path), metadata=_metadata()))
+
+
+def _delete(path: str, recursive: bool = False):
+    try:
+        response = _client().Delete(namenode_pb2.DeleteRequest(path=path, recursive=recursive),
+                                    metadata=_metadata())
+    except grpc.RpcError as e:
+        return {"success": False, "error": e.details()}
+    return {"success": True, "data": {
+        "bloques_liberados": response.blocks_freed,
+        "bloques_compartidos": response.blocks_shared,
+        "subarboles_pendientes": response.pending_subtrees
+    }}
+
+
+def delete_directory(dirname, recursive: bool = False):
+    """Elimina un directorio; en modo recursivo el NameNode libera los bloques en segundo plano"""
+    return _delete(dirname, recursive)
+
+
+def delete_file(filename):
+    return _delete(filename)
+
+
+def rename(source: str, destination: str):
+    """Mueve o renombra un archivo o directorio"""
+    try:
+        _client().Rename(namenode_pb2.RenameRequest(source=source, destination=destination),
+                         metadata=_metadata())
+    except grpc.RpcError as e:
+        return {"success": False, "error": e.details()}
+    return {"success": True}
+
+
+def _session_to_dict(session) -> dict:
+    """UploadSession con las mismas claves que devuelve la API REST"""
+    blocks = []
+    for block in session.blocks:
+        entry = _block_to_dict(block)
+        entry["confirmado"] = entry["checksum"]
+        blocks.append(entry)
+    return {
+        "sesion_id": session.session_id,
+        "ruta": session.path,
+        "tamaño": session.size,
+        "reanudada": session.resumed,
+        "confirmados": session.confirmed,
+        "bloques": blocks
+    }
+
+
+def open_upload(path: str, size: int):
+    """Abre una subida reanudable (o retoma la que quedó a medias en `path`); retorna la sesión
+    con sus bloques y, en cada uno, el checksum confirmado o None"""
+    try:
+        response = _client().OpenUpload(namenode_pb2.CreateFileRequest(path=path, size=size),
+                                        metadata=_metadata())
+    except grpc.RpcError as e:
+        print(f"Error del NameNode: {e.code().name} {e.details()}")
+        return None
+    return _session_to_dict(response)
+
+
+def upload_status(session_id: str):
+    """Estado de la subida según el NameNode: qué bloques tiene confirmados y con qué checksum"""
+    try:
+        response = _client().GetUpload(namenode_pb2.UploadRequest(session_id=session_id), metadata=_metadata())
+    except grpc.RpcError as e:
+        print(f"Error del NameNode: {e.code().name} {e.details()}")
+        return None
+    return _session_to_dict(response)
+
+
+def confirm_block(block_id: str, checksum: str, codec: str, stored_size: int):
+    """Confirma al NameNode un bloque escrito en todas sus réplicas, con su codec y tamaño almacenado"""
+    request = namenode_pb2.ConfirmBlockRequest(block_id=block_id, checksum=checksum, codec=codec or "",
+                                               stored_size=stored_size or 0)
+    try:
+        _client().ConfirmBlock(request, metadata=_metadata())
+    except grpc.RpcError as e:
+        print(f"Error al confirmar bloque {block_id}: {e.code().name} {e.details()}")
+        return False
+    return True
+
+
+def complete_upload(session_id: str):
+    """Crea el archivo con los bloques de la subida; retorna el archivo"""
+    try:
+        response = _client().CompleteUpload(namenode_pb2.UploadRequest(session_id=session_id),
+                                            metadata=_metadata())
+    except grpc.RpcError as e:
+        print(f"Error del NameNode: {e.code().name} {e.details()}")
+        return None
+    return _status_to_dict(response)
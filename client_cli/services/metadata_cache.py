@@ -0,0 +1,110 @@
+"""Caché de metadatos del cliente: ubicaciones de bloques y páginas de listados.
+
+Cada entrada caduca a los `ttl` segundos y, al pasar de `max_entries`, se
+descarta la usada hace más tiempo (LRU). Las ubicaciones de un archivo guardan
+su versión (inodo y fecha de modificación): si un stat o un listado muestran
+otra versión de la misma ruta, la entrada se descarta aunque no haya caducado.
+Con `path`, la caché se carga de ese archivo y se vuelca en él al terminar el
+proceso, de modo que invocaciones sucesivas del CLI la comparten.
+"""
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize(path: str) -> str:
+    """Ruta absoluta sin barra final: 'datos/x' y '/datos/x/' son la misma entrada"""
+    return '/' + path.strip('/')
+
+
+class MetadataCache:
+
+    def __init__(self, ttl: float, max_entries: int, path: str = None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # clave -> (caduca, versión, valor)
+        self._lock = threading.Lock()
+        if path and self.enabled:
+            self._load()
+            atexit.register(self.save)
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+
+    def get(self, key: tuple):
+        """Valor vigente de la clave, o None si no está o ya caducó"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.time():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key: tuple, value, version: str = None):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def observe_version(self, key: tuple, version: str):
+        """Descarta la entrada si se guardó para otra versión del archivo"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] is not None and entry[1] != version:
+                del self._entries[key]
+
+    def invalidate(self, path: str):
+        """Descarta todo lo de la ruta y lo que cuelga de ella, más los listados de su directorio padre"""
+        path = normalize(path)
+        parent = normalize(os.path.dirname(path))
+        prefix = path.rstrip('/') + '/'
+        with self._lock:
+            for key in [key for key in self._entries
+                        if key[1] == path or key[1].startswith(prefix)
+                        or (key[0] == 'listado' and key[1] == parent)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        for key, expires, version, value in stored:
+            if expires > now:
+                self._entries[tuple(key)] = (expires, version, value)
+
+    def save(self):
+        """Vuelca las entradas vigentes; la escritura es atómica para no dejar el archivo a medias"""
+        now = time.time()
+        with self._lock:
+            stored = [[list(key), expires, version, value]
+                      for key, (expires, version, value) in self._entries.items() if expires > now]
+        directory = os.path.dirname(os.path.abspath(self.path))
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with tempfile.NamedTemporaryFile('w', dir=directory, delete=False, suffix='.tmp') as f:
+                json.dump(stored, f, ensure_ascii=False)
+            os.replace(f.name, self.path)
+        except OSError as e:
+            # Sin caché persistente el cliente sigue funcionando; solo pierde los aciertos
+            print(f"No se pudo guardar la caché de metadatos en {self.path}: {e}")
@@ -0,0 +1,127 @@
+"""Operaciones de metadatos del cliente sobre REST o gRPC.
+
+Ambos backends exponen las mismas funciones con los mismos formatos de
+respuesta; los comandos usan este módulo sin saber cuál está activo.
+
+Las ubicaciones de bloques y las páginas de listados pasan por una caché
+(services/metadata_cache.py) configurada con DFS_METADATA_CACHE_TTL,
+DFS_METADATA_CACHE_SIZE y DFS_METADATA_CACHE_FILE. Las operaciones que
+modifican una ruta la invalidan, y `invalidate` permite hacerlo a quien
+detecte ubicaciones obsoletas (por ejemplo, un DataNode que ya no tiene el
+bloque).
+"""
+import posixpath
+from services import rest_client
+from services.metadata_cache import MetadataCache, normalize
+from common.config import metadata_protocol, metadata_cache_ttl, metadata_cache_size, metadata_cache_file
+
+_backend = rest_client
+
+cache = MetadataCache(metadata_cache_ttl, metadata_cache_size, metadata_cache_file or None)
+
+
+def use_grpc():
+    """Usa el protocolo gRPC del NameNode para las operaciones de metadatos"""
+    global _backend
+    from services import grpc_metadata_client
+    _backend = grpc_metadata_client
+
+
+def protocol() -> str:
+    """Protocolo activo para las operaciones de metadatos: 'rest' o 'grpc'"""
+    return "grpc" if _backend is not rest_client else "rest"
+
+
+def __getattr__(name):
+    return getattr(_backend, name)
+
+
+def _version(status: dict):
+    """Versión de un archivo: cambia si se borra y se vuelve a crear, o si se modifica"""
+    if status.get("inodo_id") is None:
+        return None
+    return f"{status['inodo_id']}:{status.get('fecha_modificacion')}"
+
+
+def _observe(path: str, status: dict):
+    version = _version(status)
+    if status.get("tipo") == "archivo" and version:
+        cache.observe_version(("bloques", normalize(path)), version)
+
+
+def invalidate(path: str):
+    """Olvida lo que la caché sabe de la ruta (y de los listados de su directorio)"""
+    cache.invalidate(path)
+
+
+def get_file_blocks(filename):
+    """Bloques del archivo en orden, con ubicaciones, codec y parámetros EC"""
+    key = ("bloques", normalize(filename))
+    blocks = cache.get(key)
+    if blocks is None:
+        locations = _backend.get_file_locations(filename)
+        blocks = locations["bloques"]
+        cache.put(key, blocks, _version(locations["archivo"]))
+    return blocks
+
+
+def list_directory(path: str = "/", limit: int = None, cursor: str = None, order: str = None, fields: list = None):
+    """Pide una página del listado de un directorio; retorna {entradas, siguiente_cursor}"""
+    key = ("listado", normalize(path), limit, cursor, order, ",".join(fields or []))
+    page = cache.get(key)
+    if page is None:
+        page = _backend.list_directory(path, limit, cursor, order, fields)
+        cache.put(key, page)
+        for entry in page["entradas"]:
+            _observe(entry.get("ruta") or posixpath.join(normalize(path), entry.get("nombre", "")), entry)
+    return page
+
+
+def iter_directory(path: str = "/", limit: int = None, order: str = None, fields: list = None):
+    """Recorre el directorio página a página siguiendo el cursor"""
+    cursor = None
+    while True:
+        page = list_directory(path, limit, cursor, order, fields)
+        yield from page["entradas"]
+        cursor = page["siguiente_cursor"]
+        if not cursor:
+            break
+
+
+def stat(path: str):
+    """Atributos de un archivo o directorio"""
+    status = _backend.stat(path)
+    _observe(path, status)
+    return status
+
+
+def allocate_file(path: str, file_size: int):
+    """Registra un archivo y reserva sus bloques replicados; retorna {archivo, bloques}"""
+    result = _backend.allocate_file(path, file_size)
+    invalidate(path)
+    return result
+
+
+def rename(source: str, destination: str):
+    """Mueve o renombra un archivo o directorio"""
+    result = _backend.rename(source, destination)
+    invalidate(source)
+    invalidate(destination)
+    return result
+
+
+def delete_directory(dirname, recursive: bool = False):
+    """Elimina un directorio; en modo recursivo el NameNode libera los bloques en segundo plano"""
+    result = _backend.delete_directory(dirname, recursive)
+    invalidate(dirname)
+    return result
+
+
+def delete_file(filename):
+    result = _backend.delete_file(filename)
+    invalidate(filename)
+    return result
+
+
+if metadata_protocol == 'grpc':
+    use_grpc()
@@ -2,7 +2,22 @@ import requests
 
 BASE_URL = "http:/ 3.93.218.93/:8080"  # Dirección del NameNode Flask API
 import requests
-from common.config import default_namenode_address
+from requests.auth import HTTPBasicAuth
+from common.config import default_namenode_address, default_usuario, default_password
+from common.utils import tracing
+
+API_URL = f"http://{default_namenode_address}/api/archivos"
+
+
+class _TracedAuth(HTTPBasicAuth):
+    """Autenticación básica que además envía la traza en curso al NameNode"""
+
+    def __call__(self, request):
+        request.headers.update(tracing.headers())
+        return super().__call__(request)
+
+
+AUTH = _TracedAuth(default_usuario, default_password)
 
 
 def register_file(file_name: str, file_size: int, block_ids: list[str]):
@@ -23,14 +38,188 @@ def register_file(file_name: str, file_size: int, block_ids: list[str]):
         print(f"Error al contactar al NameNode: {e}")
         return None
 
+def allocate_file(path: str, file_size: int):
+    """Registra un archivo y reserva sus bloques replicados; retorna {archivo, bloques}"""
+    payload = {"ruta": path, "tamaño": file_size}
+    response = requests.post(f"{API_URL}/asignar", json=payload, auth=AUTH)
+    if response.status_code != 201:
+        print(f"Error del NameNode: {response.status_code} {response.text}")
+        return None
+    return response.json()["data"]
+
+def upload_stream(path: str, filepath: str):
+    """Sube el archivo como cuerpo crudo; el NameNode reparte los bloques mientras llega"""
+    url = f"{API_URL}/stream/{path.lstrip('/')}"
+    with open(filepath, 'rb') as f:
+        response = requests.put(url, data=f, headers={"Content-Type": "application/octet-stream"}, auth=AUTH)
+    if response.status_code != 201:
+        print(f"Error del NameNode: {response.status_code} {response.text}")
+        return None
+    return response.json()["data"]
+
+def confirm_block(block_id: str, checksum: str, codec: str, stored_size: int):
+    """Confirma al NameNode un bloque escrito en todas sus réplicas, con su codec y tamaño almacenado"""
+    url = f"http://{default_namenode_address}/blocks/{block_id}/confirm"
+    payload = {
+        "checksum": checksum,
+        "codec": codec,
+        "tamaño_almacenado": stored_size
+    }
+    try:
+        response = requests.post(url, json=payload, headers=tracing.headers())
+        return response.status_code == 200
+    except Exception as e:
+        print(f"Error al confirmar bloque {block_id}: {e}")
+        return False
+
+def query_digests(digests: list[str]):
+    """Pregunta al NameNode qué bloques ya existen según su digest SHA-256"""
+    response = requests.post(f"{API_URL}/dedup/consultar", json={"digests": digests}, auth=AUTH)
+    if response.status_code != 200:
+        print(f"Error del NameNode: {response.status_code} {response.text}")
+        return None
+    return response.json()["data"]
+
+def register_file_dedup(path: str, blocks: list[dict]):
+    """Registra un archivo por digests; el NameNode marca qué bloques hay que subir"""
+    payload = {"ruta": path, "bloques": blocks}
+    response = requests.post(f"{API_URL}/dedup/registrar", json=payload, auth=AUTH)
+    if response.status_code != 201:
+        print(f"Error del NameNode: {response.status_code} {response.text}")
+        return None
+    return response.json()["data"]
+
+def register_file_ec(path: str, file_size: int, k: int = None, m: int = None):
+    """Registra un archivo con codificación por borrado RS(k, m)"""
+    payload = {"ruta": path, "tamaño": file_size, "ec_k": k, "ec_m": m}
+    response = requests.post(f"{API_URL}/ec/registrar", json=payload, auth=AUTH)
+    if response.status_code != 201:
+        print(f"Error del NameNode: {response.status_code} {response.text}")
+        return None
+    return response.json()["data"]
+
+def register_small_file(path: str, file_size: int):
+    """Reserva un rango en un contenedor compartido para un archivo pequeño; el archivo
+    no existe hasta confirmar la reserva"""
+    payload = {"ruta": path, "tamaño": file_size}
+    response = requests.post(f"{API_URL}/empaquetado/registrar", json=payload, auth=AUTH)
+    if response.status_code != 201:
+        print(f"Error del NameNode: {response.status_code} {response.text}")
+        return None
+    return response.json()["data"]
+
+def confirm_small_file(reservation_id: str):
+    """Crea el archivo pequeño una vez escritos sus datos en el contenedor; retorna el archivo"""
+    response = requests.post(f"{API_URL}/empaquetado/{reservation_id}/confirmar", auth=AUTH)
+    if response.status_code != 201:
+        print(f"Error del NameNode: {response.status_code} {response.text}")
+        return None
+    return response.json()["data"]["archivo"]
+
+def abandon_small_file(reservation_id: str):
+    """Descarta la reserva de un archivo pequeño cuyos datos no se pudieron escribir"""
+    requests.delete(f"{API_URL}/empaquetado/{reservation_id}", auth=AUTH)
+
+def open_append(path: str, size: int):
+    """Pide la concesión de escritor único para anexar `size` bytes; retorna el plan de escritura"""
+    response = requests.post(f"{API_URL}/anexar/abrir", json={"ruta": path, "tamaño": size}, auth=AUTH)
+    if response.status_code != 201:
+        print(f"Error del NameNode: {response.status_code} {response.text}")
+        return None
+    return response.json()["data"]
+
+def renew_append(lease_id: str):
+    """Prolonga la concesión; retorna False si ya no es válida"""
+    response = requests.post(f"{API_URL}/anexar/{lease_id}/renovar", auth=AUTH)
+    return response.status_code == 200
+
+def complete_append(lease_id: str, last_checksum: str = None):
+    """Incorpora lo anexado al archivo y libera la concesión; retorna el archivo"""
+    response = requests.post(f"{API_URL}/anexar/{lease_id}/completar",
+                             json={"checksum_ultimo": last_checksum}, auth=AUTH)
+    if response.status_code != 200:
+        print(f"Error del NameNode: {response.status_code} {response.text}")
+        return None
+    return response.json()["data"]["archivo"]
+
+def abandon_append(lease_id: str):
+    """Desiste del anexado; el archivo queda como estaba"""
+    requests.delete(f"{API_URL}/anexar/{lease_id}", auth=AUTH)
+
+def open_upload(path: str, size: int):
+    """Abre una subida reanudable (o retoma la que quedó a medias en `path`); retorna la sesión
+    con sus bloques y, en cada uno, el checksum confirmado o None"""
+    response = requests.post(f"{API_URL}/subidas", json={"ruta": path, "tamaño": size}, auth=AUTH)
+    if response.status_code not in (200, 201):
+        print(f"Error del NameNode: {response.status_code} {response.text}")
+        return None
+    return response.json()["data"]
+
+def upload_status(session_id: str):
+    """Estado de la subida según el NameNode: qué bloques tiene confirmados y con qué checksum"""
+    response = requests.get(f"{API_URL}/subidas/{session_id}", auth=AUTH)
+    if response.status_code != 200:
+        print(f"Error del NameNode: {response.status_code} {response.text}")
+        return None
+    return response.json()["data"]
+
+def complete_upload(session_id: str):
+    """Crea el archivo con los bloques de la subida; retorna el archivo"""
+    response = requests.post(f"{API_URL}/subidas/{session_id}/completar", auth=AUTH)
+    if response.status_code != 200:
+        print(f"Error del NameNode: {response.status_code} {response.text}")
+        return None
+    return response.json()["data"]["archivo"]
+
+def abandon_upload(session_id: str):
+    """Desiste de la subida y libera sus bloques"""
+    requests.delete(f"{API_URL}/subidas/{session_id}", auth=AUTH)
+
+def get_file_locations(filename):
+    """Atributos del archivo y sus bloques en orden; retorna {archivo, bloques}"""
+    url = f"{API_URL}/bloques/{filename.lstrip('/')}"
+    response = requests.get(url, auth=AUTH)
+    response.raise_for_status()
+    return response.json()["data"]
+
 def get_file_blocks(filename):
-    url = f"{BASE_URL}/files/{filename}/blocks"
-    response = requests.get(url)
-    return response.json()
+    """Bloques del archivo en orden, con ubicaciones, codec y parámetros EC"""
+    return get_file_locations(filename)["bloques"]
+
+def list_directory(path: str = "/", limit: int = None, cursor: str = None, order: str = None, fields: list = None):
+    """Pide una página del listado de un directorio; retorna {entradas, siguiente_cursor}"""
+    params = {"ruta": path}
+    if limit:
+        params["limite"] = limit
+    if cursor:
+        params["cursor"] = cursor
+    if order:
+        params["orden"] = order
+    if fields:
+        params["campos"] = ",".join(fields)
+    response = requests.get(f"{API_URL}/listar", params=params, auth=AUTH)
+    response.raise_for_status()
+    return response.json()["data"]
+
+def iter_directory(path: str = "/", limit: int = None, order: str = None, fields: list = None):
+    """Recorre el directorio página a página siguiendo el cursor"""
+    cursor = None
+    while True:
+        page = list_directory(path, limit, cursor, order, fields)
+        yield from page["entradas"]
+        cursor = page["siguiente_cursor"]
+        if not cursor:
+            break
+
+def stat(path: str):
+    """Atributos de un archivo o directorio"""
+    response = requests.get(f"{API_URL}/estado", params={"ruta": path}, auth=AUTH)
+    response.raise_for_status()
+    return response.json()["data"]
 
-def list_directory():
-    url = f"{BASE_URL}/files"
-    response = requests.get(url)
+def rename(source: str, destination: str):
+    """Mueve o renombra un archivo o directorio"""
+    response = requests.post(f"{API_URL}/renombrar", json={"origen": source, "destino": destination}, auth=AUTH)
     return response.json()
 
 def create_directory(dirname):
@@ -38,12 +227,13 @@ def create_directory(dirname):
     response = requests.post(url, json={"name": dirname})
     return response.json()
 
-def delete_directory(dirname):
-    url = f"{BASE_URL}/directories/{dirname}"
-    response = requests.delete(url)
+def delete_directory(dirname, recursive: bool = False):
+    """Elimina un directorio; en modo recursivo el NameNode libera los bloques en segundo plano"""
+    url = f"{API_URL}/directorios/{dirname.lstrip('/')}"
+    response = requests.delete(url, params={"recursivo": str(recursive).lower()}, auth=AUTH)
     return response.json()
 
 def delete_file(filename):
-    url = f"{BASE_URL}/files/{filename}"
-    response = requests.delete(url)
+    url = f"{API_URL}/{filename.lstrip('/')}"
+    response = requests.delete(url, auth=AUTH)
     return response.json()
@@ -1,14 +1,61 @@
+import os
+
 # Puerto por defecto para el NameNode REST
 default_namenode_port = 8080
 # Dirección por defecto del NameNode (host:puerto)
 default_namenode_host = 'localhost'
 default_namenode_address = f"{default_namenode_host}:{default_namenode_port}"
+# Credenciales HTTP básicas para la API /api/archivos
+default_usuario = os.getenv('DFS_USER', 'admin')
+default_password = os.getenv('DFS_PASSWORD', 'admin123')
 
 # Puerto base para DataNodes gRPC (se suma el número de nodo)
 grpc_base_port = 50051
+# Puerto gRPC del NameNode para el stream de heartbeats de los DataNodes
+namenode_grpc_port = int(os.getenv('NAMENODE_GRPC_PORT', 50050))
+# Puerto gRPC del protocolo de metadatos de los clientes
+namenode_client_grpc_port = int(os.getenv('NAMENODE_CLIENT_GRPC_PORT', 50049))
+namenode_client_grpc_address = f"{default_namenode_host}:{namenode_client_grpc_port}"
+# Protocolo de metadatos del cliente: 'rest' o 'grpc'
+metadata_protocol = os.getenv('DFS_METADATA_PROTOCOL', 'rest')
+# Segundos entre heartbeats dentro del stream
+heartbeat_interval = float(os.getenv('DN_HEARTBEAT_INTERVAL', 3))
+
+# Puerto base HTTP de /metrics (Prometheus) de los DataNodes (se suma el número de nodo)
+metrics_base_port = int(os.getenv('DN_METRICS_BASE_PORT', 9100))
 
 # Tamaño de bloque por defecto en bytes (por ejemplo, 64 MiB)
 default_block_size = 64 * 1024 * 1024  # 64 MiB
 
+# Los archivos por debajo de este tamaño se empaquetan en bloques contenedor
+small_file_threshold = int(os.getenv('SMALL_FILE_THRESHOLD', 1024 * 1024))  # 1 MiB
+
 # Ruta de almacenamiento de bloques en cada DataNode
-blocks_storage_dir = 'storage/blocks'
\ No newline at end of file
+blocks_storage_dir = 'storage/blocks'
+
+# Control de admisión en DataNodes (backpressure)
+# Presupuesto total de bytes en vuelo (escrituras + lecturas)
+max_inflight_bytes = int(os.getenv('DN_MAX_INFLIGHT_BYTES', 256 * 1024 * 1024))  # 256 MiB
+# Máximo de escrituras y lecturas concurrentes
+max_concurrent_writes = int(os.getenv('DN_MAX_CONCURRENT_WRITES', 8))
+max_concurrent_reads = int(os.getenv('DN_MAX_CONCURRENT_READS', 16))
+# Tiempo base sugerido al cliente antes de reintentar (milisegundos)
+admission_retry_after_ms = int(os.getenv('DN_RETRY_AFTER_MS', 200))
+# Reintentos máximos de un cliente ante RESOURCE_EXHAUSTED
+max_admission_retries = int(os.getenv('DN_MAX_ADMISSION_RETRIES', 5))
+# Trozos en los que viaja un bloque por WriteBlockStream; el DataNode reserva el bloque
+# entero antes de leer el primero y el resto espera en el control de flujo de HTTP/2
+write_chunk_size = int(os.getenv('DFS_WRITE_CHUNK_SIZE', 1024 * 1024))  # 1 MiB
+# Comandos pesados (transferencias, compactaciones) que un DataNode acepta por heartbeat
+max_background_commands = int(os.getenv('DN_MAX_BACKGROUND_COMMANDS', 2))
+
+# Compresión de bloques: 'none', 'lz4' o 'zstd'
+default_codec = os.getenv('DFS_CODEC', 'none')
+
+# Caché de metadatos del cliente (ubicaciones de bloques y páginas de listados)
+# Segundos que una entrada se usa sin volver a consultar al NameNode (0 la desactiva)
+metadata_cache_ttl = float(os.getenv('DFS_METADATA_CACHE_TTL', 30))
+# Entradas máximas; al superarlas se descarta la usada hace más tiempo
+metadata_cache_size = int(os.getenv('DFS_METADATA_CACHE_SIZE', 1024))
+# Archivo donde el CLI conserva la caché entre invocaciones (vacío: solo en memoria del proceso)
+metadata_cache_file = os.getenv('DFS_METADATA_CACHE_FILE', '')
@@ -6,6 +6,8 @@ class Block:
     block_id: str          # UUID o identificador único
     data: bytes            # Contenido del bloque (crudo)
     checksum: str          # Hash calculado del contenido
+    codec: str = 'none'    # Codec con el que está comprimido `data`
+    raw_size: int = 0      # Tamaño sin comprimir
 
 
 @dataclass
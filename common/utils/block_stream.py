@@ -0,0 +1,13 @@
+from common.config import write_chunk_size
+
+
+def write_requests(request_type, block_id: str, data: bytes, chunk_size: int = write_chunk_size, **fields):
+    """
+    Mensajes de WriteBlockStream para `data`. El primero lleva los campos del
+    bloque (`fields`: codec, raw_size, offset, partial_write) y el tamaño total en
+    `size`, para que el DataNode admita la escritura antes de recibir los datos;
+    los siguientes llevan solo trozos de `chunk_size` bytes.
+    """
+    yield request_type(block_id=block_id, size=len(data), data=data[:chunk_size], **fields)
+    for start in range(chunk_size, len(data), chunk_size):
+        yield request_type(data=data[start:start + chunk_size])
@@ -0,0 +1,58 @@
+import re
+
+_RANGE_HEADER = re.compile(r'^\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*$')
+
+
+def parse_range_header(header: str, file_size: int) -> tuple:
+    """
+    Interpreta una cabecera HTTP `Range: bytes=...` con un único rango
+    (`a-b`, `a-` o el sufijo `-n`) sobre un archivo de `file_size` bytes.
+    Retorna (offset, length); lanza ValueError si el rango no es satisfacible.
+    """
+    match = _RANGE_HEADER.match(header or '')
+    if not match or match.groups() == ('', ''):
+        raise ValueError(f"Rango no soportado: {header}")
+    first, last = match.groups()
+    if not first:
+        # Sufijo: los últimos n bytes
+        length = min(int(last), file_size)
+        if length == 0:
+            raise ValueError(f"Rango vacío: {header}")
+        return file_size - length, length
+    offset = int(first)
+    end = min(int(last), file_size - 1) if last else file_size - 1
+    if offset >= file_size or end < offset:
+        raise ValueError(f"Rango fuera del archivo ({file_size} bytes): {header}")
+    return offset, end - offset + 1
+
+
+def covering_blocks(blocks: list, offset: int, length: int = None) -> list:
+    """
+    Bloques que cubren [offset, offset + length) de un archivo, cada uno
+    limitado a su parte del rango. `blocks` va en orden y cada uno lleva su
+    'tamaño' real (tras un anexado un bloque intermedio puede no estar lleno),
+    así que el rango se ubica sumando tamaños, no con posicion * tamaño de bloque.
+
+    Cada bloque devuelto lleva 'offset' y 'longitud' dentro del bloque
+    almacenado, igual que un archivo empaquetado en un contenedor, de modo que
+    se lee con una sola lectura por rango al DataNode. En los bloques con
+    codificación por borrado 'tamaño' sigue siendo el del bloque completo (hace
+    falta para decodificarlo) y el rango se recorta tras reconstruirlo.
+    """
+    end = None if length is None else offset + length
+    result = []
+    position = 0
+    for block in blocks:
+        start, stop = position, position + block['tamaño']
+        position = stop
+        if stop <= offset or (end is not None and start >= end):
+            continue
+        begin = max(offset, start) - start
+        finish = (min(end, stop) if end is not None else stop) - start
+        part = dict(block)
+        part['offset'] = block.get('offset', 0) + begin
+        part['longitud'] = finish - begin
+        if not block.get('ec_k'):
+            part['tamaño'] = part['longitud']
+        result.append(part)
+    return result
@@ -0,0 +1,88 @@
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # dependencia opcional
+    lz4_frame = None
+
+try:
+    import zstandard
+except ImportError:  # dependencia opcional
+    zstandard = None
+
+CODEC_NONE = 'none'
+CODEC_LZ4 = 'lz4'
+CODEC_ZSTD = 'zstd'
+
+# Tamaño de la muestra usada por la heurística de compresibilidad
+SAMPLE_SIZE = 64 * 1024
+# Por debajo de este tamaño no compensa comprimir
+MIN_COMPRESS_SIZE = 512
+# Si la muestra comprimida ocupa más que esta fracción, se envía sin comprimir
+MIN_RATIO = 0.9
+
+
+def available_codecs() -> list:
+    """
+    Devuelve los codecs disponibles en este proceso.
+    """
+    codecs = [CODEC_NONE]
+    if lz4_frame is not None:
+        codecs.append(CODEC_LZ4)
+    if zstandard is not None:
+        codecs.append(CODEC_ZSTD)
+    return codecs
+
+
+def compress(data: bytes, codec: str) -> bytes:
+    """
+    Comprime `data` con el codec indicado.
+    """
+    if codec == CODEC_NONE:
+        return data
+    if codec == CODEC_LZ4 and lz4_frame is not None:
+        return lz4_frame.compress(data)
+    if codec == CODEC_ZSTD and zstandard is not None:
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    raise ValueError(f"Codec no soportado: {codec}")
+
+
+def decompress(data: bytes, codec: str) -> bytes:
+    """
+    Descomprime `data` comprimido con el codec indicado.
+    """
+    if not codec or codec == CODEC_NONE:
+        return data
+    if codec == CODEC_LZ4 and lz4_frame is not None:
+        return lz4_frame.decompress(data)
+    if codec == CODEC_ZSTD and zstandard is not None:
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f"Codec no soportado: {codec}")
+
+
+def is_compressible(data: bytes, codec: str) -> bool:
+    """
+    Heurística: comprime una muestra del inicio y del centro de `data`
+    y decide si el ahorro justifica comprimir el bloque completo.
+    """
+    if len(data) < MIN_COMPRESS_SIZE:
+        return False
+    if len(data) <= 2 * SAMPLE_SIZE:
+        sample = data
+    else:
+        middle = len(data) // 2
+        sample = data[:SAMPLE_SIZE] + data[middle:middle + SAMPLE_SIZE]
+    return len(compress(sample, codec)) <= len(sample) * MIN_RATIO
+
+
+def compress_block(data: bytes, codec: str) -> tuple:
+    """
+    Comprime un bloque si el codec está disponible y los datos comprimen.
+    Retorna (payload, codec_usado); codec_usado es 'none' si se omitió.
+    """
+    if codec not in available_codecs() or codec == CODEC_NONE:
+        return data, CODEC_NONE
+    if not is_compressible(data, codec):
+        return data, CODEC_NONE
+    payload = compress(data, codec)
+    if len(payload) >= len(data):
+        return data, CODEC_NONE
+    return payload, codec
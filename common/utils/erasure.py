@@ -0,0 +1,131 @@
+import numpy as np
+
+# Aritmética en GF(2^8) con el polinomio primitivo x^8 + x^4 + x^3 + x^2 + 1
+_PRIMITIVE_POLY = 0x11d
+
+
+def _build_tables():
+    exp = np.zeros(512, dtype=np.uint8)
+    log = np.zeros(256, dtype=np.int32)
+    x = 1
+    for i in range(255):
+        exp[i] = x
+        log[x] = i
+        x <<= 1
+        if x & 0x100:
+            x ^= _PRIMITIVE_POLY
+    exp[255:510] = exp[:255]
+
+    # Tabla completa de multiplicación: MUL[a][b] = a * b
+    a = np.arange(256).reshape(-1, 1)
+    b = np.arange(256).reshape(1, -1)
+    mul = exp[(log[a] + log[b]) % 255].astype(np.uint8)
+    mul[0, :] = 0
+    mul[:, 0] = 0
+    return exp, log, mul
+
+
+_EXP, _LOG, _MUL = _build_tables()
+
+
+def gf_inv(a: int) -> int:
+    """
+    Inverso multiplicativo en GF(256).
+    """
+    if a == 0:
+        raise ZeroDivisionError("0 no tiene inverso en GF(256)")
+    return int(_EXP[255 - _LOG[a]])
+
+
+def _matmul(matrix: np.ndarray, cells: np.ndarray) -> np.ndarray:
+    """
+    Producto matriz (r x k) por celdas (k x n) en GF(256), vectorizado por filas de bytes.
+    """
+    out = np.zeros((matrix.shape[0], cells.shape[1]), dtype=np.uint8)
+    for i in range(matrix.shape[0]):
+        for j in range(matrix.shape[1]):
+            coef = matrix[i, j]
+            if coef:
+                out[i] ^= _MUL[coef][cells[j]]
+    return out
+
+
+def _invert(matrix: np.ndarray) -> np.ndarray:
+    """
+    Inversa de una matriz cuadrada en GF(256) por Gauss-Jordan.
+    """
+    n = matrix.shape[0]
+    aug = np.concatenate([matrix.astype(np.uint8), np.eye(n, dtype=np.uint8)], axis=1)
+    for col in range(n):
+        pivot = next((r for r in range(col, n) if aug[r, col]), None)
+        if pivot is None:
+            raise ValueError("Matriz singular")
+        aug[[col, pivot]] = aug[[pivot, col]]
+        aug[col] = _MUL[gf_inv(int(aug[col, col]))][aug[col]]
+        for r in range(n):
+            if r != col and aug[r, col]:
+                aug[r] ^= _MUL[aug[r, col]][aug[col]]
+    return aug[:, n:]
+
+
+def encoding_matrix(k: int, m: int) -> np.ndarray:
+    """
+    Matriz sistemática (k+m x k): identidad sobre una matriz de Cauchy.
+    Cualquier subconjunto de k filas es invertible.
+    """
+    if k + m > 256:
+        raise ValueError("k + m no puede superar 256 en GF(256)")
+    cauchy = np.zeros((m, k), dtype=np.uint8)
+    for i in range(m):
+        for j in range(k):
+            cauchy[i, j] = gf_inv((k + i) ^ j)
+    return np.concatenate([np.eye(k, dtype=np.uint8), cauchy], axis=0)
+
+
+def cell_size(data_size: int, k: int) -> int:
+    """
+    Tamaño de cada celda para repartir `data_size` bytes en k celdas.
+    """
+    return max(1, -(-data_size // k))
+
+
+def encode(data: bytes, k: int, m: int) -> list:
+    """
+    Divide `data` en k celdas (con relleno de ceros) y calcula m celdas de paridad.
+    Retorna las k + m celdas como bytes.
+    """
+    size = cell_size(len(data), k)
+    buffer = np.zeros(k * size, dtype=np.uint8)
+    buffer[:len(data)] = np.frombuffer(data, dtype=np.uint8)
+    cells = buffer.reshape(k, size)
+    parity = _matmul(encoding_matrix(k, m)[k:], cells)
+    return [cells[i].tobytes() for i in range(k)] + [parity[i].tobytes() for i in range(m)]
+
+
+def decode(cells: dict, k: int, m: int, data_size: int) -> bytes:
+    """
+    Reconstruye los datos originales a partir de al menos k celdas.
+    `cells` es {índice_de_celda: bytes}; índices >= k son paridad.
+    """
+    if len(cells) < k:
+        raise ValueError(f"Se necesitan {k} celdas y solo hay {len(cells)}")
+
+    indices = sorted(cells)[:k]
+    if indices == list(range(k)):
+        data = b''.join(cells[i] for i in indices)
+        return data[:data_size]
+
+    rows = encoding_matrix(k, m)[indices]
+    available = np.stack([np.frombuffer(cells[i], dtype=np.uint8) for i in indices])
+    recovered = _matmul(_invert(rows), available)
+    return recovered.tobytes()[:data_size]
+
+
+def reconstruct_cells(cells: dict, k: int, m: int, missing: list) -> dict:
+    """
+    Recalcula celdas perdidas (datos o paridad) a partir de k celdas disponibles.
+    """
+    size = len(next(iter(cells.values())))
+    data = decode(cells, k, m, k * size)
+    all_cells = encode(data, k, m)
+    return {i: all_cells[i] for i in missing}
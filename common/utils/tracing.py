@@ -0,0 +1,168 @@
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from functools import wraps
+
+# Cabeceras HTTP y claves de metadata gRPC (en minúsculas, como exige gRPC)
+TRACE_HEADER = 'x-trace-id'
+PARENT_HEADER = 'x-parent-span-id'
+
+# Con DFS_TRACE_DIR definido cada proceso escribe sus spans en <dir>/<servicio>.jsonl
+TRACE_DIR_ENV = 'DFS_TRACE_DIR'
+
+# (trace_id, span_id) del span en curso en este hilo/contexto
+_current = contextvars.ContextVar('dfs_trace_span', default=None)
+
+
+class _Exporter:
+    """Exportador JSONL: una línea por span terminado, con escritura serializada."""
+
+    def __init__(self):
+        self.service = 'dfs'
+        self.path = None
+        self._file = None
+        self._lock = threading.Lock()
+
+    def configure(self, service: str, directory: str = None):
+        directory = directory or os.environ.get(TRACE_DIR_ENV)
+        with self._lock:
+            self.service = service
+            if self._file:
+                self._file.close()
+                self._file = None
+            self.path = None
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+                self.path = os.path.join(directory, f"{service}.jsonl")
+                self._file = open(self.path, 'a', buffering=1)
+
+    @property
+    def enabled(self) -> bool:
+        return self._file is not None
+
+    def export(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            if self._file:
+                self._file.write(line + '\n')
+
+
+_exporter = _Exporter()
+
+
+def configure(service: str, directory: str = None):
+    """Nombre del componente en los spans y directorio de exportación (por defecto $DFS_TRACE_DIR)."""
+    _exporter.configure(service, directory)
+
+
+def enabled() -> bool:
+    return _exporter.enabled
+
+
+def _new_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def current_trace_id() -> str:
+    current = _current.get()
+    return current[0] if current else None
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Mide un tramo de trabajo como hijo del span en curso (o raíz de una traza nueva).
+    Cede un dict de atributos que se puede completar dentro del bloque.
+    """
+    if not _exporter.enabled:
+        yield attributes
+        return
+    parent = _current.get()
+    trace_id, parent_id = parent if parent else (uuid.uuid4().hex, None)
+    span_id = _new_id()
+    token = _current.set((trace_id, span_id))
+    start, t0 = time.time(), time.perf_counter()
+    error = None
+    try:
+        yield attributes
+    except BaseException as e:
+        error = f"{e.__class__.__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        record = {
+            'trace_id': trace_id,
+            'span_id': span_id,
+            'parent_id': parent_id,
+            'service': _exporter.service,
+            'name': name,
+            'start': start,
+            'duration_ms': (time.perf_counter() - t0) * 1000,
+            'attributes': attributes,
+        }
+        if error:
+            record['error'] = error
+        _exporter.export(record)
+
+
+def traced(name: str = None):
+    """Decorador: ejecuta la función dentro de un span (por defecto con su nombre)."""
+    def decorator(function):
+        span_name = name or function.__name__
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _exporter.enabled:
+                return function(*args, **kwargs)
+            with span(span_name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def continued(trace_id: str, parent_id: str = None):
+    """Continúa la traza recibida de otro componente; sin trace_id no cambia nada."""
+    if not trace_id:
+        yield
+        return
+    token = _current.set((trace_id, parent_id))
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def propagate(function):
+    """Envuelve `function` para que corra en otro hilo con la traza del hilo actual."""
+    context = contextvars.copy_context()
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        return context.run(function, *args, **kwargs)
+    return wrapper
+
+
+def headers() -> dict:
+    """Cabeceras HTTP para que el receptor cuelgue sus spans del span en curso."""
+    current = _current.get()
+    if not current:
+        return {}
+    trace_id, span_id = current
+    return {TRACE_HEADER: trace_id, PARENT_HEADER: span_id} if span_id else {TRACE_HEADER: trace_id}
+
+
+def grpc_metadata() -> tuple:
+    """Lo mismo que headers() como metadata gRPC."""
+    return tuple(headers().items())
+
+
+def extract(pairs) -> tuple:
+    """(trace_id, parent_id) de cabeceras HTTP o de la metadata gRPC (pares clave/valor)."""
+    items = pairs.items() if hasattr(pairs, 'items') else pairs
+    found = {key.lower(): value for key, value in items if key.lower() in (TRACE_HEADER, PARENT_HEADER)}
+    return found.get(TRACE_HEADER), found.get(PARENT_HEADER)
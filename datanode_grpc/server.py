@@ -3,23 +3,32 @@ from concurrent import futures
 import os
 import sys
 import requests
-import time
-import threading
 
 # Permitir importar el paquete common
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from common.config import grpc_base_port
+from common.config import (grpc_base_port, default_block_size, max_concurrent_writes, max_concurrent_reads,
+                           default_namenode_port, namenode_grpc_port, metrics_base_port)
 from services.grpc_service import DataNodeGRPCService
+from services.command_service import CommandExecutor
+from services.heartbeat_client import HeartbeatStreamClient
+from services.metrics_service import start_metrics_server
+from common.utils import tracing
 import protos.datanode_pb2_grpc as datanode_pb2_grpc
 import protos.datanode_pb2      as datanode_pb2
 
+# Dirección del NameNode y dirección con la que este DataNode se anuncia
+NAMENODE_HOST = os.environ.get('NAMENODE_HOST', '34.201.251.107')
+ADVERTISED_HOST = os.environ.get('DATANODE_HOST', NAMENODE_HOST)
+TOTAL_SPACE = 100000000  # Ejemplo de espacio en bytes
+
+
 def registrar_en_namenode(node_id, port):
-    namenode_url = namenode_url = "http://34.201.251.107:8080/datanodes/register"
+    namenode_url = f"http://{NAMENODE_HOST}:{default_namenode_port}/datanodes/register"
     payload = {
-        "host": "34.201.251.107",  # Debe ser donde el NameNode pueda accederlo
+        "host": ADVERTISED_HOST,  # Debe ser donde el NameNode pueda accederlo
         "puerto": port,
-        "espacio_total": 100000000  # Ejemplo de espacio en bytes
+        "espacio_total": TOTAL_SPACE
     }
     try:
         response = requests.post(namenode_url, json=payload)
@@ -34,41 +43,39 @@ def registrar_en_namenode(node_id, port):
 
 def serve(node_id: int, storage_dir=None):
     port = grpc_base_port + node_id
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-    datanode_pb2_grpc.add_DataNodeServiceServicer_to_server(
-        DataNodeGRPCService(storage_dir), server
+    # Spans en DFS_TRACE_DIR/datanode-<id>.jsonl, colgados de la traza de cada petición
+    tracing.configure(f"datanode-{node_id}")
+    workers = max_concurrent_writes + max_concurrent_reads
+    # Las RPC por encima de este límite reciben RESOURCE_EXHAUSTED sin ocupar un hilo
+    server = grpc.server(
+        futures.ThreadPoolExecutor(max_workers=workers),
+        maximum_concurrent_rpcs=workers * 2,
+        options=[
+            ('grpc.max_receive_message_length', default_block_size + 1024 * 1024),
+            ('grpc.max_send_message_length', default_block_size + 1024 * 1024),
+        ]
     )
+    servicer = DataNodeGRPCService(storage_dir)
+    datanode_pb2_grpc.add_DataNodeServiceServicer_to_server(servicer, server)
     server.add_insecure_port(f"[::]:{port}")
     print(f"DataNode {node_id} listening on port {port}")
+    start_metrics_server(metrics_base_port + node_id)
 
     # ✅ Registrar el datanode
     registrar_en_namenode(node_id=node_id, port=port)
 
-    # ✅ Iniciar thread para enviar heartbeat periódicamente
-    threading.Thread(target=enviar_heartbeat, args=(node_id, port), daemon=True).start()
+    # ✅ Abrir el stream de heartbeats con el NameNode (recibe los comandos por el mismo stream)
+    executor = CommandExecutor(servicer.storage, node_id)
+    HeartbeatStreamClient(
+        f"{NAMENODE_HOST}:{namenode_grpc_port}", ADVERTISED_HOST, port, executor,
+        on_reregister=lambda: registrar_en_namenode(node_id=node_id, port=port),
+        total_space=TOTAL_SPACE
+    ).start()
 
     server.start()
     server.wait_for_termination()
 
 
-def enviar_heartbeat(node_id, port):
-    while True:
-        try:
-            response = requests.post("http://34.201.251.107:8080/datanodes/heartbeat", json={
-                "host": "34.201.251.107",
-                "puerto": port,
-                "estado_info": {
-                    "almacenamiento_usado": 0
-                }
-            })
-            if response.status_code != 200:
-                print(f"[{node_id}] ⚠️ Fallo heartbeat: {response.text}")
-            else:
-                print(f"[{node_id}] ✅ Heartbeat enviado correctamente")
-        except Exception as e:
-            print(f"[{node_id}] ❌ Error enviando heartbeat: {e}")
-        time.sleep(15)  # cada 15 segundos
-
 if __name__ == '__main__':
     node_id = int(os.environ.get('NODE_ID', '1'))
     storage_dir = os.environ.get('STORAGE_DIR', None)
@@ -0,0 +1,113 @@
+import os
+import sys
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+# Permite importar common
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from common.config import (
+    max_inflight_bytes,
+    max_concurrent_writes,
+    max_concurrent_reads,
+    admission_retry_after_ms,
+    default_block_size,
+)
+
+WRITE = 'write'
+READ = 'read'
+
+
+class AdmissionRejected(Exception):
+    """Se lanza cuando una transferencia excede los límites del DataNode."""
+
+    def __init__(self, reason: str, retry_after_ms: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after_ms = retry_after_ms
+
+
+class AdmissionController:
+    """
+    Control de admisión para WriteBlock/ReadBlock.
+    Limita los bytes en vuelo, las operaciones concurrentes por tipo y
+    reparte el presupuesto de bytes en partes iguales entre los clientes activos
+    más el que pide, sin bajar de un bloque por cliente.
+    """
+
+    def __init__(self,
+                 max_bytes: int = max_inflight_bytes,
+                 max_writes: int = max_concurrent_writes,
+                 max_reads: int = max_concurrent_reads,
+                 retry_after_ms: int = admission_retry_after_ms):
+        self.max_bytes = max_bytes
+        self.max_ops = {WRITE: max_writes, READ: max_reads}
+        self.retry_after_ms = retry_after_ms
+        self._lock = threading.Lock()
+        self.inflight_bytes = 0
+        self.active_ops = {WRITE: 0, READ: 0}
+        self.client_bytes = defaultdict(int)
+
+    def _retry_after(self, pressure: float) -> int:
+        # Cuanto más saturado está el nodo, más larga es la espera sugerida
+        return int(self.retry_after_ms * (1 + max(0.0, pressure)))
+
+    def _check(self, client_id: str, nbytes: int, kind: str) -> None:
+        if self.active_ops[kind] >= self.max_ops[kind]:
+            raise AdmissionRejected(
+                f"Demasiadas operaciones {kind} concurrentes ({self.active_ops[kind]}/{self.max_ops[kind]})",
+                self._retry_after(self.active_ops[kind] / self.max_ops[kind])
+            )
+
+        # Un bloque más grande que todo el presupuesto solo entra con el nodo vacío
+        if self.inflight_bytes and self.inflight_bytes + nbytes > self.max_bytes:
+            raise AdmissionRejected(
+                f"Presupuesto de bytes en vuelo agotado ({self.inflight_bytes}/{self.max_bytes})",
+                self._retry_after((self.inflight_bytes + nbytes) / self.max_bytes - 1)
+            )
+
+        # Equidad: ningún cliente, tenga o no transferencias activas, supera su parte del
+        # presupuesto. La parte nunca es menor que un bloque, para que un bloque completo
+        # siempre pueda entrar cuando el cliente no tiene nada en vuelo
+        client_inflight = self.client_bytes.get(client_id, 0)
+        participants = len(self.client_bytes) + (0 if client_id in self.client_bytes else 1)
+        fair_share = max(self.max_bytes // participants, default_block_size)
+        if self.inflight_bytes and client_inflight + nbytes > fair_share:
+            raise AdmissionRejected(
+                f"Cliente {client_id} excede su parte del presupuesto ({client_inflight}/{fair_share})",
+                self._retry_after((client_inflight + nbytes) / fair_share - 1)
+            )
+
+    def acquire(self, client_id: str, nbytes: int, kind: str) -> None:
+        with self._lock:
+            self._check(client_id, nbytes, kind)
+            self.inflight_bytes += nbytes
+            self.active_ops[kind] += 1
+            self.client_bytes[client_id] += nbytes
+
+    def release(self, client_id: str, nbytes: int, kind: str) -> None:
+        with self._lock:
+            self.inflight_bytes = max(0, self.inflight_bytes - nbytes)
+            self.active_ops[kind] = max(0, self.active_ops[kind] - 1)
+            self.client_bytes[client_id] -= nbytes
+            if self.client_bytes[client_id] <= 0:
+                del self.client_bytes[client_id]
+
+    @contextmanager
+    def admit(self, client_id: str, nbytes: int, kind: str):
+        """Reserva capacidad durante la transferencia; lanza AdmissionRejected si no hay."""
+        self.acquire(client_id, nbytes, kind)
+        try:
+            yield
+        finally:
+            self.release(client_id, nbytes, kind)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'inflight_bytes': self.inflight_bytes,
+                'max_inflight_bytes': self.max_bytes,
+                'active_writes': self.active_ops[WRITE],
+                'active_reads': self.active_ops[READ],
+                'active_clients': len(self.client_bytes),
+            }
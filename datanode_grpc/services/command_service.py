@@ -0,0 +1,132 @@
+import os
+import sys
+import time
+# Permite importar common
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import grpc
+import protos.datanode_pb2_grpc as datanode_pb2_grpc
+import protos.datanode_pb2      as datanode_pb2
+from common.config import max_background_commands
+from common.utils.block_stream import write_requests
+from services.metrics_service import COMMAND_SECONDS
+
+# Tipos de comando que llegan en la respuesta al heartbeat
+TRANSFER = 'transferir'
+INVALIDATE = 'invalidar'
+FULL_REPORT = 'reporte_completo'
+REREGISTER = 're_registrar'
+COMPACT = 'compactar'
+
+TRANSFER_TIMEOUT = 60  # segundos
+
+
+class CommandExecutor:
+    """
+    Ejecuta los comandos del NameNode y acumula sus resultados,
+    que se le devuelven en el siguiente heartbeat.
+    """
+
+    def __init__(self, storage, node_id: int, capacity: int = max_background_commands):
+        self.storage = storage
+        self.capacity = capacity
+        self.client_id = f"datanode-{node_id}"
+        self.invalidated = []
+        self.completed = []
+        self.report_requested = False
+        self.reregister_requested = False
+        # Cambios de bloques pendientes de confirmar por el NameNode
+        self.added = set()
+        self.removed = set()
+
+    def execute(self, commands: list) -> None:
+        for command in commands:
+            kind = command.get('tipo')
+            start = time.perf_counter()
+            if kind == INVALIDATE:
+                self.invalidated.extend(self.storage.delete_blocks(command.get('bloques', [])))
+            elif kind == FULL_REPORT:
+                self.report_requested = True
+            elif kind == REREGISTER:
+                self.reregister_requested = True
+            elif kind == TRANSFER:
+                self.completed.append(self._transfer(command))
+            elif kind == COMPACT:
+                self.completed.append(self._compact(command))
+            else:
+                continue
+            COMMAND_SECONDS.labels(kind).observe(time.perf_counter() - start)
+
+    def _transfer(self, command: dict) -> dict:
+        # Se envía el bloque tal como está almacenado (comprimido o no)
+        block_id = command['bloque_id']
+        result = {'id': command['id'], 'exito': False, 'destinos_ok': []}
+        try:
+            block = self.storage.retrieve_block(block_id)
+        except FileNotFoundError:
+            result['error'] = f"Bloque {block_id} no encontrado"
+            return result
+
+        errors = []
+        for target in command.get('destinos', []):
+            address = f"{target['host']}:{target['puerto']}"
+            try:
+                with grpc.insecure_channel(address) as channel:
+                    stub = datanode_pb2_grpc.DataNodeServiceStub(channel)
+                    # En trozos, como los clientes: el destino admite el bloque antes de recibirlo
+                    response = stub.WriteBlockStream(
+                        write_requests(datanode_pb2.WriteBlockRequest, block_id, block.data,
+                                       codec=block.codec, raw_size=block.raw_size or len(block.data)),
+                        timeout=TRANSFER_TIMEOUT,
+                        metadata=(('x-client-id', self.client_id),)
+                    )
+                if response.success:
+                    result['destinos_ok'].append([target['host'], target['puerto']])
+                else:
+                    errors.append(f"{address}: {response.message}")
+            except grpc.RpcError as e:
+                errors.append(f"{address}: {e.code().name}")
+
+        result['exito'] = not errors
+        if errors:
+            result['error'] = '; '.join(errors)
+        return result
+
+    def _compact(self, command: dict) -> dict:
+        ranges = [(r['src_offset'], r['length'], r['dst_offset']) for r in command.get('rangos', [])]
+        try:
+            size = self.storage.compact_block(command['origen'], command['destino'], ranges)
+            return {'id': command['id'], 'exito': True, 'tamaño': size}
+        except (OSError, ValueError) as e:
+            return {'id': command['id'], 'exito': False, 'error': str(e)}
+
+    def heartbeat_payload(self) -> dict:
+        """Campos para el próximo heartbeat: capacidad, confirmaciones y, si se pidió, el reporte."""
+        status = {'capacidad': self.capacity}
+        added, removed = self.storage.pop_changes()
+        self.added.difference_update(removed)
+        self.removed.difference_update(added)
+        self.added.update(added)
+        self.removed.update(removed)
+        if self.report_requested:
+            status['bloques'] = self.storage.list_blocks()
+            status['espacio_usado'] = self.storage.used_space()
+        else:
+            # Entre reportes completos solo viajan las diferencias
+            if self.added:
+                status['bloques_agregados'] = sorted(self.added)
+            if self.removed:
+                status['bloques_eliminados'] = sorted(self.removed)
+        return {
+            'estado_info': status,
+            'invalidados': list(self.invalidated),
+            'completados': list(self.completed),
+        }
+
+    def acknowledge(self) -> None:
+        """El NameNode recibió el heartbeat: se olvidan las confirmaciones enviadas."""
+        self.invalidated = []
+        self.completed = []
+        self.added.clear()
+        self.removed.clear()
+        self.report_requested = False
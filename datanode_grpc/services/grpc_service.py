@@ -3,35 +3,175 @@ import sys
 # Permite importar common
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+import grpc
 import protos.datanode_pb2_grpc as datanode_pb2_grpc
 import protos.datanode_pb2      as datanode_pb2
 from common.models.block import Block as BlockModel
 from services.storage_service import StorageService
+from services.admission_service import AdmissionController, AdmissionRejected, WRITE, READ
 from common.utils.hashing import verify_checksum
+from common.utils.compression import CODEC_NONE, available_codecs, decompress
+from services.metrics_service import (instrumented, register_admission, BYTES_WRITTEN, BYTES_READ,
+                                      ADMISSION_REJECTED)
+
+# Clave de metadata gRPC con la espera sugerida al cliente
+RETRY_AFTER_KEY = 'retry-after-ms'
+CLIENT_ID_KEY = 'x-client-id'
+
+
+def _client_id(context) -> str:
+    """Identifica al cliente por metadata o, en su defecto, por la IP del peer."""
+    for key, value in context.invocation_metadata():
+        if key == CLIENT_ID_KEY:
+            return value
+    # peer tiene la forma 'ipv4:10.0.0.1:51234'
+    peer = context.peer() or 'desconocido'
+    return peer.rsplit(':', 1)[0]
+
+
+def _reject(context, error: AdmissionRejected, kind: str):
+    ADMISSION_REJECTED.labels(kind).inc()
+    context.set_trailing_metadata(((RETRY_AFTER_KEY, str(error.retry_after_ms)),))
+    context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, error.reason)
 
 
 class DataNodeGRPCService(datanode_pb2_grpc.DataNodeServiceServicer):
     def __init__(self, storage_dir=None):
         node_id = int(os.environ.get('NODE_ID', '1'))
         self.storage = StorageService(node_id, storage_dir)
+        self.admission = AdmissionController()
+        register_admission(self.admission)
 
-    def WriteBlock(self, request, context):
-        # request: WriteBlockRequest { block_id, data }
-        block_model = BlockModel(
-            block_id=request.block_id,
-            data=request.data,
+    @staticmethod
+    def _validate_write(header, context) -> str:
+        codec = header.codec or CODEC_NONE
+        if codec not in available_codecs():
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, f"Codec no soportado: {codec}")
+        if header.partial_write and codec != CODEC_NONE:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, "Las escrituras parciales no admiten compresión")
+        return codec
+
+    def _store(self, header, data: bytes, codec: str) -> str:
+        """Guarda `data` según los campos de `header`; retorna el checksum del prefijo si es parcial"""
+        if header.partial_write:
+            self.storage.write_range(header.block_id, header.offset, data)
+            # Los anexados confirman el bloque hasta lo escrito, no lo que hubiera más allá
+            return self.storage.prefix_checksum(header.block_id, header.offset + len(data))
+        # Se guarda tal como llega (comprimido) junto con su codec, con cálculo interno de checksum
+        self.storage.store_block(BlockModel(
+            block_id=header.block_id,
+            data=data,
             checksum="",
+            codec=codec,
+            raw_size=header.raw_size or len(data),
+        ))
+        return ""
+
+    @instrumented
+    def WriteBlock(self, request, context):
+        # request: WriteBlockRequest { block_id, data, codec, raw_size }
+        # El mensaje ya está en memoria al llegar aquí: la admisión solo limita el
+        # trabajo concurrente. WriteBlockStream admite antes de recibir los datos.
+        codec = self._validate_write(request, context)
+        client_id = _client_id(context)
+        try:
+            with self.admission.admit(client_id, len(request.data), WRITE):
+                checksum = self._store(request, request.data, codec)
+        except AdmissionRejected as e:
+            _reject(context, e, WRITE)
+        except ValueError as e:
+            context.abort(grpc.StatusCode.FAILED_PRECONDITION, str(e))
+        BYTES_WRITTEN.labels('partial' if request.partial_write else 'full').inc(len(request.data))
+        return datanode_pb2.WriteBlockResponse(
+            success=True,
+            message="Block stored successfully",
+            checksum=checksum
         )
-        # almacenar con cálculo interno de checksum
-        self.storage.store_block(block_model)
+
+    @instrumented
+    def WriteBlockStream(self, request_iterator, context):
+        # Primer mensaje: campos del bloque y `size`; después, trozos de `data`
+        header = next(request_iterator, None)
+        if header is None:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, "Escritura vacía")
+        codec = self._validate_write(header, context)
+        size = header.size or len(header.data)
+        client_id = _client_id(context)
+        try:
+            # Se reserva el bloque entero antes de pedir el primer trozo: si no hay
+            # capacidad, los datos no llegan a leerse del socket
+            with self.admission.admit(client_id, size, WRITE):
+                data = b''.join([header.data] + [chunk.data for chunk in request_iterator])
+                if len(data) != size:
+                    context.abort(grpc.StatusCode.INVALID_ARGUMENT,
+                                  f"Se anunciaron {size} bytes y llegaron {len(data)}")
+                checksum = self._store(header, data, codec)
+        except AdmissionRejected as e:
+            _reject(context, e, WRITE)
+        except ValueError as e:
+            context.abort(grpc.StatusCode.FAILED_PRECONDITION, str(e))
+        BYTES_WRITTEN.labels('partial' if header.partial_write else 'full').inc(size)
         return datanode_pb2.WriteBlockResponse(
             success=True,
-            message="Block stored successfully"
+            message="Block stored successfully",
+            checksum=checksum
         )
 
+    @instrumented
     def ReadBlock(self, request, context):
-        # request: ReadBlockRequest { block_id }
-        block_model = self.storage.retrieve_block(request.block_id)
+        # request: ReadBlockRequest { block_id, passthrough, offset, length }
+        client_id = _client_id(context)
+        # NOT_FOUND (y no UNKNOWN) para que el cliente descarte la ubicación y pruebe otra réplica
+        if not self.storage.has_block(request.block_id):
+            context.abort(grpc.StatusCode.NOT_FOUND, f"Bloque {request.block_id} no encontrado")
+        ranged = request.offset > 0 or request.length > 0
+        if ranged:
+            size = request.length or self.storage.block_size(request.block_id, raw=True) - request.offset
+        else:
+            size = self.storage.block_size(request.block_id, raw=not request.passthrough)
+        try:
+            with self.admission.admit(client_id, max(0, size), READ):
+                if ranged:
+                    # Los rangos siempre se devuelven descomprimidos
+                    data = self.storage.read_range(request.block_id, request.offset, request.length)
+                    BYTES_READ.labels('range').inc(len(data))
+                    return datanode_pb2.ReadBlockResponse(data=data, codec=CODEC_NONE, raw_size=len(data))
+                block_model = self.storage.retrieve_block(request.block_id)
+                if request.passthrough:
+                    data, codec = block_model.data, block_model.codec
+                else:
+                    data, codec = decompress(block_model.data, block_model.codec), CODEC_NONE
+        except AdmissionRejected as e:
+            _reject(context, e, READ)
+        except FileNotFoundError:
+            # Borrado por una invalidación entre la comprobación y la lectura
+            context.abort(grpc.StatusCode.NOT_FOUND, f"Bloque {request.block_id} no encontrado")
+        BYTES_READ.labels('passthrough' if request.passthrough else 'full').inc(len(data))
         return datanode_pb2.ReadBlockResponse(
-            data=block_model.data
-        )
\ No newline at end of file
+            data=data,
+            codec=codec,
+            raw_size=block_model.raw_size
+        )
+
+    @instrumented
+    def BlockChecksum(self, request, context):
+        # request: BlockChecksumRequest { block_id, length }
+        try:
+            checksum = self.storage.checksum(request.block_id, request.length)
+        except FileNotFoundError:
+            context.abort(grpc.StatusCode.NOT_FOUND, f"Bloque {request.block_id} no encontrado")
+        return datanode_pb2.BlockChecksumResponse(checksum=checksum)
+
+    @instrumented
+    def CompactBlock(self, request, context):
+        # request: CompactBlockRequest { source_block_id, target_block_id, ranges }
+        ranges = [(r.src_offset, r.length, r.dst_offset) for r in request.ranges]
+        try:
+            size = self.storage.compact_block(request.source_block_id, request.target_block_id, ranges)
+        except FileNotFoundError:
+            context.abort(grpc.StatusCode.NOT_FOUND, f"Bloque {request.source_block_id} no encontrado")
+        return datanode_pb2.CompactBlockResponse(
+            success=True,
+            message="Block compacted successfully",
+            size=size
+        )
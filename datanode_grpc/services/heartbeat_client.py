@@ -0,0 +1,124 @@
+import os
+import sys
+import threading
+import time
+# Permite importar common
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import grpc
+import protos.namenode_pb2_grpc as namenode_pb2_grpc
+import protos.namenode_pb2      as namenode_pb2
+from common.config import heartbeat_interval
+
+# Espera máxima entre reintentos de conexión con el NameNode
+MAX_RECONNECT_DELAY = 30
+
+
+def command_to_dict(command) -> dict:
+    """Convierte un Command tipado al formato que ejecuta CommandExecutor."""
+    return {
+        'id': command.id,
+        'tipo': command.type,
+        'bloque_id': command.block_id,
+        'destinos': [{'host': t.host, 'puerto': t.port} for t in command.targets],
+        'bloques': list(command.block_ids),
+        'origen': command.source_block_id,
+        'destino': command.target_block_id,
+        'rangos': [{'src_offset': r.src_offset, 'length': r.length, 'dst_offset': r.dst_offset}
+                   for r in command.ranges],
+    }
+
+
+def build_heartbeat(host: str, port: int, payload: dict, total_space: int = 0):
+    """Construye el Heartbeat a partir de CommandExecutor.heartbeat_payload()."""
+    status = payload['estado_info']
+    full = 'bloques' in status
+    report = namenode_pb2.BlockReport(
+        added=status['bloques'] if full else status.get('bloques_agregados', []),
+        removed=[] if full else status.get('bloques_eliminados', []),
+        full=full,
+    )
+    completed = [namenode_pb2.CommandResult(
+        id=result['id'],
+        success=result.get('exito', False),
+        error=result.get('error', ''),
+        targets_ok=[namenode_pb2.NodeAddress(host=h, port=p) for h, p in result.get('destinos_ok', [])],
+        size=result.get('tamaño', 0),
+    ) for result in payload['completados']]
+    return namenode_pb2.Heartbeat(
+        node=namenode_pb2.NodeAddress(host=host, port=port),
+        used_space=status.get('espacio_usado', 0),
+        total_space=total_space,
+        capacity=status.get('capacidad', 0),
+        report=report,
+        invalidated=payload['invalidados'],
+        completed=completed,
+    )
+
+
+class HeartbeatStreamClient:
+    """
+    Mantiene un único stream bidireccional con el NameNode.
+    Cada heartbeat espera la respuesta del anterior, así los resultados
+    se confirman en orden y el trabajo queda marcado por la cadencia del heartbeat.
+    """
+
+    def __init__(self, namenode_address: str, host: str, port: int, executor,
+                 on_reregister=None, total_space: int = 0, interval: float = heartbeat_interval):
+        self.namenode_address = namenode_address
+        self.host = host
+        self.port = port
+        self.executor = executor
+        self.on_reregister = on_reregister
+        self.total_space = total_space
+        self.interval = interval
+        self._answered = threading.Event()
+        self._stop = threading.Event()
+
+    def _heartbeats(self, closed: threading.Event):
+        while not closed.is_set():
+            yield build_heartbeat(self.host, self.port, self.executor.heartbeat_payload(), self.total_space)
+            # No se envía el siguiente hasta procesar la respuesta a este
+            while not self._answered.wait(timeout=1):
+                if closed.is_set():
+                    return
+            self._answered.clear()
+            if closed.wait(self.interval):
+                return
+
+    def _run_stream(self) -> None:
+        closed = threading.Event()
+        self._answered.clear()
+        try:
+            with grpc.insecure_channel(self.namenode_address) as channel:
+                stub = namenode_pb2_grpc.NameNodeServiceStub(channel)
+                for response in stub.HeartbeatStream(self._heartbeats(closed)):
+                    self.executor.acknowledge()
+                    self.executor.execute([command_to_dict(c) for c in response.commands])
+                    if self.executor.reregister_requested and self.on_reregister:
+                        self.on_reregister()
+                        self.executor.reregister_requested = False
+                        self.executor.report_requested = True
+                    self._answered.set()
+        finally:
+            closed.set()
+
+    def run_forever(self) -> None:
+        delay = 1
+        while not self._stop.is_set():
+            started = time.time()
+            try:
+                self._run_stream()
+            except grpc.RpcError as e:
+                print(f"❌ Stream de heartbeat con el NameNode cortado: {e.code().name}")
+            # Si el stream duró, se vuelve a intentar enseguida; si no, backoff exponencial
+            delay = 1 if time.time() - started > MAX_RECONNECT_DELAY else min(delay * 2, MAX_RECONNECT_DELAY)
+            self._stop.wait(delay)
+
+    def start(self) -> threading.Thread:
+        thread = threading.Thread(target=self.run_forever, daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self) -> None:
+        self._stop.set()
@@ -0,0 +1,66 @@
+import os
+import sys
+import time
+from functools import wraps
+# Permite importar common
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import grpc
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+from common.utils import tracing
+
+# Latencias de una transferencia de bloque: desde lecturas en caché de página
+# hasta bloques de 64 MiB en disco lento
+RPC_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+RPC_SECONDS = Histogram('dfs_datanode_rpc_seconds', 'Duración de las RPC del DataNode',
+                        ['method', 'code'], buckets=RPC_BUCKETS)
+RPC_INFLIGHT = Gauge('dfs_datanode_rpc_inflight', 'RPC del DataNode en curso', ['method'])
+BYTES_WRITTEN = Counter('dfs_datanode_written_bytes_total', 'Bytes recibidos en WriteBlock', ['mode'])
+BYTES_READ = Counter('dfs_datanode_read_bytes_total', 'Bytes enviados en ReadBlock', ['mode'])
+ADMISSION_REJECTED = Counter('dfs_datanode_admission_rejected_total',
+                             'Transferencias rechazadas por el control de admisión', ['kind'])
+COMMAND_SECONDS = Histogram('dfs_datanode_command_seconds', 'Duración de los comandos recibidos por heartbeat',
+                            ['type'], buckets=RPC_BUCKETS)
+
+
+def instrumented(method):
+    """
+    Decorador para un método del servicer gRPC: latencia por código de salida, RPC en curso
+    y un span colgado de la traza que llegue en la metadata.
+    """
+    inflight = RPC_INFLIGHT.labels(method.__name__)
+
+    @wraps(method)
+    def wrapper(self, request, context):
+        code = grpc.StatusCode.OK
+        start = time.perf_counter()
+        inflight.inc()
+        try:
+            with tracing.continued(*tracing.extract(context.invocation_metadata())), \
+                    tracing.span(method.__name__, block_id=getattr(request, 'block_id', '')):
+                return method(self, request, context)
+        except Exception:
+            # context.abort lanza una excepción; el código ya quedó fijado en el contexto
+            code = getattr(context, 'code', lambda: None)() or grpc.StatusCode.UNKNOWN
+            raise
+        finally:
+            inflight.dec()
+            RPC_SECONDS.labels(method.__name__, code.name).observe(time.perf_counter() - start)
+    return wrapper
+
+
+def register_admission(admission):
+    """Expone el estado del control de admisión como gauges leídos en cada scrape"""
+    Gauge('dfs_datanode_inflight_bytes', 'Bytes admitidos en vuelo').set_function(
+        lambda: admission.inflight_bytes)
+    Gauge('dfs_datanode_inflight_bytes_limit', 'Presupuesto de bytes en vuelo').set_function(
+        lambda: admission.max_bytes)
+    Gauge('dfs_datanode_active_clients', 'Clientes con transferencias activas').set_function(
+        lambda: len(admission.client_bytes))
+
+
+def start_metrics_server(port: int):
+    """Servir /metrics en un puerto HTTP aparte (el DataNode solo habla gRPC)"""
+    start_http_server(port)
+    print(f"📈 Métricas del DataNode en http://0.0.0.0:{port}/metrics")
@@ -1,11 +1,19 @@
 import os
 import sys
+import json
+import hashlib
+import threading
 # Permite importar common
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from common.config import blocks_storage_dir
 from common.models.block import Block
 from common.utils.hashing import calculate_checksum
+from common.utils.compression import CODEC_NONE, decompress
+from common.utils import tracing
+
+# Lectura por tramos al calcular checksums de bloques ya escritos
+CHECKSUM_CHUNK = 4 * 1024 * 1024
 
 
 class StorageService:
@@ -13,19 +21,154 @@ class StorageService:
         self.node_id = node_id
         self.base_dir = base_dir or os.path.join(blocks_storage_dir)
         os.makedirs(self.base_dir, exist_ok=True)
+        # Bloques creados/borrados desde el último reporte al NameNode
+        self._changes_lock = threading.Lock()
+        self._added = set()
+        self._removed = set()
+
+    def _record_change(self, block_id: str, added: bool) -> None:
+        with self._changes_lock:
+            if added:
+                self._removed.discard(block_id)
+                self._added.add(block_id)
+            else:
+                self._added.discard(block_id)
+                self._removed.add(block_id)
+
+    def pop_changes(self) -> tuple:
+        """Retorna (agregados, borrados) desde la última llamada y reinicia el registro."""
+        with self._changes_lock:
+            added, removed = sorted(self._added), sorted(self._removed)
+            self._added.clear()
+            self._removed.clear()
+        return added, removed
 
     def _block_path(self, block_id: str) -> str:
         return os.path.join(self.base_dir, block_id)
 
+    def _meta_path(self, block_id: str) -> str:
+        return self._block_path(block_id) + '.meta'
+
+    def _read_meta(self, block_id: str) -> dict:
+        # Bloques sin archivo .meta se guardaron sin comprimir
+        path = self._meta_path(block_id)
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                return json.load(f)
+        return {'codec': CODEC_NONE, 'raw_size': self.block_size(block_id)}
+
     def store_block(self, block: Block) -> None:
         path = self._block_path(block.block_id)
-        block.checksum = calculate_checksum(block.data)
-        with open(path, 'wb') as f:
+        with tracing.span('checksum', bytes=len(block.data)):
+            block.checksum = calculate_checksum(block.data)
+        with tracing.span('disk_write', bytes=len(block.data)), open(path, 'wb') as f:
             f.write(block.data)
+        # El codec se registra junto al bloque para poder servirlo después
+        if block.codec != CODEC_NONE:
+            with open(self._meta_path(block.block_id), 'w') as f:
+                json.dump({'codec': block.codec, 'raw_size': block.raw_size}, f)
+        elif os.path.exists(self._meta_path(block.block_id)):
+            os.remove(self._meta_path(block.block_id))
+        self._record_change(block.block_id, added=True)
+
+    def write_range(self, block_id: str, offset: int, data: bytes) -> int:
+        """Escribe `data` en `offset` sin truncar (contenedores de archivos pequeños)."""
+        if self._read_meta(block_id)['codec'] != CODEC_NONE:
+            raise ValueError(f"El bloque {block_id} está comprimido; no admite escrituras parciales")
+        path = self._block_path(block_id)
+        exists = os.path.exists(path)
+        with tracing.span('disk_write', bytes=len(data), offset=offset), \
+                open(path, 'r+b' if exists else 'wb') as f:
+            f.seek(offset)
+            f.write(data)
+        if not exists:
+            self._record_change(block_id, added=True)
+        return os.path.getsize(path)
+
+    def prefix_checksum(self, block_id: str, length: int) -> str:
+        """SHA-256 de los primeros `length` bytes del bloque sin comprimir, leído por tramos."""
+        sha = hashlib.sha256()
+        with tracing.span('checksum', bytes=length), open(self._block_path(block_id), 'rb') as f:
+            while length > 0:
+                chunk = f.read(min(length, CHECKSUM_CHUNK))
+                if not chunk:
+                    break
+                sha.update(chunk)
+                length -= len(chunk)
+        return sha.hexdigest()
+
+    def checksum(self, block_id: str, length: int = 0) -> str:
+        """SHA-256 de los primeros `length` bytes del bloque sin comprimir (0 = el bloque entero)."""
+        meta = self._read_meta(block_id)
+        if meta['codec'] != CODEC_NONE:
+            data = decompress(self.retrieve_block(block_id).data, meta['codec'])
+            with tracing.span('checksum', bytes=len(data)):
+                return calculate_checksum(data[:length] if length else data)
+        return self.prefix_checksum(block_id, length or self.block_size(block_id))
+
+    def read_range(self, block_id: str, offset: int, length: int) -> bytes:
+        """Lee `length` bytes desde `offset` del bloque sin comprimir (0 = hasta el final)."""
+        meta = self._read_meta(block_id)
+        if meta['codec'] != CODEC_NONE:
+            data = decompress(self.retrieve_block(block_id).data, meta['codec'])
+            return data[offset:offset + length] if length else data[offset:]
+        with open(self._block_path(block_id), 'rb') as f:
+            f.seek(offset)
+            return f.read(length) if length else f.read()
+
+    def compact_block(self, source_id: str, target_id: str, ranges: list) -> int:
+        """Copia los rangos (src_offset, length, dst_offset) de un contenedor a uno nuevo."""
+        target_path = self._block_path(target_id)
+        with open(self._block_path(source_id), 'rb') as src, open(target_path + '.tmp', 'wb') as dst:
+            for src_offset, length, dst_offset in ranges:
+                src.seek(src_offset)
+                dst.seek(dst_offset)
+                dst.write(src.read(length))
+        os.replace(target_path + '.tmp', target_path)
+        self._record_change(target_id, added=True)
+        return os.path.getsize(target_path)
+
+    def has_block(self, block_id: str) -> bool:
+        return os.path.exists(self._block_path(block_id))
+
+    def block_size(self, block_id: str, raw: bool = False) -> int:
+        path = self._block_path(block_id)
+        if not os.path.exists(path):
+            return 0
+        if raw:
+            return self._read_meta(block_id)['raw_size']
+        return os.path.getsize(path)
+
+    def list_blocks(self) -> list:
+        """IDs de todos los bloques guardados (para el reporte completo al NameNode)."""
+        return [name for name in os.listdir(self.base_dir)
+                if not name.endswith(('.meta', '.tmp'))]
+
+    def used_space(self) -> int:
+        return sum(os.path.getsize(self._block_path(block_id)) for block_id in self.list_blocks())
+
+    def delete_blocks(self, block_ids: list) -> list:
+        """Borra varios bloques (y su .meta); retorna los que ya no existen en disco."""
+        deleted = []
+        for block_id in block_ids:
+            for path in (self._block_path(block_id), self._meta_path(block_id)):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            # Borrar es idempotente: un bloque ausente también se confirma
+            if not os.path.exists(self._block_path(block_id)):
+                deleted.append(block_id)
+                self._record_change(block_id, added=False)
+        return deleted
 
     def retrieve_block(self, block_id: str) -> Block:
         path = self._block_path(block_id)
-        with open(path, 'rb') as f:
+        with tracing.span('disk_read') as attributes, open(path, 'rb') as f:
             data = f.read()
-        checksum = calculate_checksum(data)
-        return Block(block_id=block_id, data=data, checksum=checksum)
+            attributes['bytes'] = len(data)
+        with tracing.span('checksum', bytes=len(data)):
+            checksum = calculate_checksum(data)
+        meta = self._read_meta(block_id)
+        return Block(block_id=block_id, data=data, checksum=checksum,
+                     codec=meta['codec'], raw_size=meta['raw_size'])
@@ -0,0 +1,60 @@
+"""Configuración común de las pruebas unitarias.
+
+Las pruebas importan los servicios del NameNode (API/) y los módulos compartidos
+(common/, datanode_grpc/) sin arrancar ningún proceso. Los protos se compilan en
+un directorio temporal si no están generados, como hace el harness de benchmarks.
+
+Uso (desde la raíz del repositorio):
+    python -m pytest -q
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, 'API'))
+
+# config crea el directorio de metadatos al importarse: nunca debe ser el del NameNode
+os.environ['NAMENODE_METADATA_DIR'] = tempfile.mkdtemp(prefix='pruebas_namenode_')
+
+
+def _preparar_protos():
+    fuente = os.path.join(RAIZ, 'datanode_grpc')
+    if os.path.exists(os.path.join(fuente, 'protos', 'datanode_pb2.py')):
+        return
+    from grpc_tools import protoc
+    destino = tempfile.mkdtemp(prefix='pruebas_protos_')
+    for proto in ('namenode.proto', 'datanode.proto'):
+        codigo = protoc.main(['protoc', f'-I{fuente}', f'--python_out={destino}', f'--grpc_python_out={destino}',
+                              os.path.join(fuente, 'protos', proto)])
+        if codigo != 0:
+            raise RuntimeError(f"No se pudo compilar {proto}")
+    sys.path.insert(0, destino)
+
+
+_preparar_protos()
+
+
+@pytest.fixture
+def metadatos(tmp_path, monkeypatch):
+    """Directorio de metadatos vacío para los servicios que se creen en la prueba"""
+    from servicios import archivos_servicio, bloques_servicio, sesiones_subida_servicio
+    for modulo in (archivos_servicio, bloques_servicio, sesiones_subida_servicio):
+        monkeypatch.setattr(modulo, 'NAMENODE_METADATA_DIR', str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def servicios(metadatos, monkeypatch):
+    """(ArchivosServicio, BloquesServicio) sobre `metadatos`, con DataNodes que nunca se contactan"""
+    from servicios.archivos_servicio import ArchivosServicio
+    from servicios.bloques_servicio import BloquesServicio
+    archivos_servicio = ArchivosServicio()
+    bloques_servicio = BloquesServicio()
+    # Las réplicas confirman el contenido anotado en el bloque
+    monkeypatch.setattr(bloques_servicio.cliente_datanodes, 'checksum_bloque',
+                        lambda host, puerto, bloque_id, longitud=0: bloques_servicio.bloques_metadata[bloque_id].checksum)
+    return archivos_servicio, bloques_servicio
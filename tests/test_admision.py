@@ -0,0 +1,63 @@
+import pytest
+
+from common.config import default_block_size
+from datanode_grpc.services.admission_service import AdmissionController, AdmissionRejected, READ, WRITE
+
+
+def test_limita_operaciones_concurrentes_por_tipo():
+    control = AdmissionController(max_bytes=100 * default_block_size, max_writes=2, max_reads=1)
+    control.acquire('a', 10, WRITE)
+    control.acquire('b', 10, WRITE)
+    with pytest.raises(AdmissionRejected):
+        control.acquire('c', 10, WRITE)
+    # Las lecturas tienen su propio límite
+    control.acquire('c', 10, READ)
+
+    control.release('a', 10, WRITE)
+    control.acquire('c', 10, WRITE)
+
+
+def test_presupuesto_de_bytes_en_vuelo():
+    control = AdmissionController(max_bytes=4 * default_block_size, max_writes=10, max_reads=10)
+    for cliente in ('a', 'b', 'c', 'd'):
+        control.acquire(cliente, default_block_size, WRITE)
+    with pytest.raises(AdmissionRejected) as rechazo:
+        control.acquire('e', 1, WRITE)
+    assert rechazo.value.retry_after_ms >= control.retry_after_ms
+
+    control.release('a', default_block_size, WRITE)
+    control.acquire('e', default_block_size, WRITE)
+    assert control.stats()['inflight_bytes'] == 4 * default_block_size
+
+
+def test_bloque_mayor_que_el_presupuesto_entra_con_el_nodo_vacio():
+    control = AdmissionController(max_bytes=default_block_size, max_writes=10, max_reads=10)
+    with control.admit('a', 3 * default_block_size, WRITE):
+        with pytest.raises(AdmissionRejected):
+            control.acquire('b', 1, WRITE)
+    assert control.stats()['inflight_bytes'] == 0
+
+
+def test_reparto_equitativo_entre_clientes():
+    control = AdmissionController(max_bytes=4 * default_block_size, max_writes=10, max_reads=10)
+    control.acquire('a', default_block_size, WRITE)
+    control.acquire('b', default_block_size, WRITE)
+    # Con dos clientes, a cada uno le corresponde la mitad del presupuesto
+    control.acquire('a', default_block_size, WRITE)
+    with pytest.raises(AdmissionRejected):
+        control.acquire('a', default_block_size, WRITE)
+    control.acquire('b', default_block_size, WRITE)
+
+
+def test_admit_libera_aunque_falle_la_transferencia():
+    control = AdmissionController(max_bytes=4 * default_block_size, max_writes=1, max_reads=1)
+    with pytest.raises(IOError):
+        with control.admit('a', default_block_size, WRITE):
+            raise IOError('fallo de disco')
+    assert control.stats() == {
+        'inflight_bytes': 0,
+        'max_inflight_bytes': 4 * default_block_size,
+        'active_writes': 0,
+        'active_reads': 0,
+        'active_clients': 0,
+    }
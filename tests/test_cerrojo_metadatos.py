@@ -0,0 +1,97 @@
+import threading
+import time
+
+import pytest
+
+from servicios.cerrojo_metadatos import CerrojoLectorEscritor
+
+ESPERA = 2  # segundos; solo se agotan si el cerrojo se bloquea
+
+
+def _en_hilo(funcion):
+    hilo = threading.Thread(target=funcion, daemon=True)
+    hilo.start()
+    return hilo
+
+
+def test_las_lecturas_se_solapan():
+    cerrojo = CerrojoLectorEscritor()
+    dentro = threading.Barrier(3, timeout=ESPERA)
+
+    def leer():
+        with cerrojo.lectura():
+            dentro.wait()
+
+    hilos = [_en_hilo(leer) for _ in range(3)]
+    for hilo in hilos:
+        hilo.join(ESPERA)
+    assert not any(hilo.is_alive() for hilo in hilos)
+
+
+def test_la_escritura_excluye_a_los_lectores():
+    cerrojo = CerrojoLectorEscritor()
+    leido = threading.Event()
+
+    def leer():
+        with cerrojo.lectura():
+            leido.set()
+
+    with cerrojo.escritura():
+        hilo = _en_hilo(leer)
+        assert not leido.wait(0.1)
+    assert leido.wait(ESPERA)
+    hilo.join(ESPERA)
+
+
+def test_un_escritor_esperando_no_se_queda_sin_turno():
+    cerrojo = CerrojoLectorEscritor()
+    orden = []
+    escritor_esperando = threading.Event()
+
+    def escribir():
+        escritor_esperando.set()
+        with cerrojo.escritura():
+            orden.append('escritor')
+
+    def leer():
+        with cerrojo.lectura():
+            orden.append('lector nuevo')
+
+    with cerrojo.lectura():
+        escritor = _en_hilo(escribir)
+        escritor_esperando.wait(ESPERA)
+        while not cerrojo._escritores_esperando:
+            time.sleep(0.001)
+        # Con un escritor en cola, un lector que llega después espera a que termine
+        lector = _en_hilo(leer)
+        time.sleep(0.1)
+        assert orden == []
+    escritor.join(ESPERA)
+    lector.join(ESPERA)
+    assert orden == ['escritor', 'lector nuevo']
+
+
+def test_reentrante_por_hilo():
+    cerrojo = CerrojoLectorEscritor()
+    with cerrojo.escritura():
+        with cerrojo.lectura():
+            with cerrojo.escritura():
+                pass
+    assert cerrojo._escritor is None
+
+    with cerrojo.lectura():
+        with cerrojo.lectura():
+            pass
+        with pytest.raises(RuntimeError):
+            cerrojo.adquirir_escritura()
+    assert cerrojo._lectores == 0
+
+    # Tras liberarse por completo, otro hilo puede escribir
+    escrito = threading.Event()
+
+    def escribir():
+        with cerrojo.escritura():
+            escrito.set()
+
+    _en_hilo(escribir).join(ESPERA)
+    assert escrito.is_set()
@@ -0,0 +1,86 @@
+import pytest
+
+from servicios.archivos_servicio import ArchivosServicio
+from servicios.bloques_servicio import BloquesServicio
+from servicios.concesiones_servicio import ConcesionesServicio, EN_CONSTRUCCION
+
+
+def _archivo(servicios, ruta: str, tamaño: int):
+    archivos_servicio, bloques_servicio = servicios
+    archivo = archivos_servicio.crear_archivo(ruta, 'ana')
+    archivo.bloques = [b.bloque_id for b in bloques_servicio.crear_bloques_para_archivo(archivo.nombre, tamaño)]
+    archivo.tamaño_total = tamaño
+    archivos_servicio.guardar_archivo(archivo)
+    return archivo
+
+
+def test_anexar_rellena_el_ultimo_bloque_y_agrega_los_nuevos(servicios):
+    archivos_servicio, bloques_servicio = servicios
+    block_size = bloques_servicio.block_size
+    archivo = _archivo(servicios, '/log', block_size + 10)
+    anteriores = list(archivo.bloques)
+    concesiones = ConcesionesServicio(archivos_servicio, bloques_servicio)
+
+    plan = concesiones.abrir('/log', block_size, 'ana')
+    assert plan['ultimo']['bloque_id'] == anteriores[-1]
+    assert plan['ultimo']['offset'] == 10
+    assert plan['ultimo']['longitud'] == block_size - 10
+    assert [b['tamaño'] for b in plan['bloques']] == [10]
+    # Hasta completar, los lectores ven el archivo como estaba
+    assert archivo.bloques == anteriores
+    assert archivo.tamaño_total == block_size + 10
+    assert bloques_servicio.obtener_bloque(plan['bloques'][0]['bloque_id']).estado == EN_CONSTRUCCION
+
+    concesiones.completar(plan['concesion_id'], 'ana', checksum_ultimo='c' * 64)
+    assert archivo.bloques == anteriores + [plan['bloques'][0]['bloque_id']]
+    assert archivo.tamaño_total == 2 * block_size + 10
+    assert bloques_servicio.obtener_bloque(anteriores[-1]).tamaño == block_size
+    assert bloques_servicio.obtener_bloque(archivo.bloques[-1]).estado == 'activo'
+    assert concesiones.concesiones == {}
+
+
+def test_un_solo_escritor_por_archivo(servicios):
+    archivos_servicio, bloques_servicio = servicios
+    _archivo(servicios, '/log', 10)
+    concesiones = ConcesionesServicio(archivos_servicio, bloques_servicio)
+
+    plan = concesiones.abrir('/log', 5, 'ana')
+    with pytest.raises(ValueError):
+        concesiones.abrir('/log', 5, 'ana')
+    with pytest.raises(PermissionError):
+        concesiones.renovar(plan['concesion_id'], 'luis')
+    with pytest.raises(PermissionError):
+        concesiones.completar(plan['concesion_id'], 'luis', checksum_ultimo='c' * 64)
+
+    concesiones.abandonar(plan['concesion_id'], 'ana')
+    concesiones.abrir('/log', 5, 'luis')
+
+
+def test_una_concesion_caducada_libera_sus_bloques(servicios):
+    archivos_servicio, bloques_servicio = servicios
+    archivo = _archivo(servicios, '/log', bloques_servicio.block_size)
+    concesiones = ConcesionesServicio(archivos_servicio, bloques_servicio)
+    concesiones.duracion = 0
+
+    plan = concesiones.abrir('/log', 100, 'ana')
+    nuevo = plan['bloques'][0]['bloque_id']
+    assert concesiones.expirar() == 1
+    assert bloques_servicio.obtener_bloque(nuevo) is None
+    assert archivo.tamaño_total == bloques_servicio.block_size
+    with pytest.raises(ValueError):
+        concesiones.completar(plan['concesion_id'], 'ana')
+
+    # Otro escritor puede anexar sin esperar
+    concesiones.duracion = 60
+    concesiones.abrir('/log', 100, 'luis')
+
+
+def test_al_reiniciar_se_liberan_los_bloques_en_construccion(servicios):
+    archivos_servicio, bloques_servicio = servicios
+    _archivo(servicios, '/log', bloques_servicio.block_size)
+    plan = ConcesionesServicio(archivos_servicio, bloques_servicio).abrir('/log', 100, 'ana')
+
+    recargado = BloquesServicio()
+    assert recargado.obtener_bloque(plan['bloques'][0]['bloque_id']).estado == EN_CONSTRUCCION
+    ConcesionesServicio(ArchivosServicio(), recargado)
+    assert recargado.obtener_bloque(plan['bloques'][0]['bloque_id']) is None
@@ -0,0 +1,72 @@
+import hashlib
+
+import pytest
+
+from servicios.bloques_servicio import BloquesServicio
+
+
+def _digest(contenido: bytes) -> str:
+    return hashlib.sha256(contenido).hexdigest()
+
+
+def _verificado(bloques_servicio, bloque):
+    """Lo que ocurre cuando una réplica confirma que guarda el contenido del bloque"""
+    bloques_servicio.verificaciones_digest[bloque.bloque_id] = bloque.checksum
+    bloques_servicio._indexar_digest(bloque.bloque_id, bloque.checksum, bloque.checksum)
+
+
+def _invalidaciones(bloques_servicio):
+    return {bloque_id for datanode in bloques_servicio.datanodes.values() for bloque_id in datanode.invalidaciones}
+
+
+@pytest.fixture
+def bloques_servicio(metadatos):
+    return BloquesServicio()
+
+
+def test_bloques_repetidos_en_un_archivo_se_guardan_una_vez(bloques_servicio):
+    d = _digest(b'a')
+    resultado = bloques_servicio.crear_bloques_deduplicados('/x', [{'digest': d, 'tamaño': 1}] * 3)
+
+    assert [es_nuevo for _, es_nuevo in resultado] == [True, False, False]
+    bloque = resultado[0][0]
+    assert all(b is bloque for b, _ in resultado)
+    assert bloque.referencias == 3
+
+
+def test_borrar_un_archivo_solo_libera_sus_referencias(bloques_servicio):
+    comun, solo_a, solo_b = _digest(b'comun'), _digest(b'a'), _digest(b'b')
+    archivo_a = bloques_servicio.crear_bloques_deduplicados('/a', [{'digest': comun, 'tamaño': 5},
+                                                                  {'digest': solo_a, 'tamaño': 1}])
+    for bloque, _ in archivo_a:
+        _verificado(bloques_servicio, bloque)
+
+    archivo_b = bloques_servicio.crear_bloques_deduplicados('/b', [{'digest': comun, 'tamaño': 5},
+                                                                  {'digest': solo_b, 'tamaño': 1}])
+    assert [es_nuevo for _, es_nuevo in archivo_b] == [False, True]
+    compartido = archivo_a[0][0]
+    assert archivo_b[0][0] is compartido
+    assert compartido.referencias == 2
+
+    # Borrar /a elimina su bloque propio y deja el compartido con una referencia, aún deduplicable
+    assert bloques_servicio.liberar_bloques([b.bloque_id for b, _ in archivo_a]) == 1
+    assert compartido.bloque_id in bloques_servicio.bloques_metadata
+    assert compartido.referencias == 1
+    assert bloques_servicio.buscar_bloques_por_digest([comun, solo_a]) == {comun: compartido}
+    assert _invalidaciones(bloques_servicio) == {archivo_a[1][0].bloque_id}
+
+    # Borrar /b elimina el último uso del compartido: se desindexa y se borra de sus réplicas
+    assert bloques_servicio.liberar_bloques([b.bloque_id for b, _ in archivo_b]) == 2
+    assert bloques_servicio.bloques_metadata == {}
+    assert bloques_servicio.indice_digest == {}
+    assert compartido.bloque_id in _invalidaciones(bloques_servicio)
+
+
+def test_las_referencias_sobreviven_a_un_reinicio(bloques_servicio):
+    d = _digest(b'persistente')
+    (bloque, _), _ = bloques_servicio.crear_bloques_deduplicados('/x', [{'digest': d, 'tamaño': 11}] * 2)
+
+    recargado = BloquesServicio()
+    assert recargado.bloques_metadata[bloque.bloque_id].referencias == 2
+    recargado.liberar_bloques([bloque.bloque_id])
+    assert BloquesServicio().bloques_metadata[bloque.bloque_id].referencias == 1
@@ -0,0 +1,121 @@
+import json
+
+import pytest
+
+from modelos.archivo_metadata import DirectorioMetadata
+from servicios.archivos_servicio import ArchivosServicio
+
+
+def _caida(servicio):
+    """El proceso muere sin escribir la instantánea: solo queda lo anotado en el diario"""
+    servicio._diario.close()
+
+
+def _estado(servicio):
+    return {ruta: (type(nodo).__name__, nodo.inodo_id, getattr(nodo, 'bloques', None),
+                   getattr(nodo, 'tamaño_total', None))
+            for nodo in servicio.inodos.values() for ruta in [_ruta(nodo)]}
+
+
+def _ruta(nodo):
+    partes = []
+    while nodo.padre is not None:
+        partes.append(nodo.nombre)
+        nodo = nodo.padre
+    return '/' + '/'.join(reversed(partes))
+
+
+@pytest.fixture
+def servicio(metadatos):
+    servicio = ArchivosServicio()
+    servicio.crear_directorio('/datos', usuario='ana')
+    servicio._guardar_metadata()
+    return servicio
+
+
+def _poblar(servicio):
+    servicio.crear_directorio('/datos/a/b', usuario='ana')
+    archivo = servicio.crear_archivo('/datos/a/b/x', 'ana')
+    archivo.bloques = ['b1', 'b2']
+    archivo.tamaño_total = 10
+    servicio.guardar_archivo(archivo)
+    servicio.crear_archivo('/datos/borrado', 'ana')
+    servicio.eliminar_archivo('/datos/borrado', 'ana')
+    servicio.renombrar('/datos/a', '/datos/c', 'ana')
+
+
+def test_los_cambios_se_anotan_sin_reescribir_la_instantanea(servicio, metadatos):
+    instantanea = (metadatos / 'directorios.json').read_text(), (metadatos / 'archivos.json').read_text()
+    _poblar(servicio)
+
+    assert ((metadatos / 'directorios.json').read_text(), (metadatos / 'archivos.json').read_text()) == instantanea
+    operaciones = [json.loads(linea)['op'] for linea in (metadatos / 'namespace_diario.jsonl').read_text().splitlines()]
+    assert operaciones == ['crear_directorio', 'crear_directorio', 'crear_archivo', 'archivo',
+                           'crear_archivo', 'eliminar', 'renombrar']
+
+
+def test_reaplica_el_diario_tras_una_caida(servicio, metadatos):
+    _poblar(servicio)
+    antes = _estado(servicio)
+    _caida(servicio)
+
+    recuperado = ArchivosServicio()
+    assert _estado(recuperado) == antes
+    archivo = recuperado.obtener_archivo('/datos/c/b/x')
+    assert archivo.bloques == ['b1', 'b2']
+    assert archivo.tamaño_total == 10
+    assert recuperado.obtener_archivo('/datos/borrado') is None
+    assert recuperado.obtener_directorio('/datos/a') is None
+
+    # Al arrancar se compacta: la instantánea ya lo contiene y el diario queda vacío
+    assert (metadatos / 'namespace_diario.jsonl').read_text() == ''
+    # Los inodos nuevos no reutilizan los anotados
+    nuevo = recuperado.crear_archivo('/datos/nuevo', 'ana')
+    assert nuevo.inodo_id > max(inodo for _, inodo, _, _ in antes.values())
+
+
+def test_descarta_la_ultima_entrada_a_medio_escribir(servicio, metadatos):
+    servicio.crear_archivo('/datos/completo', 'ana')
+    _caida(servicio)
+    with open(metadatos / 'namespace_diario.jsonl', 'a') as f:
+        f.write('{"op": "crear_archivo", "archivo": {"inodo_')
+
+    recuperado = ArchivosServicio()
+    assert recuperado.obtener_archivo('/datos/completo') is not None
+
+
+def test_caida_entre_la_instantanea_y_el_vaciado_del_diario(servicio, metadatos):
+    _poblar(servicio)
+    antes = _estado(servicio)
+    # La instantánea nueva ya reemplazó a la anterior, pero el diario no llegó a vaciarse
+    servicio._escribir_json('archivos.json',
+                            {str(a.inodo_id): a.to_dict() for a in servicio.iterar_archivos()})
+    servicio._escribir_json('directorios.json',
+                            {str(d.inodo_id): d.to_dict() for d in servicio.inodos.values()
+                             if isinstance(d, DirectorioMetadata)})
+    _caida(servicio)
+
+    assert _estado(ArchivosServicio()) == antes
+
+
+def test_caida_mientras_se_escribe_la_instantanea(servicio, metadatos):
+    _poblar(servicio)
+    antes = _estado(servicio)
+    _caida(servicio)
+    # Temporal a medias: la instantánea anterior sigue intacta
+    (metadatos / 'directorios.json.tmp').write_text('{"1": {"nombre"')
+
+    assert _estado(ArchivosServicio()) == antes
+
+
+def test_un_directorio_sobre_un_archivo_no_consume_inodos(servicio):
+    servicio.crear_archivo('/datos/f', 'ana')
+    siguiente = servicio.siguiente_inodo
+
+    with pytest.raises(ValueError):
+        servicio.crear_directorio('/datos/f/g', usuario='ana')
+    with pytest.raises(ValueError):
+        servicio.crear_directorio('/datos/f', usuario='ana')
+    with pytest.raises(ValueError):
+        servicio._crear_directorio_simple('/datos/f', usuario='ana')
+    assert servicio.siguiente_inodo == siguiente
@@ -0,0 +1,38 @@
+import itertools
+import os
+
+import pytest
+
+from common.utils import erasure
+
+
+@pytest.mark.parametrize('k, m', [(3, 2), (6, 3), (4, 1)])
+def test_recupera_los_datos_con_cualquier_combinacion_de_celdas_perdidas(k, m):
+    datos = os.urandom(1000)
+    celdas = erasure.encode(datos, k, m)
+    assert len(celdas) == k + m
+    assert len({len(celda) for celda in celdas}) == 1
+
+    for perdidas in itertools.combinations(range(k + m), m):
+        disponibles = {i: celda for i, celda in enumerate(celdas) if i not in perdidas}
+        assert erasure.decode(disponibles, k, m, len(datos)) == datos
+
+
+@pytest.mark.parametrize('tamaño', [0, 1, 5, 6, 7])
+def test_tamaños_que_no_llenan_las_celdas(tamaño):
+    datos = os.urandom(tamaño)
+    celdas = erasure.encode(datos, 3, 2)
+    assert erasure.decode({1: celdas[1], 3: celdas[3], 4: celdas[4]}, 3, 2, tamaño) == datos
+
+
+def test_faltan_celdas_para_decodificar():
+    celdas = erasure.encode(b'datos', 3, 2)
+    with pytest.raises(ValueError):
+        erasure.decode({0: celdas[0], 4: celdas[4]}, 3, 2, 5)
+
+
+def test_reconstruye_celdas_de_datos_y_de_paridad():
+    celdas = erasure.encode(os.urandom(3000), 6, 3)
+    disponibles = {i: celdas[i] for i in (0, 2, 4, 5, 7, 8)}
+    reconstruidas = erasure.reconstruct_cells(disponibles, 6, 3, [1, 3, 6])
+    assert reconstruidas == {1: celdas[1], 3: celdas[3], 6: celdas[6]}
@@ -0,0 +1,102 @@
+import time
+
+import pytest
+
+from servicios.archivos_servicio import ArchivosServicio
+from servicios.bloques_servicio import BloquesServicio
+from servicios.sesiones_subida_servicio import PENDIENTE, SesionesSubidaServicio
+
+
+def _confirmar(servicios, sesiones, bloque_id: str):
+    """Lo que hace /blocks/<id>/confirm tras escribir el bloque en sus DataNodes"""
+    _, bloques_servicio = servicios
+    bloques_servicio.registrar_checksum(bloques_servicio.obtener_bloque(bloque_id), bloque_id[:8] * 8)
+    sesiones.bloque_confirmado(bloque_id)
+    bloques_servicio._guardar_metadata()
+
+
+@pytest.fixture
+def sesiones(servicios):
+    return SesionesSubidaServicio(*servicios)
+
+
+def test_reanudar_devuelve_la_misma_sesion_con_lo_confirmado(servicios, sesiones):
+    archivos_servicio, bloques_servicio = servicios
+    tamaño = 2 * bloques_servicio.block_size + 1
+    plan = sesiones.abrir('/d/grande', tamaño, 'ana')
+    bloque_ids = [b['bloque_id'] for b in plan['bloques']]
+    assert len(bloque_ids) == 3
+    assert all(bloques_servicio.obtener_bloque(b).estado == PENDIENTE for b in bloque_ids)
+    assert archivos_servicio.obtener_archivo('/d/grande') is None
+
+    _confirmar(servicios, sesiones, bloque_ids[0])
+    reanudada = sesiones.abrir('/d/grande', tamaño, 'ana')
+    assert reanudada['sesion_id'] == plan['sesion_id']
+    assert reanudada['reanudada']
+    assert reanudada['confirmados'] == 1
+    assert [b['bloque_id'] for b in reanudada['bloques']] == bloque_ids
+
+    with pytest.raises(ValueError):
+        sesiones.completar(plan['sesion_id'], 'ana')
+    for bloque_id in bloque_ids[1:]:
+        _confirmar(servicios, sesiones, bloque_id)
+    archivo = sesiones.completar(plan['sesion_id'], 'ana')
+
+    assert archivos_servicio.obtener_archivo('/d/grande') is archivo
+    assert archivo.bloques == bloque_ids
+    assert archivo.tamaño_total == tamaño
+    assert all(bloques_servicio.obtener_bloque(b).estado == 'activo' for b in bloque_ids)
+    assert sesiones.sesiones == {}
+
+
+def test_las_sesiones_sobreviven_a_un_reinicio(servicios, sesiones):
+    plan = sesiones.abrir('/x', 10, 'ana')
+    _confirmar(servicios, sesiones, plan['bloques'][0]['bloque_id'])
+
+    recuperadas = SesionesSubidaServicio(ArchivosServicio(), BloquesServicio())
+    estado = recuperadas.estado(plan['sesion_id'], 'ana')
+    assert estado['confirmados'] == 1
+    with pytest.raises(PermissionError):
+        recuperadas.estado(plan['sesion_id'], 'luis')
+
+
+def test_otro_usuario_no_puede_abrir_la_misma_ruta(sesiones):
+    sesiones.abrir('/x', 10, 'ana')
+    with pytest.raises(ValueError):
+        sesiones.abrir('/x', 10, 'luis')
+
+
+def test_si_cambia_el_tamaño_se_abandona_la_subida_anterior(servicios, sesiones):
+    _, bloques_servicio = servicios
+    anterior = sesiones.abrir('/x', 10, 'ana')
+    nueva = sesiones.abrir('/x', 20, 'ana')
+
+    assert nueva['sesion_id'] != anterior['sesion_id']
+    assert not nueva['reanudada']
+    assert bloques_servicio.obtener_bloque(anterior['bloques'][0]['bloque_id']) is None
+
+
+def test_una_sesion_inactiva_caduca_y_libera_sus_bloques(servicios, sesiones):
+    _, bloques_servicio = servicios
+    plan = sesiones.abrir('/x', 10, 'ana')
+    sesiones.sesiones[plan['sesion_id']]['actividad'] = time.time() - sesiones.duracion - 1
+
+    assert sesiones.expirar() == 1
+    assert bloques_servicio.obtener_bloque(plan['bloques'][0]['bloque_id']) is None
+    with pytest.raises(LookupError):
+        sesiones.estado(plan['sesion_id'], 'ana')
+
+
+def test_un_bloque_sin_confirmar_en_un_datanode_caido_se_recoloca(servicios, sesiones):
+    _, bloques_servicio = servicios
+    plan = sesiones.abrir('/x', 10, 'ana')
+    bloque = bloques_servicio.obtener_bloque(plan['bloques'][0]['bloque_id'])
+    caido = bloques_servicio._buscar_datanode(*bloque.ubicaciones[0])
+    caido.estado = 'inactivo'
+
+    estado = sesiones.estado(plan['sesion_id'], 'ana')
+    nuevo = estado['bloques'][0]
+    assert nuevo['bloque_id'] != bloque.bloque_id
+    assert [caido.host, caido.puerto] not in [list(u) for u in nuevo['ubicaciones']]
+    assert bloques_servicio.obtener_bloque(bloque.bloque_id) is None
+    assert sesiones.pertenece(nuevo['bloque_id'])